@@ -4,26 +4,60 @@ Agents Package
 Export all agents for easy import.
 """
 
-from agents.study_buddy_agent import study_buddy_agent
-from agents.learning_planner_agent import learning_planner
-from agents.tutor_agent import tutor_agent
-from agents.quiz_agent import quiz_agent
-from agents.progress_tracker_agent import progress_tracker
-from agents.reflection_agent import reflection_agent
-from agents.validators import (
-    study_plan_validator,
-    quiz_validator,
-    explanation_validator
+from agents.validation import ValidationPipeline, ValidatingHooks, get_validating_hooks
+from agents.schemas import (
+    Explanation, Quiz, Flashcard, SchemaError,
+    parse_explanation, parse_quiz, render_explanation, render_quiz
 )
+from agents.fanout import FanOutHooks, get_fanout_hooks, plan_subtasks, merge_deltas
+from agents.prefetch import PrefetchScheduler, PrefetchHooks, get_prefetch_hooks
+from agents.tiering import model_for, TieringHooks, TierReport, get_tiering_hooks
+from agents.single_flight import SingleFlight, SingleFlightHooks, get_single_flight_hooks
+from agents.cohort_content import CohortContent, CohortContentHooks, get_cohort_content_hooks
 
-__all__ = [
-    "study_buddy_agent",
-    "learning_planner",
-    "tutor_agent", 
-    "quiz_agent",
-    "progress_tracker",
-    "reflection_agent",
-    "study_plan_validator",
-    "quiz_validator",
-    "explanation_validator"
-]
+# The agents themselves need ADK, import conditionally
+try:
+    from agents.study_buddy_agent import study_buddy_agent
+    from agents.learning_planner_agent import learning_planner
+    from agents.tutor_agent import tutor_agent
+    from agents.quiz_agent import quiz_agent
+    from agents.progress_tracker_agent import progress_tracker
+    from agents.reflection_agent import reflection_agent
+    from agents.validators import (
+        study_plan_validator,
+        quiz_validator,
+        explanation_validator
+    )
+    
+    __all__ = [
+        "study_buddy_agent",
+        "learning_planner",
+        "tutor_agent", 
+        "quiz_agent",
+        "progress_tracker",
+        "reflection_agent",
+        "study_plan_validator",
+        "quiz_validator",
+        "explanation_validator",
+        "ValidationPipeline",
+        "ValidatingHooks",
+        "get_validating_hooks",
+        "Explanation", "Quiz", "Flashcard", "SchemaError",
+        "parse_explanation", "parse_quiz", "render_explanation", "render_quiz",
+        "FanOutHooks", "get_fanout_hooks", "plan_subtasks", "merge_deltas",
+        "PrefetchScheduler", "PrefetchHooks", "get_prefetch_hooks",
+        "model_for", "TieringHooks", "TierReport", "get_tiering_hooks",
+        "SingleFlight", "SingleFlightHooks", "get_single_flight_hooks",
+        "CohortContent", "CohortContentHooks", "get_cohort_content_hooks"
+    ]
+except ImportError:
+    __all__ = [
+        "ValidationPipeline", "ValidatingHooks", "get_validating_hooks",
+        "Explanation", "Quiz", "Flashcard", "SchemaError",
+        "parse_explanation", "parse_quiz", "render_explanation", "render_quiz",
+        "FanOutHooks", "get_fanout_hooks", "plan_subtasks", "merge_deltas",
+        "PrefetchScheduler", "PrefetchHooks", "get_prefetch_hooks",
+        "model_for", "TieringHooks", "TierReport", "get_tiering_hooks",
+        "SingleFlight", "SingleFlightHooks", "get_single_flight_hooks",
+        "CohortContent", "CohortContentHooks", "get_cohort_content_hooks"
+    ]
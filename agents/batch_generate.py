@@ -0,0 +1,223 @@
+"""
+batch_generate.py
+==================
+Pre-generates a cohort's explanations, flashcards and quizzes off-peak.
+
+    python -m agents.batch_generate                                  # the syllabus in COHORT_TOPICS
+    python -m agents.batch_generate --topics "Binary Heaps,Tries" --levels beginner
+    python -m agents.batch_generate --topics-file topics.txt --concurrency 8 --retries 5
+
+Every topic gets, at every level, a tutor explanation (with its flashcards
+pulled out as Q/A pairs) and a quiz, written to COHORT_CONTENT_DIR where
+CohortContentHooks serves them. At most --concurrency generations run at
+once. A failed one - an error, or a reply the local checks don't take for
+a full quiz/explanation - is retried with exponential backoff plus jitter.
+Every item is saved the moment it's done, so an interrupted run picks up
+where it stopped: run the same command again (--force regenerates it all).
+"""
+
+import argparse
+import asyncio
+import random
+import re
+import sys
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config.settings import (
+    COHORT_TOPICS, COHORT_LEVELS, BATCH_CONCURRENCY, BATCH_RETRIES, BATCH_BACKOFF
+)
+from agents.cohort_content import CohortContent
+from agents.schemas import (
+    SchemaError, json_payload, parse_explanation, parse_quiz, render_explanation, render_quiz
+)
+from agents.validation import LOCAL_CHECKS, INVALID, SKIPPED, section_body, EXPLANATION_SECTIONS
+from observability.metrics import registry as metrics
+
+BATCH_USER = "cohort_batch"
+
+_FLASHCARD = re.compile(r"^\s*\*\*Q(\d+):?\*\*:?\s*(.+?)\s*\n\s*\*\*A\1:?\*\*:?\s*(.+?)\s*$", re.MULTILINE)
+
+
+class BatchItem:
+    """One thing to generate: an agent's answer about a topic at a level."""
+    
+    __slots__ = ("agent", "topic", "level")
+    
+    def __init__(self, agent: str, topic: str, level: str):
+        self.agent = agent
+        self.topic = topic
+        self.level = level
+    
+    @property
+    def request(self) -> str:
+        a = "an" if self.level[:1] in "aeiou" else "a"
+        if self.agent == "quiz_agent":
+            return f"Create {a} {self.level} quiz on {self.topic}"
+        return f"Explain {self.topic} for {a} {self.level} student"
+    
+    def __repr__(self):
+        return f"{self.agent} / {self.level} / {self.topic}"
+
+
+def plan_items(topics: List[str], levels: List[str]) -> List[BatchItem]:
+    """Everything to generate, topic by topic."""
+    return [BatchItem(agent, topic, level)
+            for topic in topics for level in levels for agent in ("tutor_agent", "quiz_agent")]
+
+
+def read_topics(spec: Optional[str] = None, path: Optional[str] = None) -> List[str]:
+    """Topics from a comma-separated list and/or a file with one per line (# for comments)."""
+    topics: List[str] = []
+    if spec:
+        topics += [t.strip() for t in spec.split(",")]
+    if path:
+        with open(path, encoding="utf-8") as f:
+            topics += [line.split("#", 1)[0].strip() for line in f]
+    topics = [t for t in topics if t]
+    return list(dict.fromkeys(topics)) if topics else list(COHORT_TOPICS)
+
+
+def flashcards_of(explanation: str) -> List[Dict[str, str]]:
+    """The Q/A pairs in an explanation's Flashcards section."""
+    body = section_body(explanation, EXPLANATION_SECTIONS["Flashcards"])
+    return [{"question": q, "answer": a} for _, q, a in _FLASHCARD.findall(body)]
+
+
+def finish(agent: str, text: str) -> Dict[str, Any]:
+    """
+    Turn a raw reply into what gets saved: markdown content, plus the
+    flashcards for an explanation. JSON replies (structured output) are
+    parsed and rendered. Raises ValueError if it isn't usable.
+    """
+    if json_payload(text) is not None:
+        try:
+            if agent == "quiz_agent":
+                text = render_quiz(parse_quiz(text))
+            else:
+                explanation = parse_explanation(text)
+                return {"content": render_explanation(explanation),
+                        "flashcards": [card.to_dict() for card in explanation.flashcards]}
+        except SchemaError as e:
+            raise ValueError(f"bad structured reply: {e}")
+    if not text.strip():
+        raise ValueError("empty reply")
+    check = LOCAL_CHECKS.get(agent)
+    result = check(text) if check is not None else None
+    if result is not None and result.verdict == SKIPPED:
+        raise ValueError("not a full quiz/explanation")  # fine as a chat reply, not as cohort content
+    if result is not None and result.verdict == INVALID:
+        raise ValueError("; ".join(result.issues))
+    if agent == "quiz_agent":
+        return {"content": text}
+    return {"content": text, "flashcards": flashcards_of(text)}
+
+
+async def generate_item(
+    item: BatchItem,
+    generate: Callable[[str, str, str, Dict[str, Any]], Awaitable[str]],
+    retries: int = BATCH_RETRIES,
+    backoff: float = BATCH_BACKOFF,
+    sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep
+) -> Dict[str, Any]:
+    """Generate one item, retrying with exponential backoff. Returns the finished record."""
+    for attempt in range(retries + 1):
+        try:
+            record = finish(item.agent, await generate(item.agent, item.request, BATCH_USER, {}))
+            record["attempts"] = attempt + 1
+            return record
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            print(f"  {item}: {type(e).__name__}: {e} - retrying in {delay:.1f}s")
+            metrics.counter("studybuddy_batch_retries_total", "Batch generations retried", agent=item.agent).inc()
+            await sleep(delay)
+
+
+async def run_batch(
+    items: List[BatchItem],
+    generate: Optional[Callable[[str, str, str, Dict[str, Any]], Awaitable[str]]] = None,
+    store: Optional[CohortContent] = None,
+    concurrency: int = BATCH_CONCURRENCY,
+    retries: int = BATCH_RETRIES,
+    backoff: float = BATCH_BACKOFF,
+    force: bool = False
+) -> Dict[str, Any]:
+    """Generate everything not already done, `concurrency` at a time, saving each as it lands."""
+    if generate is None:
+        from agents.prefetch import run_agent as generate
+    store = store if store is not None else CohortContent()
+    todo = [item for item in items if force or not store.has(item.agent, item.level, item.topic)]
+    slots = asyncio.Semaphore(concurrency)
+    failed: List[str] = []
+    attempts = 0
+    
+    async def one(item: BatchItem) -> None:
+        nonlocal attempts
+        async with slots:
+            try:
+                record = await generate_item(item, generate, retries, backoff)
+            except Exception as e:
+                failed.append(f"{item}: {type(e).__name__}: {e}")
+                attempts += retries + 1
+                metrics.counter("studybuddy_batch_items_total", "Batch items by outcome",
+                                agent=item.agent, outcome="failed").inc()
+                print(f"  [FAIL] {item}: {e}")
+                return
+        attempts += record.pop("attempts")
+        store.save(item.agent, item.level, item.topic, item.request, **record)
+        metrics.counter("studybuddy_batch_items_total", "Batch items by outcome",
+                        agent=item.agent, outcome="generated").inc()
+        print(f"  [OK] {item}")
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(one(item) for item in todo))
+    return {
+        "items": len(items),
+        "skipped": len(items) - len(todo),
+        "generated": len(todo) - len(failed),
+        "failed": failed,
+        "attempts": attempts,
+        "elapsed_s": time.perf_counter() - start,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-generate explanations, flashcards and quizzes for a cohort")
+    parser.add_argument("--topics", help="Comma-separated topics (default: COHORT_TOPICS)")
+    parser.add_argument("--topics-file", help="File with one topic per line")
+    parser.add_argument("--levels", default=",".join(COHORT_LEVELS), help="Comma-separated difficulty levels")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Generations running at once")
+    parser.add_argument("--retries", type=int, default=BATCH_RETRIES, help="Extra attempts per failed item")
+    parser.add_argument("--backoff", type=float, default=BATCH_BACKOFF, help="Seconds before the first retry")
+    parser.add_argument("--output", help="Directory to write to (default: COHORT_CONTENT_DIR)")
+    parser.add_argument("--force", action="store_true", help="Regenerate items that are already done")
+    args = parser.parse_args(argv)
+    
+    try:
+        import google.adk  # noqa: F401
+    except ImportError:
+        print("Batch generation needs google-adk installed.")
+        return 2
+    
+    levels = [level.strip() for level in args.levels.split(",") if level.strip()]
+    items = plan_items(read_topics(args.topics, args.topics_file), levels)
+    store = CohortContent(args.output) if args.output else CohortContent()
+    print(f"Generating {len(items)} item(s) into {store.directory} ({args.concurrency} at a time)...")
+    summary = asyncio.run(run_batch(
+        items, store=store, concurrency=args.concurrency,
+        retries=args.retries, backoff=args.backoff, force=args.force
+    ))
+    
+    print(f"\nGenerated {summary['generated']}, already done {summary['skipped']}, failed {len(summary['failed'])}"
+          f" ({summary['attempts']} model run(s) in {summary['elapsed_s']:.1f}s)")
+    for failure in summary["failed"]:
+        print(f"  {failure}")
+    if summary["failed"]:
+        print("Run the same command again to retry just the failed items.")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+cohort_content.py
+==================
+Explanations and quizzes generated ahead of time for a whole cohort.
+
+`python -m agents.batch_generate` writes one JSON file per agent, level and
+topic into COHORT_CONTENT_DIR, off-peak, before the class needs them.
+With USE_COHORT_CONTENT on, CohortContentHooks answers tutor_agent and
+quiz_agent calls from those files when a request is about exactly a
+generated topic, at a generated level:
+
+    "Create an intermediate quiz on OS"   ->  quiz_agent / intermediate / OS
+    "Explain DSA for a beginner student"  ->  tutor_agent / beginner / DSA
+    "Explain sorting in DSA"              ->  no match (more specific), goes to the model
+
+A request that doesn't name a level counts as COHORT_DEFAULT_LEVEL, and
+files older than COHORT_CONTENT_TTL are ignored. The files double as the
+batch job's checkpoints: an item whose file exists is done.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, FrozenSet, Optional, Tuple
+
+from config.settings import (
+    COHORT_CONTENT_DIR, COHORT_CONTENT_TTL, COHORT_DEFAULT_LEVEL
+)
+from agents.fanout import topic_of, user_message
+from observability.instrumentation import InstrumentationHooks
+from observability.metrics import registry as metrics, record_cache_lookup
+
+SERVED_AGENTS = ("tutor_agent", "quiz_agent")
+
+# Words a request can name a level with
+LEVEL_WORDS = {
+    "beginner": ("beginner", "beginners", "basic", "basics", "intro", "introductory"),
+    "intermediate": ("intermediate",),
+    "exam-prep": ("exam", "prep", "exam-prep", "advanced", "interview"),
+}
+_NOT_TOPIC = {"at", "level", "difficulty", "student", "students"} | {w for ws in LEVEL_WORDS.values() for w in ws}
+_WORD = re.compile(r"[a-z0-9+#]+")
+
+
+def level_of(request: str) -> str:
+    words = set(re.findall(r"[a-z-]+", request.lower()))
+    for level, names in LEVEL_WORDS.items():
+        if words & set(names):
+            return level
+    return COHORT_DEFAULT_LEVEL
+
+
+def topic_words(request: str) -> FrozenSet[str]:
+    """What a request is about, as words: "Create an intermediate quiz on OS" -> {"os"}."""
+    return frozenset(w for w in _WORD.findall(topic_of(request).lower()) if w not in _NOT_TOPIC)
+
+
+def _slug(text: str) -> str:
+    text = text.lower().replace("+", "p").replace("#", "sharp")
+    return re.sub(r"[^a-z0-9]+", "-", text).strip("-") or "topic"
+
+
+class CohortContent:
+    """The generated files, indexed by (agent, level, topic words)."""
+    
+    def __init__(self, directory: str = COHORT_CONTENT_DIR, ttl: float = COHORT_CONTENT_TTL,
+                 clock: Callable[[], float] = time.time):
+        self.directory = directory
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: Optional[Dict[Tuple[str, str, FrozenSet[str]], Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+    
+    def path(self, agent: str, level: str, topic: str) -> str:
+        return os.path.join(self.directory, f"{agent}__{level}__{_slug(topic)}.json")
+    
+    def _fresh(self, record: Dict[str, Any]) -> bool:
+        return self.clock() - record.get("created", 0) < self.ttl
+    
+    def has(self, agent: str, level: str, topic: str) -> bool:
+        """Whether a fresh file for this item is already there."""
+        try:
+            with open(self.path(agent, level, topic), encoding="utf-8") as f:
+                return self._fresh(json.load(f))
+        except (OSError, ValueError):
+            return False
+    
+    def save(self, agent: str, level: str, topic: str, request: str, content: str, **extra: Any) -> str:
+        """Write one item (atomically, so a killed run never leaves half a file)."""
+        record = {"agent": agent, "level": level, "topic": topic, "request": request,
+                  "content": content, "created": self.clock(), **extra}
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(agent, level, topic)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+        with self._lock:
+            if self._entries is not None:
+                self._entries[(agent, level, topic_words(topic))] = record
+        return path
+    
+    def load(self) -> int:
+        """(Re)read every fresh file in the directory; returns how many there are."""
+        entries = {}
+        names = os.listdir(self.directory) if os.path.isdir(self.directory) else []
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+                    record = json.load(f)
+                key = (record["agent"], record["level"], topic_words(record["topic"]))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Skipping cohort content {name}: {e}")
+                continue
+            if self._fresh(record):
+                entries[key] = record
+        with self._lock:
+            self._entries = entries
+        return len(entries)
+    
+    def find(self, agent: str, request: str) -> Optional[Dict[str, Any]]:
+        """The generated item this request asks for exactly, or None."""
+        if self._entries is None:
+            self.load()
+        words = topic_words(request)
+        if not words:
+            return None
+        with self._lock:
+            record = self._entries.get((agent, level_of(request), words))
+        return record if record is not None and self._fresh(record) else None
+    
+    def __len__(self) -> int:
+        if self._entries is None:
+            self.load()
+        return len(self._entries)
+
+
+class CohortContentHooks(InstrumentationHooks):
+    """Answers tutor/quiz calls with pre-generated cohort content when there's an exact match."""
+    
+    def __init__(self, store: Optional[CohortContent] = None):
+        self.store = store if store is not None else CohortContent()
+    
+    def before_tool(self, tool, args, tool_context):
+        agent = getattr(getattr(tool, "agent", None), "name", None)
+        if agent not in SERVED_AGENTS:
+            return None
+        record = self.store.find(agent, user_message(str((args or {}).get("request", ""))))
+        record_cache_lookup("cohort_content", record is not None)
+        if record is None:
+            return None
+        metrics.counter("studybuddy_cohort_content_served_total", "Tool calls answered with pre-generated content",
+                        agent=agent, level=record["level"]).inc()
+        return record["content"]
+
+
+_hooks: Optional[CohortContentHooks] = None
+
+
+def get_cohort_content_hooks() -> CohortContentHooks:
+    """Process-wide cohort content hooks."""
+    global _hooks
+    if _hooks is None:
+        _hooks = CohortContentHooks()
+    return _hooks
@@ -0,0 +1,311 @@
+"""
+fanout.py
+==========
+Runs the independent parts of a compound request at the same time.
+
+"Explain heaps and then quiz me" makes the orchestrator call tutor_agent,
+wait for the whole explanation, then call quiz_agent - even though the quiz
+doesn't need the explanation. FanOutHooks looks at each new student message
+before the orchestrator's first model call. If it splits into parts that
+each clearly belong to one sub-agent, and none refers back to another
+("quiz me on that", "based on my progress"), the sub-agents run together
+with asyncio.gather:
+
+    explain heaps | quiz me      ->  tutor_agent("explain heaps")
+                                     quiz_agent("quiz me on heaps")   (together)
+
+The orchestrator's model call is then answered with those AgentTool calls,
+and each call is answered with its finished result. To the orchestrator
+(and the session history) it looks like it asked for them itself, so it
+still writes the reply and any follow-up (saving the flashcards of an
+explanation) on its next turn. Anything else goes to the orchestrator as
+usual.
+
+Every sub-agent gets its own tool context, so its state changes are kept
+apart; merge_deltas() then applies them in order, merging dict values
+(progress, spaced_repetition, ...) key by key so two agents touching the
+same dict don't undo each other.
+"""
+
+import asyncio
+import re
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config.settings import FANOUT_MAX_TASKS
+from memory.content_cache import GENERATE
+from observability.instrumentation import InstrumentationHooks, context_ids
+from observability.metrics import registry as metrics
+
+ORCHESTRATOR = "study_buddy"
+
+# A part has to match exactly one of these to be sent straight to that agent
+ROUTES = {
+    "quiz_agent": re.compile(r"\bquiz\b|\btest me\b|\bpractice questions?\b", re.IGNORECASE),
+    "learning_planner": re.compile(r"\bplan\b|\bschedule\b|\broadmap\b", re.IGNORECASE),
+    "progress_tracker": re.compile(r"\bprogress\b|\bstats\b|\bhow am i doing\b", re.IGNORECASE),
+    "tutor_agent": re.compile(r"\bexplain\b|\bteach me\b|\bwhat (?:is|are)\b|\bhow does\b", re.IGNORECASE),
+}
+_SPLIT = re.compile(r"\s*(?:[;,]?\s*\b(?:and then|and also|after that|then|also|plus|and)\b|;)\s*", re.IGNORECASE)
+# Words that point at another part's answer - those parts have to wait
+_DEPENDS = re.compile(r"\b(?:that|it|this|these|those|them|above|based on|using the|from the)\b", re.IGNORECASE)
+# What's left of "quiz me on heaps" once the routing words and the
+# orchestrator's phrasing ("to the student with a simple example") are gone
+# is the topic
+_FILLER = re.compile(
+    r"\b(?:explain|teach|me|what|is|are|how|does|quiz|test|practice|questions?|make|create|give|"
+    r"show|my|a|an|the|on|about|for|of|to|please|can|you|plan|schedule|roadmap|progress|stats|"
+    r"am|i|doing|study|students?|with|in|using|some|new|short|quick|simple|simpler|simply|"
+    r"examples?|detail|detailed|level|beginners?|intermediate|advanced)\b|[?.!,]",
+    re.IGNORECASE,
+)
+# Requests about the student's own work (grading, checking answers) rather than for new content
+_REVIEWING = re.compile(
+    r"\b(?:grade|grading|mark|check|evaluate|review|feedback|score|answers?|answered|responses?|"
+    r"submitted|results?)\b",
+    re.IGNORECASE,
+)
+REVIEW = "review"
+
+
+class SubTask:
+    """One part of a compound request and the agent it goes to."""
+    
+    __slots__ = ("agent", "request")
+    
+    def __init__(self, agent: str, request: str):
+        self.agent = agent
+        self.request = request
+    
+    def __repr__(self):
+        return f"SubTask({self.agent!r}, {self.request!r})"
+
+
+def route(part: str) -> Optional[str]:
+    """The one agent a part is for, or None if it's unclear."""
+    matches = [agent for agent, pattern in ROUTES.items() if pattern.search(part)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def topic_of(part: str) -> str:
+    return " ".join(_FILLER.sub(" ", part).split())
+
+
+def intent_of(request: str) -> str:
+    """GENERATE for a request for new content, REVIEW for one about the student's answers."""
+    return REVIEW if _REVIEWING.search(request) else GENERATE
+
+
+def plan_subtasks(message: str, max_tasks: int = FANOUT_MAX_TASKS) -> Optional[List[SubTask]]:
+    """
+    Split a message into independent sub-tasks, or None if it isn't one.
+    
+    Parts that don't route anywhere stick to the part before them ("explain
+    stacks and queues" stays one part). A part without a topic of its own
+    borrows the previous part's ("quiz me" after "explain heaps").
+    """
+    parts: List[str] = []
+    for piece in _SPLIT.split(message.strip()):
+        if not piece:
+            continue
+        if parts and route(piece) is None:
+            parts[-1] += f" and {piece}"
+        else:
+            parts.append(piece)
+    if not 2 <= len(parts) <= max_tasks:
+        return None
+    
+    tasks: List[SubTask] = []
+    topic = ""
+    for i, part in enumerate(parts):
+        agent = route(part)
+        if agent is None or (i and _DEPENDS.search(part)):
+            return None
+        own_topic = topic_of(part)
+        if own_topic:
+            topic = own_topic
+        elif topic and agent in ("quiz_agent", "tutor_agent"):
+            part = f"{part} on {topic}"
+        tasks.append(SubTask(agent, part))
+    return tasks
+
+
+_MISSING = object()
+
+
+def merge_deltas(base: Dict[str, Any], deltas: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], int]:
+    """
+    Combine the state changes of sub-agents that ran side by side.
+    
+    Deltas are applied in order. When two of them set the same dict-valued
+    key, each one's changes (relative to `base`) are merged in one level
+    down; only a sub-key both changed - or a non-dict value both set
+    differently - is a real conflict, and the later task wins it.
+    
+    Returns:
+        (merged delta, number of conflicts)
+    """
+    merged: Dict[str, Any] = {}
+    conflicts = 0
+    for delta in deltas:
+        for key, value in delta.items():
+            if key not in merged:
+                merged[key] = value
+                continue
+            previous = merged[key]
+            original = base.get(key)
+            if isinstance(previous, dict) and isinstance(value, dict) and isinstance(original, (dict, type(None))):
+                original = original or {}
+                combined = dict(previous)
+                for sub_key, sub_value in value.items():
+                    before = original.get(sub_key, _MISSING)
+                    if sub_value == before:
+                        continue  # this task didn't touch it
+                    if combined.get(sub_key, _MISSING) not in (before, sub_value):
+                        conflicts += 1
+                    combined[sub_key] = sub_value
+                for sub_key in original:
+                    if sub_key not in value:
+                        combined.pop(sub_key, None)
+                merged[key] = combined
+            else:
+                if previous != value:
+                    conflicts += 1
+                merged[key] = value
+    return merged, conflicts
+
+
+def _result_text(task: SubTask, result: Any) -> str:
+    if isinstance(result, BaseException):
+        return f"(Couldn't finish \"{task.request}\": {result})"
+    return str(result).strip()
+
+
+def user_message(text: str) -> str:
+    """What the student typed, without the Context: block main.py puts in front."""
+    marker = "\n\nUser: "
+    return text.rsplit(marker, 1)[1] if text.startswith("Context:") and marker in text else text
+
+
+def _last_user_text(llm_request) -> Optional[str]:
+    """The new student message, if this is the first model call of a turn."""
+    contents = getattr(llm_request, "contents", None) or []
+    if not contents or getattr(contents[-1], "role", None) != "user":
+        return None
+    parts = getattr(contents[-1], "parts", None) or []
+    if any(getattr(p, "function_response", None) for p in parts):
+        return None  # a tool result - the orchestrator is already at work
+    text = "".join(getattr(p, "text", None) or "" for p in parts)
+    return text or None
+
+
+def agent_tools(agent) -> Dict[str, Any]:
+    """Sub-agent name -> the AgentTool that calls it."""
+    return {tool.agent.name: tool for tool in getattr(agent, "tools", None) or []
+            if getattr(tool, "agent", None) is not None}
+
+
+def _new_tool_context(callback_context):
+    from google.adk.tools.tool_context import ToolContext
+    
+    return ToolContext(callback_context._invocation_context)
+
+
+def _function_call_response(calls: List[Tuple[str, Dict[str, Any]]]):
+    from google.adk.models import LlmResponse
+    from google.genai import types
+    
+    return LlmResponse(content=types.Content(role="model", parts=[
+        types.Part(function_call=types.FunctionCall(name=name, args=args)) for name, args in calls
+    ]))
+
+
+def _state_delta(tool_context) -> Dict[str, Any]:
+    actions = getattr(tool_context, "actions", None)
+    return dict(getattr(actions, "state_delta", None) or {})
+
+
+class FanOutHooks(InstrumentationHooks):
+    """
+    Runs the sub-agents of a compound request concurrently, then hands the
+    orchestrator their calls and results as if it had made them itself.
+    """
+    
+    def __init__(
+        self,
+        max_tasks: int = FANOUT_MAX_TASKS,
+        make_tool_context: Callable[[Any], Any] = _new_tool_context,
+        make_response: Callable[[List[Tuple[str, Dict[str, Any]]]], Any] = _function_call_response
+    ):
+        self.max_tasks = max_tasks
+        self.make_tool_context = make_tool_context
+        self.make_response = make_response
+        # invocation -> {(sub-agent, request): result} waiting for the orchestrator's tool call
+        self._results: Dict[Any, Dict[Tuple[str, str], str]] = {}
+    
+    async def before_model(self, callback_context, llm_request):
+        if context_ids(callback_context)["agent_name"] != ORCHESTRATOR:
+            return None
+        text = _last_user_text(llm_request)
+        tasks = plan_subtasks(user_message(text), self.max_tasks) if text else None
+        if not tasks:
+            return None
+        invocation = getattr(callback_context, "_invocation_context", None)
+        tools = agent_tools(getattr(invocation, "agent", None))
+        if any(task.agent not in tools for task in tasks):
+            return None
+        
+        context = text[:len(text) - len(user_message(text))]  # the Context: block, if any
+        calls = [(task.agent, {"request": context + task.request}) for task in tasks]
+        state = callback_context.state
+        base = dict(state.to_dict() if hasattr(state, "to_dict") else state)
+        tool_contexts = [self.make_tool_context(callback_context) for _ in tasks]
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            tools[name].run_async(args=args, tool_context=tool_context)
+            for (name, args), tool_context in zip(calls, tool_contexts)
+        ), return_exceptions=True)
+        elapsed = time.perf_counter() - start
+        
+        merged, conflicts = merge_deltas(base, [_state_delta(c) for c in tool_contexts])
+        for key, value in merged.items():
+            state[key] = value
+        
+        metrics.counter("studybuddy_fanout_total", "Compound requests run as parallel sub-tasks").inc()
+        metrics.counter("studybuddy_fanout_subtasks_total", "Sub-tasks run in parallel").inc(len(tasks))
+        if conflicts:
+            metrics.counter("studybuddy_fanout_state_conflicts_total", "State keys two sub-tasks both changed").inc(conflicts)
+        metrics.histogram("studybuddy_fanout_duration_seconds", "Wall-clock time of a fan-out").observe(elapsed)
+        self._results[context_ids(callback_context)["invocation_id"]] = {
+            (name, args["request"]): _result_text(task, result)
+            for (name, args), task, result in zip(calls, tasks, results)
+        }
+        return self.make_response(calls)
+    
+    def before_tool(self, tool, args, tool_context):
+        invocation = context_ids(tool_context)["invocation_id"]
+        results = self._results.get(invocation)
+        if not results:
+            return None
+        name = getattr(getattr(tool, "agent", None), "name", None)
+        result = results.pop((name, str((args or {}).get("request", ""))), None)
+        if not results:
+            del self._results[invocation]
+        return result
+    
+    def after_agent(self, callback_context):
+        ids = context_ids(callback_context)
+        if ids["agent_name"] == ORCHESTRATOR:
+            self._results.pop(ids["invocation_id"], None)  # calls the orchestrator didn't make after all
+        return None
+
+
+_hooks: Optional[FanOutHooks] = None
+
+
+def get_fanout_hooks() -> FanOutHooks:
+    """Process-wide fan-out hooks."""
+    global _hooks
+    if _hooks is None:
+        _hooks = FanOutHooks()
+    return _hooks
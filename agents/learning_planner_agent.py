@@ -5,11 +5,11 @@ Creates personalized study plans with spaced repetition scheduling.
 """
 
 from google.adk.agents import LlmAgent
-from config.settings import MODEL
+from agents.tiering import model_for
 
 
 learning_planner = LlmAgent(
-    model=MODEL,
+    model=model_for("learning_planner"),
     name="learning_planner",
     description="Creates and updates personalized study plans with spaced repetition",
     instruction="""
@@ -25,8 +25,8 @@ INPUT CONTEXT:
 BEHAVIOR:
 1. Analyze the user's goals and constraints
 2. Check any available progress data to identify:
-   - Which topics are weak (low scores)
-   - Recent quiz scores and trends
+   - Which topics are weak (low `ewma`, low `mastery`)
+   - Recent quiz scores and trends (`trend_slope` > 0 improving, < 0 slipping)
    - What has already been covered
 3. Check spaced repetition schedule for topics due for review
 
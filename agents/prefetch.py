@@ -0,0 +1,286 @@
+"""
+prefetch.py
+============
+Generates the student's likely next step while they're still reading.
+
+After an explanation the student nearly always says "quiz me on this" or
+moves on to the next topic of their study plan. So whenever tutor_agent
+answers, PrefetchHooks asks the scheduler for, in the background:
+
+    quiz_agent   "Create a quiz on <topic>"
+    tutor_agent  "Explain <next plan topic>"    (if there's a plan)
+
+When the orchestrator then asks quiz_agent/tutor_agent for new content on
+the same topic, the prefetched answer is returned straight away (asking
+quiz_agent to grade the student's answers on it doesn't count). One that's
+still being written is awaited for up to PREFETCH_WAIT; one still queued
+behind other students' prefetches isn't awaited at all - it's cancelled and
+the agent runs as usual, so a prefetch never makes the live request slower.
+A call that goes somewhere else is a divergence: whatever was prefetched for
+that student is cancelled and dropped.
+
+Prefetches run one at a time on their own thread and event loop, after a
+short delay so the live request goes first, and each student gets at most
+PREFETCH_DAILY_LIMIT a day (none at all once over their token budget).
+The plan's topics are read from the planner's "Topics Breakdown" table.
+"""
+
+import asyncio
+import re
+import threading
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config.settings import PREFETCH_DAILY_LIMIT, PREFETCH_DELAY, PREFETCH_WAIT
+from agents.fanout import GENERATE, intent_of, topic_of
+from agents.validation import section_body, PLAN_SECTIONS
+from memory.content_cache import ContentCache
+from observability.instrumentation import InstrumentationHooks, context_ids
+from observability.metrics import registry as metrics, record_cache_lookup
+
+PLAN_TOPICS_KEY = "plan_topics"
+# Calls to these that don't match a prefetch mean the student went elsewhere
+DIVERGING_AGENTS = ("tutor_agent", "quiz_agent", "learning_planner")
+
+_CELL_SPLIT = re.compile(r"\s*(?:,|;|&|\band\b|<br>)\s*", re.IGNORECASE)
+
+
+def plan_topics(plan: str) -> List[str]:
+    """Topics in the order a plan's "Topics Breakdown" table lists them."""
+    body = section_body(plan, PLAN_SECTIONS["Topics Breakdown"])
+    rows = [[cell.strip() for cell in line.strip().strip("|").split("|")]
+            for line in body.splitlines() if line.strip().startswith("|")]
+    if len(rows) < 3:
+        return []
+    header = [cell.lower() for cell in rows[0]]
+    column = next((i for i, cell in enumerate(header) if "topic" in cell), 1 if len(header) > 1 else 0)
+    topics: List[str] = []
+    for row in rows[2:]:  # skip the |---| line
+        if column < len(row):
+            for topic in _CELL_SPLIT.split(row[column]):
+                topic = topic.strip(" *`")
+                if topic and topic not in topics:
+                    topics.append(topic)
+    return topics
+
+
+def next_plan_topic(topics: List[str], current: str) -> Optional[str]:
+    """The plan topic after the one just explained (None if it's not in the plan or is last)."""
+    current_words = set(current.lower().split())
+    for i, topic in enumerate(topics):
+        if current_words and current_words <= set(topic.lower().split()) or topic.lower() in current.lower():
+            return topics[i + 1] if i + 1 < len(topics) else None
+    return None
+
+
+async def run_agent(agent_name: str, request: str, user_id: str, state: Dict[str, Any]) -> str:
+    """Run one sub-agent on its own, in a throwaway session seeded with the student's state."""
+    from google.adk.runners import InMemoryRunner
+    from google.genai import types
+    from agents.fanout import agent_tools
+    from agents.study_buddy_agent import study_buddy_agent
+    
+    runner = InMemoryRunner(agent=agent_tools(study_buddy_agent)[agent_name].agent, app_name="studybuddy_prefetch")
+    session = await runner.session_service.create_session(
+        app_name="studybuddy_prefetch", user_id=user_id, state=state
+    )
+    text = ""
+    async for event in runner.run_async(
+        user_id=user_id, session_id=session.id,
+        new_message=types.Content(role="user", parts=[types.Part(text=request)])
+    ):
+        if event.is_final_response() and event.content and event.content.parts:
+            text = "".join(part.text or "" for part in event.content.parts)
+    return text
+
+
+class Prefetch:
+    """One background generation, and whether it has actually started (left the queue)."""
+    
+    __slots__ = ("future", "started")
+    
+    def __init__(self, future: Future, started: threading.Event):
+        self.future = future
+        self.started = started
+    
+    def cancel(self) -> bool:
+        return self.future.cancel()
+
+
+class PrefetchScheduler:
+    """Background generation of likely next answers, with a per-student daily cap."""
+    
+    def __init__(
+        self,
+        generate: Callable[[str, str, str, Dict[str, Any]], Awaitable[str]] = run_agent,
+        cache: Optional[ContentCache] = None,
+        daily_limit: int = PREFETCH_DAILY_LIMIT,
+        delay: float = PREFETCH_DELAY,
+        over_budget: Optional[Callable[[str], bool]] = None
+    ):
+        self.generate = generate
+        self.cache = cache or ContentCache()
+        self.daily_limit = daily_limit
+        self.delay = delay
+        self.over_budget = over_budget
+        self._spent: Dict[Tuple[str, str], int] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slot: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+    
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="prefetch", daemon=True).start()
+                self._loop = loop
+            return self._loop
+    
+    async def _run(self, agent: str, request: str, student: str, state: Dict[str, Any],
+                   started: threading.Event) -> str:
+        await asyncio.sleep(self.delay)
+        if self._slot is None:
+            self._slot = asyncio.Semaphore(1)  # one at a time - they're only guesses
+        async with self._slot:
+            started.set()
+            return await self.generate(agent, request, student, state)
+    
+    def schedule(self, student: str, agent: str, topic: str, request: str, state: Dict[str, Any]) -> bool:
+        """Start generating `request` for later. False if it's over budget or already there."""
+        if not student or not topic or self.cache.find(student, agent, topic, GENERATE) is not None:
+            return False
+        day = datetime.now().strftime("%Y-%m-%d")
+        with self._lock:
+            if self._spent.get((student, day), 0) >= self.daily_limit:
+                return False
+            if self.over_budget is not None and self.over_budget(student):
+                return False
+            self._spent = {k: v for k, v in self._spent.items() if k[1] == day}
+            self._spent[(student, day)] = self._spent.get((student, day), 0) + 1
+        started = threading.Event()
+        future = asyncio.run_coroutine_threadsafe(
+            self._run(agent, request, student, state, started), self._background_loop()
+        )
+        self.cache.put(student, agent, topic, Prefetch(future, started), GENERATE)
+        metrics.counter("studybuddy_prefetch_total", "Prefetches by outcome", agent=agent, outcome="scheduled").inc()
+        return True
+    
+    def take(self, student: str, agent: str, request: str) -> Optional[Prefetch]:
+        entry = self.cache.take(student, agent, request, intent_of(request))
+        return entry.value if entry is not None else None
+    
+    def cancel(self, student: str) -> int:
+        """Drop (and stop) everything prefetched for a student."""
+        dropped = self.cache.drop(student)
+        for entry in dropped:
+            entry.value.cancel()
+            metrics.counter("studybuddy_prefetch_total", "Prefetches by outcome",
+                            agent=entry.agent, outcome="cancelled").inc()
+        return len(dropped)
+    
+    def shutdown(self) -> None:
+        """Cancel whatever is still running and stop the background loop."""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        
+        async def cancel_all():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        try:
+            asyncio.run_coroutine_threadsafe(cancel_all(), loop).result(timeout=5)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+
+
+async def prefetched_result(prefetch: Prefetch, wait: float = PREFETCH_WAIT) -> Optional[str]:
+    """
+    A prefetch's answer, or None if it failed, was cancelled, or isn't worth
+    waiting for: still queued, or not done within `wait` seconds. Those are
+    cancelled - the live request is better off running the agent itself.
+    """
+    future = prefetch.future
+    if not future.done() and not prefetch.started.is_set():
+        prefetch.cancel()
+        return None
+    try:
+        result = await asyncio.wait_for(asyncio.wrap_future(future), wait)
+    except BaseException:
+        prefetch.cancel()
+        return None
+    return result if isinstance(result, str) and result.strip() else None
+
+
+def _state_dict(tool_context) -> Dict[str, Any]:
+    state = getattr(tool_context, "state", None) or {}
+    return dict(state.to_dict() if hasattr(state, "to_dict") else state)
+
+
+class PrefetchHooks(InstrumentationHooks):
+    """Serves prefetched answers to sub-agent calls, and queues new prefetches after the tutor."""
+    
+    def __init__(self, scheduler: PrefetchScheduler, wait: float = PREFETCH_WAIT):
+        self.scheduler = scheduler
+        self.wait = wait
+    
+    async def before_tool(self, tool, args, tool_context):
+        agent = getattr(getattr(tool, "agent", None), "name", None)
+        if agent not in DIVERGING_AGENTS:
+            return None
+        student = context_ids(tool_context)["user_id"]
+        request = str((args or {}).get("request", ""))
+        prefetch = self.scheduler.take(student, agent, request)
+        result = await prefetched_result(prefetch, self.wait) if prefetch is not None else None
+        record_cache_lookup("prefetch", result is not None)
+        if result is not None:
+            metrics.counter("studybuddy_prefetch_total", "Prefetches by outcome", agent=agent, outcome="used").inc()
+            return result
+        # same topic, different angle ("explain it more simply") isn't a divergence
+        if not any(self.scheduler.cache.find(student, other, request) for other in DIVERGING_AGENTS):
+            self.scheduler.cancel(student)
+        return None
+    
+    def after_tool(self, tool, args, tool_context, tool_response):
+        agent = getattr(getattr(tool, "agent", None), "name", None)
+        if not isinstance(tool_response, str):
+            return None
+        if agent == "learning_planner":
+            topics = plan_topics(tool_response)
+            if topics:
+                tool_context.state[PLAN_TOPICS_KEY] = topics
+        elif agent == "tutor_agent":
+            student = context_ids(tool_context)["user_id"]
+            topic = topic_of(str((args or {}).get("request", "")))
+            state = _state_dict(tool_context)
+            self.scheduler.schedule(student, "quiz_agent", topic, f"Create a quiz on {topic}", state)
+            upcoming = next_plan_topic(state.get(PLAN_TOPICS_KEY) or [], topic)
+            if upcoming:
+                self.scheduler.schedule(student, "tutor_agent", upcoming, f"Explain {upcoming}", state)
+        return None
+
+
+_scheduler: Optional[PrefetchScheduler] = None
+_hooks: Optional[PrefetchHooks] = None
+
+
+def get_prefetch_scheduler() -> PrefetchScheduler:
+    """Process-wide scheduler (respects the token budget from accounting)."""
+    global _scheduler
+    if _scheduler is None:
+        from observability.accounting import get_accountant
+        
+        _scheduler = PrefetchScheduler(over_budget=get_accountant().over_budget)
+    return _scheduler
+
+
+def get_prefetch_hooks() -> PrefetchHooks:
+    """Process-wide prefetch hooks."""
+    global _hooks
+    if _hooks is None:
+        _hooks = PrefetchHooks(get_prefetch_scheduler())
+    return _hooks
@@ -5,18 +5,20 @@ Tracks learning progress, manages spaced repetition, and provides recommendation
 """
 
 from google.adk.agents import LlmAgent
-from config.settings import MODEL
+from agents.tiering import model_for
 
 from tools.progress_tools import (
     get_progress_summary,
     get_review_schedule,
-    update_spaced_repetition_schedule
+    update_spaced_repetition_schedule,
+    suggest_topic_merges,
+    merge_topics
 )
 from tools.file_tools import save_study_plan_to_file
 
 
 progress_tracker = LlmAgent(
-    model=MODEL,
+    model=model_for("progress_tracker"),
     name="progress_tracker",
     description="Tracks learning progress and manages spaced repetition reviews",
     instruction="""
@@ -44,7 +46,14 @@ When asked about what to review:
    - [OK] Topics on track
 3. Explain the spaced repetition benefit
 
-### 3. Recommendations
+### 3. Topic Cleanup
+If the same subject shows up under different names (e.g. "BST basics" and
+"Binary Search Trees"):
+1. Call `suggest_topic_merges` to find likely duplicates
+2. Ask the student to confirm
+3. Call `merge_topics` for each confirmed pair
+
+### 4. Recommendations
 Based on the data, suggest:
 - Which topics to focus on next
 - When to take breaks
@@ -91,6 +100,8 @@ Based on the data, suggest:
         get_progress_summary,
         get_review_schedule,
         update_spaced_repetition_schedule,
+        suggest_topic_merges,
+        merge_topics,
         save_study_plan_to_file
     ]
 )
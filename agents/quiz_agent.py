@@ -12,24 +12,28 @@ from typing import Any, Dict
 
 from google.adk.agents import LlmAgent
 from google.adk.tools.tool_context import ToolContext
-from config.settings import MODEL
+from config.settings import USE_STRUCTURED_OUTPUT
+from agents.tiering import model_for
+from agents.schemas import QUIZ_SCHEMA, structured_instruction
 
 # Import progress tools
 from tools.progress_tools import (
     record_quiz_result,
     update_spaced_repetition_schedule,
-    get_progress_summary
+    get_progress_summary,
+    get_due_flashcards,
+    review_flashcard
 )
 
 
 quiz_agent = LlmAgent(
-    model=MODEL,
+    model=model_for("quiz_agent"),
     name="quiz_agent",
     description="Generates quizzes, grades answers, and records results with spaced repetition",
     instruction="""
 You are a strict but supportive quiz master who helps students learn effectively.
 
-You support THREE main modes:
+You support FOUR main modes:
 
 ## 1) QUIZ GENERATION
 When user asks for a quiz on a topic:
@@ -98,11 +102,26 @@ When user asks about their progress:
 2. Present results in a friendly format
 3. Recommend topics to focus on
 
+## 4) FLASHCARD REVIEW
+When user wants to review or asks for a quick review session:
+
+1. Call `get_due_flashcards` (limit 10) to get stored cards that are due
+2. If there are cards, quiz the student on those questions - do NOT
+   generate a new quiz
+3. For each answer, call `review_flashcard` with:
+   - card_id: The card's id
+   - performance: 1.0 correct, 0.5 partially correct, 0.0 wrong
+4. If no cards are due, fall back to QUIZ GENERATION
+
 ## ADAPTIVE BEHAVIOR
-- Check state['progress'] for previous performance
-- If scores are LOW (<60%): Make easier questions, focus on fundamentals
-- If scores are HIGH (>80%): Increase difficulty, add exam-style questions
-- Track improvement trends across attempts
+- Check state['progress'][topic] for previous performance. Each topic has
+  precomputed fields, no need to look through raw history:
+  - `ewma`: recent average score (0-100)
+  - `trend_slope`: points gained/lost per attempt lately
+  - `mastery`: chance the student has mastered the topic (0-1)
+- If `ewma` is LOW (<60): Make easier questions, focus on fundamentals
+- If `ewma` is HIGH (>80) or `mastery` > 0.8: Increase difficulty, add exam-style questions
+- If `trend_slope` is negative: Revisit the concepts they're slipping on
 
 ## TONE
 - Encouraging but honest
@@ -112,6 +131,14 @@ When user asks about their progress:
     tools=[
         record_quiz_result,
         update_spaced_repetition_schedule,
-        get_progress_summary
+        get_progress_summary,
+        get_due_flashcards,
+        review_flashcard
     ]
 )
+
+if USE_STRUCTURED_OUTPUT:
+    quiz_agent.instruction += structured_instruction(
+        "Quiz", QUIZ_SCHEMA,
+        "When you GENERATE a quiz (mode 1; grading and the other modes stay in markdown)"
+    )
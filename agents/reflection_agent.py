@@ -6,11 +6,11 @@ This is a bonus agent for additional depth.
 """
 
 from google.adk.agents import LlmAgent
-from config.settings import MODEL
+from agents.tiering import model_for
 
 
 reflection_agent = LlmAgent(
-    model=MODEL,
+    model=model_for("reflection_agent"),
     name="reflection_agent",
     description="Evaluates learning effectiveness and provides improvement suggestions",
     instruction="""
@@ -0,0 +1,346 @@
+"""
+schemas.py
+===========
+Structured output for the tutor and the quiz agent.
+
+Normally both answer in markdown, and anything that wants the flashcards,
+questions or answer key has to fish them out with regexes. With
+USE_STRUCTURED_OUTPUT on they reply with JSON instead:
+
+    Explanation  {topic, explanation, examples, key_points, flashcards, quiz}
+    Quiz         {topic, difficulty, questions: [{number, type, question,
+                  options}], answer_key: [{number, answer, explanation}]}
+
+StructuredOutputHooks parses that reply (one json.loads plus a few checks)
+into an Explanation / Quiz, keeps it in session state ("last_explanation",
+"last_quiz") and swaps the reply for the usual markdown, so the student
+and the orchestrator see exactly what they saw before.
+
+Both agents call tools (google_search, record_quiz_result...), and Gemini
+won't combine function calling with a JSON response schema, so the schema
+goes into the instruction rather than generate_content_config.
+"""
+
+import json
+from typing import Any, Dict, List, Optional
+
+from observability.instrumentation import InstrumentationHooks, context_ids
+from observability.metrics import registry as metrics
+
+QUESTION_TYPES = ("mcq", "short_answer", "true_false", "code")
+TYPE_LABELS = {
+    "mcq": "Multiple Choice",
+    "short_answer": "Short Answer",
+    "true_false": "True/False",
+    "code": "Code",
+}
+
+_STRING = {"type": "string"}
+_STRINGS = {"type": "array", "items": _STRING}
+
+QUIZ_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "topic": _STRING,
+        "difficulty": {"type": "string", "enum": ["beginner", "intermediate", "exam-prep"]},
+        "questions": {"type": "array", "items": {
+            "type": "object",
+            "properties": {
+                "number": {"type": "integer"},
+                "type": {"type": "string", "enum": list(QUESTION_TYPES)},
+                "question": _STRING,
+                "options": _STRINGS,
+            },
+            "required": ["number", "type", "question"],
+        }},
+        "answer_key": {"type": "array", "items": {
+            "type": "object",
+            "properties": {"number": {"type": "integer"}, "answer": _STRING, "explanation": _STRING},
+            "required": ["number", "answer"],
+        }},
+    },
+    "required": ["questions", "answer_key"],
+}
+
+EXPLANATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "topic": _STRING,
+        "explanation": _STRING,
+        "examples": _STRINGS,
+        "key_points": _STRINGS,
+        "flashcards": {"type": "array", "items": {
+            "type": "object",
+            "properties": {"question": _STRING, "answer": _STRING},
+            "required": ["question", "answer"],
+        }},
+        "quiz": QUIZ_SCHEMA,
+    },
+    "required": ["explanation", "key_points", "flashcards"],
+}
+
+
+class SchemaError(ValueError):
+    """A structured reply that doesn't match its schema."""
+
+
+def _text(data: Dict[str, Any], field: str, where: str, required: bool = True) -> str:
+    value = data.get(field)
+    if value is None and not required:
+        return ""
+    if not isinstance(value, str) or (required and not value.strip()):
+        raise SchemaError(f"{where}.{field} must be a non-empty string")
+    return value.strip()
+
+
+def _list(data: Dict[str, Any], field: str, where: str, required: bool = True) -> list:
+    value = data.get(field)
+    if value is None and not required:
+        return []
+    if not isinstance(value, list) or (required and not value):
+        raise SchemaError(f"{where}.{field} must be a non-empty list")
+    return value
+
+
+class Flashcard:
+    __slots__ = ("question", "answer")
+    
+    def __init__(self, question: str, answer: str):
+        self.question = question
+        self.answer = answer
+    
+    def to_dict(self) -> Dict[str, str]:
+        return {"question": self.question, "answer": self.answer}
+
+
+class Question:
+    """One quiz question, with its answer from the answer key."""
+    
+    __slots__ = ("number", "type", "text", "options", "answer", "explanation")
+    
+    def __init__(self, number: int, type: str, text: str, options: Optional[List[str]] = None,
+                 answer: str = "", explanation: str = ""):
+        self.number = number
+        self.type = type
+        self.text = text
+        self.options = options or []
+        self.answer = answer
+        self.explanation = explanation
+
+
+class Quiz:
+    __slots__ = ("topic", "difficulty", "questions")
+    
+    def __init__(self, questions: List[Question], topic: str = "", difficulty: str = ""):
+        self.questions = questions
+        self.topic = topic
+        self.difficulty = difficulty
+    
+    @classmethod
+    def from_dict(cls, data: Any, where: str = "quiz") -> "Quiz":
+        if not isinstance(data, dict):
+            raise SchemaError(f"{where} must be an object")
+        questions = []
+        for i, item in enumerate(_list(data, "questions", where)):
+            at = f"{where}.questions[{i}]"
+            if not isinstance(item, dict):
+                raise SchemaError(f"{at} must be an object")
+            kind = item.get("type")
+            if kind not in QUESTION_TYPES:
+                raise SchemaError(f"{at}.type must be one of {', '.join(QUESTION_TYPES)}")
+            options = [str(o) for o in _list(item, "options", at, required=kind == "mcq")]
+            if kind == "mcq" and len(options) < 2:
+                raise SchemaError(f"{at}.options needs at least 2 choices")
+            number = item.get("number")
+            questions.append(Question(number if isinstance(number, int) else i + 1, kind,
+                                      _text(item, "question", at), options))
+        
+        by_number = {q.number: q for q in questions}
+        if len(by_number) != len(questions):
+            raise SchemaError(f"{where}.questions has duplicate numbers")
+        for i, item in enumerate(_list(data, "answer_key", where)):
+            at = f"{where}.answer_key[{i}]"
+            question = by_number.get(item.get("number")) if isinstance(item, dict) else None
+            if question is None:
+                raise SchemaError(f"{at} doesn't match a question")
+            question.answer = _text(item, "answer", at)
+            question.explanation = _text(item, "explanation", at, required=False)
+        unanswered = [q.number for q in questions if not q.answer]
+        if unanswered:
+            raise SchemaError(f"{where}.answer_key is missing question(s) {unanswered}")
+        return cls(questions, str(data.get("topic") or ""), str(data.get("difficulty") or ""))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "topic": self.topic,
+            "difficulty": self.difficulty,
+            "questions": [{"number": q.number, "type": q.type, "question": q.text, "options": q.options}
+                          for q in self.questions],
+            "answer_key": [{"number": q.number, "answer": q.answer, "explanation": q.explanation}
+                           for q in self.questions],
+        }
+
+
+class Explanation:
+    __slots__ = ("topic", "explanation", "examples", "key_points", "flashcards", "quiz")
+    
+    def __init__(self, explanation: str, key_points: List[str], flashcards: List[Flashcard],
+                 examples: Optional[List[str]] = None, quiz: Optional[Quiz] = None, topic: str = ""):
+        self.explanation = explanation
+        self.key_points = key_points
+        self.flashcards = flashcards
+        self.examples = examples or []
+        self.quiz = quiz
+        self.topic = topic
+    
+    @classmethod
+    def from_dict(cls, data: Any, where: str = "explanation") -> "Explanation":
+        if not isinstance(data, dict):
+            raise SchemaError(f"{where} must be an object")
+        cards = []
+        for i, item in enumerate(_list(data, "flashcards", where)):
+            at = f"{where}.flashcards[{i}]"
+            if not isinstance(item, dict):
+                raise SchemaError(f"{at} must be an object")
+            cards.append(Flashcard(_text(item, "question", at), _text(item, "answer", at)))
+        return cls(
+            explanation=_text(data, "explanation", where),
+            key_points=[str(p) for p in _list(data, "key_points", where)],
+            flashcards=cards,
+            examples=[str(e) for e in _list(data, "examples", where, required=False)],
+            quiz=Quiz.from_dict(data["quiz"], f"{where}.quiz") if data.get("quiz") else None,
+            topic=str(data.get("topic") or ""),
+        )
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "topic": self.topic,
+            "explanation": self.explanation,
+            "examples": self.examples,
+            "key_points": self.key_points,
+            "flashcards": [card.to_dict() for card in self.flashcards],
+            "quiz": self.quiz.to_dict() if self.quiz else None,
+        }
+
+
+def json_payload(text: str) -> Optional[Any]:
+    """The JSON object in a reply (bare or in a ```json fence), or None if there isn't one."""
+    text = (text or "").strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[-1].rsplit("```", 1)[0].strip()
+    if not text.startswith("{"):
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        return None
+
+
+def parse_explanation(text: str) -> Explanation:
+    data = json_payload(text)
+    if data is None:
+        raise SchemaError("reply is not a JSON object")
+    return Explanation.from_dict(data)
+
+
+def parse_quiz(text: str) -> Quiz:
+    data = json_payload(text)
+    if data is None:
+        raise SchemaError("reply is not a JSON object")
+    return Quiz.from_dict(data)
+
+
+def _render_questions(quiz: Quiz, key_heading: str) -> List[str]:
+    lines = []
+    for q in quiz.questions:
+        lines.append(f"**Q{q.number}. [{TYPE_LABELS[q.type]}]** {q.text}")
+        lines.extend(f"- {chr(ord('A') + i)}. {option}" for i, option in enumerate(q.options))
+        lines.append("")
+    lines += ["---", key_heading]
+    for q in quiz.questions:
+        answer = f"**{q.answer}**" if q.type in ("mcq", "true_false") else q.answer
+        lines.append(f"{q.number}. {answer}" + (f" - {q.explanation}" if q.explanation else ""))
+    lines.append("---")
+    return lines
+
+
+def render_quiz(quiz: Quiz) -> str:
+    """The quiz in the quiz agent's usual markdown format."""
+    return "\n".join(_render_questions(quiz, "###  Answer Key"))
+
+
+def render_explanation(explanation: Explanation) -> str:
+    """The explanation in the tutor's usual 4-section markdown format."""
+    lines = ["### 1.  Explanation", explanation.explanation, ""]
+    lines += [f"*Example:* {example}\n" for example in explanation.examples]
+    lines += ["### 2.  Key Points"] + [f"- {point}" for point in explanation.key_points] + [""]
+    lines.append("### 3.  Flashcards")
+    for i, card in enumerate(explanation.flashcards, 1):
+        lines += [f"**Q{i}:** {card.question}", f"**A{i}:** {card.answer}", ""]
+    if explanation.quiz is not None:
+        lines += ["### 4.  Quick Quiz"] + _render_questions(explanation.quiz, "**Answer Key:**")
+    return "\n".join(lines).rstrip()
+
+
+def structured_instruction(name: str, schema: Dict[str, Any], when: str) -> str:
+    """Instruction addendum asking for JSON matching `schema`."""
+    return (
+        f"\n\nSTRUCTURED OUTPUT MODE:\n{when}, reply with ONLY a JSON object (no markdown, "
+        f"no text around it) - the {name} - matching this JSON schema:\n"
+        f"{json.dumps(schema, separators=(',', ':'))}\n"
+        "The markdown structure above still describes what goes in each field."
+    )
+
+
+# agent -> (parser, renderer, state key)
+STRUCTURED_AGENTS = {
+    "tutor_agent": (parse_explanation, render_explanation, "last_explanation"),
+    "quiz_agent": (parse_quiz, render_quiz, "last_quiz"),
+}
+
+
+def _response_text(llm_response) -> Optional[str]:
+    content = getattr(llm_response, "content", None)
+    parts = getattr(content, "parts", None) or []
+    if not parts or any(getattr(p, "function_call", None) for p in parts):
+        return None
+    return "".join(getattr(p, "text", None) or "" for p in parts)
+
+
+class StructuredOutputHooks(InstrumentationHooks):
+    """Turns the tutor's/quiz agent's JSON replies into objects (in state) + markdown."""
+    
+    def after_model(self, callback_context, llm_response):
+        agent = context_ids(callback_context)["agent_name"]
+        if agent not in STRUCTURED_AGENTS:
+            return None
+        text = _response_text(llm_response)
+        if text is None or json_payload(text) is None:
+            return None  # a tool call, or a plain-text reply (grading, a question back)
+        parse, render, state_key = STRUCTURED_AGENTS[agent]
+        try:
+            parsed = parse(text)
+        except SchemaError as e:
+            # leave the JSON as it is - still readable, and nothing gets lost
+            metrics.counter("studybuddy_structured_output_total", "Structured replies by result",
+                            agent=agent, result="invalid").inc()
+            print(f"Structured reply from {agent} didn't match its schema: {e}")
+            return None
+        metrics.counter("studybuddy_structured_output_total", "Structured replies by result",
+                        agent=agent, result="ok").inc()
+        callback_context.state[state_key] = parsed.to_dict()
+        parts = llm_response.content.parts
+        parts[0].text = render(parsed)
+        del parts[1:]
+        return None
+
+
+_hooks: Optional[StructuredOutputHooks] = None
+
+
+def get_structured_output_hooks() -> StructuredOutputHooks:
+    """Process-wide structured output hooks."""
+    global _hooks
+    if _hooks is None:
+        _hooks = StructuredOutputHooks()
+    return _hooks
@@ -0,0 +1,196 @@
+"""
+single_flight.py
+=================
+One model call for identical requests that arrive together.
+
+When a class gets the same assignment, dozens of students ask the tutor
+about the same thing within a few seconds, and every one of them starts
+the same tutor_agent generation. SingleFlightHooks keys each model call on
+its normalized request (agent, model, instruction and conversation, case
+and whitespace folded). The first call with a key goes to the model; any
+identical call that comes in while it's running waits for it and gets a
+copy of its answer instead:
+
+    ana  "Explain binary heaps"  ->  model call ........ answer
+    ben  "explain  binary heaps" ->  (waits) ........... copy of the answer
+    cara "Explain binary heaps?" ->  (waits) ........... copy of the answer
+
+Personalized requests (a student's progress in the instruction or the
+conversation) have different keys, so only truly identical calls share.
+Flights are concurrent.futures Futures, so a prefetch on its own loop and
+a live turn coalesce too. A flight lasts as long as its leader's call: it
+lands in after_model, and if the call fails (on_model_error) it's released
+and everyone waiting makes their own call right away. SINGLE_FLIGHT_TIMEOUT
+is only a backstop for a leader that vanishes without either, so it's well
+above any real generation time - a slow answer must not send the herd off
+on its own.
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from config.settings import SINGLE_FLIGHT_AGENTS, SINGLE_FLIGHT_TIMEOUT
+from observability.instrumentation import InstrumentationHooks, PendingCalls, context_ids
+from observability.metrics import registry as metrics, record_cache_lookup
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split()).rstrip("?.! ")
+
+
+def _content_text(content) -> str:
+    if content is None:
+        return ""
+    if isinstance(content, str):
+        return _normalize(content)
+    pieces = []
+    for part in getattr(content, "parts", None) or []:
+        if getattr(part, "text", None):
+            pieces.append(_normalize(part.text))
+        for field in ("function_call", "function_response"):
+            call = getattr(part, field, None)
+            if call is not None:
+                payload = getattr(call, "args", None) or getattr(call, "response", None) or {}
+                pieces.append(f"{field}:{getattr(call, 'name', '')}:{json.dumps(payload, sort_keys=True, default=str)}")
+    return "\n".join(pieces)
+
+
+def request_key(agent_name: str, llm_request) -> str:
+    """Hash of everything that decides a model call's answer, case and whitespace folded."""
+    config = getattr(llm_request, "config", None)
+    lines = [
+        agent_name or "",
+        getattr(llm_request, "model", None) or "",
+        _content_text(getattr(config, "system_instruction", None)),
+    ]
+    for content in getattr(llm_request, "contents", None) or []:
+        lines.append(f"{getattr(content, 'role', '')}: {_content_text(content)}")
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """key -> the one call in flight for it. Thread-safe, so any event loop can join."""
+    
+    def __init__(self, timeout: float = SINGLE_FLIGHT_TIMEOUT, clock: Callable[[], float] = time.monotonic):
+        self.timeout = timeout
+        self.clock = clock
+        self._flights: Dict[str, Tuple[Future, float]] = {}
+        self._lock = threading.Lock()
+    
+    def join(self, key: str) -> Tuple[Future, bool]:
+        """The flight for `key`, and whether the caller is its leader (has to make the call)."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and self.clock() - flight[1] < self.timeout:
+                return flight[0], False
+            future: Future = Future()
+            self._flights[key] = (future, self.clock())
+            return future, True
+    
+    def finish(self, key: str, future: Future, value: Any) -> None:
+        """Land a flight: everyone waiting on it gets `value` (None = make your own call)."""
+        with self._lock:
+            if self._flights.get(key, (None,))[0] is future:
+                del self._flights[key]
+        if not future.done():
+            future.set_result(value)
+    
+    async def wait(self, future: Future) -> Optional[Any]:
+        """
+        The leader's answer, or None if it failed or didn't land in time.
+        Giving up doesn't end the flight for the others waiting on it.
+        """
+        loop = asyncio.get_running_loop()
+        landed = asyncio.Event()
+        
+        def wake(_):
+            try:
+                loop.call_soon_threadsafe(landed.set)
+            except RuntimeError:
+                pass  # that waiter's loop is gone
+        
+        future.add_done_callback(wake)
+        try:
+            await asyncio.wait_for(landed.wait(), self.timeout)
+        except asyncio.TimeoutError:
+            return None
+        return future.result()
+    
+    def __len__(self) -> int:
+        return len(self._flights)
+
+
+def _usable(llm_response) -> bool:
+    parts = getattr(getattr(llm_response, "content", None), "parts", None) or []
+    return not getattr(llm_response, "error_code", None) and bool(parts)
+
+
+class SingleFlightHooks(InstrumentationHooks):
+    """Coalesces identical model calls of the chosen agents that are in flight at the same time."""
+    
+    def __init__(
+        self,
+        flights: Optional[SingleFlight] = None,
+        agents: Iterable[str] = SINGLE_FLIGHT_AGENTS,
+        max_pending: int = 1024
+    ):
+        self.flights = flights if flights is not None else SingleFlight()
+        self.agents = set(agents)
+        # call -> (key, flight) it leads; a dropped one lets its waiters go
+        self._leading = PendingCalls(max_pending, on_evict=lambda leading: self.flights.finish(*leading, None))
+    
+    async def before_model(self, callback_context, llm_request):
+        ids = context_ids(callback_context)
+        agent = ids["agent_name"]
+        if agent not in self.agents:
+            return None
+        key = request_key(agent, llm_request)
+        future, leader = self.flights.join(key)
+        if leader:
+            self._leading.put(callback_context, (key, future))
+            record_cache_lookup("single_flight", False)
+            return None
+        
+        shared = await self.flights.wait(future)
+        record_cache_lookup("single_flight", shared is not None)
+        if shared is None:
+            return None  # the first call failed or stalled - make our own
+        metrics.counter("studybuddy_coalesced_calls_total", "Model calls answered by an identical call in flight",
+                        agent=agent).inc()
+        response = copy.deepcopy(shared)
+        if hasattr(response, "usage_metadata"):
+            response.usage_metadata = None  # this call cost nothing
+        return response
+    
+    def after_model(self, callback_context, llm_response):
+        if getattr(llm_response, "partial", False):
+            return None
+        leading = self._leading.pop(callback_context)
+        if leading is not None:
+            key, future = leading
+            self.flights.finish(key, future, copy.deepcopy(llm_response) if _usable(llm_response) else None)
+        return None
+    
+    def on_model_error(self, callback_context, llm_request, error):
+        # the call raised, so after_model never comes - let the waiters go now
+        leading = self._leading.pop(callback_context)
+        if leading is not None:
+            self.flights.finish(*leading, None)
+        return None
+
+
+_hooks: Optional[SingleFlightHooks] = None
+
+
+def get_single_flight_hooks() -> SingleFlightHooks:
+    """Process-wide single-flight hooks."""
+    global _hooks
+    if _hooks is None:
+        _hooks = SingleFlightHooks()
+    return _hooks
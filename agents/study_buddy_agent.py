@@ -13,16 +13,17 @@ from google.adk.agents import LlmAgent
 from google.adk.tools import google_search
 from google.adk.tools.agent_tool import AgentTool
 
-from config.settings import MODEL
+from agents.tiering import model_for
 from agents.learning_planner_agent import learning_planner
 from agents.tutor_agent import tutor_agent
 from agents.quiz_agent import quiz_agent
 from agents.progress_tracker_agent import progress_tracker
 from tools.file_tools import save_study_plan_to_file, save_notes_to_file
+from tools.progress_tools import save_flashcards
 
 
 study_buddy_agent = LlmAgent(
-    model=MODEL,
+    model=model_for("study_buddy"),
     name="study_buddy",
     description="Main Study Buddy orchestrator that coordinates learning activities",
     instruction="""
@@ -59,6 +60,11 @@ students learn effectively using proven techniques like spaced repetition.
 6. **save_study_plan_to_file** -> Save Plans
    Use when: Student wants to save their study plan
 
+7. **save_flashcards** -> Store Flashcards
+   Use when: tutor_tool returned a Flashcards section
+   Pass the topic and the Q/A pairs so each card gets its own review schedule
+   (an empty list stores the cards from the tutor's last explanation)
+
 ## ROUTING LOGIC
 
 Analyze the user's message and route appropriately:
@@ -69,6 +75,7 @@ Analyze the user's message and route appropriately:
 | "Explain..." / "What is..." | tutor_tool |
 | "Give me a quiz..." | quiz_tool |
 | "Grade these answers..." | quiz_tool |
+| "Review my flashcards" | quiz_tool |
 | "How am I doing?" | progress_tool |
 | "What should I review?" | progress_tool |
 | General chat / unclear | Respond directly, ask for clarification |
@@ -116,6 +123,7 @@ What would you like to work on today?"
         AgentTool(agent=progress_tracker),
         google_search,
         save_study_plan_to_file,
-        save_notes_to_file
+        save_notes_to_file,
+        save_flashcards
     ]
 )
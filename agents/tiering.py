@@ -0,0 +1,248 @@
+"""
+tiering.py
+===========
+Which model each agent runs on, and stepping up when an answer looks shaky.
+
+Not every agent needs the same model. Routing (study_buddy), the validators
+and progress narration are short, formulaic calls - the cheapest, fastest
+tier is plenty. Explanations, quizzes and plans start on the standard tier,
+and the strong tier is kept for answers that need another go:
+
+    fast      study_buddy, *_validator, progress_tracker
+    standard  learning_planner, reflection_agent, tutor_agent, quiz_agent
+    strong    (escalations only)
+
+model_for() gives an agent its model: an entry in AGENT_MODELS wins, then
+its tier if USE_MODEL_TIERS is on, else MODEL as before.
+
+TieringHooks watches every answer. If one looks unreliable - cut off,
+blocked, empty, low average logprob, or (for a plan, quiz or explanation
+the agent generated - not grading feedback or a question back) structurally
+INVALID - the same request is sent again one tier up and its answer
+replaces the first. It also keeps a per agent/model report of calls,
+latency, tokens and estimated cost (`/models` in interactive mode).
+"""
+
+import copy
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config.settings import (
+    MODEL, USE_MODEL_TIERS, MODEL_TIERS, AGENT_TIERS, AGENT_MODELS,
+    ESCALATE_LOW_CONFIDENCE, ESCALATION_MIN_LOGPROB
+)
+from agents.validation import LOCAL_CHECKS, INVALID
+from observability.accounting import estimate_cost
+from observability.instrumentation import InstrumentationHooks, PendingCalls, context_ids
+from observability.metrics import registry as metrics
+
+# finish reasons that mean the answer isn't a complete, usable one
+BAD_FINISH_REASONS = {"MAX_TOKENS", "SAFETY", "RECITATION", "BLOCKLIST", "PROHIBITED_CONTENT",
+                      "SPII", "MALFORMED_FUNCTION_CALL", "OTHER"}
+
+
+def model_for(agent_name: str) -> str:
+    """The model an agent should be built with."""
+    if agent_name in AGENT_MODELS:
+        return AGENT_MODELS[agent_name]
+    if USE_MODEL_TIERS and agent_name in AGENT_TIERS:
+        return MODEL_TIERS[AGENT_TIERS[agent_name]]
+    return MODEL
+
+
+def tier_of(model: str) -> Optional[str]:
+    return next((tier for tier, name in MODEL_TIERS.items() if name == model), None)
+
+
+def next_model(model: str) -> Optional[str]:
+    """The model one tier above `model` (None at the top, or for a model outside the tiers)."""
+    models = list(MODEL_TIERS.values())
+    if model not in models:
+        return None
+    i = models.index(model)
+    return models[i + 1] if i + 1 < len(models) else None
+
+
+def _response_text(llm_response) -> str:
+    parts = getattr(getattr(llm_response, "content", None), "parts", None) or []
+    return "".join(getattr(p, "text", None) or "" for p in parts)
+
+
+def _has_function_call(llm_response) -> bool:
+    parts = getattr(getattr(llm_response, "content", None), "parts", None) or []
+    return any(getattr(p, "function_call", None) for p in parts)
+
+
+def low_confidence(agent_name: str, llm_response, min_logprob: float = ESCALATION_MIN_LOGPROB) -> Optional[str]:
+    """Why an answer looks unreliable, or None if it looks fine."""
+    if getattr(llm_response, "error_code", None):
+        return "error"
+    finish = getattr(llm_response, "finish_reason", None)
+    finish = getattr(finish, "name", finish)
+    if finish in BAD_FINISH_REASONS:
+        return f"finish_{str(finish).lower()}"
+    if _has_function_call(llm_response):
+        return None
+    text = _response_text(llm_response)
+    if not text.strip():
+        return "empty"
+    logprob = getattr(llm_response, "avg_logprobs", None)
+    if logprob is not None and logprob < min_logprob:
+        return "low_logprob"
+    # The checks SKIP anything that isn't generated content, e.g. quiz_agent grading an answer
+    check = LOCAL_CHECKS.get(agent_name)
+    if check is not None and check(text).verdict == INVALID:
+        return "invalid_structure"
+    return None
+
+
+# What later hooks (prefix caching) rewrite on the request before it's sent
+_CONFIG_FIELDS = ("system_instruction", "tools", "tool_config", "cached_content")
+
+
+def _config_snapshot(llm_request) -> Dict[str, Any]:
+    config = getattr(llm_request, "config", None)
+    return {field: getattr(config, field, None) for field in _CONFIG_FIELDS} if config is not None else {}
+
+
+def _escalation_request(llm_request, snapshot: Dict[str, Any]):
+    """
+    A copy of the request as it was when tiering saw it. Prefix caching
+    swaps the instruction and tools for a cache handle made for the first
+    model, and that handle is no good to another model.
+    """
+    request = copy.copy(llm_request)
+    config = getattr(llm_request, "config", None)
+    if config is not None:
+        request.config = copy.copy(config)
+        for field, value in snapshot.items():
+            setattr(request.config, field, value)
+    return request
+
+
+async def call_model(model: str, llm_request) -> Any:
+    """Send a request to another model through ADK's model registry."""
+    from google.adk.models.registry import LLMRegistry
+    
+    llm_request.model = model
+    response = None
+    async for response in LLMRegistry.new_llm(model).generate_content_async(llm_request, stream=False):
+        pass
+    return response
+
+
+class TierReport:
+    """Calls, latency, tokens and cost per (agent, model), plus escalations."""
+    
+    def __init__(self):
+        self.rows: Dict[Tuple[str, str], Dict[str, float]] = {}
+    
+    def record(self, agent: str, model: str, latency_ms: float, llm_response, escalated: bool = False) -> None:
+        usage = getattr(llm_response, "usage_metadata", None)
+        prompt = getattr(usage, "prompt_token_count", None) or 0
+        completion = getattr(usage, "candidates_token_count", None) or 0
+        cached = getattr(usage, "cached_content_token_count", None) or 0
+        row = self.rows.setdefault((agent, model), {
+            "calls": 0, "escalations": 0, "latency_ms": 0.0,
+            "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0,
+        })
+        row["calls"] += 1
+        row["escalations"] += int(escalated)
+        row["latency_ms"] += latency_ms
+        row["prompt_tokens"] += prompt
+        row["completion_tokens"] += completion
+        row["cost_usd"] += estimate_cost(prompt, completion, cached, model=model)
+        metrics.counter("studybuddy_model_calls_total", "Model calls by agent and tier",
+                        agent=agent, tier=tier_of(model) or model).inc()
+    
+    def summary(self) -> List[Dict[str, Any]]:
+        """One row per agent/model, most expensive first."""
+        rows = []
+        for (agent, model), row in self.rows.items():
+            rows.append({
+                "agent": agent, "model": model, "tier": tier_of(model) or "-",
+                **row, "avg_latency_ms": row["latency_ms"] / row["calls"] if row["calls"] else 0.0,
+            })
+        return sorted(rows, key=lambda r: r["cost_usd"], reverse=True)
+    
+    def format(self) -> str:
+        rows = self.summary()
+        if not rows:
+            return "No model calls yet."
+        lines = [f"{'agent':<22}{'model':<24}{'tier':<10}{'calls':>6}{'esc':>5}{'avg ms':>9}{'tokens':>10}{'cost $':>10}"]
+        for r in rows:
+            lines.append(
+                f"{r['agent']:<22}{r['model']:<24}{r['tier']:<10}{r['calls']:>6}{r['escalations']:>5}"
+                f"{r['avg_latency_ms']:>9.0f}{r['prompt_tokens'] + r['completion_tokens']:>10}{r['cost_usd']:>10.4f}"
+            )
+        lines.append(f"total cost ${sum(r['cost_usd'] for r in rows):.4f}, "
+                     f"{sum(r['escalations'] for r in rows)} escalation(s)")
+        return "\n".join(lines)
+
+
+class TieringHooks(InstrumentationHooks):
+    """Times every model call for the report, and escalates unreliable answers one tier up."""
+    
+    def __init__(
+        self,
+        report: Optional[TierReport] = None,
+        call_model: Callable[[str, Any], Awaitable[Any]] = call_model,
+        escalate: bool = ESCALATE_LOW_CONFIDENCE,
+        max_pending: int = 1024
+    ):
+        self.report = report or TierReport()
+        self.call_model = call_model
+        self.escalate = escalate
+        # call -> (start, request, its config as tiering saw it)
+        self._pending = PendingCalls(max_pending)
+    
+    def before_model(self, callback_context, llm_request):
+        self._pending.put(callback_context, (time.perf_counter(), llm_request, _config_snapshot(llm_request)))
+        return None
+    
+    async def after_model(self, callback_context, llm_response):
+        ids = context_ids(callback_context)
+        pending = self._pending.pop(callback_context)
+        if pending is None or getattr(llm_response, "partial", False):
+            return None
+        start, llm_request, snapshot = pending
+        agent = ids["agent_name"] or "unknown"
+        model = getattr(llm_request, "model", None) or MODEL
+        self.report.record(agent, model, (time.perf_counter() - start) * 1000, llm_response)
+        
+        reason = low_confidence(agent, llm_response) if self.escalate else None
+        stronger = next_model(model) if reason else None
+        if stronger is None:
+            return None
+        metrics.counter("studybuddy_escalations_total", "Answers re-asked one tier up",
+                        agent=agent, reason=reason).inc()
+        start = time.perf_counter()
+        try:
+            better = await self.call_model(stronger, _escalation_request(llm_request, snapshot))
+        except Exception as e:
+            print(f"Escalating {agent} to {stronger} failed: {e}")
+            return None
+        self.report.record(agent, stronger, (time.perf_counter() - start) * 1000, better, escalated=True)
+        if better is None or (not _has_function_call(better) and not _response_text(better).strip()):
+            return None
+        
+        # swap the answer in place (so every other hook sees it) and bill both calls
+        usage, first = getattr(better, "usage_metadata", None), getattr(llm_response, "usage_metadata", None)
+        if usage is not None and first is not None:
+            for field in ("prompt_token_count", "candidates_token_count", "cached_content_token_count"):
+                setattr(usage, field, (getattr(usage, field, None) or 0) + (getattr(first, field, None) or 0))
+        for field in ("content", "usage_metadata", "finish_reason", "error_code", "error_message", "avg_logprobs"):
+            if hasattr(better, field):
+                setattr(llm_response, field, getattr(better, field))
+        return None
+
+
+_hooks: Optional[TieringHooks] = None
+
+
+def get_tiering_hooks() -> TieringHooks:
+    """Process-wide tiering hooks."""
+    global _hooks
+    if _hooks is None:
+        _hooks = TieringHooks()
+    return _hooks
@@ -9,11 +9,13 @@ I call it "mixed-mode" because it mixes different learning formats together.
 
 from google.adk.agents import LlmAgent
 from google.adk.tools import google_search
-from config.settings import MODEL
+from config.settings import USE_STRUCTURED_OUTPUT
+from agents.tiering import model_for
+from agents.schemas import EXPLANATION_SCHEMA, structured_instruction
 
 
 tutor_agent = LlmAgent(
-    model=MODEL,
+    model=model_for("tutor_agent"),
     name="tutor_agent",
     description="Explains concepts with mixed-mode output: explanation, key points, flashcards, and quiz",
     instruction="""
@@ -89,3 +91,8 @@ NEVER skip sections. ALWAYS fill all 4 sections.
 """,
     tools=[google_search]
 )
+
+if USE_STRUCTURED_OUTPUT:
+    tutor_agent.instruction += structured_instruction(
+        "Explanation", EXPLANATION_SCHEMA, "Whenever you explain a concept"
+    )
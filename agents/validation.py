@@ -0,0 +1,384 @@
+"""
+validation.py
+==============
+Quality checks on what the planner, tutor and quiz agents send back.
+
+validators.py has an LLM checker for each of them, meant for a LoopAgent
+(generate -> validate -> regenerate). Run on every answer that's two extra
+model calls per sub-agent call even when the output is obviously fine, so
+most of the checking happens locally first:
+    
+    learning_planner -> required plan sections (Overview, Learning Goals, ...)
+    tutor_agent      -> Explanation / Key Points / Flashcards / Quick Quiz
+    quiz_agent       -> question count, mix of question types, answer key
+
+Each check says VALID, INVALID (with the issues, which go back to the agent
+as feedback) or INCONCLUSIVE. Only INCONCLUSIVE answers go to the LLM
+validator. Output that isn't a plan/quiz/explanation at all (a clarifying
+question, grading feedback) isn't checked - a quiz only counts as one when
+its questions carry [MCQ]/[Short Answer]/... tags or it has an answer key.
+
+ValidatingHooks runs this on the sub-agents' AgentTool results and, while
+one is INVALID (up to MAX_LOOP_ITERATIONS attempts), re-asks the sub-agent's
+model: its last request, plus its answer and the issues. The agent itself
+isn't run again, so its tools aren't either - and an answer whose run
+called a tool that changes state (recording a quiz result, rescheduling a
+review) is delivered as it is rather than asked for again.
+"""
+
+import copy
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from config.settings import MAX_LOOP_ITERATIONS, VALIDATION_USE_LLM
+from agents.schemas import STRUCTURED_AGENTS, SchemaError, json_payload
+from observability.instrumentation import InstrumentationHooks, context_ids
+from observability.metrics import registry as metrics
+
+VALID = "VALID"
+INVALID = "INVALID"
+INCONCLUSIVE = "INCONCLUSIVE"
+SKIPPED = "SKIPPED"
+
+MIN_QUESTIONS = 3
+# [tag] types a generated quiz labels its questions with
+QUIZ_TYPES = ("mcq", "true_false", "short_answer", "code")
+# Tools a sub-agent can call without changing anything
+READ_ONLY_TOOLS = ("get_progress_summary", "get_review_schedule", "get_due_flashcards", "google_search")
+
+_HEADING = re.compile(r"^\s*#{2,4}\s*(.+?)\s*$", re.MULTILINE)
+# **Q1. [MCQ]** / **Q2: [Short Answer]** / **Q3.** (no type)
+_QUESTION = re.compile(r"^\s*\*\*Q(\d+)[.:)]?\s*(?:\*\*\s*)?(?:\[([^\]]+)\])?", re.MULTILINE)
+_ANSWER_KEY = re.compile(r"^\s*(?:#{2,4}.*answer key|\*\*answer key:?\*\*)", re.IGNORECASE | re.MULTILINE)
+_NUMBERED = re.compile(r"^\s*(\d+)[.)]\s+(.*)$", re.MULTILINE)
+_TABLE_ROW = re.compile(r"^\s*\|.*\|\s*$", re.MULTILINE)
+_LIST_ITEM = re.compile(r"^\s*(?:[-*]|\d+[.)])\s+\S", re.MULTILINE)
+_EXAMPLE = re.compile(r"example|analogy|e\.g\.|for instance|imagine|```", re.IGNORECASE)
+
+# Heading keywords for each required section (matched loosely, so
+# "### [OK] Checkpoints" and "### 2.  Key Points" both count)
+PLAN_SECTIONS = {
+    "Overview": ("overview", "summary"),
+    "Learning Goals": ("goal", "objective"),
+    "Topics Breakdown": ("breakdown", "timeline"),
+    "Priority Topics": ("priority",),
+    "Review Schedule": ("review",),
+    "Checkpoints": ("checkpoint", "milestone"),
+}
+EXPLANATION_SECTIONS = {
+    "Explanation": ("explanation",),
+    "Key Points": ("key point", "takeaway"),
+    "Flashcards": ("flashcard",),
+    "Quick Quiz": ("quiz",),
+}
+
+# Which LLM validator backs up the local check for each agent
+VALIDATORS = {
+    "learning_planner": "study_plan_validator",
+    "tutor_agent": "explanation_validator",
+    "quiz_agent": "quiz_validator",
+}
+
+
+class CheckResult:
+    """Verdict of one check, plus what's wrong (for INVALID/INCONCLUSIVE)."""
+    
+    __slots__ = ("verdict", "issues", "source")
+    
+    def __init__(self, verdict: str, issues: Optional[List[str]] = None, source: str = "local"):
+        self.verdict = verdict
+        self.issues = issues or []
+        self.source = source
+    
+    @property
+    def feedback(self) -> str:
+        """In the validators' own format: "VALID" or "INVALID: ..."."""
+        if self.verdict == VALID:
+            return VALID
+        return f"INVALID: {'; '.join(self.issues) or 'does not meet the format'}"
+    
+    def __repr__(self):
+        return f"CheckResult({self.verdict!r}, {self.issues!r}, source={self.source!r})"
+
+
+def headings(text: str) -> List[str]:
+    return [h.lower() for h in _HEADING.findall(text)]
+
+
+def missing_sections(text: str, sections: Dict[str, Tuple[str, ...]]) -> List[str]:
+    found = headings(text)
+    return [name for name, keywords in sections.items()
+            if not any(k in heading for heading in found for k in keywords)]
+
+
+def section_body(text: str, keywords: Tuple[str, ...]) -> str:
+    """Text under the first heading matching one of the keywords (up to the next heading)."""
+    for match in _HEADING.finditer(text):
+        if any(k in match.group(1).lower() for k in keywords):
+            following = _HEADING.search(text, match.end())
+            return text[match.end():following.start() if following else len(text)]
+    return ""
+
+
+def _question_type(tag: Optional[str]) -> Optional[str]:
+    if not tag:
+        return None
+    tag = tag.strip().lower()
+    if tag in ("mcq", "multiple choice") or "choice" in tag:
+        return "mcq"
+    if "true" in tag and "false" in tag:
+        return "true_false"
+    if "short" in tag:
+        return "short_answer"
+    if "code" in tag or "problem" in tag:
+        return "code"
+    return tag
+
+
+def is_generated_quiz(text: str) -> bool:
+    """A quiz the agent wrote (typed questions or an answer key), not grading feedback about one."""
+    if _ANSWER_KEY.search(text):
+        return True
+    return any(_question_type(tag) in QUIZ_TYPES for _, tag in _QUESTION.findall(text))
+
+
+def check_quiz(text: str) -> CheckResult:
+    """Question count, type mix and answer key of a generated quiz."""
+    if not is_generated_quiz(text):
+        return CheckResult(SKIPPED)  # grading feedback, a question back to the student...
+    questions = _QUESTION.findall(text)
+    key = _ANSWER_KEY.search(text)
+    
+    issues = []
+    if len(questions) < MIN_QUESTIONS:
+        issues.append(f"Only {len(questions)} question(s) - need at least {MIN_QUESTIONS}")
+    if key is None:
+        issues.append("No answer key provided")
+    types = [_question_type(tag) for _, tag in questions]
+    if questions and None not in types and len(set(types)) == 1:
+        issues.append(f"All questions are {questions[0][1]} - add variety")
+    if issues:
+        return CheckResult(INVALID, issues)
+    
+    unsure = []
+    if None in types:
+        unsure.append("some questions have no [type] tag")
+    answers = [a for n, a in _NUMBERED.findall(text[key.end():]) if a.strip()]
+    if len(answers) < len(questions):
+        unsure.append(f"answer key has {len(answers)} entries for {len(questions)} questions")
+    elif any(len(re.sub(r"[*_`\s]", "", a)) <= 2 for a in answers):
+        unsure.append("some answers have no explanation")
+    return CheckResult(INCONCLUSIVE, unsure) if unsure else CheckResult(VALID)
+
+
+def check_study_plan(text: str) -> CheckResult:
+    """The six sections of the planner's output format, with a real breakdown."""
+    missing = missing_sections(text, PLAN_SECTIONS)
+    if len(missing) == len(PLAN_SECTIONS):
+        return CheckResult(SKIPPED)  # asking for the exam date etc.
+    if len(missing) >= 3:
+        return CheckResult(INVALID, [f"Missing sections: {', '.join(missing)}"])
+    if missing:
+        # might be there under another name - let the LLM look
+        return CheckResult(INCONCLUSIVE, [f"Missing sections: {', '.join(missing)}"])
+    breakdown = section_body(text, PLAN_SECTIONS["Topics Breakdown"])
+    if len(_TABLE_ROW.findall(breakdown)) < 3 and not _LIST_ITEM.search(breakdown):
+        return CheckResult(INVALID, ["Topics breakdown is empty - break the plan into specific topics with times"])
+    return CheckResult(VALID)
+
+
+def check_explanation(text: str) -> CheckResult:
+    """The tutor's four sections, and an example somewhere in the explanation."""
+    missing = missing_sections(text, EXPLANATION_SECTIONS)
+    if len(missing) >= 3:
+        return CheckResult(SKIPPED)  # a short follow-up answer
+    if "Explanation" in missing or "Key Points" in missing:
+        return CheckResult(INVALID, [f"Missing sections: {', '.join(missing)}"])
+    issues = [f"Missing sections: {', '.join(missing)}"] if missing else []
+    if not _EXAMPLE.search(section_body(text, EXPLANATION_SECTIONS["Explanation"])):
+        issues.append("no example or analogy found")
+    return CheckResult(INCONCLUSIVE, issues) if issues else CheckResult(VALID)
+
+
+LOCAL_CHECKS: Dict[str, Callable[[str], CheckResult]] = {
+    "learning_planner": check_study_plan,
+    "tutor_agent": check_explanation,
+    "quiz_agent": check_quiz,
+}
+
+
+def parse_verdict(reply: str) -> CheckResult:
+    """Turn a validator's "VALID" / "INVALID: ..." reply into a CheckResult."""
+    reply = (reply or "").strip()
+    if reply.upper().startswith(INVALID):
+        issue = reply[len(INVALID):].lstrip(" :-").strip()
+        return CheckResult(INVALID, [issue] if issue else [], source="llm")
+    if reply.upper().startswith(VALID):
+        return CheckResult(VALID, source="llm")
+    # can't read it - don't hold the answer back over that
+    return CheckResult(VALID, [f"unreadable validator reply: {reply[:80]}"], source="llm")
+
+
+async def gemini_validate(agent_name: str, text: str) -> str:
+    """Ask the agent's LLM validator (from validators.py) about one output."""
+    from google import genai
+    from google.genai import types
+    from agents import validators
+    
+    validator = getattr(validators, VALIDATORS[agent_name])
+    response = await genai.Client().aio.models.generate_content(
+        model=validator.model,
+        contents=text,
+        config=types.GenerateContentConfig(system_instruction=validator.instruction),
+    )
+    return response.text or ""
+
+
+class ValidationPipeline:
+    """Local check first, the LLM validator only when that can't tell."""
+    
+    def __init__(
+        self,
+        llm_validate: Optional[Callable[[str, str], Awaitable[str]]] = gemini_validate,
+        checks: Dict[str, Callable[[str], CheckResult]] = LOCAL_CHECKS
+    ):
+        self.llm_validate = llm_validate
+        self.checks = checks
+    
+    async def validate(self, agent_name: str, text: str) -> CheckResult:
+        result = self.checks[agent_name](text)
+        if result.verdict == INCONCLUSIVE:
+            if self.llm_validate is None:
+                # nobody to ask - deliver it, as we did before there were checks
+                result = CheckResult(VALID, result.issues)
+            else:
+                try:
+                    result = parse_verdict(await self.llm_validate(agent_name, text))
+                except Exception as e:
+                    print(f"Validator call failed ({e}) - accepting the output")
+                    result = CheckResult(VALID, result.issues, source="llm")
+        elif result.verdict != SKIPPED:
+            # the LoopAgent would have made a validator call here
+            metrics.counter(
+                "studybuddy_regenerations_avoided_total",
+                "Validator loop iterations settled by the local check", agent=agent_name
+            ).inc()
+        metrics.counter(
+            "studybuddy_validations_total", "Output validations by verdict",
+            agent=agent_name, verdict=result.verdict.lower(), source=result.source
+        ).inc()
+        return result
+
+
+def _feedback(result: CheckResult) -> str:
+    return (f"Your previous answer did not pass review ({result.feedback}). "
+            "Please answer again in the required format and fix these issues.")
+
+
+async def ask_model_again(agent_name: str, llm_request, answer: str, feedback: str) -> Optional[str]:
+    """
+    Send a sub-agent's last model request again with its answer and the
+    review's feedback appended. Returns the new answer as markdown, or None
+    if the model went for a tool instead.
+    """
+    from google.genai import types
+    from agents.tiering import call_model
+    
+    request = copy.copy(llm_request)
+    request.contents = list(getattr(llm_request, "contents", None) or []) + [
+        types.Content(role="model", parts=[types.Part(text=answer)]),
+        types.Content(role="user", parts=[types.Part(text=feedback)]),
+    ]
+    response = await call_model(llm_request.model, request)
+    parts = getattr(getattr(response, "content", None), "parts", None) or []
+    if not parts or any(getattr(part, "function_call", None) for part in parts):
+        return None
+    text = "".join(getattr(part, "text", None) or "" for part in parts)
+    if agent_name in STRUCTURED_AGENTS and json_payload(text) is not None:
+        parse, render, _ = STRUCTURED_AGENTS[agent_name]
+        try:
+            text = render(parse(text))
+        except SchemaError:
+            pass  # still readable as it is
+    return text
+
+
+class ValidatingHooks(InstrumentationHooks):
+    """
+    Validates planner/tutor/quiz results as they come back through their
+    AgentTool, and re-asks the sub-agent's model with the issues as feedback
+    while they are INVALID. The last attempt is delivered either way.
+    
+    The sub-agent runs in its own session, so its model request and tool
+    calls are matched to the AgentTool call by student and agent name.
+    """
+    
+    def __init__(
+        self,
+        pipeline: Optional[ValidationPipeline] = None,
+        max_iterations: int = MAX_LOOP_ITERATIONS,
+        ask_again: Callable[[str, Any, str, str], Awaitable[Optional[str]]] = ask_model_again,
+        read_only_tools: Tuple[str, ...] = READ_ONLY_TOOLS
+    ):
+        self.pipeline = pipeline or ValidationPipeline(gemini_validate if VALIDATION_USE_LLM else None)
+        self.max_iterations = max_iterations
+        self.ask_again = ask_again
+        self.read_only_tools = set(read_only_tools)
+        # (student, sub-agent) -> {"request": its last model request, "changed_state": bool}
+        self._runs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    
+    def before_tool(self, tool, args, tool_context):
+        ids = context_ids(tool_context)
+        name = getattr(getattr(tool, "agent", None), "name", None)
+        if name in self.pipeline.checks:
+            self._runs[(ids["user_id"], name)] = {"request": None, "changed_state": False}
+            return None
+        run = self._runs.get((ids["user_id"], ids["agent_name"]))
+        if run is not None and getattr(tool, "name", None) not in self.read_only_tools:
+            run["changed_state"] = True
+        return None
+    
+    def before_model(self, callback_context, llm_request):
+        ids = context_ids(callback_context)
+        run = self._runs.get((ids["user_id"], ids["agent_name"]))
+        if run is not None:
+            run["request"] = llm_request
+        return None
+    
+    async def after_tool(self, tool, args, tool_context, tool_response):
+        agent = getattr(tool, "agent", None)
+        name = getattr(agent, "name", None)
+        if name not in self.pipeline.checks:
+            return None
+        run = self._runs.pop((context_ids(tool_context)["user_id"], name), None) or {}
+        if not isinstance(tool_response, str):
+            return None
+        
+        response = tool_response
+        for attempt in range(1, self.max_iterations + 1):
+            result = await self.pipeline.validate(name, response)
+            if result.verdict != INVALID or attempt == self.max_iterations:
+                break
+            if run.get("changed_state") or run.get("request") is None:
+                # asking again would record/reschedule twice (or there's nothing to re-ask)
+                metrics.counter("studybuddy_regenerations_skipped_total", "Invalid outputs delivered as they were",
+                                agent=name).inc()
+                break
+            metrics.counter("studybuddy_regenerations_total", "Outputs sent back for another try", agent=name).inc()
+            answer = await self.ask_again(name, run["request"], response, _feedback(result))
+            if not isinstance(answer, str):
+                break  # keep the last answer
+            response = answer
+        # returning the response replaces what the orchestrator sees
+        return response if response is not tool_response else None
+
+
+_hooks: Optional[ValidatingHooks] = None
+
+
+def get_validating_hooks() -> ValidatingHooks:
+    """Process-wide validation hooks."""
+    global _hooks
+    if _hooks is None:
+        _hooks = ValidatingHooks()
+    return _hooks
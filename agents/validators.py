@@ -6,12 +6,12 @@ Used with LoopAgent pattern for quality assurance.
 """
 
 from google.adk.agents import LlmAgent
-from config.settings import MODEL
+from agents.tiering import model_for
 
 
 # Study Plan Validation Checker
 study_plan_validator = LlmAgent(
-    model=MODEL,
+    model=model_for("study_plan_validator"),
     name="study_plan_validator",
     description="Validates that study plans meet quality standards",
     instruction="""
@@ -39,7 +39,7 @@ Examples of issues:
 
 # Quiz Validation Checker
 quiz_validator = LlmAgent(
-    model=MODEL,
+    model=model_for("quiz_validator"),
     name="quiz_validator",
     description="Validates that quizzes meet quality standards",
     instruction="""
@@ -65,7 +65,7 @@ Examples:
 
 # Explanation Validation Checker
 explanation_validator = LlmAgent(
-    model=MODEL,
+    model=model_for("explanation_validator"),
     name="explanation_validator",
     description="Validates that explanations are complete and helpful",
     instruction="""
@@ -0,0 +1,83 @@
+"""
+Run the benchmark suite.
+    
+    python -m benchmarks                    # everything, compared to baselines.json
+    python -m benchmarks --quick            # sizes up to 100 only
+    python -m benchmarks --filter session   # only matching cases
+    python -m benchmarks --save-baseline --repeat 5   # record the median of 5 runs as the baseline
+
+Exits with status 1 when any case is slower than its baseline by more than
+--threshold (default 25%, at least 100% for cases under 1ms). Baselines
+are scaled by a reference workload timed in the same run, so a slower or
+busier machine doesn't count as a regression.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import bench_persistence, bench_scheduling, bench_tools  # noqa: F401 (registers benchmarks)
+from benchmarks.runner import (
+    BASELINE_FILE, DEFAULT_THRESHOLD, REFERENCE_CASE,
+    run, load_baseline, save_baseline, compare, format_seconds, speed_factor
+)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="StudyBuddy benchmarks")
+    parser.add_argument("--filter", help="Only run cases whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="Skip sizes above 100")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write results to the baseline file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="Allowed slowdown (0.25 = 25%%)")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per case (the median is kept)")
+    parser.add_argument("--json", help="Also write results to this file")
+    args = parser.parse_args(argv)
+    
+    baseline_path = os.path.abspath(args.baseline)
+    json_path = os.path.abspath(args.json) if args.json else None
+    baseline = load_baseline(baseline_path)
+    
+    speed = 1.0
+    
+    def report(case, seconds):
+        nonlocal speed
+        previous = baseline.get(case)
+        if case == REFERENCE_CASE:
+            speed = speed_factor({case: seconds}, baseline)
+        elif previous:
+            previous *= speed  # change against the baseline scaled to this machine
+        change = f"{(seconds / previous - 1):+.0%}" if previous else "new"
+        print(f"  {case:<58} {format_seconds(seconds):>10}  {change:>6}", flush=True)
+    
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)  # persistence writes to relative output/ paths
+        try:
+            results = run(args.filter, max_size=100 if args.quick else None, report=report,
+                          repeat=max(1, args.repeat))
+        finally:
+            os.chdir(original_cwd)
+    
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        save_baseline(results, baseline_path)
+        print(f"\nBaseline saved to {baseline_path}")
+        return 0
+    
+    regressions = compare(results, baseline, args.threshold)
+    print(f"\nReference workload: {speed:.2f}x the baseline machine's time")
+    for case, expected, now in regressions:
+        print(f"[REGRESSION] {case}: {format_seconds(expected)} (scaled baseline) -> {format_seconds(now)}")
+    print(f"\n{len(results)} case(s), {len(regressions)} regression(s)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
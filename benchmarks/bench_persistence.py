@@ -0,0 +1,83 @@
+"""Session and progress persistence."""
+
+from benchmarks.generators import make_progress, make_quiz_results, make_reviews, topic_names
+from benchmarks.runner import benchmark
+from memory.session_manager import StudyBuddySession, ProgressTracker
+
+ATTEMPTS = [{"attempts": 10}, {"attempts": 10_000}, {"attempts": 1_000_000}]
+TOPICS = [{"topics": 1}, {"topics": 100}, {"topics": 10_000}]
+
+
+def _session(attempts: int) -> StudyBuddySession:
+    session = StudyBuddySession("_bench")
+    session.current_topic = "Topic 00000"
+    session.study_plan = "Week 1: ..."
+    session.quiz_results = make_quiz_results(attempts)
+    for i in range(50):
+        session.add_interaction("query", f"question {i} " * 20)
+    return session
+
+
+@benchmark("session.save", ATTEMPTS)
+def bench_session_save(param):
+    session = _session(param["attempts"])
+    return session.save
+
+
+@benchmark("session.load", ATTEMPTS)
+def bench_session_load(param):
+    _session(param["attempts"]).save()
+    return lambda: StudyBuddySession.load("_bench")
+
+
+def _tracker(n_topics: int) -> ProgressTracker:
+    tracker = ProgressTracker("_bench")
+    tracker.progress_data = make_progress(n_topics, n_topics * 10)
+    tracker.review_data = make_reviews(n_topics)
+    for topic in tracker.progress_data:
+        tracker.topics.canonicalize(topic)
+    tracker.topics.save()
+    return tracker
+
+
+@benchmark("progress.update_topic_progress", TOPICS)
+def bench_update_topic_progress(param):
+    tracker = _tracker(param["topics"])
+    names = topic_names(param["topics"])
+    calls = iter(range(10 ** 9))
+    
+    def update():
+        i = next(calls)
+        tracker.update_topic_progress(names[i % len(names)], 50 + i % 50, 10)
+    return update
+
+
+@benchmark("progress.update_review_schedule", TOPICS)
+def bench_update_review_schedule(param):
+    tracker = _tracker(param["topics"])
+    names = topic_names(param["topics"])
+    calls = iter(range(10 ** 9))
+    
+    def update():
+        i = next(calls)
+        topic = names[i % len(names)]
+        # keep each topic looking the same on every call - repeating one topic forever
+        # grows its history and pushes intervals past datetime's range
+        data = tracker.review_data[topic]
+        data["repetition_number"] = i % 8
+        del data["performance_history"][:-3]
+        tracker.update_review_schedule(topic, (i % 10) / 10)
+    return update
+
+
+@benchmark("progress.get_review_schedule", TOPICS)
+def bench_tracker_review_schedule(param):
+    return _tracker(param["topics"]).get_review_schedule
+
+
+@benchmark("progress.load", TOPICS)
+def bench_tracker_load(param):
+    tracker = _tracker(param["topics"])
+    tracker._save_progress()
+    tracker._save_reviews()
+    return lambda: ProgressTracker("_bench")
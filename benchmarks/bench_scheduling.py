@@ -0,0 +1,30 @@
+"""Spaced repetition scheduling."""
+
+from datetime import timedelta
+
+from benchmarks.generators import NOW, make_reviews
+from benchmarks.runner import benchmark
+from memory.spaced_repetition import SpacedRepetitionScheduler
+
+TOPICS = [{"topics": 1}, {"topics": 100}, {"topics": 10_000}]
+
+
+@benchmark("scheduler.calculate_next_review")
+def bench_calculate_next_review(param):
+    scheduler = SpacedRepetitionScheduler()
+    last_review = NOW - timedelta(days=3)
+    return lambda: scheduler.calculate_next_review(last_review, 4, 0.75)
+
+
+@benchmark("scheduler.calculate_balanced_review", TOPICS)
+def bench_calculate_balanced_review(param):
+    scheduler = SpacedRepetitionScheduler()
+    day_load = scheduler.build_day_load(make_reviews(param["topics"]).values())
+    last_review = NOW - timedelta(days=3)
+    return lambda: scheduler.calculate_balanced_review(last_review, 4, 0.75, day_load=day_load)
+
+
+@benchmark("scheduler.build_day_load", TOPICS)
+def bench_build_day_load(param):
+    reviews = list(make_reviews(param["topics"]).values())
+    return lambda: SpacedRepetitionScheduler.build_day_load(reviews)
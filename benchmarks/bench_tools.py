@@ -0,0 +1,68 @@
+"""Agent tool hot paths (run against an in-memory stand-in for ToolContext)."""
+
+from benchmarks.generators import make_flashcards, make_quiz_results, make_tool_context, topic_names
+from benchmarks.runner import benchmark
+from memory.context_builder import ContextBuilder
+from memory.session_manager import StudyBuddySession
+from tools.file_tools import export_flashcards
+from tools.progress_tools import get_progress_summary, get_review_schedule, record_quiz_result
+
+TOPICS = [{"topics": 1}, {"topics": 100}, {"topics": 10_000}]
+CARDS = [{"cards": 10}, {"cards": 100}, {"cards": 10_000}]
+ATTEMPTS = [{"attempts": 10}, {"attempts": 10_000}, {"attempts": 1_000_000}]
+
+
+@benchmark("tools.record_quiz_result", TOPICS)
+def bench_record_quiz_result(param):
+    context = make_tool_context(param["topics"], param["topics"] * 10)
+    names = topic_names(param["topics"])
+    calls = iter(range(10 ** 9))
+    
+    def record():
+        i = next(calls)
+        record_quiz_result(names[i % len(names)], 50 + i % 50, 10, "", context)
+    return record
+
+
+@benchmark("tools.get_progress_summary", TOPICS)
+def bench_get_progress_summary(param):
+    context = make_tool_context(param["topics"], param["topics"] * 10)
+    return lambda: get_progress_summary(context)
+
+
+@benchmark("tools.get_review_schedule", TOPICS)
+def bench_get_review_schedule(param):
+    context = make_tool_context(param["topics"], param["topics"] * 10)
+    return lambda: get_review_schedule(context)
+
+
+@benchmark("tools.export_flashcards.md", CARDS)
+def bench_export_flashcards_md(param):
+    cards = make_flashcards(param["cards"])
+    return lambda: export_flashcards("Bench Topic", cards, "md")
+
+
+@benchmark("tools.export_flashcards.json", CARDS)
+def bench_export_flashcards_json(param):
+    cards = make_flashcards(param["cards"])
+    return lambda: export_flashcards("Bench Topic", cards, "json")
+
+
+@benchmark("session.get_context", ATTEMPTS)
+def bench_get_context(param):
+    session = StudyBuddySession("_bench")
+    session.current_topic = "Topic 00000"
+    session.quiz_results = make_quiz_results(param["attempts"])
+    session.review_schedule = {"total_due": 3}
+    return session.get_context
+
+
+@benchmark("context.build", TOPICS)
+def bench_build_context(param):
+    session = StudyBuddySession("_bench")
+    session.current_topic = "Topic 00000"
+    state = make_tool_context(param["topics"], param["topics"] * 10).state
+    builder = ContextBuilder()
+    # the cached case - same session and state, a different question each time
+    queries = [f"quiz me on topic {i:05d}" for i in range(16)]
+    return lambda: [builder.build(session, q, state) for q in queries]
@@ -0,0 +1,107 @@
+"""
+Synthetic data for the benchmarks.
+
+Everything is seeded, so the same size always gives the same data and
+timings stay comparable between runs.
+"""
+
+import random
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+from memory.progress_aggregates import rebuild_aggregates
+from memory.score_history import empty_history, append_score
+from memory.topic_registry import TopicRegistry
+
+NOW = datetime(2026, 1, 15, 9, 0, 0)
+
+
+def topic_names(n: int) -> List[str]:
+    return [f"Topic {i:05d}" for i in range(n)]
+
+
+def make_progress(n_topics: int, attempts: int, seed: int = 1) -> Dict[str, Dict[str, Any]]:
+    """Progress data as ProgressTracker/record_quiz_result keep it, `attempts` spread over topics."""
+    rng = random.Random(seed)
+    progress = {}
+    per_topic = max(1, attempts // max(1, n_topics))
+    for topic in topic_names(n_topics):
+        history = empty_history()
+        # the history is capped, so only the last few scores matter for its shape
+        for i in range(min(per_topic, 40)):
+            append_score(history, rng.uniform(30, 100), NOW - timedelta(days=per_topic - i))
+        last = history["s"][-1]
+        history["n"] = per_topic
+        progress[topic] = {
+            "attempts": per_topic,
+            "last_score": last,
+            "best_score": max(history["s"]),
+            "total_answered": per_topic * 10,
+            "notes": "",
+            "last_updated": NOW.isoformat(),
+            "history": history,
+            "ewma": history["ewma"],
+            "trend_slope": history["trend_slope"],
+            "mastery": history["mastery"],
+        }
+    return progress
+
+
+def make_reviews(n_topics: int, attempts: int = 0, seed: int = 2) -> Dict[str, Dict[str, Any]]:
+    """Spaced repetition data: about a third of topics due, the rest spread over 60 days."""
+    rng = random.Random(seed)
+    per_topic = max(1, attempts // max(1, n_topics)) if attempts else 3
+    reviews = {}
+    for topic in topic_names(n_topics):
+        next_review = NOW + timedelta(days=rng.randint(-20, 40), hours=rng.randint(0, 23))
+        reviews[topic] = {
+            "repetition_number": rng.randint(0, 8),
+            "last_review": (next_review - timedelta(days=7)).isoformat(),
+            "next_review": next_review.isoformat(),
+            "performance_history": [
+                {"date": (NOW - timedelta(days=i)).isoformat(), "score": round(rng.random(), 2)}
+                for i in range(per_topic)
+            ],
+        }
+    return reviews
+
+
+def make_quiz_results(attempts: int, n_topics: int = 100, seed: int = 3) -> List[Dict[str, Any]]:
+    """StudyBuddySession.quiz_results with `attempts` entries."""
+    rng = random.Random(seed)
+    names = topic_names(n_topics)
+    start = NOW - timedelta(minutes=attempts)
+    return [
+        {
+            "timestamp": (start + timedelta(minutes=i)).isoformat(),
+            "topic": names[i % n_topics],
+            "score": round(rng.uniform(30, 100), 1),
+            "total": 10,
+        }
+        for i in range(attempts)
+    ]
+
+
+def make_flashcards(n: int, seed: int = 4) -> List[Dict[str, str]]:
+    rng = random.Random(seed)
+    return [
+        {"question": f"Question {i}: what is concept {rng.randint(0, 10 ** 6)}?",
+         "answer": f"Concept {i} is explained by a short paragraph of text. " * 2}
+        for i in range(n)
+    ]
+
+
+def make_tool_context(n_topics: int, attempts: int) -> SimpleNamespace:
+    """A stand-in ToolContext whose state looks like a long-running session."""
+    progress = make_progress(n_topics, attempts)
+    registry = TopicRegistry()
+    for topic in progress:
+        registry.canonicalize(topic)
+    state = {
+        "progress": progress,
+        "progress_aggregates": rebuild_aggregates(progress),
+        "spaced_repetition": make_reviews(n_topics),
+        "topic_registry": registry.data,
+    }
+    return SimpleNamespace(state=state)
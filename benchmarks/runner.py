@@ -0,0 +1,157 @@
+"""
+Benchmark runner.
+
+Benchmarks are functions registered with @benchmark. Each one takes a size
+parameter, does its setup, and returns a zero-argument callable - only that
+callable is timed. Timing follows timeit: calibrate the loop count until a
+run takes ~0.2s, repeat, keep the best per-call time.
+
+Results are compared against a stored baseline (benchmarks/baselines.json)
+as ratios, not absolute times: every run also times a fixed reference
+workload, and each baseline is scaled by how much faster or slower that
+reference ran here than when the baseline was recorded. Anything slower
+than the scaled baseline * (1 + threshold) counts as a regression. Cases
+under FAST_SECONDS (a millisecond) swing with timer, cache and disk noise
+far more than the reference does, so they get at least FAST_THRESHOLD, and
+nothing slower by under NOISE_SECONDS counts at all.
+"""
+
+import json
+import os
+import statistics
+import timeit
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+DEFAULT_THRESHOLD = 0.25
+FAST_SECONDS = 1e-3
+FAST_THRESHOLD = 1.0
+NOISE_SECONDS = 1e-6
+REFERENCE_CASE = "_reference"
+
+# (group.name, function, params)
+BENCHMARKS: List[Tuple[str, Callable[[Any], Callable[[], Any]], List[Any]]] = []
+
+
+def benchmark(name: str, params: Iterable[Any] = (None,)):
+    """Register a benchmark. `params` are the sizes it runs at."""
+    def register(func):
+        BENCHMARKS.append((name, func, list(params)))
+        return func
+    return register
+
+
+def case_name(name: str, param: Any) -> str:
+    if param is None:
+        return name
+    if isinstance(param, dict):
+        return f"{name}[{','.join(f'{k}={v}' for k, v in param.items())}]"
+    return f"{name}[{param}]"
+
+
+def measure(func: Callable[[], Any], min_time: float = 0.2, repeat: int = 3) -> float:
+    """Best seconds per call."""
+    timer = timeit.Timer(func)
+    number, total = timer.autorange()
+    if total / number > 1.0:
+        # slow case (e.g. 1M attempts) - one calibrated run is plenty
+        return total / number
+    if total < min_time:
+        number = max(number, int(number * min_time / max(total, 1e-9)))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def _reference_workload() -> Callable[[], Any]:
+    """Plain-Python work (dicts, sorting, JSON) like the benchmarks do, fixed forever."""
+    data = {f"topic {i}": {"score": i % 97, "next_review": f"2025-01-{i % 28 + 1:02d}"} for i in range(200)}
+    return lambda: sorted(json.loads(json.dumps(data)).items(), key=lambda item: item[1]["next_review"])
+
+
+def calibrate(repeat: int = 5) -> float:
+    """Seconds per call of the reference workload on this machine, right now."""
+    return measure(_reference_workload(), repeat=repeat)
+
+
+def run(
+    pattern: Optional[str] = None,
+    max_size: Optional[int] = None,
+    report: Callable[[str, float], None] = lambda case, seconds: None,
+    repeat: int = 1
+) -> Dict[str, float]:
+    """
+    Run the registered benchmarks, plus the reference workload (as REFERENCE_CASE).
+    
+    Args:
+        pattern: Only cases whose name contains this
+        max_size: Skip parameter sets with any size above this (quick runs)
+        report: Called with (case, seconds) as each case finishes
+        repeat: Measure each case this many times and keep the median
+    """
+    results: Dict[str, float] = {REFERENCE_CASE: statistics.median(calibrate() for _ in range(repeat))}
+    report(REFERENCE_CASE, results[REFERENCE_CASE])
+    for name, func, params in BENCHMARKS:
+        for param in params:
+            case = case_name(name, param)
+            if pattern and pattern not in case:
+                continue
+            if max_size is not None and _largest(param) > max_size:
+                continue
+            seconds = statistics.median(measure(func(param)) for _ in range(repeat))
+            results[case] = seconds
+            report(case, seconds)
+    return results
+
+
+def _largest(param: Any) -> int:
+    if isinstance(param, dict):
+        return max((v for v in param.values() if isinstance(v, int)), default=0)
+    return param if isinstance(param, int) else 0
+
+
+def load_baseline(path: str = BASELINE_FILE) -> Dict[str, float]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(results: Dict[str, float], path: str = BASELINE_FILE) -> None:
+    baseline = load_baseline(path)
+    baseline.update({case: round(seconds, 9) for case, seconds in results.items()})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(dict(sorted(baseline.items())), f, indent=2)
+        f.write("\n")
+
+
+def speed_factor(results: Dict[str, float], baseline: Dict[str, float]) -> float:
+    """How much slower this machine/run is than the baseline's, from the reference workload."""
+    now, then = results.get(REFERENCE_CASE), baseline.get(REFERENCE_CASE)
+    return now / then if now and then else 1.0
+
+
+def compare(
+    results: Dict[str, float],
+    baseline: Dict[str, float],
+    threshold: float = DEFAULT_THRESHOLD
+) -> List[Tuple[str, float, float]]:
+    """
+    Cases slower than their (speed-scaled) baseline by more than `threshold`,
+    as (case, scaled baseline, now).
+    """
+    speed = speed_factor(results, baseline)
+    regressions = []
+    for case, seconds in results.items():
+        if case == REFERENCE_CASE or case not in baseline:
+            continue
+        expected = baseline[case] * speed
+        allowed = threshold if baseline[case] >= FAST_SECONDS else max(threshold, FAST_THRESHOLD)
+        if seconds > expected * (1 + allowed) and seconds - expected > NOISE_SECONDS:
+            regressions.append((case, expected, seconds))
+    return regressions
+
+
+def format_seconds(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
@@ -8,6 +8,28 @@ Central configuration for model selection, agent settings, and feature toggles.
 MODEL = "gemini-2.0-flash"  # Main model for all agents
 EMBED_MODEL = "text-embedding-004"  # For embeddings if needed
 
+# Model Tier Settings
+USE_MODEL_TIERS = False          # Give each agent its tier's model (off = MODEL everywhere)
+MODEL_TIERS = {                  # Cheapest first - escalation moves one step up
+    "fast": "gemini-2.0-flash-lite",
+    "standard": "gemini-2.0-flash",
+    "strong": "gemini-2.5-flash",
+}
+AGENT_TIERS = {                  # Everyone starts below "strong" so a shaky answer has somewhere to go
+    "study_buddy": "fast",
+    "study_plan_validator": "fast",
+    "quiz_validator": "fast",
+    "explanation_validator": "fast",
+    "progress_tracker": "fast",
+    "learning_planner": "standard",
+    "reflection_agent": "standard",
+    "tutor_agent": "standard",   # content: escalates to "strong" on an INVALID quiz/explanation
+    "quiz_agent": "standard",
+}
+AGENT_MODELS = {}                # Per-agent model overrides, e.g. {"tutor_agent": "gemini-2.5-pro"}
+ESCALATE_LOW_CONFIDENCE = True   # Re-ask one tier up when an answer looks unreliable
+ESCALATION_MIN_LOGPROB = -1.0    # Average token logprob below this counts as unsure
+
 # Feature Toggles
 USE_SPACED_REPETITION = True  # Enable spaced repetition scheduling
 USE_FILE_PERSISTENCE = True   # Save sessions/progress to files
@@ -17,17 +39,142 @@ USE_OBSERVABILITY = True      # Enable logging/observability
 SPACED_REPETITION_INTERVALS = [1, 3, 7, 14, 30, 60, 120]  # Days
 EASE_FACTOR = 2.5  # Growth factor for intervals
 
+# Review Load Balancing
+USE_REVIEW_LOAD_BALANCING = True  # Spread reviews across nearby days to flatten peaks
+REVIEW_FUZZ_RATIO = 0.15          # Max fraction of the interval a review may move
+REVIEW_FUZZ_MAX_DAYS = 4          # Hard cap on how far a review may move (days)
+REVIEW_COHORT_LOAD_WEIGHT = 0.0   # Weight of cohort-wide load vs. the student's own (0 = off)
+
+# Flashcard Settings
+MAX_CARD_HISTORY = 20   # Reviews kept per flashcard
+DUE_CARDS_LIMIT = 10    # Default number of cards served per review session
+
+# Score History Settings
+SCORE_HISTORY_MAX_POINTS = 32  # Points kept per topic before old ones get merged
+SCORE_EWMA_ALPHA = 0.4         # Weight of the newest score in the moving average
+SCORE_TREND_WINDOW = 5         # Attempts used for the trend slope
+MASTERY_THRESHOLD = 0.8        # Skill level (0-1) that counts as "mastered"
+MASTERY_DECAY = 0.85           # How fast old attempts stop counting toward mastery
+
+# Topic Settings
+TOPIC_MERGE_THRESHOLD = 0.85  # Similarity needed before suggesting two topics be merged
+
 # Session Settings
 APP_NAME = "study_buddy_app"
 DEFAULT_USER_ID = "demo_user"
 DEFAULT_SESSION_ID = "demo_session"
 
+# Context Settings
+CONTEXT_TOKEN_BUDGET = 200       # Tokens of student context put in front of each message
+CONTEXT_RECENT_INTERACTIONS = 3  # Recent questions considered for the context
+CONTEXT_CACHE_SIZE = 256         # Sessions whose collected facts are kept in memory
+
+# Conversation Summary Settings
+USE_CONVERSATION_SUMMARY = True  # Fold old turns into a summary once history gets long
+SUMMARY_TRIGGER_TOKENS = 3000    # Unsummarized history allowed before compacting
+SUMMARY_RECENT_TURNS = 4         # Student turns always sent word for word
+SUMMARY_MAX_TOKENS = 400         # Summary size cap (oldest lines drop off first)
+SUMMARY_MODEL = None             # Cheap model to rewrite summaries in the background (None = local only)
+
+# Prefix Cache Settings
+USE_PREFIX_CACHE = True                # Cache each agent's instruction + tools on the model side
+PREFIX_CACHE_AGENTS = ("study_buddy", "tutor_agent", "quiz_agent", "learning_planner", "progress_tracker")
+PREFIX_CACHE_TTL = 3600                # Seconds a cache handle lives
+PREFIX_CACHE_REFRESH_MARGIN = 120      # Extend a handle's TTL when it has less than this left
+PREFIX_CACHE_MIN_TOKENS = 1024         # Smaller prefixes aren't worth (or allowed) caching
+PREFIX_CACHE_DISCOUNT = 0.75           # Share of the input price saved on cached tokens (stub backend)
+
 # Output Directories
 OUTPUT_DIR = "output"
+LOGS_DIR = "output/logs"
 STUDY_PLANS_DIR = "output/study_plans"
 SESSIONS_DIR = "output/sessions"
 PROGRESS_DIR = "output/progress"
 SPACED_REPETITION_DIR = "output/spaced_repetition"
+FLASHCARDS_DIR = "output/flashcards"
+USAGE_DIR = "output/usage"
+PROFILES_DIR = "output/profiles"
+COHORT_CONTENT_DIR = "output/cohort_content"
+
+# Logging Settings
+LOG_LEVEL = "info"                            # debug, info, warning, error
+LOG_JSON_FILE = "output/logs/studybuddy.jsonl"  # JSON lines log (None to disable)
+LOG_CONSOLE = True                            # Also show logs on the rich console
+LOG_SAMPLE_RATES = {"debug": 0.1}             # Fraction of records kept per level
+LOG_MAX_BYTES = 10 * 1024 * 1024              # Rotate the log file at this size
+LOG_BACKUP_COUNT = 5                          # Rotated files to keep
+LOG_QUEUE_SIZE = 10000                        # Records buffered before dropping
+
+# Tracing Settings
+USE_TRACING = True                                  # Spans for agents, model calls and tools
+TRACE_EXPORT_FILE = "output/traces/spans.otlp.jsonl"  # OTLP/JSON, one trace per line
+
+# Metrics Settings
+USE_METRICS = True                                 # Counters and latency histograms
+METRICS_PORT = 0                                   # Serve /metrics on this port (0 = off)
+METRICS_DUMP_FILE = "output/metrics/metrics.prom"  # Prometheus text dump written on exit
+
+# Dashboard Settings
+DASHBOARD_REFRESH_SECONDS = 1.0  # Redraw interval
+DASHBOARD_WINDOW = 60            # Seconds covered by rates and percentiles
+REVIEW_BACKLOG_TTL = 30          # Seconds between rescans of review files for the due backlog
+
+# Request Recording Settings
+USE_REQUEST_RECORDING = False                            # Record full requests for offline replay
+RECORDING_FILE = "output/recordings/requests.jsonl.gz"   # One request per line, gzip-appended
+
+# Profiling Settings
+PROFILE_SAMPLE_INTERVAL = 0.005  # Seconds between stack samples while sampling
+PROFILE_MAX_DEPTH = 64           # Frames kept per sampled stack
+PROFILE_SLOW_THRESHOLD = 0       # Dump a profile of any request slower than this (seconds, 0 = off)
+
+# Slow Request Settings
+SLOW_REQUEST_SLO_MS = 15000                      # Snapshot any request slower than this (0 = off)
+SLOW_LOG_FILE = "output/logs/slow_requests.jsonl"  # One snapshot per line
+
+# Token Budget Settings
+DAILY_TOKEN_BUDGET = 200_000   # Prompt + completion tokens per student per day (0 = unlimited)
+USAGE_RETENTION_DAYS = 30      # Days of usage kept per student
+BUDGET_CACHE_SIZE = 256        # Recent answers kept for replay once a budget runs out
+TOKEN_PRICES_PER_MILLION = {   # USD per 1M tokens, for cost estimates in the usage report
+    "gemini-2.0-flash-lite": {"input": 0.075, "output": 0.30},
+    "gemini-2.0-flash": {"input": 0.10, "output": 0.40, "cached": 0.025},
+    "gemini-2.5-flash": {"input": 0.30, "output": 2.50, "cached": 0.075},
+}
 
 # Agent Settings
 MAX_LOOP_ITERATIONS = 3  # For LoopAgent validation retries
+
+# Output Validation Settings
+USE_OUTPUT_VALIDATION = False  # Check plans, quizzes and explanations before they reach the student
+VALIDATION_USE_LLM = True      # Ask the LLM validator when the local check can't tell
+
+# Structured Output Settings
+USE_STRUCTURED_OUTPUT = False  # Tutor/quiz agents reply in JSON, parsed into objects and rendered as markdown
+
+# Fan-out Settings
+USE_FANOUT = False    # Run the independent parts of a compound request ("explain X and quiz me") in parallel
+FANOUT_MAX_TASKS = 4  # Most sub-agents one request fans out to
+
+# Prefetch Settings
+USE_PREFETCH = False       # After an explanation, generate the likely next quiz/explanation in the background
+PREFETCH_DAILY_LIMIT = 10  # Prefetches per student per day
+PREFETCH_DELAY = 1.0       # Seconds before a prefetch starts (the live request goes first)
+PREFETCH_WAIT = 2.0        # Seconds a live request waits for a prefetch that's still being written
+PREFETCH_TTL = 1800        # Seconds a prefetched answer stays usable
+PREFETCH_MATCH = 0.5       # Share of a prefetched topic's words a request has to mention to use it
+
+# Single-flight Settings
+USE_SINGLE_FLIGHT = False                             # Identical model calls in flight at once share one answer
+SINGLE_FLIGHT_AGENTS = ("tutor_agent", "quiz_agent")  # Agents whose calls get coalesced
+SINGLE_FLIGHT_TIMEOUT = 120.0                         # Backstop for a leader that vanishes without an answer or error
+
+# Cohort Content Settings
+USE_COHORT_CONTENT = False                                 # Serve explanations/quizzes pre-generated by agents.batch_generate
+COHORT_TOPICS = ("DSA", "OS", "DBMS", "CN", "AI/ML")       # What batch_generate covers by default (the planner's syllabus)
+COHORT_LEVELS = ("beginner", "intermediate", "exam-prep")  # Difficulty levels generated per topic
+COHORT_DEFAULT_LEVEL = "intermediate"                      # Level of a request that doesn't name one
+COHORT_CONTENT_TTL = 14 * 24 * 3600                        # Seconds generated content stays servable
+BATCH_CONCURRENCY = 4                                      # Generations running at once
+BATCH_RETRIES = 3                                          # Extra attempts for a failed generation
+BATCH_BACKOFF = 2.0                                        # Seconds before the first retry (doubles each time)
@@ -0,0 +1 @@
+# Load testing with a fake Gemini backend - run with: python -m loadtest.driver
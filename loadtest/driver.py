@@ -0,0 +1,199 @@
+"""
+Load Test Driver
+
+Pushes simulated students through the real agent graph (study_buddy and
+all its sub-agents and tools) with the fake Gemini backend, then reports
+throughput, end-to-end latency, and our own overhead - wall time minus
+the time the fake model spent "thinking".
+
+    python -m loadtest.driver --students 2000 --concurrency 500
+    python -m loadtest.driver --latency fixed:0 --mix quiz=1     # pure overhead
+    python -m loadtest.driver --hooks                            # with tracing/metrics/accounting on
+    python -m loadtest.driver --prefix-cache                     # instruction caching, stub backend
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+try:
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+    from google.genai.types import Content, Part
+except ImportError:
+    Runner = InMemorySessionService = Content = Part = None
+
+from config.settings import APP_NAME
+from loadtest.fake_gemini import RequestInfo, install_fake_models, restore_models, simulated_request
+from memory.prefix_cache import PrefixCacheRegistry, PrefixCachingHooks, StubCacheBackend
+from observability.instrumentation import instrument_agent, register_hooks, unregister_hooks
+
+TOPICS = ["Binary Trees", "Graphs", "Dynamic Programming", "Operating Systems", "Sorting", "Hashing"]
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """Parse "quiz=0.5,explain=0.3,progress=0.2" into scenario weights."""
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def simulate_student(
+    index: int,
+    runner,
+    session_service,
+    mix: Dict[str, float],
+    requests: int,
+    semaphore: asyncio.Semaphore,
+    results: List[Dict[str, Any]],
+    seed: int
+) -> None:
+    """One student: create a session, then send `requests` messages in a row."""
+    rng = random.Random(seed + index)
+    user_id = f"loadtest_{index:05d}"
+    session_id = f"{user_id}_session"
+    await session_service.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+    
+    for _ in range(requests):
+        scenario = rng.choices(list(mix), weights=list(mix.values()))[0]
+        info = RequestInfo(scenario, topic=rng.choice(TOPICS), rng=rng)
+        async with semaphore:
+            start = time.perf_counter()
+            error = None
+            try:
+                with simulated_request(info):
+                    async for _event in runner.run_async(
+                        user_id=user_id, session_id=session_id,
+                        new_message=Content(role="user", parts=[Part(text=f"Context:\nStudent: {user_id}\n\nUser: {scenario} {info.topic}")])
+                    ):
+                        pass
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            wall_ms = (time.perf_counter() - start) * 1000
+        results.append({
+            "scenario": scenario, "wall_ms": wall_ms, "model_ms": info.model_ms,
+            "overhead_ms": wall_ms - info.model_ms, "model_calls": info.model_calls,
+            "tokens": info.input_tokens + info.output_tokens, "input_tokens": info.input_tokens,
+            "cached_tokens": info.cached_tokens, "error": error
+        })
+
+
+async def run_load_test(
+    students: int,
+    requests: int,
+    concurrency: int,
+    mix: Dict[str, float],
+    latency: str,
+    seed: int = 0,
+    hooks: bool = False,
+    prefix_cache: bool = False
+) -> Dict[str, Any]:
+    """Run the load test and return a summary."""
+    from agents.study_buddy_agent import study_buddy_agent
+    
+    cache_backend = StubCacheBackend()
+    prefix_hooks = None
+    if hooks:
+        # same hooks main.py installs, so their overhead shows up in the numbers
+        import main  # noqa: F401
+        from memory.prefix_cache import get_prefix_cache_registry
+        get_prefix_cache_registry().backend = cache_backend  # never create real caches from a load test
+    elif prefix_cache:
+        prefix_hooks = register_hooks(PrefixCachingHooks(PrefixCacheRegistry(cache_backend)))
+        instrument_agent(study_buddy_agent)
+    
+    saved = install_fake_models(study_buddy_agent, latency=latency, seed=seed, cache_backend=cache_backend)
+    try:
+        session_service = InMemorySessionService()
+        runner = Runner(agent=study_buddy_agent, app_name=APP_NAME, session_service=session_service)
+        semaphore = asyncio.Semaphore(concurrency)
+        results: List[Dict[str, Any]] = []
+        
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            simulate_student(i, runner, session_service, mix, requests, semaphore, results, seed)
+            for i in range(students)
+        ))
+        elapsed = time.perf_counter() - start
+    finally:
+        restore_models(saved)
+        if prefix_hooks is not None:
+            unregister_hooks(prefix_hooks)
+    
+    ok = [r for r in results if not r["error"]]
+    input_tokens = sum(r["input_tokens"] for r in ok)
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "first_error": next((r["error"] for r in results if r["error"]), None),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(results) / elapsed if elapsed else 0.0,
+        "wall_ms": {q: percentile([r["wall_ms"] for r in ok], q) for q in (0.5, 0.95, 0.99)},
+        "overhead_ms": {q: percentile([r["overhead_ms"] for r in ok], q) for q in (0.5, 0.95, 0.99)},
+        "mean_overhead_ms": statistics.fmean(r["overhead_ms"] for r in ok) if ok else 0.0,
+        "model_calls": sum(r["model_calls"] for r in ok),
+        "tokens": sum(r["tokens"] for r in ok),
+        "cached_share": sum(r["cached_tokens"] for r in ok) / input_tokens if input_tokens else 0.0,
+        "by_scenario": {
+            scenario: len([r for r in ok if r["scenario"] == scenario]) for scenario in mix
+        },
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the agent graph with a fake Gemini backend")
+    parser.add_argument("--students", type=int, default=1000, help="Simulated students")
+    parser.add_argument("--requests", type=int, default=3, help="Requests per student")
+    parser.add_argument("--concurrency", type=int, default=500, help="Requests in flight at once")
+    parser.add_argument("--mix", default="quiz=0.5,explain=0.3,progress=0.2", help="Scenario weights")
+    parser.add_argument("--latency", default="lognormal:800:0.5", help="fixed:MS | uniform:LO:HI | lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--hooks", action="store_true", help="Install main.py's observability hooks")
+    parser.add_argument("--prefix-cache", action="store_true", help="Cache agent instructions (stub backend)")
+    args = parser.parse_args(argv)
+    
+    if Runner is None:
+        print("The load test needs google-adk installed.")
+        return 2
+    
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)  # tools and hooks write to relative output/ paths
+        try:
+            summary = asyncio.run(run_load_test(
+                args.students, args.requests, args.concurrency,
+                parse_mix(args.mix), args.latency, args.seed, args.hooks, args.prefix_cache
+            ))
+        finally:
+            os.chdir(original_cwd)
+    
+    print(f"\nRequests:    {summary['requests']} ({summary['errors']} errors) in {summary['elapsed_s']:.1f}s"
+          f" -> {summary['throughput_rps']:.1f} req/s")
+    print(f"Scenarios:   {summary['by_scenario']}")
+    print(f"Model calls: {summary['model_calls']}, tokens: {summary['tokens']}"
+          f" ({summary['cached_share']:.0%} of input cached)")
+    print("Latency:     " + "  ".join(f"p{int(q * 100)}={v:.0f}ms" for q, v in summary["wall_ms"].items()))
+    print("Overhead:    " + "  ".join(f"p{int(q * 100)}={v:.1f}ms" for q, v in summary["overhead_ms"].items())
+          + f"  mean={summary['mean_overhead_ms']:.1f}ms")
+    if summary["first_error"]:
+        print(f"First error: {summary['first_error']}")
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+Fake Gemini Backend
+
+A local stand-in for Gemini that plugs into every LlmAgent, so the whole
+multi-agent graph can be load tested without an API key or network.
+
+What it fakes:
+- latency: fixed, uniform or lognormal (the usual shape for LLM calls)
+- token counts: prompt tokens estimated from the request, output tokens configured
+- prefix caching: with a StubCacheBackend, requests that point at a cached
+  instruction get its tokens counted back in and reported as cached
+- tool calls: scripted per scenario and agent, e.g. for "quiz" the
+  orchestrator calls quiz_agent, which calls record_quiz_result and then
+  update_spaced_repetition_schedule, then both answer in text
+
+Which step of a script to play is worked out from the request itself: the
+number of function responses since the last user message. So the model
+stays stateless and any number of concurrent students can share it.
+
+The current scenario and a per-request model-time accumulator travel in a
+contextvar (see simulated_request), which ADK's async runner carries down
+into AgentTool sub-runs.
+"""
+
+import asyncio
+import contextvars
+import math
+import random
+from contextlib import contextmanager
+from typing import Any, AsyncGenerator, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    from google.adk.models import BaseLlm, LlmResponse
+    from google.genai import types
+except ImportError:
+    # the scripting/latency pieces work without ADK; plugging into agents needs it
+    BaseLlm = object
+    LlmResponse = types = None
+
+from observability.instrumentation import iter_agents
+
+ArgsFactory = Callable[["RequestInfo"], Dict[str, Any]]
+
+
+class LatencyModel:
+    """
+    Latency distribution, from a spec string (milliseconds):
+        "fixed:200", "uniform:100:900", "lognormal:800:0.5" (median, sigma)
+    """
+    
+    def __init__(self, spec: str = "lognormal:800:0.5", seed: Optional[int] = None):
+        kind, *numbers = spec.split(":")
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        self.spec = spec
+        self.kind = kind
+        self.params = [float(n) for n in numbers]
+        self.rng = random.Random(seed)
+    
+    def sample_ms(self) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self.rng.uniform(self.params[0], self.params[1])
+        median, sigma = self.params
+        return self.rng.lognormvariate(math.log(median), sigma)
+
+
+class RequestInfo:
+    """What one simulated request is doing (lives in the contextvar)."""
+    
+    def __init__(self, scenario: str, topic: str = "Binary Trees", rng: Optional[random.Random] = None):
+        self.scenario = scenario
+        self.topic = topic
+        self.rng = rng or random.Random()
+        self.model_ms = 0.0
+        self.model_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+
+
+_current: contextvars.ContextVar[Optional[RequestInfo]] = contextvars.ContextVar("fake_gemini_request", default=None)
+
+
+@contextmanager
+def simulated_request(info: RequestInfo) -> Iterator[RequestInfo]:
+    """Run a block as one simulated request (scenario + model-time accounting)."""
+    token = _current.set(info)
+    try:
+        yield info
+    finally:
+        _current.reset(token)
+
+
+# scenario -> agent -> tool calls made in order before answering in text
+SCENARIOS: Dict[str, Dict[str, List[Tuple[str, ArgsFactory]]]] = {
+    "quiz": {
+        "study_buddy": [("quiz_agent", lambda r: {"request": f"Quiz me on {r.topic}"})],
+        "quiz_agent": [
+            ("record_quiz_result", lambda r: {
+                "topic": r.topic, "score": float(r.rng.choice([40, 60, 80, 100])),
+                "total_questions": 5, "notes": ""
+            }),
+            ("update_spaced_repetition_schedule", lambda r: {
+                "topic": r.topic, "performance": r.rng.choice([0.4, 0.6, 0.8, 1.0])
+            }),
+        ],
+    },
+    "explain": {
+        "study_buddy": [("tutor_agent", lambda r: {"request": f"Explain {r.topic}"})],
+    },
+    "progress": {
+        "study_buddy": [("progress_tracker", lambda r: {"request": "How am I doing?"})],
+        "progress_tracker": [
+            ("get_progress_summary", lambda r: {}),
+            ("get_review_schedule", lambda r: {}),
+        ],
+    },
+    "plan": {
+        "study_buddy": [("learning_planner", lambda r: {"request": f"Plan 2 weeks of {r.topic}"})],
+    },
+}
+
+
+def plan_response(agent: str, contents: List[Any], info: RequestInfo) -> Tuple[str, Any]:
+    """
+    Decide the next scripted step for an agent.
+    
+    Returns:
+        ("call", (tool_name, args)) or ("text", reply)
+    """
+    steps = SCENARIOS.get(info.scenario, {}).get(agent, [])
+    step = _function_responses_since_user(contents)
+    if step < len(steps):
+        name, args_factory = steps[step]
+        return "call", (name, args_factory(info))
+    return "text", f"[{agent}] Here's what I found about {info.topic}."
+
+
+def _function_responses_since_user(contents: List[Any]) -> int:
+    count = 0
+    for content in reversed(contents or []):
+        parts = getattr(content, "parts", None) or []
+        if any(getattr(p, "function_response", None) is not None for p in parts):
+            count += 1
+        elif getattr(content, "role", None) == "user" and any(getattr(p, "text", None) for p in parts):
+            break
+    return count
+
+
+def estimate_prompt_tokens(llm_request) -> int:
+    """~4 characters per token over the instruction and the conversation."""
+    chars = len(str(getattr(getattr(llm_request, "config", None), "system_instruction", "") or ""))
+    for content in getattr(llm_request, "contents", None) or []:
+        for part in getattr(content, "parts", None) or []:
+            chars += len(getattr(part, "text", None) or "")
+            for field in ("function_call", "function_response"):
+                value = getattr(part, field, None)
+                if value is not None:
+                    chars += len(str(value))
+    return max(1, chars // 4)
+
+
+class FakeGemini(BaseLlm):
+    """Scripted, latency-simulating model for one agent."""
+    
+    model: str = "fake-gemini"
+    agent_name: str = ""
+    latency: Any = None
+    output_tokens: int = 250
+    default_scenario: str = "quiz"
+    cache_backend: Any = None
+    
+    async def generate_content_async(self, llm_request, stream: bool = False) -> AsyncGenerator:
+        info = _current.get() or RequestInfo(self.default_scenario)
+        delay_ms = self.latency.sample_ms() if self.latency is not None else 0.0
+        await asyncio.sleep(delay_ms / 1000)
+        
+        kind, payload = plan_response(self.agent_name, getattr(llm_request, "contents", None), info)
+        if kind == "call":
+            name, args = payload
+            part = types.Part(function_call=types.FunctionCall(name=name, args=args))
+            output_tokens = 20
+        else:
+            part = types.Part(text=payload)
+            output_tokens = self.output_tokens
+        prompt_tokens = estimate_prompt_tokens(llm_request)
+        cached_tokens = 0
+        if self.cache_backend is not None:
+            # like the real API: cached tokens are part of the prompt count
+            cached_tokens = self.cache_backend.cached_tokens(getattr(llm_request.config, "cached_content", None))
+            prompt_tokens += cached_tokens
+        
+        info.model_ms += delay_ms
+        info.model_calls += 1
+        info.input_tokens += prompt_tokens
+        info.output_tokens += output_tokens
+        info.cached_tokens += cached_tokens
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[part]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=output_tokens,
+                cached_content_token_count=cached_tokens or None,
+                total_token_count=prompt_tokens + output_tokens,
+            ),
+        )
+
+
+def install_fake_models(
+    root_agent,
+    latency: str = "lognormal:800:0.5",
+    output_tokens: int = 250,
+    seed: Optional[int] = None,
+    cache_backend: Any = None
+) -> List[Tuple[Any, Any]]:
+    """
+    Swap every LlmAgent's model for a FakeGemini.
+    
+    Returns:
+        (agent, original_model) pairs, for restore_models()
+    """
+    saved = []
+    for i, agent in enumerate(iter_agents(root_agent)):
+        if hasattr(agent, "model"):
+            saved.append((agent, agent.model))
+            agent.model = FakeGemini(
+                agent_name=agent.name,
+                latency=LatencyModel(latency, seed=None if seed is None else seed + i),
+                output_tokens=output_tokens,
+                cache_backend=cache_backend,
+            )
+    return saved
+
+
+def restore_models(saved: List[Tuple[Any, Any]]) -> None:
+    for agent, model in saved:
+        agent.model = model
@@ -7,6 +7,7 @@ Supports both interactive CLI mode and programmatic usage.
 """
 
 import asyncio
+import atexit
 import os
 from typing import Optional
 
@@ -16,9 +17,89 @@ from google.adk.sessions import InMemorySessionService
 from google.adk.memory import InMemoryMemoryService
 
 from agents.study_buddy_agent import study_buddy_agent
-from memory.session_manager import StudyBuddySession
+from agents.validation import get_validating_hooks
+from agents.schemas import get_structured_output_hooks
+from agents.fanout import get_fanout_hooks
+from agents.prefetch import get_prefetch_hooks, get_prefetch_scheduler
+from agents.tiering import get_tiering_hooks
+from agents.single_flight import get_single_flight_hooks
+from agents.cohort_content import get_cohort_content_hooks
+from memory.session_manager import StudyBuddySession, ProgressTracker
+from memory.summarizer import get_summarizing_hooks
+from memory.prefix_cache import get_prefix_caching_hooks, get_prefix_cache_registry
 from observability.logger import log_session_event, log_event
-from config.settings import APP_NAME, DEFAULT_USER_ID, DEFAULT_SESSION_ID
+from observability.instrumentation import instrument_agent, register_hooks
+from observability.tracing import get_tracing_hooks, trace_request
+from observability.metrics import get_metrics_hooks, track_request, registry as metrics_registry
+from observability.accounting import get_accounting_hooks, get_accountant
+from observability.recorder import get_recorder_hooks, record_request
+from observability.watchdog import watch_request
+from observability.dashboard import run_dashboard, local_source
+from observability.profiling import (
+    profiled, get_profiling_hooks, install_signal_handlers, handle_admin_command
+)
+from config.settings import (
+    APP_NAME, DEFAULT_USER_ID, DEFAULT_SESSION_ID, USE_TRACING, USE_METRICS, METRICS_PORT,
+    USE_REQUEST_RECORDING, USE_CONVERSATION_SUMMARY, USE_PREFIX_CACHE, USE_OUTPUT_VALIDATION,
+    USE_STRUCTURED_OUTPUT, USE_FANOUT, USE_PREFETCH, USE_MODEL_TIERS,
+    USE_SINGLE_FLIGHT, USE_COHORT_CONTENT
+)
+
+
+# Hook token accounting, tracing and metrics into every agent's callbacks.
+# The summarizer goes first so every other hook sees the compacted request.
+# Tiering next: an escalated answer replaces the first one in place, so
+# accounting (and everything after) sees the final answer and both calls'
+# tokens. Accounting next so a budget short-circuit wins over everything else.
+# Fan-out comes after it (it answers the orchestrator's call itself), then
+# structured replies get rendered, so the rest see the markdown.
+# Single-flight answers duplicate calls itself, so it sits before tracing,
+# profiling and metrics (a short-circuited call never reaches their
+# after_model) and after tiering/rendering, so it shares the final answer.
+# Cohort content and prefetch serve tool calls themselves, so they come after
+# tracing and metrics have seen the call (cohort content first: it's ready).
+# Validation goes last: a replaced tool result would hide it from the rest.
+if USE_CONVERSATION_SUMMARY:
+    register_hooks(get_summarizing_hooks())
+if USE_MODEL_TIERS:
+    register_hooks(get_tiering_hooks())
+register_hooks(get_accounting_hooks())
+atexit.register(get_accountant().flush)
+if USE_FANOUT:
+    register_hooks(get_fanout_hooks())
+if USE_STRUCTURED_OUTPUT:
+    register_hooks(get_structured_output_hooks())
+if USE_PREFIX_CACHE:
+    register_hooks(get_prefix_caching_hooks())
+    atexit.register(get_prefix_cache_registry().clear)
+if USE_SINGLE_FLIGHT:
+    register_hooks(get_single_flight_hooks())
+if USE_TRACING:
+    register_hooks(get_tracing_hooks())
+register_hooks(get_profiling_hooks())
+if USE_REQUEST_RECORDING:
+    register_hooks(get_recorder_hooks())
+if USE_METRICS:
+    register_hooks(get_metrics_hooks())
+    atexit.register(metrics_registry.dump)
+    if METRICS_PORT:
+        metrics_registry.serve(METRICS_PORT)
+if USE_COHORT_CONTENT:
+    register_hooks(get_cohort_content_hooks())
+if USE_PREFETCH:
+    register_hooks(get_prefetch_hooks())
+    atexit.register(get_prefetch_scheduler().shutdown)
+if USE_OUTPUT_VALIDATION:
+    register_hooks(get_validating_hooks())
+instrument_agent(study_buddy_agent)
+
+
+async def save_session(session: StudyBuddySession, session_service: InMemorySessionService) -> None:
+    """Save the session, and the flashcards the tools collected in ADK state."""
+    adk_session = await session_service.get_session(
+        app_name=APP_NAME, user_id=session.student_name, session_id=f"{session.student_name}_session"
+    )
+    session.save(adk_session.state if adk_session else None)
 
 
 async def run_interactive():
@@ -41,11 +122,12 @@ async def run_interactive():
     session_service = InMemorySessionService()
     memory_service = InMemoryMemoryService()
     
-    # Create ADK session
+    # Create ADK session, starting from the saved progress
     await session_service.create_session(
         app_name=APP_NAME,
         user_id=student_name,
         session_id=f"{student_name}_session",
+        state=ProgressTracker(student_name).as_state(),
     )
     
     # Create runner
@@ -76,7 +158,7 @@ async def run_interactive():
                 continue
             
             if user_input.lower() in {"exit", "quit", "bye"}:
-                session.save()
+                await save_session(session, session_service)
                 log_session_event("end", student_name)
                 print("\nStudyBuddy: Good luck with your studies! \n")
                 break
@@ -88,12 +170,30 @@ async def run_interactive():
                 print("  'plan [goal]' - Create a study plan")
                 print("  'progress' - Check your learning progress")
                 print("  'review' - See what topics need review")
+                print("  '/profile start|stop|status|slow <sec>' - Profile this process")
+                print("  '/dashboard' - Live ops dashboard (Ctrl+C to go back)")
+                print("  '/models' - Model calls, latency and cost per agent and tier")
                 print("  'exit' - Save and quit")
                 print()
                 continue
             
-            # Add context from session
-            context = session.get_context()
+            if user_input.startswith("/profile"):
+                print(f"\n[profile] {handle_admin_command(user_input)}\n")
+                continue
+            
+            if user_input == "/dashboard":
+                run_dashboard(local_source)
+                continue
+            
+            if user_input == "/models":
+                print(f"\n{get_tiering_hooks().report.format()}\n")
+                continue
+            
+            # Add context from session, ranked against what was asked
+            adk_session = await session_service.get_session(
+                app_name=APP_NAME, user_id=student_name, session_id=f"{student_name}_session"
+            )
+            context = session.get_context(user_input, adk_session.state if adk_session else None)
             full_query = f"Context:\n{context}\n\nUser: {user_input}"
             
             # Create message
@@ -103,14 +203,21 @@ async def run_interactive():
             log_event("study_buddy", "Processing request", {"query": user_input[:50]})
             
             final_text = ""
-            for event in runner.run(
-                user_id=student_name,
-                session_id=f"{student_name}_session",
-                new_message=content,
-            ):
-                if event.is_final_response():
-                    if event.content and event.content.parts:
-                        final_text = event.content.parts[0].text
+            with trace_request(student_name, f"{student_name}_session", query=user_input[:100]) as span, \
+                    watch_request(student_name, span, context, session), \
+                    track_request(), profiled("run_interactive"), \
+                    record_request(student_name, f"{student_name}_session", user_input, context, full_query) as recording:
+                for event in runner.run(
+                    user_id=student_name,
+                    session_id=f"{student_name}_session",
+                    new_message=content,
+                ):
+                    if event.is_final_response():
+                        if event.content and event.content.parts:
+                            final_text = event.content.parts[0].text
+                recording["final"] = final_text
+            
+            get_accountant().flush()
             
             # Record interaction
             session.add_interaction("query", user_input)
@@ -119,7 +226,7 @@ async def run_interactive():
             print(f"\nStudyBuddy: {final_text}\n")
             
         except KeyboardInterrupt:
-            session.save()
+            await save_session(session, session_service)
             log_session_event("end", student_name, "Interrupted by user")
             print("\n\nStudyBuddy: Session saved. See you next time! \n")
             break
@@ -141,10 +248,12 @@ async def run_query(student_name: str, query: str) -> str:
     session_service = InMemorySessionService()
     memory_service = InMemoryMemoryService()
     
+    state = ProgressTracker(student_name).as_state()
     await session_service.create_session(
         app_name=APP_NAME,
         user_id=student_name,
         session_id=f"{student_name}_session",
+        state=state,
     )
     
     runner = Runner(
@@ -155,26 +264,33 @@ async def run_query(student_name: str, query: str) -> str:
     )
     
     # Add context
-    context = session.get_context()
+    context = session.get_context(query, state)
     full_query = f"Context:\n{context}\n\nUser: {query}"
     
     content = Content(role="user", parts=[Part(text=full_query)])
     
     # Run and collect response
     final_text = ""
-    for event in runner.run(
-        user_id=student_name,
-        session_id=f"{student_name}_session",
-        new_message=content,
-    ):
-        if event.is_final_response():
-            if event.content and event.content.parts:
-                final_text = event.content.parts[0].text
+    with trace_request(student_name, f"{student_name}_session", query=query[:100]) as span, \
+            watch_request(student_name, span, context, session), \
+            track_request(), profiled("run_query"), \
+            record_request(student_name, f"{student_name}_session", query, context, full_query) as recording:
+        for event in runner.run(
+            user_id=student_name,
+            session_id=f"{student_name}_session",
+            new_message=content,
+        ):
+            if event.is_final_response():
+                if event.content and event.content.parts:
+                    final_text = event.content.parts[0].text
+        recording["final"] = final_text
+    
+    get_accountant().flush()
     
     # Save interaction
     session.add_interaction("query", query)
     session.add_interaction("response", final_text[:200])
-    session.save()
+    await save_session(session, session_service)
     
     return final_text
 
@@ -190,6 +306,7 @@ def main():
         print()
         return
     
+    install_signal_handlers()
     asyncio.run(run_interactive())
 
 
@@ -1,5 +1,10 @@
 # Memory package
 from memory.spaced_repetition import SpacedRepetitionScheduler
 from memory.session_manager import StudyBuddySession, ProgressTracker
+from memory.card_store import FlashcardStore
+from memory.topic_registry import TopicRegistry
 
-__all__ = ["SpacedRepetitionScheduler", "StudyBuddySession", "ProgressTracker"]
+__all__ = [
+    "SpacedRepetitionScheduler", "StudyBuddySession", "ProgressTracker",
+    "FlashcardStore", "TopicRegistry"
+]
@@ -0,0 +1,256 @@
+"""
+card_store.py
+==============
+Flashcard-level spaced repetition. The tutor hands out 4-8 flashcards every
+time it explains something - this is where we keep them so each card gets its
+own review schedule (instead of the whole topic sharing one).
+
+Cards are deduplicated by a hash of the normalized question, so asking for the
+same explanation twice doesn't give you the same card twice. Due cards can be
+served straight from here, no need to ask the LLM for a fresh quiz.
+"""
+
+import os
+import re
+import json
+import hashlib
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import (
+    FLASHCARDS_DIR, USE_FILE_PERSISTENCE, SPACED_REPETITION_INTERVALS,
+    MAX_CARD_HISTORY
+)
+from observability.metrics import persistence_timer
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    question = re.sub(r"[^\w\s]", " ", question.lower())
+    return " ".join(question.split())
+
+
+def card_id_for(question: str) -> str:
+    """Stable id for a card - same question (give or take punctuation) = same id."""
+    return hashlib.sha1(normalize_question(question).encode("utf-8")).hexdigest()[:16]
+
+
+def card_text(card: Any) -> Tuple[str, str]:
+    """(question, answer) of a card dict ('question'/'answer' or 'q'/'a') or a schemas.Flashcard."""
+    if isinstance(card, dict):
+        return (str(card.get("question", card.get("q", ""))).strip(),
+                str(card.get("answer", card.get("a", ""))).strip())
+    return str(getattr(card, "question", "")).strip(), str(getattr(card, "answer", "")).strip()
+
+
+def last_explanation_cards(state: Any) -> List[Dict[str, str]]:
+    """Flashcards of the tutor's last structured explanation in session state (agents/schemas.py)."""
+    explanation = (state.get("last_explanation") if state is not None else None) or {}
+    return list(explanation.get("flashcards") or [])
+
+
+class FlashcardStore:
+    """
+    Holds a student's flashcards and their individual review schedules.
+    
+    The store wraps a plain dict (card_id -> card) so it can live either in
+    ADK session state or in a JSON file. A sorted (next_review, card_id) index
+    is built on first use and kept up to date on every change, so "next N due
+    cards" is a binary search plus N steps no matter how many cards there are.
+    """
+    
+    def __init__(self, cards: Optional[Dict[str, Dict[str, Any]]] = None, student_name: Optional[str] = None):
+        self.student_name = student_name
+        self.cards: Dict[str, Dict[str, Any]] = cards if cards is not None else {}
+        self._due_index: Optional[List[Tuple[str, str]]] = None
+    
+    def add_cards(
+        self,
+        topic: str,
+        flashcards: List[Any],
+        now: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Add cards for a topic, skipping ones we already have.
+        
+        Args:
+            topic: Topic the cards belong to
+            flashcards: List of Q/A dicts ('question'/'answer' or 'q'/'a') or Flashcards
+            now: Creation time (defaults to now)
+        
+        Returns:
+            Counts of added/duplicate cards and the ids of all cards passed in
+        """
+        if now is None:
+            now = datetime.now()
+        
+        added = 0
+        duplicates = 0
+        card_ids = []
+        
+        for card in flashcards:
+            question, answer = card_text(card)
+            if not question:
+                continue
+            
+            card_id = card_id_for(question)
+            card_ids.append(card_id)
+            if card_id in self.cards:
+                duplicates += 1
+                continue
+            
+            # Freshly learned - first check comes after the first interval
+            next_review = (now + timedelta(days=SPACED_REPETITION_INTERVALS[0])).isoformat()
+            self.cards[card_id] = {
+                "topic": topic,
+                "question": question,
+                "answer": answer,
+                "created": now.isoformat(),
+                "repetition_number": 0,
+                "last_review": None,
+                "next_review": next_review,
+                "performance_history": []
+            }
+            if self._due_index is not None:
+                insort(self._due_index, (next_review, card_id))
+            added += 1
+        
+        return {"added": added, "duplicates": duplicates, "card_ids": card_ids}
+    
+    def review_card(
+        self,
+        card_id: str,
+        performance: float,
+        now: Optional[datetime] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Record a review of one card and schedule its next one.
+        
+        Args:
+            card_id: Card that was reviewed
+            performance: How well it went (0-1)
+            now: Review time (defaults to now)
+        
+        Returns:
+            Updated review info, or None if the card doesn't exist
+        """
+        from memory.spaced_repetition import SpacedRepetitionScheduler
+        
+        card = self.cards.get(card_id)
+        if card is None:
+            return None
+        if now is None:
+            now = datetime.now()
+        
+        scheduler = SpacedRepetitionScheduler()
+        next_review = scheduler.calculate_next_review(
+            last_review=now,
+            repetition_number=card["repetition_number"],
+            performance=performance
+        )
+        
+        self._unindex(card_id)
+        history = card["performance_history"]
+        history.append({"date": now.isoformat(), "score": performance})
+        if len(history) > MAX_CARD_HISTORY:
+            del history[:-MAX_CARD_HISTORY]
+        card["repetition_number"] += 1
+        card["last_review"] = now.isoformat()
+        card["next_review"] = next_review.isoformat()
+        if self._due_index is not None:
+            insort(self._due_index, (card["next_review"], card_id))
+        
+        return {
+            "card_id": card_id,
+            "topic": card["topic"],
+            "next_review": card["next_review"],
+            "days_until_review": (next_review - now).days,
+            "repetition_number": card["repetition_number"]
+        }
+    
+    def next_due(
+        self,
+        limit: int = 10,
+        now: Optional[datetime] = None,
+        topic: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the most overdue cards, oldest due date first.
+        
+        Args:
+            limit: Max number of cards to return
+            now: Current time (defaults to now)
+            topic: Only return cards for this topic
+        
+        Returns:
+            List of due cards (each with its 'card_id')
+        """
+        if now is None:
+            now = datetime.now()
+        
+        index = self._index()
+        cutoff = now.isoformat()
+        due = []
+        for next_review, card_id in index:
+            if next_review > cutoff or len(due) >= limit:
+                break
+            card = self.cards[card_id]
+            if topic is not None and card["topic"] != topic:
+                continue
+            due.append({"card_id": card_id, **card})
+        return due
+    
+    def count_due(self, now: Optional[datetime] = None) -> int:
+        """Number of cards due right now."""
+        if now is None:
+            now = datetime.now()
+        return bisect_right(self._index(), (now.isoformat(), "\uffff"))
+    
+    def _index(self) -> List[Tuple[str, str]]:
+        """Sorted (next_review, card_id) index, built lazily."""
+        if self._due_index is None:
+            self._due_index = sorted(
+                (card["next_review"], card_id) for card_id, card in self.cards.items()
+            )
+        return self._due_index
+    
+    def _unindex(self, card_id: str) -> None:
+        """Drop a card's current entry from the index before it changes."""
+        if self._due_index is None:
+            return
+        entry = (self.cards[card_id]["next_review"], card_id)
+        pos = bisect_left(self._due_index, entry)
+        if pos < len(self._due_index) and self._due_index[pos] == entry:
+            del self._due_index[pos]
+    
+    @classmethod
+    def load(cls, student_name: str) -> "FlashcardStore":
+        """Load a student's saved cards (or start an empty store)."""
+        filepath = os.path.join(FLASHCARDS_DIR, f"{student_name}_cards.json")
+        
+        if os.path.exists(filepath):
+            try:
+                with persistence_timer("flashcards", "load"):
+                    with open(filepath, "r", encoding="utf-8") as f:
+                        return cls(json.load(f), student_name=student_name)
+            except Exception as e:
+                print(f"Error loading flashcards: {e}")
+        
+        return cls(student_name=student_name)
+    
+    def save(self) -> bool:
+        """Persist cards to disk."""
+        if not USE_FILE_PERSISTENCE or not self.student_name:
+            return False
+        
+        try:
+            os.makedirs(FLASHCARDS_DIR, exist_ok=True)
+            filepath = os.path.join(FLASHCARDS_DIR, f"{self.student_name}_cards.json")
+            with persistence_timer("flashcards", "save"):
+                with open(filepath, "w", encoding="utf-8") as f:
+                    json.dump(self.cards, f, indent=2)
+            return True
+        except Exception as e:
+            print(f"Error saving flashcards: {e}")
+            return False
@@ -0,0 +1,91 @@
+"""
+content_cache.py
+=================
+Generated answers waiting to be used, per student.
+
+Entries are matched by topic rather than exact request: the orchestrator
+might phrase "quiz me on this" as "Create an intermediate quiz on binary
+heaps" or "Quiz the student on heaps", so an entry matches a request
+mentioning enough of its topic's words. An entry also records what kind of
+request it answers (its intent - new content by default), so a quiz written
+ahead isn't handed to a request to grade the student's answers on the same
+topic. Each entry is used at most once and expires after a TTL.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from config.settings import PREFETCH_TTL, PREFETCH_MATCH
+from memory.context_builder import terms
+
+GENERATE = "generate"
+
+
+class CachedContent:
+    __slots__ = ("agent", "intent", "topic", "terms", "value", "created")
+    
+    def __init__(self, agent: str, topic: str, value: Any, created: float, intent: str = GENERATE):
+        self.agent = agent
+        self.intent = intent
+        self.topic = topic
+        self.terms = terms(topic)
+        self.value = value
+        self.created = created
+
+
+class ContentCache:
+    """student -> the few entries generated ahead for them."""
+    
+    def __init__(self, ttl: float = PREFETCH_TTL, match: float = PREFETCH_MATCH,
+                 clock: Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.match = match
+        self.clock = clock
+        self._entries: Dict[str, List[CachedContent]] = {}
+        self._lock = threading.Lock()
+    
+    def _live(self, student: str) -> List[CachedContent]:
+        cutoff = self.clock() - self.ttl
+        entries = [e for e in self._entries.get(student, []) if e.created > cutoff]
+        if entries or student in self._entries:
+            self._entries[student] = entries
+        return entries
+    
+    def put(self, student: str, agent: str, topic: str, value: Any, intent: str = GENERATE) -> None:
+        with self._lock:
+            entry = CachedContent(agent, topic, value, self.clock(), intent)
+            self._entries[student] = self._live(student) + [entry]
+    
+    def find(self, student: str, agent: str, request: str, intent: Optional[str] = None) -> Optional[CachedContent]:
+        """
+        Best live entry for this agent (and intent, if given) whose topic the
+        request mentions (left in place).
+        """
+        words = terms(request)
+        best, best_share = None, 0.0
+        with self._lock:
+            for entry in self._live(student):
+                if entry.agent != agent or not entry.terms or intent is not None and entry.intent != intent:
+                    continue
+                share = len(entry.terms & words) / len(entry.terms)
+                if share >= self.match and share > best_share:
+                    best, best_share = entry, share
+        return best
+    
+    def take(self, student: str, agent: str, request: str, intent: Optional[str] = None) -> Optional[CachedContent]:
+        """Like find(), but the entry is removed - it's served once."""
+        entry = self.find(student, agent, request, intent)
+        if entry is None:
+            return None
+        with self._lock:
+            entries = self._entries.get(student, [])
+            if entry not in entries:
+                return None  # someone else took it first
+            entries.remove(entry)
+        return entry
+    
+    def drop(self, student: str) -> List[CachedContent]:
+        """Remove (and return) everything held for a student."""
+        with self._lock:
+            return self._entries.pop(student, [])
@@ -0,0 +1,343 @@
+"""
+context_builder.py
+===================
+Builds the "Context:" block we put in front of every message to Study Buddy.
+
+Instead of always sending the same summary, we collect small facts about
+the student (due reviews, weak topics, what they're studying right now,
+what they asked recently...), score each one against the query, and pack
+the best ones into a token budget. A question about recursion gets the
+recursion facts; a "what should I review?" gets the due list.
+
+Collecting the facts walks the student's progress and review data, so the
+fact list is memoized on what it's built from - ranking against a new
+query, or after the student asked something new, only re-scores the
+cached facts.
+"""
+
+import re
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from config.settings import (
+    CONTEXT_TOKEN_BUDGET, CONTEXT_RECENT_INTERACTIONS, CONTEXT_CACHE_SIZE, MASTERY_THRESHOLD
+)
+from observability.metrics import record_cache_lookup
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Words that don't tell us anything about what the student wants
+_STOPWORDS = {
+    "the", "and", "for", "with", "what", "how", "can", "you", "are", "about",
+    "this", "that", "have", "does", "should", "could", "would", "please", "tell",
+    "give", "some", "more", "need", "want", "help", "today", "next", "my", "me"
+}
+
+# Base importance of each kind of fact (before looking at the query)
+BASE_SCORES = {
+    "due": 0.7,
+    "current": 0.6,
+    "weak": 0.5,
+    "quizzes": 0.4,
+    "plan": 0.3,
+    "topic": 0.2,
+    "recent": 0.3,
+}
+
+# Query words that make a whole kind of fact more useful
+INTENTS = {
+    "review": ("due",),
+    "reviews": ("due",),
+    "due": ("due",),
+    "quiz": ("weak", "current"),
+    "test": ("weak", "current"),
+    "progress": ("quizzes", "weak", "due", "topic"),
+    "doing": ("quizzes", "weak", "due"),
+    "plan": ("plan", "weak", "due"),
+    "schedule": ("plan", "due"),
+    "explain": ("current",),
+    "continue": ("current", "recent"),
+    "again": ("recent",),
+}
+INTENT_BOOST = 0.3
+RELEVANCE_WEIGHT = 1.0
+# Each extra fact of the same kind counts for a bit less, so ten weak
+# topics don't push out the current topic and the quiz summary
+REPEAT_PENALTY = 0.1
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count without a tokenizer (~4 characters per token, the
+    rule of thumb for Gemini on English text). Good enough for budgeting.
+    """
+    return (len(text) + 3) // 4
+
+
+def terms(text: str) -> frozenset:
+    """Lowercase content words of a piece of text."""
+    return frozenset(w for w in _WORD.findall(text.lower()) if len(w) > 2 and w not in _STOPWORDS)
+
+
+class Fact:
+    """One line of context, with what it's about and what it costs."""
+    
+    __slots__ = ("kind", "text", "terms", "base", "tokens")
+    
+    def __init__(self, kind: str, text: str, about: str = "", bonus: float = 0.0):
+        self.kind = kind
+        self.text = text
+        self.terms = terms(about)
+        self.base = BASE_SCORES[kind] + bonus
+        self.tokens = estimate_tokens(text) + 1  # +1 for the newline
+    
+    def score(self, query_terms: frozenset, intent_kinds: frozenset) -> float:
+        score = self.base
+        if self.terms and query_terms:
+            score += RELEVANCE_WEIGHT * len(self.terms & query_terms) / len(self.terms)
+        if self.kind in intent_kinds:
+            score += INTENT_BOOST
+        return score
+
+
+def collect_facts(session, state: Optional[Mapping[str, Any]] = None, now: Optional[datetime] = None) -> List[Fact]:
+    """
+    Everything we could tell the agents about this student right now.
+    
+    Args:
+        session: The StudyBuddySession
+        state: ADK session state (uses "progress" and "spaced_repetition")
+        now: Current time (for due reviews)
+    """
+    return state_facts(session, state, now) + recent_facts(session)
+
+
+def state_facts(session, state: Optional[Mapping[str, Any]] = None, now: Optional[datetime] = None) -> List[Fact]:
+    """The facts that come from progress, reviews and quizzes (everything but recent questions)."""
+    state = state or {}
+    now = now or datetime.now()
+    facts: List[Fact] = []
+    
+    if session.current_topic:
+        facts.append(Fact("current", f"Currently studying: {session.current_topic}", session.current_topic))
+    if session.study_plan:
+        facts.append(Fact("plan", "Has an active study plan"))
+    
+    if session.quiz_results:
+        facts.append(Fact("quizzes", f"Completed {len(session.quiz_results)} quizzes (avg: {session.quiz_average():.0%})"))
+    
+    # Due reviews, most overdue first gets a small bonus
+    reviews = state.get("spaced_repetition") or {}
+    now_iso = now.isoformat()
+    due_topics = set()
+    for topic, data in reviews.items():
+        next_review = data.get("next_review")
+        if next_review and next_review <= now_iso:
+            overdue = max(0, (now - datetime.fromisoformat(next_review)).days)
+            when = f"{overdue} day(s) overdue" if overdue else "due today"
+            facts.append(Fact("due", f"[!] Review due: {topic} ({when})", topic, bonus=min(0.2, overdue / 30)))
+            due_topics.add(topic)
+    if not reviews and session.review_schedule and session.review_schedule.get("total_due", 0) > 0:
+        facts.append(Fact("due", f"[!] {session.review_schedule['total_due']} topic(s) due for review!"))
+    
+    # Topic progress: weak topics are worth mentioning anyway, the rest only if asked about
+    for topic, stats in (state.get("progress") or {}).items():
+        mastery = stats.get("mastery")
+        if mastery is None:
+            mastery = stats.get("last_score", 0) / 100
+        trend = stats.get("trend_slope") or 0
+        direction = ", improving" if trend > 0.5 else ", slipping" if trend < -0.5 else ""
+        text = (f"{topic}: last {stats.get('last_score', 0):.0f}%, best {stats.get('best_score', 0):.0f}%, "
+                f"mastery {mastery:.0%}{direction}")
+        if mastery < MASTERY_THRESHOLD:
+            facts.append(Fact("weak", f"Needs work - {text}", topic, bonus=0.3 * (1 - mastery)))
+        elif topic not in due_topics:
+            facts.append(Fact("topic", text, topic))
+    
+    return facts
+
+
+def recent_facts(session) -> List[Fact]:
+    """Recent questions, newest first and worth a bit more."""
+    facts: List[Fact] = []
+    for item in reversed(session.session_history):
+        if len(facts) == CONTEXT_RECENT_INTERACTIONS:
+            break
+        if item.get("type") == "query":
+            content = item.get("content", "")[:120]
+            facts.append(Fact("recent", f"Recently asked: {content}", content, bonus=-0.05 * len(facts)))
+    return facts
+
+
+def facts_expire(state: Optional[Mapping[str, Any]], now: datetime) -> datetime:
+    """When facts collected at `now` go stale: a review falls due, or one more day overdue."""
+    expires = datetime.max
+    for data in ((state or {}).get("spaced_repetition") or {}).values():
+        next_review = data.get("next_review")
+        if not next_review:
+            continue
+        due = datetime.fromisoformat(next_review)
+        if due <= now:
+            due += timedelta(days=(now - due).days + 1)
+        expires = min(expires, due)
+    return expires
+
+
+class FactSet:
+    """
+    A session's facts, indexed so ranking doesn't have to score all of them.
+    
+    Without query matches a fact's score only depends on its kind and base,
+    so per kind only the best few (as many as could ever fit the budget)
+    are candidates. Facts sharing a word with the query are found through
+    a word index. With thousands of topics that keeps a build to a few
+    dozen scored facts.
+    """
+    
+    def __init__(self, facts: List[Fact]):
+        self.facts = facts
+        self.by_kind: Dict[str, List[Fact]] = {}
+        self.index: Dict[str, List[Fact]] = {}
+        for fact in facts:
+            self.by_kind.setdefault(fact.kind, []).append(fact)
+            for term in fact.terms:
+                self.index.setdefault(term, []).append(fact)
+        for group in self.by_kind.values():
+            group.sort(key=lambda f: f.base, reverse=True)
+        self.min_tokens = min((f.tokens for f in facts), default=1)
+        # a word most facts share (e.g. "topic") doesn't say which one is meant
+        self.common = max(8, len(facts) // 4)
+    
+    def pack(
+        self,
+        header: str,
+        query: str = "",
+        budget: int = CONTEXT_TOKEN_BUDGET,
+        extra: Sequence[Fact] = ()
+    ) -> str:
+        """
+        Rank facts against the query and keep the best ones that fit the budget.
+        
+        The header (student name) is always kept. A fact that doesn't fit is
+        skipped, but smaller ones after it still get a chance. `extra` facts
+        (a handful, not indexed) are always candidates.
+        """
+        words = terms(query)
+        intent_kinds = frozenset(kind for word in words for kind in INTENTS.get(word, ()))
+        query_terms = frozenset(t for t in words if 0 < len(self.index.get(t, ())) <= self.common)
+        min_tokens = min([self.min_tokens] + [f.tokens for f in extra])
+        
+        most = budget // min_tokens + 1
+        candidates = {id(f): f for group in self.by_kind.values() for f in group[:most]}
+        candidates.update((id(f), f) for f in extra)
+        for term in query_terms:
+            candidates.update((id(f), f) for f in self.index[term])
+        by_kind: Dict[str, List[Tuple[float, Fact]]] = {}
+        for fact in candidates.values():
+            by_kind.setdefault(fact.kind, []).append((fact.score(query_terms, intent_kinds), fact))
+        ranked = []
+        for scored in by_kind.values():
+            scored.sort(key=lambda sf: sf[0], reverse=True)
+            ranked.extend((score - REPEAT_PENALTY * i, fact) for i, (score, fact) in enumerate(scored))
+        ranked.sort(key=lambda sf: sf[0], reverse=True)
+        
+        lines = [header]
+        used = estimate_tokens(header)
+        for _, fact in ranked:
+            if used + fact.tokens <= budget:
+                lines.append(fact.text)
+                used += fact.tokens
+                if budget - used < min_tokens:
+                    break
+        return "\n".join(lines)
+
+
+def pack(header: str, facts: List[Fact], query: str = "", budget: int = CONTEXT_TOKEN_BUDGET) -> str:
+    """Rank and pack a list of facts (see FactSet.pack)."""
+    return FactSet(facts).pack(header, query, budget)
+
+
+class ContextBuilder:
+    """
+    Builds context strings, caching each session's (indexed) facts.
+    
+    The cache key is what the facts are built from: the session fields they
+    read and a cheap fingerprint of the progress and review state (running
+    aggregates, sizes, the review update count) - content, not identity, as
+    the session service hands out a fresh copy of the state every turn.
+    Asking something new
+    doesn't change it - recent questions are added at build time. Cached
+    facts also expire when the next review falls due (or a due one gets a
+    day more overdue), since that changes what they say.
+    """
+    
+    def __init__(self, max_entries: int = CONTEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._facts: "OrderedDict[Tuple, Tuple[FactSet, datetime]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def _key(session, state: Mapping[str, Any]) -> Tuple:
+        aggregates = state.get("progress_aggregates") or {}
+        return (
+            session.student_name, session.current_topic, bool(session.study_plan),
+            len(session.quiz_results), (session.review_schedule or {}).get("total_due"),
+            len(state.get("progress") or ()), aggregates.get("total_attempts"), aggregates.get("score_sum"),
+            len(state.get("spaced_repetition") or ()), state.get("review_updates"),
+        )
+    
+    def facts(self, session, state: Optional[Mapping[str, Any]] = None, now: Optional[datetime] = None) -> FactSet:
+        """The session's cached facts from progress, reviews and quizzes (recollected when stale)."""
+        state = state or {}
+        now = now or datetime.now()
+        key = self._key(session, state)
+        cached = self._facts.get(key)
+        if cached is not None and now >= cached[1]:
+            cached = None
+        record_cache_lookup("context_facts", cached is not None)
+        if cached is not None:
+            self._facts.move_to_end(key)
+            self.hits += 1
+            return cached[0]
+        self.misses += 1
+        facts = FactSet(state_facts(session, state, now))
+        self._facts[key] = (facts, facts_expire(state, now))
+        self._facts.move_to_end(key)
+        if len(self._facts) > self.max_entries:
+            self._facts.popitem(last=False)
+        return facts
+    
+    def build(
+        self,
+        session,
+        query: str = "",
+        state: Optional[Mapping[str, Any]] = None,
+        budget: int = CONTEXT_TOKEN_BUDGET,
+        now: Optional[datetime] = None
+    ) -> str:
+        """Context string for this session and query, within `budget` tokens."""
+        facts = self.facts(session, state, now)
+        return facts.pack(f"Student: {session.student_name}", query, budget, recent_facts(session))
+
+
+_builder: Optional[ContextBuilder] = None
+
+
+def get_context_builder() -> ContextBuilder:
+    """Process-wide builder (shared fact cache)."""
+    global _builder
+    if _builder is None:
+        _builder = ContextBuilder()
+    return _builder
+
+
+def build_context(
+    session,
+    query: str = "",
+    state: Optional[Mapping[str, Any]] = None,
+    budget: int = CONTEXT_TOKEN_BUDGET
+) -> str:
+    """Shortcut for get_context_builder().build(...)."""
+    return get_context_builder().build(session, query, state, budget)
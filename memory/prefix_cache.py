@@ -0,0 +1,260 @@
+"""
+prefix_cache.py
+================
+Model-side caching of each agent's fixed instruction block.
+
+Every call to study_buddy, tutor_agent, quiz_agent, learning_planner or
+progress_tracker starts with the same long instruction (plus the same tool
+declarations). Gemini can cache that prefix once and bill it at the cached
+rate afterwards. PrefixCachingHooks swaps the instruction and tools in each
+request for a handle to the cached copy:
+
+    before:  [instruction + tools] [history ... Context: ... User: ...]
+    after:   cached_content=<handle>  [history ... Context: ... User: ...]
+
+The static part is always first and the dynamic part (history, student
+context, the question) always last, so one cache serves every student.
+
+PrefixCacheRegistry keeps the handles, keyed by model + a hash of the
+prefix, and extends a handle's TTL shortly before it runs out (or creates a
+new one if that fails). GeminiCacheBackend talks to the API;
+StubCacheBackend simulates it - including the discount - for tests and the
+load test.
+"""
+
+import hashlib
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config.settings import (
+    PREFIX_CACHE_AGENTS, PREFIX_CACHE_TTL, PREFIX_CACHE_REFRESH_MARGIN,
+    PREFIX_CACHE_MIN_TOKENS, PREFIX_CACHE_DISCOUNT
+)
+from memory.context_builder import estimate_tokens
+from observability.instrumentation import InstrumentationHooks, context_ids
+from observability.metrics import record_cache_lookup
+
+
+def instruction_text(system_instruction) -> str:
+    """system_instruction as plain text (ADK passes a str, the API also takes a Content)."""
+    if system_instruction is None:
+        return ""
+    if isinstance(system_instruction, str):
+        return system_instruction
+    parts = getattr(system_instruction, "parts", None) or []
+    return "\n".join(getattr(p, "text", None) or "" for p in parts)
+
+
+def prefix_key(model: str, instruction: str, tools: Any, tool_config: Any = None) -> str:
+    digest = hashlib.sha256()
+    for piece in (model, instruction, repr(tools), repr(tool_config)):
+        digest.update(piece.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class GeminiCacheBackend:
+    """Explicit context caching through the google-genai client."""
+    
+    def __init__(self, client=None):
+        self._client = client
+    
+    @property
+    def client(self):
+        if self._client is None:
+            from google import genai
+            
+            self._client = genai.Client()
+        return self._client
+    
+    def create(self, model: str, system_instruction: str, tools: Any, tool_config: Any, ttl: float) -> str:
+        from google.genai import types
+        
+        cache = self.client.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                system_instruction=system_instruction,
+                tools=tools or None,
+                tool_config=tool_config,
+                ttl=f"{int(ttl)}s",
+                display_name="studybuddy-prefix",
+            ),
+        )
+        return cache.name
+    
+    def refresh(self, name: str, ttl: float) -> None:
+        from google.genai import types
+        
+        self.client.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=f"{int(ttl)}s"))
+    
+    def delete(self, name: str) -> None:
+        self.client.caches.delete(name=name)
+
+
+class StubCacheBackend:
+    """
+    In-memory stand-in for the caching API.
+    
+    Remembers how many tokens each handle covers, so a fake model can report
+    them as cached_content_token_count, and bill() applies the discount.
+    """
+    
+    def __init__(self, discount: float = PREFIX_CACHE_DISCOUNT, clock: Callable[[], float] = time.time):
+        self.discount = discount
+        self.clock = clock
+        self.caches: Dict[str, Dict[str, float]] = {}
+        self.created = 0
+        self.refreshed = 0
+    
+    def create(self, model: str, system_instruction: str, tools: Any, tool_config: Any, ttl: float) -> str:
+        self.created += 1
+        name = f"cachedContents/stub-{self.created}"
+        self.caches[name] = {
+            "tokens": estimate_tokens(system_instruction + repr(tools or "")),
+            "expires_at": self.clock() + ttl,
+        }
+        return name
+    
+    def refresh(self, name: str, ttl: float) -> None:
+        if name not in self.caches or self.caches[name]["expires_at"] <= self.clock():
+            raise KeyError(f"{name} has expired")
+        self.refreshed += 1
+        self.caches[name]["expires_at"] = self.clock() + ttl
+    
+    def delete(self, name: str) -> None:
+        self.caches.pop(name, None)
+    
+    def cached_tokens(self, name: Optional[str]) -> int:
+        """Tokens a live handle covers (0 for unknown or expired ones)."""
+        cache = self.caches.get(name or "")
+        if cache is None or cache["expires_at"] <= self.clock():
+            return 0
+        return int(cache["tokens"])
+    
+    def bill(self, prompt_tokens: int, cached_tokens: int) -> float:
+        """Input tokens as billed: cached ones cost (1 - discount)."""
+        return prompt_tokens - cached_tokens * self.discount
+
+
+class PrefixCacheRegistry:
+    """
+    Local registry of cache handles: prefix key -> (handle, expiry).
+    
+    Handles get their TTL extended once they're within `refresh_margin`
+    seconds of expiring. A prefix the backend refused (e.g. too short) is
+    remembered for a TTL so we don't ask again on every call.
+    """
+    
+    def __init__(
+        self,
+        backend: Any,
+        ttl: float = PREFIX_CACHE_TTL,
+        refresh_margin: float = PREFIX_CACHE_REFRESH_MARGIN,
+        min_tokens: int = PREFIX_CACHE_MIN_TOKENS,
+        clock: Callable[[], float] = time.time
+    ):
+        self.backend = backend
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.min_tokens = min_tokens
+        self.clock = clock
+        self._handles: Dict[str, Tuple[Optional[str], float]] = {}
+        self._lock = threading.Lock()
+    
+    def handle(self, model: str, system_instruction: str, tools: Any = None, tool_config: Any = None) -> Tuple[Optional[str], bool]:
+        """
+        Cache handle for this prefix, creating or refreshing it if needed.
+        
+        Returns:
+            (handle or None, whether an existing handle was reused)
+        """
+        if estimate_tokens(system_instruction + repr(tools or "")) < self.min_tokens:
+            return None, False
+        key = prefix_key(model, system_instruction, tools, tool_config)
+        now = self.clock()
+        entry = self._handles.get(key)
+        if entry is not None and entry[1] - now > self.refresh_margin:
+            return entry[0], entry[0] is not None
+        
+        # creating/refreshing is a network call - one at a time is plenty,
+        # and it stops concurrent requests from creating duplicate caches
+        with self._lock:
+            entry = self._handles.get(key)
+            now = self.clock()
+            if entry is not None and entry[1] - now > self.refresh_margin:
+                return entry[0], entry[0] is not None
+            name = entry[0] if entry is not None else None
+            if name is not None and entry[1] > now:
+                try:
+                    self.backend.refresh(name, self.ttl)
+                    self._handles[key] = (name, now + self.ttl)
+                    return name, True
+                except Exception:
+                    name = None
+            try:
+                name = self.backend.create(model, system_instruction, tools, tool_config, self.ttl)
+            except Exception as e:
+                print(f"Prefix cache create failed ({e}) - sending the full prompt for now")
+                name = None
+            self._handles[key] = (name, now + self.ttl)
+            return name, False
+    
+    def clear(self) -> None:
+        """Delete every live handle (e.g. at shutdown, so they stop being billed for storage)."""
+        with self._lock:
+            handles, self._handles = self._handles, {}
+        for name, expires_at in handles.values():
+            if name is not None and expires_at > self.clock():
+                try:
+                    self.backend.delete(name)
+                except Exception:
+                    pass
+
+
+class PrefixCachingHooks(InstrumentationHooks):
+    """Points each request for a cached agent at its cached instruction + tools."""
+    
+    def __init__(self, registry: PrefixCacheRegistry, agents=PREFIX_CACHE_AGENTS):
+        self.registry = registry
+        self.agents = set(agents)
+    
+    def before_model(self, callback_context, llm_request):
+        if context_ids(callback_context)["agent_name"] not in self.agents:
+            return None
+        config = getattr(llm_request, "config", None)
+        if config is None or getattr(config, "cached_content", None):
+            return None
+        instruction = instruction_text(config.system_instruction)
+        if not instruction:
+            return None
+        
+        name, reused = self.registry.handle(llm_request.model, instruction, config.tools, config.tool_config)
+        record_cache_lookup("prefix", reused)
+        if name is not None:
+            # the API rejects these next to cached_content - they live in the cache now
+            config.cached_content = name
+            config.system_instruction = None
+            config.tools = None
+            config.tool_config = None
+        return None
+
+
+_registry: Optional[PrefixCacheRegistry] = None
+_hooks: Optional[PrefixCachingHooks] = None
+
+
+def get_prefix_cache_registry() -> PrefixCacheRegistry:
+    """Process-wide registry backed by the Gemini API."""
+    global _registry
+    if _registry is None:
+        _registry = PrefixCacheRegistry(GeminiCacheBackend())
+    return _registry
+
+
+def get_prefix_caching_hooks() -> PrefixCachingHooks:
+    """Process-wide prefix caching hooks."""
+    global _hooks
+    if _hooks is None:
+        _hooks = PrefixCachingHooks(get_prefix_cache_registry())
+    return _hooks
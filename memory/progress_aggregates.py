@@ -0,0 +1,94 @@
+"""
+progress_aggregates.py
+=======================
+Running totals for the progress summary, so "how am I doing?" doesn't have to
+re-add every topic and re-sort the whole list each time it's asked.
+
+The aggregates live next to state["progress"] as a plain dict:
+- topics / total_attempts / total_questions / score_sum: running sums
+- ranking: [last_score, topic] pairs kept sorted, so the top and bottom
+  topics are just the two ends of the list
+"""
+
+from bisect import bisect_left, insort
+from typing import Any, Dict, List, Optional
+
+
+def empty_aggregates() -> Dict[str, Any]:
+    """Aggregates for a student with no progress yet."""
+    return {
+        "topics": 0,
+        "total_attempts": 0,
+        "total_questions": 0,
+        "score_sum": 0.0,
+        "ranking": []
+    }
+
+
+def update_aggregates(
+    aggregates: Dict[str, Any],
+    topic: str,
+    new_stats: Dict[str, Any],
+    old_stats: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Apply one topic's change to the running aggregates.
+    
+    Args:
+        aggregates: Aggregates dict to update in place
+        topic: The topic that changed
+        new_stats: Topic stats after the change
+        old_stats: Snapshot of the topic stats before the change
+                   (None if the topic is new)
+    
+    Returns:
+        The same aggregates dict
+    """
+    ranking = aggregates["ranking"]
+    
+    if old_stats is None:
+        aggregates["topics"] += 1
+    else:
+        aggregates["total_attempts"] -= old_stats.get("attempts", 0)
+        aggregates["total_questions"] -= old_stats.get("total_answered", 0)
+        aggregates["score_sum"] -= old_stats.get("last_score", 0)
+        entry = [old_stats.get("last_score", 0), topic]
+        pos = bisect_left(ranking, entry)
+        if pos < len(ranking) and ranking[pos] == entry:
+            del ranking[pos]
+    
+    aggregates["total_attempts"] += new_stats.get("attempts", 0)
+    aggregates["total_questions"] += new_stats.get("total_answered", 0)
+    aggregates["score_sum"] += new_stats.get("last_score", 0)
+    insort(ranking, [new_stats.get("last_score", 0), topic])
+    
+    return aggregates
+
+
+def rebuild_aggregates(progress: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Compute aggregates from scratch (for old sessions or after topic merges)."""
+    aggregates = empty_aggregates()
+    aggregates["topics"] = len(progress)
+    aggregates["total_attempts"] = sum(t.get("attempts", 0) for t in progress.values())
+    aggregates["total_questions"] = sum(t.get("total_answered", 0) for t in progress.values())
+    aggregates["score_sum"] = sum(t.get("last_score", 0) for t in progress.values())
+    aggregates["ranking"] = sorted([t.get("last_score", 0), topic] for topic, t in progress.items())
+    return aggregates
+
+
+def top_topics(aggregates: Dict[str, Any], k: int = 3, min_score: float = 70) -> List[str]:
+    """Best k topics by last score (highest first), only if they're >= min_score."""
+    best = aggregates["ranking"][-k:][::-1]
+    return [topic for score, topic in best if score >= min_score]
+
+
+def bottom_topics(aggregates: Dict[str, Any], k: int = 3, max_score: float = 70) -> List[str]:
+    """Worst k topics by last score (highest of them first), only if they're < max_score."""
+    worst = aggregates["ranking"][:k][::-1]
+    return [topic for score, topic in worst if score < max_score]
+
+
+def average_score(aggregates: Dict[str, Any]) -> float:
+    """Average last score across topics."""
+    topics = aggregates["topics"]
+    return aggregates["score_sum"] / topics if topics else 0
@@ -0,0 +1,148 @@
+"""
+score_history.py
+=================
+A small per-topic time series of quiz scores.
+
+Before this we only kept last_score / best_score, which isn't enough to tell
+whether someone is actually getting better. Each topic now carries parallel
+arrays of timestamps, scores and weights, capped at SCORE_HISTORY_MAX_POINTS:
+when it fills up, the older half gets merged pairwise (weighted averages), so
+recent attempts stay at full detail and old ones fade into summaries.
+
+Everything the planner/quiz agents care about is precomputed on write:
+- ewma: exponentially weighted average score (0-100)
+- trend_slope: score change per attempt over the last few attempts
+- mastery: probability the student is above MASTERY_THRESHOLD (0-1)
+"""
+
+from datetime import datetime
+from math import erf, sqrt
+from typing import Any, Dict, List, Optional
+
+from config.settings import (
+    SCORE_HISTORY_MAX_POINTS, SCORE_EWMA_ALPHA, SCORE_TREND_WINDOW,
+    MASTERY_THRESHOLD, MASTERY_DECAY
+)
+
+
+def empty_history() -> Dict[str, Any]:
+    """A topic with no scores yet."""
+    return {
+        "t": [],     # unix timestamps (seconds)
+        "s": [],     # scores (0-100)
+        "w": [],     # how many raw attempts each point stands for
+        "n": 0,      # total attempts ever recorded
+        "ewma": None,
+        "trend_slope": 0.0,
+        "mastery": 0.0,
+        "alpha": 0.0,  # decayed "correct" evidence for the mastery estimate
+        "beta": 0.0    # decayed "wrong" evidence
+    }
+
+
+def append_score(
+    history: Dict[str, Any],
+    score: float,
+    when: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Add a score to a topic's history and refresh the derived fields.
+    
+    Args:
+        history: History dict (see empty_history), updated in place
+        score: Quiz score (0-100)
+        when: When the quiz was taken (defaults to now)
+    
+    Returns:
+        The derived fields: ewma, trend_slope, mastery
+    """
+    if when is None:
+        when = datetime.now()
+    
+    history["t"].append(int(when.timestamp()))
+    history["s"].append(float(score))
+    history["w"].append(1)
+    history["n"] += 1
+    
+    if len(history["s"]) > SCORE_HISTORY_MAX_POINTS:
+        _downsample(history)
+    
+    alpha = SCORE_EWMA_ALPHA
+    previous = history["ewma"]
+    history["ewma"] = round(score if previous is None else alpha * score + (1 - alpha) * previous, 2)
+    
+    fraction = max(0.0, min(1.0, score / 100))
+    history["alpha"] = MASTERY_DECAY * history["alpha"] + fraction
+    history["beta"] = MASTERY_DECAY * history["beta"] + (1 - fraction)
+    
+    history["trend_slope"] = round(_slope(history["s"][-SCORE_TREND_WINDOW:]), 2)
+    history["mastery"] = round(_mastery_probability(history["alpha"], history["beta"]), 3)
+    
+    return derived_fields(history)
+
+
+def derived_fields(history: Dict[str, Any]) -> Dict[str, Any]:
+    """The precomputed fields agents read."""
+    return {
+        "ewma": history["ewma"],
+        "trend_slope": history["trend_slope"],
+        "mastery": history["mastery"]
+    }
+
+
+def merge_histories(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine two histories for the same topic (used when topics get merged)."""
+    points = sorted(zip(a["t"] + b["t"], a["s"] + b["s"], a["w"] + b["w"]))
+    merged = empty_history()
+    for t, s, w in points:
+        append_score(merged, s, datetime.fromtimestamp(t))
+        merged["w"][-1] = w
+    merged["n"] = a["n"] + b["n"]
+    return merged
+
+
+def _downsample(history: Dict[str, Any]) -> None:
+    """Merge the older half of the points pairwise into weighted averages."""
+    keep = SCORE_HISTORY_MAX_POINTS // 2
+    old_count = len(history["s"]) - keep
+    t, s, w = history["t"], history["s"], history["w"]
+    
+    new_t: List[int] = []
+    new_s: List[float] = []
+    new_w: List[int] = []
+    for i in range(0, old_count, 2):
+        j = min(i + 2, old_count)
+        weight = sum(w[i:j])
+        new_t.append(int(sum(t[k] * w[k] for k in range(i, j)) / weight))
+        new_s.append(round(sum(s[k] * w[k] for k in range(i, j)) / weight, 2))
+        new_w.append(weight)
+    
+    history["t"] = new_t + t[old_count:]
+    history["s"] = new_s + s[old_count:]
+    history["w"] = new_w + w[old_count:]
+
+
+def _slope(scores: List[float]) -> float:
+    """Least-squares slope of scores against attempt number."""
+    n = len(scores)
+    if n < 2:
+        return 0.0
+    mean_x = (n - 1) / 2
+    mean_y = sum(scores) / n
+    num = sum((i - mean_x) * (y - mean_y) for i, y in enumerate(scores))
+    den = sum((i - mean_x) ** 2 for i in range(n))
+    return num / den
+
+
+def _mastery_probability(alpha: float, beta: float) -> float:
+    """
+    P(true skill >= MASTERY_THRESHOLD) under a Beta(1 + alpha, 1 + beta) belief.
+    
+    Uses the normal approximation to the Beta, which is plenty for a
+    "should we move on?" signal and avoids pulling in scipy.
+    """
+    a, b = 1 + alpha, 1 + beta
+    mean = a / (a + b)
+    std = sqrt(a * b / ((a + b) ** 2 * (a + b + 1)))
+    z = (MASTERY_THRESHOLD - mean) / std
+    return 0.5 * (1 - erf(z / sqrt(2)))
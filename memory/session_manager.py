@@ -8,14 +8,21 @@ personalized learning thing to actually work!
 """
 
 import os
+import glob
 import json
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
 from config.settings import (
     SESSIONS_DIR, PROGRESS_DIR, SPACED_REPETITION_DIR,
-    USE_FILE_PERSISTENCE
+    USE_FILE_PERSISTENCE, USE_REVIEW_LOAD_BALANCING, REVIEW_COHORT_LOAD_WEIGHT
 )
+from memory.topic_registry import TopicRegistry, merge_progress_stats, merge_review_data
+from memory.score_history import empty_history, append_score
+from memory.progress_aggregates import rebuild_aggregates
+from memory.context_builder import build_context
+from memory.card_store import FlashcardStore
+from observability.metrics import persistence_timer
 
 
 class StudyBuddySession:
@@ -39,6 +46,17 @@ class StudyBuddySession:
         self.review_schedule: Optional[Dict[str, Any]] = None
         self.created_at = datetime.now().isoformat()
         self.last_active = datetime.now().isoformat()
+        self._topic_registry: Optional[TopicRegistry] = None
+        # running total of quiz scores, so get_context doesn't re-add them all
+        self._quiz_score_total = 0.0
+        self._quiz_score_count = 0
+    
+    @property
+    def topic_registry(self) -> TopicRegistry:
+        """Student's topic registry (read from disk on first use, never written here)."""
+        if self._topic_registry is None:
+            self._topic_registry = TopicRegistry.load(self.student_name)
+        return self._topic_registry
     
     def add_interaction(self, interaction_type: str, content: str) -> None:
         """Record an interaction in the session history."""
@@ -53,48 +71,61 @@ class StudyBuddySession:
         """Record a quiz result."""
         self.quiz_results.append({
             "timestamp": datetime.now().isoformat(),
-            "topic": topic,
+            "topic": self.topic_registry.canonicalize(topic),
             "score": score,
             "total": total
         })
+        self._quiz_score_total += score
+        self._quiz_score_count += 1
+    
+    def quiz_average(self) -> float:
+        """Average quiz score as 0-1 (from the running total)."""
+        if not self.quiz_results:
+            return 0.0
+        if self._quiz_score_count != len(self.quiz_results):
+            # quiz_results was replaced/edited directly - resync once
+            self._quiz_score_total = sum(r.get('score', 0) for r in self.quiz_results)
+            self._quiz_score_count = len(self.quiz_results)
+        return self._quiz_score_total / self._quiz_score_count / 100  # score is a percentage 0-100
     
-    def get_context(self) -> str:
+    def get_context(
+        self,
+        query: str = "",
+        state: Optional[Dict[str, Any]] = None,
+        budget: Optional[int] = None
+    ) -> str:
         """
         Build context string for agent prompts.
         
+        Facts about the student are ranked by how relevant they are to the
+        query and packed into a token budget (see memory/context_builder.py).
+        
+        Args:
+            query: What the student just asked
+            state: ADK session state, for progress and review details
+            budget: Token budget (defaults to CONTEXT_TOKEN_BUDGET)
+        
         Returns:
             Formatted context about the student's current state
         """
-        context_parts = [f"Student: {self.student_name}"]
-        
-        if self.current_topic:
-            context_parts.append(f"Currently studying: {self.current_topic}")
-        
-        if self.study_plan:
-            context_parts.append("Has an active study plan")
-        
-        if self.quiz_results:
-            # Calculate average score (score is already a percentage 0-100)
-            if self.quiz_results:
-                total_score = sum(r.get('score', 0) for r in self.quiz_results)
-                avg = total_score / len(self.quiz_results) / 100  # Convert to 0-1 for formatting
-                context_parts.append(
-                    f"Completed {len(self.quiz_results)} quizzes (avg: {avg:.0%})"
-                )
-        
-        # Check for pending reviews
-        if self.review_schedule:
-            due_count = self.review_schedule.get('total_due', 0)
-            if due_count > 0:
-                context_parts.append(f"[!] {due_count} topic(s) due for review!")
-        
-        return "\n".join(context_parts)
+        if budget is None:
+            return build_context(self, query, state)
+        return build_context(self, query, state, budget)
     
-    def save(self) -> bool:
-        """Persist session to disk."""
+    def save(self, state: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Persist session to disk.
+        
+        Args:
+            state: ADK session state - its flashcards are saved along with the session
+        """
         if not USE_FILE_PERSISTENCE:
             return False
         
+        cards = (state or {}).get("flashcards")
+        if cards:
+            FlashcardStore(cards, student_name=self.student_name).save()
+        
         try:
             os.makedirs(SESSIONS_DIR, exist_ok=True)
             filepath = os.path.join(SESSIONS_DIR, f"{self.student_name}_session.json")
@@ -109,8 +140,9 @@ class StudyBuddySession:
                 "last_active": self.last_active
             }
             
-            with open(filepath, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2)
+            with persistence_timer("session", "save"):
+                with open(filepath, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=2)
             
             return True
         except Exception as e:
@@ -124,8 +156,9 @@ class StudyBuddySession:
         
         if os.path.exists(filepath):
             try:
-                with open(filepath, "r", encoding="utf-8") as f:
-                    data = json.load(f)
+                with persistence_timer("session", "load"):
+                    with open(filepath, "r", encoding="utf-8") as f:
+                        data = json.load(f)
                 
                 session = cls(student_name)
                 session.current_topic = data.get("current_topic")
@@ -149,16 +182,18 @@ class ProgressTracker:
         self.student_name = student_name
         self.progress_data: Dict[str, Any] = {}
         self.review_data: Dict[str, Any] = {}
+        self.topics = TopicRegistry.load(student_name)
         self._load()
     
     def _load(self) -> None:
-        """Load existing progress and review data."""
+        """Load existing progress and review data, merging duplicate topics."""
         # Load progress
         progress_path = os.path.join(PROGRESS_DIR, f"{self.student_name}_progress.json")
         if os.path.exists(progress_path):
             try:
-                with open(progress_path, "r") as f:
-                    self.progress_data = json.load(f)
+                with persistence_timer("progress", "load"):
+                    with open(progress_path, "r") as f:
+                        self.progress_data = json.load(f)
             except:
                 pass
         
@@ -166,10 +201,48 @@ class ProgressTracker:
         review_path = os.path.join(SPACED_REPETITION_DIR, f"{self.student_name}_reviews.json")
         if os.path.exists(review_path):
             try:
-                with open(review_path, "r") as f:
-                    self.review_data = json.load(f)
+                with persistence_timer("reviews", "load"):
+                    with open(review_path, "r") as f:
+                        self.review_data = json.load(f)
             except:
                 pass
+        
+        self.migrate_topics()
+    
+    def migrate_topics(self) -> bool:
+        """
+        Merge progress/review entries that are really the same topic.
+        
+        Runs on every load (it's a single pass over the topics) and only
+        writes files when something actually got merged or renamed.
+        
+        Returns:
+            True if any data was re-keyed
+        """
+        known = len(self.topics.names)
+        progress = self.topics.merge_keys(self.progress_data, merge_progress_stats)
+        reviews = self.topics.merge_keys(self.review_data, merge_review_data)
+        changed = False
+        
+        if list(progress) != list(self.progress_data):
+            self.progress_data = progress
+            self._save_progress()
+            changed = True
+        if list(reviews) != list(self.review_data):
+            self.review_data = reviews
+            self._save_reviews()
+            changed = True
+        if len(self.topics.names) != known:
+            self.topics.save()
+        
+        return changed
+    
+    def add_topic_alias(self, alias: str, canonical: str) -> str:
+        """Track `alias` as `canonical` from now on and merge existing data."""
+        name = self.topics.add_alias(alias, canonical)
+        self.topics.save()
+        self.migrate_topics()
+        return name
     
     def update_topic_progress(
         self,
@@ -184,6 +257,7 @@ class ProgressTracker:
         Returns:
             Updated topic statistics
         """
+        topic = self._canonical_topic(topic)
         if topic not in self.progress_data:
             self.progress_data[topic] = {
                 "attempts": 0,
@@ -194,6 +268,8 @@ class ProgressTracker:
             }
         
         stats = self.progress_data[topic]
+        if stats["attempts"]:
+            stats["previous_score"] = stats["last_score"]
         stats["attempts"] += 1
         stats["last_score"] = score
         stats["best_score"] = max(stats["best_score"], score)
@@ -201,6 +277,7 @@ class ProgressTracker:
         if notes:
             stats["notes"] = notes
         stats["last_updated"] = datetime.now().isoformat()
+        stats.update(append_score(stats.setdefault("history", empty_history()), score))
         
         self._save_progress()
         return stats
@@ -218,6 +295,7 @@ class ProgressTracker:
         """
         from memory.spaced_repetition import SpacedRepetitionScheduler
         
+        topic = self._canonical_topic(topic)
         if topic not in self.review_data:
             self.review_data[topic] = {
                 "repetition_number": 0,
@@ -236,11 +314,22 @@ class ProgressTracker:
         # Calculate next review
         scheduler = SpacedRepetitionScheduler()
         last_review = datetime.fromisoformat(topic_data["last_review"])
-        next_review = scheduler.calculate_next_review(
-            last_review=last_review,
-            repetition_number=topic_data["repetition_number"],
-            performance=performance
-        )
+        if USE_REVIEW_LOAD_BALANCING:
+            day_load = scheduler.build_day_load(self.review_data.values(), exclude=topic_data)
+            cohort_load = self.cohort_day_load() if REVIEW_COHORT_LOAD_WEIGHT > 0 else None
+            next_review = scheduler.calculate_balanced_review(
+                last_review=last_review,
+                repetition_number=topic_data["repetition_number"],
+                performance=performance,
+                day_load=day_load,
+                cohort_load=cohort_load
+            )
+        else:
+            next_review = scheduler.calculate_next_review(
+                last_review=last_review,
+                repetition_number=topic_data["repetition_number"],
+                performance=performance
+            )
         
         topic_data["repetition_number"] += 1
         topic_data["last_review"] = datetime.now().isoformat()
@@ -291,6 +380,48 @@ class ProgressTracker:
             "total_due": len(due_now)
         }
     
+    def as_state(self) -> Dict[str, Any]:
+        """
+        Saved progress in the shape the tools keep in ADK session state, so a
+        new session (and every sub-agent) starts out seeing it.
+        """
+        return {
+            "progress": self.progress_data,
+            "progress_aggregates": rebuild_aggregates(self.progress_data),
+            "spaced_repetition": self.review_data,
+            "topic_registry": self.topics.data,
+            "flashcards": FlashcardStore.load(self.student_name).cards,
+        }
+    
+    def _canonical_topic(self, topic: str) -> str:
+        """Canonical topic name, saving the registry when a new topic shows up."""
+        known = len(self.topics.names)
+        name = self.topics.canonicalize(topic)
+        if len(self.topics.names) != known:
+            self.topics.save()
+        return name
+    
+    @staticmethod
+    def cohort_day_load() -> Dict[str, int]:
+        """
+        Reviews booked per day across every student's saved review file.
+        
+        Reads all *_reviews.json files, so only used when cohort balancing
+        is switched on (REVIEW_COHORT_LOAD_WEIGHT > 0).
+        """
+        from memory.spaced_repetition import SpacedRepetitionScheduler
+        
+        day_load: Dict[str, int] = {}
+        for path in glob.glob(os.path.join(SPACED_REPETITION_DIR, "*_reviews.json")):
+            try:
+                with open(path, "r") as f:
+                    reviews = json.load(f)
+            except Exception:
+                continue
+            for day, count in SpacedRepetitionScheduler.build_day_load(reviews.values()).items():
+                day_load[day] = day_load.get(day, 0) + count
+        return day_load
+    
     def _save_progress(self) -> None:
         """Save progress data to file."""
         if not USE_FILE_PERSISTENCE:
@@ -299,8 +430,9 @@ class ProgressTracker:
         try:
             os.makedirs(PROGRESS_DIR, exist_ok=True)
             filepath = os.path.join(PROGRESS_DIR, f"{self.student_name}_progress.json")
-            with open(filepath, "w") as f:
-                json.dump(self.progress_data, f, indent=2)
+            with persistence_timer("progress", "save"):
+                with open(filepath, "w") as f:
+                    json.dump(self.progress_data, f, indent=2)
         except Exception as e:
             print(f"Error saving progress: {e}")
     
@@ -312,7 +444,8 @@ class ProgressTracker:
         try:
             os.makedirs(SPACED_REPETITION_DIR, exist_ok=True)
             filepath = os.path.join(SPACED_REPETITION_DIR, f"{self.student_name}_reviews.json")
-            with open(filepath, "w") as f:
-                json.dump(self.review_data, f, indent=2)
+            with persistence_timer("reviews", "save"):
+                with open(filepath, "w") as f:
+                    json.dump(self.review_data, f, indent=2)
         except Exception as e:
             print(f"Error saving reviews: {e}")
@@ -6,8 +6,11 @@ This helps students retain information by scheduling reviews at optimal interval
 """
 
 from datetime import datetime, timedelta
-from typing import Any, Dict, List
-from config.settings import SPACED_REPETITION_INTERVALS, EASE_FACTOR
+from typing import Any, Dict, Iterable, List, Optional
+from config.settings import (
+    SPACED_REPETITION_INTERVALS, EASE_FACTOR,
+    REVIEW_FUZZ_RATIO, REVIEW_FUZZ_MAX_DAYS, REVIEW_COHORT_LOAD_WEIGHT
+)
 
 
 class SpacedRepetitionScheduler:
@@ -21,11 +24,17 @@ class SpacedRepetitionScheduler:
     - High performance (>=80%): Longer intervals (1.2x)
     - Medium performance (60-79%): Standard intervals  
     - Low performance (<60%): Shorter intervals (0.7x), step back if needed
+    
+    Load-aware mode (calculate_balanced_review) nudges a review a few days
+    earlier/later onto the least busy day, so topics studied together don't
+    all come due on the same day.
     """
     
     def __init__(self):
         self.intervals = SPACED_REPETITION_INTERVALS
         self.ease_factor = EASE_FACTOR
+        self.fuzz_ratio = REVIEW_FUZZ_RATIO
+        self.fuzz_max_days = REVIEW_FUZZ_MAX_DAYS
     
     def calculate_next_review(
         self,
@@ -67,6 +76,84 @@ class SpacedRepetitionScheduler:
         
         return next_review
     
+    def calculate_balanced_review(
+        self,
+        last_review: datetime,
+        repetition_number: int,
+        performance: float,
+        day_load: Optional[Dict[str, int]] = None,
+        cohort_load: Optional[Dict[str, int]] = None,
+        cohort_weight: float = REVIEW_COHORT_LOAD_WEIGHT
+    ) -> datetime:
+        """
+        Same as calculate_next_review, but picks the least loaded day near it.
+        
+        The review can move by at most fuzz_ratio of its interval (capped at
+        fuzz_max_days), so short intervals (1 and 3 days) are never touched
+        and the retention curve barely notices. Ties go to the day closest
+        to the original date.
+        
+        Args:
+            last_review: When the topic was last reviewed
+            repetition_number: How many times it's been reviewed
+            performance: Score for this review (0-1)
+            day_load: Reviews already booked per day for this student
+                      ({"2025-01-31": 3, ...}), see build_day_load
+            cohort_load: Optional reviews booked per day across all students
+            cohort_weight: How much the cohort load counts vs. the student's
+        
+        Returns:
+            Datetime of the next review
+        """
+        nominal = self.calculate_next_review(last_review, repetition_number, performance)
+        if not day_load and not (cohort_load and cohort_weight > 0):
+            return nominal
+        
+        interval_days = (nominal - last_review).total_seconds() / 86400
+        window = min(self.fuzz_max_days, int(interval_days * self.fuzz_ratio))
+        if window < 1:
+            return nominal
+        
+        day_load = day_load or {}
+        cohort_load = cohort_load or {}
+        
+        best_review = nominal
+        best_load = None
+        # closest offsets first, so ties keep the review near the nominal date
+        for offset in sorted(range(-window, window + 1), key=lambda d: (abs(d), d)):
+            candidate = nominal + timedelta(days=offset)
+            day = candidate.date().isoformat()
+            load = day_load.get(day, 0) + cohort_weight * cohort_load.get(day, 0)
+            if best_load is None or load < best_load:
+                best_review, best_load = candidate, load
+        
+        return best_review
+    
+    @staticmethod
+    def build_day_load(
+        topics: Iterable[Dict[str, Any]],
+        exclude: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, int]:
+        """
+        Count how many reviews are booked on each day.
+        
+        Args:
+            topics: Topic dictionaries with a 'next_review' field
+            exclude: A topic entry to leave out (the one being rescheduled)
+        
+        Returns:
+            Day-load histogram keyed by ISO date
+        """
+        day_load: Dict[str, int] = {}
+        for topic in topics:
+            if topic is exclude:
+                continue
+            next_review = topic.get('next_review')
+            if next_review:
+                day = next_review[:10]
+                day_load[day] = day_load.get(day, 0) + 1
+        return day_load
+    
     def get_due_topics(
         self,
         topics: List[Dict[str, Any]],
@@ -0,0 +1,224 @@
+"""
+summarizer.py
+==============
+Keeps long conversations from making every prompt bigger than the last.
+
+ADK sends the whole session history with every model call, so by turn 100
+of an interactive session each call (and each sub-agent call) carries all
+99 turns before it - including the Context: block we put on every message.
+
+SummarizingHooks sits in front of every model call. Once the part of the
+history that hasn't been summarized yet passes SUMMARY_TRIGGER_TOKENS, the
+older turns get folded into a short summary (kept in session state under
+"conversation_summary"), and the request goes out as
+
+    [summary of earlier turns] + [the last few turns, word for word]
+
+The summary is extractive and local (first sentence of each message, which
+tools were called), so it's instant and free. If SUMMARY_MODEL is set, a
+cheap model also rewrites it in a background thread; the next turn picks
+up the rewrite once it's ready.
+"""
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config.settings import (
+    SUMMARY_TRIGGER_TOKENS, SUMMARY_RECENT_TURNS, SUMMARY_MAX_TOKENS, SUMMARY_MODEL
+)
+from memory.context_builder import estimate_tokens
+from observability.instrumentation import InstrumentationHooks, context_ids
+from observability.metrics import registry as metrics
+
+STATE_KEY = "conversation_summary"
+SUMMARY_HEADER = "Summary of the conversation so far:"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+# main.py puts "Context:\n...\n\nUser: <what they typed>" on every message
+_USER_PREFIX = re.compile(r"^Context:\n.*?\n\nUser: ", re.DOTALL)
+
+
+def content_text(content) -> str:
+    """All the text in a Content, with tool calls/results written out briefly."""
+    pieces = []
+    for part in getattr(content, "parts", None) or []:
+        if getattr(part, "text", None):
+            pieces.append(part.text)
+        call = getattr(part, "function_call", None)
+        if call is not None:
+            pieces.append(f"[called {getattr(call, 'name', '?')}({getattr(call, 'args', None) or {}})]")
+        response = getattr(part, "function_response", None)
+        if response is not None:
+            pieces.append(f"[{getattr(response, 'name', '?')} -> {getattr(response, 'response', None)}]")
+    return " ".join(pieces)
+
+
+def content_tokens(contents: List[Any]) -> int:
+    return sum(estimate_tokens(content_text(c)) for c in contents)
+
+
+def is_user_turn(content) -> bool:
+    """A message the student typed (not a tool result, which ADK also sends as role=user)."""
+    parts = getattr(content, "parts", None) or []
+    return getattr(content, "role", None) == "user" and any(getattr(p, "text", None) for p in parts)
+
+
+def _first_sentence(text: str, limit: int = 160) -> str:
+    text = " ".join(text.split())
+    sentence = _SENTENCE_END.split(text, 1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit - 3].rstrip() + "..."
+
+
+def summarize_turns(contents: List[Any]) -> List[str]:
+    """One short line per message: what was asked, what was answered, which tools ran."""
+    lines = []
+    for content in contents:
+        role = getattr(content, "role", None)
+        for part in getattr(content, "parts", None) or []:
+            call = getattr(part, "function_call", None)
+            if call is not None:
+                lines.append(f"- Used {getattr(call, 'name', '?')}")
+            elif getattr(part, "text", None):
+                text = _USER_PREFIX.sub("", part.text) if role == "user" else part.text
+                who = "Student" if role == "user" else "Study Buddy"
+                lines.append(f"- {who}: {_first_sentence(text)}")
+    # back-to-back tool calls read better as one line
+    merged: List[str] = []
+    for line in lines:
+        if merged and line.startswith("- Used ") and merged[-1].startswith("- Used "):
+            merged[-1] += ", " + line[len("- Used "):]
+        else:
+            merged.append(line)
+    return merged
+
+
+def merge_summary(previous: str, new_lines: List[str], max_tokens: int = SUMMARY_MAX_TOKENS) -> str:
+    """Add new lines to a summary, dropping the oldest once it's over max_tokens."""
+    lines = [line for line in previous.splitlines() if line] + new_lines
+    used = 0
+    kept: List[str] = []
+    for line in reversed(lines):
+        used += estimate_tokens(line) + 1
+        if used > max_tokens and kept:
+            break
+        kept.append(line)
+    return "\n".join(reversed(kept))
+
+
+def _cut_point(contents: List[Any], keep_turns: int) -> int:
+    """
+    Index to summarize up to: the start of the keep_turns-th last student
+    message, so a tool call is never separated from its result. 0 = nothing.
+    """
+    turn_starts = [i for i, content in enumerate(contents) if is_user_turn(content)]
+    if len(turn_starts) <= keep_turns:
+        return 0
+    return turn_starts[-keep_turns]
+
+
+def compact(
+    contents: List[Any],
+    summary: Optional[Dict[str, Any]],
+    make_content: Callable[[str], Any],
+    trigger_tokens: int = SUMMARY_TRIGGER_TOKENS,
+    keep_turns: int = SUMMARY_RECENT_TURNS,
+    max_tokens: int = SUMMARY_MAX_TOKENS
+) -> Tuple[List[Any], Dict[str, Any]]:
+    """
+    Summary + recent window for one request.
+    
+    Args:
+        contents: The full history ADK is about to send
+        summary: {"text", "covered"} from state - `covered` messages from
+                 the start are already in the summary
+        make_content: Wraps the summary text as a Content
+    
+    Returns:
+        (contents to send, updated summary)
+    """
+    summary = dict(summary or {"text": "", "covered": 0})
+    if summary["covered"] > len(contents):
+        # history got shorter (new session, rewind) - start over
+        summary = {"text": "", "covered": 0}
+    
+    tail = contents[summary["covered"]:]
+    if content_tokens(tail) > trigger_tokens:
+        cut = _cut_point(tail, keep_turns)
+        if cut:
+            summary["text"] = merge_summary(summary["text"], summarize_turns(tail[:cut]), max_tokens)
+            summary["covered"] += cut
+            tail = tail[cut:]
+            metrics.counter("studybuddy_summary_compactions_total", "History compactions").inc()
+    
+    if not summary["covered"]:
+        return contents, summary
+    return [make_content(f"{SUMMARY_HEADER}\n{summary['text']}")] + tail, summary
+
+
+def _text_content(text: str):
+    from google.genai import types
+    
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+
+class SummarizingHooks(InstrumentationHooks):
+    """Rewrites each model request as summary + recent turns once history gets long."""
+    
+    def __init__(self, summarize_model: Optional[str] = SUMMARY_MODEL):
+        self.summarize_model = summarize_model
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="summarizer") if summarize_model else None
+        # (session_id, agent, covered) -> rewritten summary, filled in by the background thread
+        self._rewrites: Dict[Tuple[str, str, int], str] = {}
+    
+    def before_model(self, callback_context, llm_request):
+        contents = getattr(llm_request, "contents", None)
+        if not contents:
+            return None
+        ids = context_ids(callback_context)
+        agent = ids["agent_name"] or "unknown"
+        state = callback_context.state
+        summaries = dict(state.get(STATE_KEY) or {})
+        stored = previous = summaries.get(agent)
+        
+        # a background rewrite of the summary we have now can replace it
+        if previous and self._executor is not None:
+            rewrite = self._rewrites.pop((ids["session_id"], agent, previous["covered"]), None)
+            if rewrite:
+                previous = {**previous, "text": rewrite}
+        
+        new_contents, summary = compact(contents, previous, _text_content)
+        if summary["covered"] and summary != stored:
+            summaries[agent] = summary
+            state[STATE_KEY] = summaries  # assigning records it in the session's state delta
+            if self._executor is not None and summary["covered"] != (previous or {}).get("covered"):
+                self._executor.submit(self._rewrite, (ids["session_id"], agent, summary["covered"]), summary["text"])
+        if new_contents is not contents:
+            llm_request.contents = new_contents
+        return None
+    
+    def _rewrite(self, key: Tuple[str, str, int], text: str) -> None:
+        """Ask the cheap model for a tighter summary (background thread)."""
+        try:
+            from google import genai
+            
+            response = genai.Client().models.generate_content(
+                model=self.summarize_model,
+                contents=("Rewrite these notes about a tutoring conversation as a short summary. "
+                          "Keep topics, scores and anything the student struggled with.\n\n" + text),
+            )
+            if response.text:
+                self._rewrites[key] = response.text.strip()
+        except Exception as e:
+            print(f"Summary rewrite failed: {e}")
+
+
+_hooks: Optional[SummarizingHooks] = None
+
+
+def get_summarizing_hooks() -> SummarizingHooks:
+    """Process-wide summarizing hooks."""
+    global _hooks
+    if _hooks is None:
+        _hooks = SummarizingHooks()
+    return _hooks
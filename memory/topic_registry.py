@@ -0,0 +1,298 @@
+"""
+topic_registry.py
+==================
+The LLM passes topics around as free text, so "Binary Trees", "binary trees"
+and "BST basics" would normally end up as three separate entries in progress
+and review data. That splits the stats and triples the reviews.
+
+This registry maps every spelling we've seen to one canonical topic:
+1. Normalization catches case, punctuation, plurals and filler words
+2. An alias table catches abbreviations and manual merges
+3. Merge suggestions (string similarity or embeddings) catch the rest
+"""
+
+import os
+import re
+import json
+from difflib import SequenceMatcher
+from math import sqrt
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from config.settings import PROGRESS_DIR, USE_FILE_PERSISTENCE, TOPIC_MERGE_THRESHOLD
+from observability.metrics import persistence_timer
+
+
+# Common B.Tech CSE abbreviations (alias -> canonical, normalized below)
+_ABBREVIATIONS = {
+    "bst": "binary search trees",
+    "dsa": "data structures and algorithms",
+    "os": "operating systems",
+    "dbms": "database management systems",
+    "cn": "computer networks",
+    "ml": "machine learning",
+    "ai": "artificial intelligence",
+    "dp": "dynamic programming",
+    "oop": "object oriented programming",
+    "oops": "object oriented programming",
+}
+
+_FILLER_PREFIXES = ("introduction to ", "intro to ", "basics of ", "fundamentals of ")
+_FILLER_SUFFIXES = (" basics", " fundamentals", " intro", " introduction", " overview")
+
+
+def _clean_topic(topic: str) -> str:
+    """Lowercase, punctuation and filler words stripped - everything but the singular."""
+    key = topic.lower().replace("&", " and ")
+    key = re.sub(r"[^\w\s+#]", " ", key)  # keep C++ / C# intact
+    key = " ".join(key.split())
+    
+    for prefix in _FILLER_PREFIXES:
+        if key.startswith(prefix):
+            key = key[len(prefix):]
+    for suffix in _FILLER_SUFFIXES:
+        if key.endswith(suffix) and len(key) > len(suffix):
+            key = key[:-len(suffix)]
+    return key
+
+
+def normalize_topic(topic: str) -> str:
+    """
+    Reduce a topic to its lookup key.
+    
+    "Binary Trees!" -> "binary tree", "Intro to Graphs" -> "graph"
+    """
+    # naive singular: "trees" -> "tree", but leave "class", "bus", "analysis"
+    words = _clean_topic(topic).split()
+    if words:
+        last = words[-1]
+        if len(last) > 3 and last.endswith("s") and not last.endswith(("ss", "us", "is")):
+            words[-1] = last[:-1]
+    return " ".join(words)
+
+
+# Keyed by the alias both before and after singularizing, so "DBMS" isn't
+# only found as the plural of "dbm"
+DEFAULT_ALIASES = {
+    **{normalize_topic(alias): normalize_topic(canonical) for alias, canonical in _ABBREVIATIONS.items()},
+    **{_clean_topic(alias): normalize_topic(canonical) for alias, canonical in _ABBREVIATIONS.items()},
+}
+
+
+class TopicRegistry:
+    """
+    Maps topic spellings to one canonical topic name.
+    
+    Backed by a plain dict so it can live in ADK session state or in a file:
+    - "names": canonical key -> display name (first spelling we saw)
+    - "aliases": alias key -> canonical key
+    """
+    
+    def __init__(self, data: Optional[Dict[str, Any]] = None, student_name: Optional[str] = None):
+        self.student_name = student_name
+        self.data: Dict[str, Any] = data if data is not None else {}
+        self.data.setdefault("names", {})
+        self.data.setdefault("aliases", {})
+    
+    @property
+    def names(self) -> Dict[str, str]:
+        return self.data["names"]
+    
+    @property
+    def aliases(self) -> Dict[str, str]:
+        return self.data["aliases"]
+    
+    def resolve_key(self, topic: str) -> str:
+        """Canonical key for a topic (without registering it)."""
+        key = normalize_topic(topic)
+        default = DEFAULT_ALIASES.get(_clean_topic(topic), DEFAULT_ALIASES.get(key, key))
+        key = self.aliases.get(key, default)
+        # aliases can point at a topic that was itself merged later
+        seen = {key}
+        while key in self.aliases and self.aliases[key] not in seen:
+            key = self.aliases[key]
+            seen.add(key)
+        return key
+    
+    def canonicalize(self, topic: str) -> str:
+        """
+        Get the canonical display name for a topic, registering it if new.
+        
+        This is what every write path should store topics under.
+        """
+        topic = topic.strip()
+        key = self.resolve_key(topic)
+        if key not in self.names:
+            self.names[key] = topic
+        return self.names[key]
+    
+    def add_alias(self, alias: str, canonical: str) -> str:
+        """
+        Make `alias` resolve to the same topic as `canonical`.
+        
+        Returns:
+            The canonical display name
+        """
+        canonical_name = self.canonicalize(canonical)
+        canonical_key = self.resolve_key(canonical)
+        alias_key = normalize_topic(alias)
+        if alias_key != canonical_key:
+            self.aliases[alias_key] = canonical_key
+            self.names.pop(alias_key, None)
+        return canonical_name
+    
+    def suggest_merges(
+        self,
+        topics: Optional[Sequence[str]] = None,
+        embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None,
+        threshold: float = TOPIC_MERGE_THRESHOLD
+    ) -> List[Dict[str, Any]]:
+        """
+        Find topic pairs that look like the same thing.
+        
+        Uses cosine similarity of embeddings if `embed_fn` is given
+        (see gemini_embed_fn), otherwise cheap string similarity.
+        Nothing is merged - call add_alias for the ones you accept.
+        
+        Args:
+            topics: Topic names to compare (defaults to all canonical topics)
+            embed_fn: Maps a list of strings to a list of vectors
+            threshold: Minimum similarity to suggest a merge (0-1)
+        
+        Returns:
+            Suggested merges, most similar first
+        """
+        if topics is None:
+            topics = list(self.names.values())
+        topics = list(topics)
+        if len(topics) < 2:
+            return []
+        
+        if embed_fn is not None:
+            vectors = embed_fn(topics)
+            similarity = lambda i, j: _cosine(vectors[i], vectors[j])
+        else:
+            keys = [self.resolve_key(t) for t in topics]
+            similarity = lambda i, j: _string_similarity(keys[i], keys[j])
+        
+        suggestions = []
+        for i in range(len(topics)):
+            for j in range(i + 1, len(topics)):
+                score = similarity(i, j)
+                if score >= threshold:
+                    suggestions.append({
+                        "topic": topics[j],
+                        "merge_into": topics[i],
+                        "similarity": round(score, 3)
+                    })
+        
+        suggestions.sort(key=lambda s: s["similarity"], reverse=True)
+        return suggestions
+    
+    def merge_keys(
+        self,
+        data: Dict[str, Dict[str, Any]],
+        merge_fn: Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Re-key a topic -> stats dict under canonical names.
+        
+        Entries that collapse onto the same topic are combined with merge_fn.
+        Returns a new dict; the input is left alone.
+        """
+        merged: Dict[str, Dict[str, Any]] = {}
+        for topic, entry in data.items():
+            name = self.canonicalize(topic)
+            if name in merged:
+                merged[name] = merge_fn(merged[name], entry)
+            else:
+                merged[name] = entry
+        return merged
+    
+    def has_duplicates(self, topics: Sequence[str]) -> bool:
+        """True if any two topics resolve to the same canonical topic."""
+        keys = [self.resolve_key(t) for t in topics]
+        return len(set(keys)) < len(keys)
+    
+    @classmethod
+    def load(cls, student_name: str) -> "TopicRegistry":
+        """Load a student's saved registry (or start an empty one)."""
+        filepath = os.path.join(PROGRESS_DIR, f"{student_name}_topics.json")
+        
+        if os.path.exists(filepath):
+            try:
+                with persistence_timer("topics", "load"):
+                    with open(filepath, "r", encoding="utf-8") as f:
+                        return cls(json.load(f), student_name=student_name)
+            except Exception as e:
+                print(f"Error loading topic registry: {e}")
+        
+        return cls(student_name=student_name)
+    
+    def save(self) -> bool:
+        """Persist the registry to disk."""
+        if not USE_FILE_PERSISTENCE or not self.student_name:
+            return False
+        
+        try:
+            os.makedirs(PROGRESS_DIR, exist_ok=True)
+            filepath = os.path.join(PROGRESS_DIR, f"{self.student_name}_topics.json")
+            with persistence_timer("topics", "save"):
+                with open(filepath, "w", encoding="utf-8") as f:
+                    json.dump(self.data, f, indent=2)
+            return True
+        except Exception as e:
+            print(f"Error saving topic registry: {e}")
+            return False
+
+
+def merge_progress_stats(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine two progress entries for the same topic."""
+    newer, older = (a, b) if a.get("last_updated", "") >= b.get("last_updated", "") else (b, a)
+    merged = {**older, **newer}
+    merged["attempts"] = a.get("attempts", 0) + b.get("attempts", 0)
+    merged["total_answered"] = a.get("total_answered", 0) + b.get("total_answered", 0)
+    merged["best_score"] = max(a.get("best_score", 0.0), b.get("best_score", 0.0))
+    if a.get("history") and b.get("history"):
+        from memory.score_history import merge_histories, derived_fields
+        merged["history"] = merge_histories(a["history"], b["history"])
+        merged.update(derived_fields(merged["history"]))
+    return merged
+
+
+def merge_review_data(a: Dict[str, Any], b: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine two spaced repetition entries for the same topic."""
+    newer, older = (a, b) if a.get("last_review", "") >= b.get("last_review", "") else (b, a)
+    merged = {**older, **newer}
+    merged["repetition_number"] = max(a.get("repetition_number", 0), b.get("repetition_number", 0))
+    merged["performance_history"] = sorted(
+        a.get("performance_history", []) + b.get("performance_history", []),
+        key=lambda h: h.get("date", "")
+    )
+    # review whichever copy was due first
+    due_dates = [d["next_review"] for d in (a, b) if d.get("next_review")]
+    if due_dates:
+        merged["next_review"] = min(due_dates)
+    return merged
+
+
+def gemini_embed_fn(texts: List[str]) -> List[List[float]]:
+    """Embed topic names with EMBED_MODEL (needs google-genai and an API key)."""
+    from google.genai import Client
+    from config.settings import EMBED_MODEL
+    
+    client = Client(api_key=os.environ.get("GEMINI_API_KEY"))
+    response = client.models.embed_content(model=EMBED_MODEL, contents=texts)
+    return [e.values for e in response.embeddings]
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = sqrt(sum(x * x for x in a)) * sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _string_similarity(a: str, b: str) -> float:
+    """Best of character similarity and word overlap."""
+    words_a, words_b = set(a.split()), set(b.split())
+    jaccard = len(words_a & words_b) / len(words_a | words_b) if words_a | words_b else 0.0
+    return max(SequenceMatcher(None, a, b).ratio(), jaccard)
@@ -1,4 +1,12 @@
 # Observability package
 from observability.logger import log_event, log_agent_call, log_tool_call
+from observability.instrumentation import instrument_agent, register_hooks
+from observability.tracing import get_tracer, trace_request
+from observability.metrics import registry as metrics_registry
 
-__all__ = ["log_event", "log_agent_call", "log_tool_call"]
+__all__ = [
+    "log_event", "log_agent_call", "log_tool_call",
+    "instrument_agent", "register_hooks",
+    "get_tracer", "trace_request",
+    "metrics_registry"
+]
@@ -0,0 +1,350 @@
+"""
+Token Accounting and Budgets
+
+Every Gemini call made by any agent gets recorded here: prompt, completion
+and cached tokens, attributed to the student, the agent that made the call,
+and the tool the model asked for (or "-" when it just answered).
+
+Usage lives in a small rolling file per student (USAGE_DIR), one bucket per
+day, trimmed to USAGE_RETENTION_DAYS:
+
+    {"days": {"2026-10-19": {"quiz_agent/record_quiz_result@gemini-2.5-flash": [calls, in, out, cached]}}}
+
+Each row is priced at the model it ran on (rows without one, from before
+model tiers, at MODEL).
+
+Once a student goes over DAILY_TOKEN_BUDGET, model calls are short-circuited
+instead of failing: we replay a cached answer to the same prompt if we have
+one, otherwise give a local-only answer built from their due flashcards.
+
+Report:
+    python -m observability.accounting --days 7 --by agent
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config.settings import (
+    MODEL, USAGE_DIR, DAILY_TOKEN_BUDGET, USAGE_RETENTION_DAYS,
+    TOKEN_PRICES_PER_MILLION, BUDGET_CACHE_SIZE, USE_FILE_PERSISTENCE
+)
+from memory.card_store import FlashcardStore
+from observability.instrumentation import InstrumentationHooks, PendingCalls, context_ids
+from observability.metrics import registry as metrics, record_cache_lookup
+
+NO_TOOL = "-"
+
+
+class TokenAccountant:
+    """Rolling per-student, per-day token usage with a daily budget."""
+    
+    def __init__(self, directory: str = USAGE_DIR, daily_budget: int = DAILY_TOKEN_BUDGET):
+        self.directory = directory
+        self.daily_budget = daily_budget
+        self._usage: Dict[str, Dict[str, Any]] = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+    
+    def _path(self, student: str) -> str:
+        return os.path.join(self.directory, f"{student}_usage.json")
+    
+    def usage(self, student: str) -> Dict[str, Any]:
+        """A student's usage data (loaded from disk the first time)."""
+        data = self._usage.get(student)
+        if data is None:
+            data = {"days": {}}
+            path = self._path(student)
+            if os.path.exists(path):
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                except Exception as e:
+                    print(f"Error loading usage: {e}")
+            self._usage[student] = data
+        return data
+    
+    def record(
+        self,
+        student: str,
+        agent: str,
+        tool: Optional[str],
+        input_tokens: int,
+        output_tokens: int,
+        cached_tokens: int = 0,
+        when: Optional[datetime] = None,
+        model: Optional[str] = None
+    ) -> None:
+        """Add one model call to the student's usage for the day."""
+        day = (when or datetime.now()).strftime("%Y-%m-%d")
+        key = f"{agent}/{tool or NO_TOOL}" + (f"@{model}" if model else "")
+        with self._lock:
+            days = self.usage(student)["days"]
+            if day not in days:
+                days[day] = {}
+                self._trim(days, day)
+            row = days[day].setdefault(key, [0, 0, 0, 0])
+            row[0] += 1
+            row[1] += input_tokens
+            row[2] += output_tokens
+            row[3] += cached_tokens
+            self._dirty.add(student)
+    
+    @staticmethod
+    def _trim(days: Dict[str, Any], today: str) -> None:
+        """Drop days older than USAGE_RETENTION_DAYS."""
+        cutoff = (datetime.strptime(today, "%Y-%m-%d") - timedelta(days=USAGE_RETENTION_DAYS)).strftime("%Y-%m-%d")
+        for day in [d for d in days if d < cutoff]:
+            del days[day]
+    
+    def used_today(self, student: str, when: Optional[datetime] = None) -> int:
+        """Billable tokens (prompt + completion) the student used today."""
+        day = (when or datetime.now()).strftime("%Y-%m-%d")
+        rows = self.usage(student)["days"].get(day, {})
+        return sum(row[1] + row[2] for row in rows.values())
+    
+    def over_budget(self, student: Optional[str], when: Optional[datetime] = None) -> bool:
+        """True if the student has used up today's budget (0 = unlimited)."""
+        if not student or not self.daily_budget:
+            return False
+        return self.used_today(student, when) >= self.daily_budget
+    
+    def flush(self) -> None:
+        """Write every student whose usage changed since the last flush."""
+        if not USE_FILE_PERSISTENCE:
+            return
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            snapshots = {s: json.dumps(self._usage[s], separators=(",", ":")) for s in dirty}
+        if not snapshots:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for student, text in snapshots.items():
+            try:
+                with open(self._path(student), "w", encoding="utf-8") as f:
+                    f.write(text)
+            except Exception as e:
+                print(f"Error saving usage: {e}")
+    
+    def report(
+        self,
+        students: Optional[List[str]] = None,
+        days: int = 7,
+        by: str = "agent",
+        today: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Sum usage over the last `days` days.
+        
+        Args:
+            students: Students to include (defaults to everyone with a usage file)
+            days: How many days back to look
+            by: Group rows by "student", "agent", "tool", "model" or "day"
+            today: Last day of the window (defaults to now)
+        
+        Returns:
+            Rows with calls, input/output/cached tokens and estimated cost, biggest first
+        """
+        if students is None:
+            on_disk = {
+                os.path.basename(p)[:-len("_usage.json")]
+                for p in glob.glob(os.path.join(self.directory, "*_usage.json"))
+            }
+            students = sorted(on_disk | set(self._usage))
+        cutoff = ((today or datetime.now()) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        
+        totals: Dict[str, List[float]] = {}
+        for student in students:
+            for day, rows in self.usage(student)["days"].items():
+                if day < cutoff:
+                    continue
+                for key, row in rows.items():
+                    agent_tool, _, model = key.partition("@")
+                    agent, _, tool = agent_tool.partition("/")
+                    model = model or MODEL
+                    group = {"student": student, "agent": agent, "tool": tool, "model": model, "day": day}.get(by, agent)
+                    total = totals.setdefault(group, [0, 0, 0, 0, 0.0])
+                    for i, value in enumerate(row):
+                        total[i] += value
+                    total[4] += estimate_cost(row[1], row[2], row[3], model=model)
+        
+        result = [
+            {
+                by: group, "calls": calls, "input_tokens": input_tokens,
+                "output_tokens": output_tokens, "cached_tokens": cached_tokens,
+                "cost_usd": round(cost, 4)
+            }
+            for group, (calls, input_tokens, output_tokens, cached_tokens, cost) in totals.items()
+        ]
+        return sorted(result, key=lambda r: r["input_tokens"] + r["output_tokens"], reverse=True)
+
+
+def estimate_cost(input_tokens: int, output_tokens: int, cached_tokens: int = 0, model: str = MODEL) -> float:
+    """Rough USD cost using TOKEN_PRICES_PER_MILLION (cached tokens billed at the cached rate)."""
+    prices = TOKEN_PRICES_PER_MILLION.get(model)
+    if not prices:
+        return 0.0
+    uncached = max(0, input_tokens - cached_tokens)
+    return (
+        uncached * prices["input"]
+        + cached_tokens * prices.get("cached", prices["input"])
+        + output_tokens * prices["output"]
+    ) / 1_000_000
+
+
+class TokenAccountingHooks(InstrumentationHooks):
+    """Records usage after every model call and enforces the daily budget before it."""
+    
+    def __init__(
+        self,
+        accountant: TokenAccountant,
+        cache_size: int = BUDGET_CACHE_SIZE,
+        make_response: Optional[Callable[[str], Any]] = None,
+        max_pending: int = 1024
+    ):
+        self.accountant = accountant
+        self.cache_size = cache_size
+        self.make_response = make_response or _text_response
+        # (student, agent, prompt digest) -> answer; per student, since answers are personal
+        self._responses: "OrderedDict[Tuple[str, str, str], Any]" = OrderedDict()
+        # call -> (replay key, model)
+        self._pending_keys = PendingCalls(max_pending)
+    
+    def before_model(self, callback_context, llm_request):
+        ids = context_ids(callback_context)
+        key = (ids["user_id"] or "", ids["agent_name"] or "", _prompt_digest(llm_request))
+        
+        if not self.accountant.over_budget(ids["user_id"]):
+            self._pending_keys.put(callback_context, (key, getattr(llm_request, "model", None)))
+            return None
+        
+        cached = self._responses.get(key)
+        record_cache_lookup("budget_response", cached is not None)
+        if cached is not None:
+            metrics.counter("studybuddy_budget_degraded_total", "Model calls skipped over budget", mode="cached").inc()
+            return cached
+        metrics.counter("studybuddy_budget_degraded_total", "Model calls skipped over budget", mode="local").inc()
+        state = getattr(callback_context, "state", None) or {}
+        return self.make_response(local_fallback(FlashcardStore(state.get("flashcards", {}))))
+    
+    def after_model(self, callback_context, llm_response):
+        ids = context_ids(callback_context)
+        key, model = self._pending_keys.pop(callback_context, (None, None))
+        
+        usage = getattr(llm_response, "usage_metadata", None)
+        if usage is not None and ids["user_id"]:
+            tool_names = _function_call_names(llm_response)
+            self.accountant.record(
+                ids["user_id"], ids["agent_name"] or "unknown",
+                tool_names[0] if tool_names else None,
+                getattr(usage, "prompt_token_count", None) or 0,
+                getattr(usage, "candidates_token_count", None) or 0,
+                getattr(usage, "cached_content_token_count", None) or 0,
+                model=model
+            )
+            # Only plain answers are worth replaying later - tool calls depend on state
+            if key is not None and not tool_names:
+                self._responses[key] = llm_response
+                self._responses.move_to_end(key)
+                while len(self._responses) > self.cache_size:
+                    self._responses.popitem(last=False)
+        return None
+
+
+def _prompt_digest(llm_request) -> str:
+    """Hash of the text in the request's contents (what the model was asked)."""
+    digest = hashlib.sha1()
+    for content in getattr(llm_request, "contents", None) or []:
+        for part in getattr(content, "parts", None) or []:
+            text = getattr(part, "text", None)
+            if text:
+                digest.update(text.encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _function_call_names(llm_response) -> List[str]:
+    content = getattr(llm_response, "content", None)
+    names = []
+    for part in getattr(content, "parts", None) or []:
+        call = getattr(part, "function_call", None)
+        if call is not None and getattr(call, "name", None):
+            names.append(call.name)
+    return names
+
+
+def local_fallback(store: FlashcardStore) -> str:
+    """An answer we can give without the model: the student's due flashcards."""
+    lines = [
+        "You've reached today's study budget, so I'm in offline mode until tomorrow.",
+        "In the meantime, here are some flashcards that are due for review:"
+    ]
+    due = store.next_due(limit=5)
+    if not due:
+        return lines[0] + " Nothing is due for review right now - a great time to reread your notes!"
+    for card in due:
+        lines.append(f"- [{card.get('topic', '')}] {card.get('question', '')}")
+    return "\n".join(lines)
+
+
+def _text_response(text: str):
+    """Wrap plain text as an LlmResponse (short-circuits the model call)."""
+    from google.adk.models import LlmResponse
+    from google.genai import types
+    
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+
+_accountant: Optional[TokenAccountant] = None
+_hooks: Optional[TokenAccountingHooks] = None
+
+
+def get_accountant() -> TokenAccountant:
+    """The process-wide accountant."""
+    global _accountant
+    if _accountant is None:
+        _accountant = TokenAccountant()
+    return _accountant
+
+
+def get_accounting_hooks() -> TokenAccountingHooks:
+    """Process-wide accounting hooks, bound to get_accountant()."""
+    global _hooks
+    if _hooks is None:
+        _hooks = TokenAccountingHooks(get_accountant())
+    return _hooks
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Print a usage report."""
+    parser = argparse.ArgumentParser(description="StudyBuddy token usage report")
+    parser.add_argument("--student", action="append", help="Only these students (repeatable)")
+    parser.add_argument("--days", type=int, default=7, help="Days to include (default 7)")
+    parser.add_argument("--by", choices=["student", "agent", "tool", "model", "day"], default="agent")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = parser.parse_args(argv)
+    
+    rows = get_accountant().report(students=args.student, days=args.days, by=args.by)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    if not rows:
+        print("No usage recorded.")
+        return
+    
+    print(f"{args.by:<28}{'calls':>8}{'input':>12}{'output':>12}{'cached':>12}{'cost $':>10}")
+    for row in rows:
+        print(f"{str(row[args.by]):<28}{row['calls']:>8}{row['input_tokens']:>12}"
+              f"{row['output_tokens']:>12}{row['cached_tokens']:>12}{row['cost_usd']:>10.4f}")
+    print(f"{'total':<28}{sum(r['calls'] for r in rows):>8}{sum(r['input_tokens'] for r in rows):>12}"
+          f"{sum(r['output_tokens'] for r in rows):>12}{sum(r['cached_tokens'] for r in rows):>12}"
+          f"{sum(r['cost_usd'] for r in rows):>10.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+Live Ops Dashboard
+
+A rich.live terminal view over the in-process metrics (observability/metrics.py):
+
+- requests in flight, request rate and p50/p95 latency
+- per-agent model call p50/p95 and tokens per minute
+- cache hit ratios
+- storage writes/reads per second
+- due-review backlog across all students
+
+It reads the same Prometheus text the /metrics endpoint serves, so it works
+in-process (the /dashboard command in the CLI) or against a worker's
+endpoint or metrics dump over SSH:
+
+    python -m observability.dashboard                      # METRICS_PORT or METRICS_DUMP_FILE
+    python -m observability.dashboard --url http://127.0.0.1:9464/metrics
+    python -m observability.dashboard --once               # print one frame and exit
+
+Rates and latency percentiles cover the last DASHBOARD_WINDOW seconds
+(bucket deltas between refreshes), so the cost is one render + parse per
+refresh and nothing on the request path.
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+import urllib.request
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+try:
+    from rich.console import Console, Group
+    from rich.live import Live
+    from rich.panel import Panel
+    from rich.table import Table
+except ImportError:
+    # the parsing/aggregation below works without rich; drawing needs it
+    Console = Group = Live = Panel = Table = None
+
+from config.settings import (
+    METRICS_PORT, METRICS_DUMP_FILE, SPACED_REPETITION_DIR,
+    DASHBOARD_REFRESH_SECONDS, DASHBOARD_WINDOW, REVIEW_BACKLOG_TTL
+)
+from observability.metrics import registry as metrics_registry
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+# ---------------------------------------------------------------------------
+# Due-review backlog gauge
+# ---------------------------------------------------------------------------
+
+_backlog_cache = {"at": 0.0, "value": 0.0}
+
+
+def review_backlog(now: Optional[datetime] = None) -> float:
+    """
+    Topics due for review across every student's review file.
+    
+    Scans SPACED_REPETITION_DIR, so the result is cached for
+    REVIEW_BACKLOG_TTL seconds - scrapes stay cheap with lots of students.
+    """
+    if now is None and time.monotonic() - _backlog_cache["at"] < REVIEW_BACKLOG_TTL:
+        return _backlog_cache["value"]
+    cutoff = (now or datetime.now()).isoformat()
+    due = 0
+    for path in glob.glob(os.path.join(SPACED_REPETITION_DIR, "*_reviews.json")):
+        try:
+            with open(path, "r") as f:
+                reviews = json.load(f)
+        except Exception:
+            continue
+        # ISO timestamps compare correctly as strings
+        due += sum(1 for data in reviews.values() if (data.get("next_review") or "~") <= cutoff)
+    if now is None:
+        _backlog_cache.update(at=time.monotonic(), value=float(due))
+    return float(due)
+
+
+metrics_registry.gauge(
+    "studybuddy_reviews_due", "Topics due for review across all students"
+).set_function(review_backlog)
+
+
+# ---------------------------------------------------------------------------
+# Parsing and aggregation
+# ---------------------------------------------------------------------------
+
+class MetricsSnapshot:
+    """Parsed Prometheus text: {name: {labels: value}} plus when it was taken."""
+    
+    def __init__(self, samples: Dict[str, Dict[Labels, float]], taken_at: float):
+        self.samples = samples
+        self.taken_at = taken_at
+    
+    @classmethod
+    def parse(cls, text: str, taken_at: Optional[float] = None) -> "MetricsSnapshot":
+        samples: Dict[str, Dict[Labels, float]] = {}
+        for line in text.splitlines():
+            if not line or line.startswith("#"):
+                continue
+            match = _SAMPLE.match(line)
+            if not match:
+                continue
+            name, raw_labels, value = match.groups()
+            labels = tuple(sorted(
+                (k, v.replace('\\"', '"').replace("\\\\", "\\"))
+                for k, v in _LABEL.findall(raw_labels or "")
+            ))
+            samples.setdefault(name, {})[labels] = float(value)
+        return cls(samples, time.time() if taken_at is None else taken_at)
+    
+    def series(self, name: str, **match: str) -> Dict[Labels, float]:
+        return {
+            labels: value for labels, value in self.samples.get(name, {}).items()
+            if all(dict(labels).get(k) == v for k, v in match.items())
+        }
+    
+    def value(self, name: str, **match: str) -> float:
+        """Sum of every series of `name` whose labels include `match`."""
+        return sum(self.series(name, **match).values())
+    
+    def label_values(self, name: str, label: str) -> List[str]:
+        return sorted({dict(labels)[label] for labels in self.samples.get(name, {}) if label in dict(labels)})
+
+
+def bucket_quantile(buckets: Dict[float, float], q: float) -> Optional[float]:
+    """Quantile (as the bucket's upper bound) from {upper bound: count in that bucket}."""
+    total = sum(buckets.values())
+    if total <= 0:
+        return None
+    target = q * total
+    seen = 0.0
+    for bound in sorted(buckets):
+        seen += buckets[bound]
+        if seen >= target:
+            return bound
+    return max(buckets)
+
+
+def _per_bucket(snapshot: MetricsSnapshot, name: str, **match: str) -> Dict[float, float]:
+    """
+    Per-bucket counts for `name`, merged over matching series.
+    
+    The exposition is cumulative and only lists non-empty buckets, so each
+    series is differenced on its own before merging.
+    """
+    by_series: Dict[Labels, List[Tuple[float, float]]] = {}
+    for labels, count in snapshot.series(f"{name}_bucket", **match).items():
+        bound = dict(labels)["le"]
+        if bound == "+Inf":
+            continue
+        key = tuple(kv for kv in labels if kv[0] != "le")
+        by_series.setdefault(key, []).append((float(bound), count))
+    merged: Dict[float, float] = {}
+    for points in by_series.values():
+        previous = 0.0
+        for bound, cumulative in sorted(points):
+            merged[bound] = merged.get(bound, 0.0) + cumulative - previous
+            previous = cumulative
+    return merged
+
+
+class DashboardData:
+    """
+    Keeps a short history of snapshots and turns it into the numbers the
+    dashboard shows (rates and percentiles over the window).
+    """
+    
+    def __init__(self, source: Callable[[], str], window: float = DASHBOARD_WINDOW):
+        self.source = source
+        self.window = window
+        self.history: Deque[MetricsSnapshot] = deque()
+    
+    def refresh(self, now: Optional[float] = None) -> MetricsSnapshot:
+        snapshot = MetricsSnapshot.parse(self.source(), now)
+        self.history.append(snapshot)
+        while len(self.history) > 2 and snapshot.taken_at - self.history[1].taken_at >= self.window:
+            self.history.popleft()
+        return snapshot
+    
+    @property
+    def latest(self) -> MetricsSnapshot:
+        return self.history[-1]
+    
+    @property
+    def oldest(self) -> MetricsSnapshot:
+        return self.history[0]
+    
+    def rate(self, name: str, per: float = 1.0, **match: str) -> float:
+        """Increase per `per` seconds over the window (counters)."""
+        elapsed = self.latest.taken_at - self.oldest.taken_at
+        if elapsed <= 0:
+            return 0.0
+        delta = self.latest.value(name, **match) - self.oldest.value(name, **match)
+        return max(0.0, delta) * per / elapsed
+    
+    def quantile(self, name: str, q: float, **match: str) -> Optional[float]:
+        """Histogram quantile over the window, or over all time before there's a window."""
+        current = _per_bucket(self.latest, name, **match)
+        if len(self.history) > 1:
+            earlier = _per_bucket(self.oldest, name, **match)
+            current = {bound: count - earlier.get(bound, 0.0) for bound, count in current.items()}
+        return bucket_quantile({b: c for b, c in current.items() if c > 0}, q)
+    
+    def cache_ratios(self) -> List[Tuple[str, float, float]]:
+        """(cache, hits, misses) over all time - hit ratios move slowly."""
+        snapshot = self.latest
+        return [
+            (cache,
+             snapshot.value("studybuddy_cache_lookups_total", cache=cache, result="hit"),
+             snapshot.value("studybuddy_cache_lookups_total", cache=cache, result="miss"))
+            for cache in snapshot.label_values("studybuddy_cache_lookups_total", "cache")
+        ]
+
+
+# ---------------------------------------------------------------------------
+# Drawing
+# ---------------------------------------------------------------------------
+
+def _ms(seconds: Optional[float]) -> str:
+    return "-" if seconds is None else f"{seconds * 1000:.0f}ms"
+
+
+def render(data: DashboardData, title: str = "StudyBuddy"):
+    """One dashboard frame as a rich renderable."""
+    snapshot = data.latest
+    
+    overview = Table.grid(padding=(0, 3))
+    for _ in range(4):
+        overview.add_column()
+    overview.add_row(
+        f"In flight: [bold]{snapshot.value('studybuddy_requests_in_flight'):.0f}[/]",
+        f"Requests/min: [bold]{data.rate('studybuddy_requests_total', 60):.1f}[/]",
+        f"p50: [bold]{_ms(data.quantile('studybuddy_request_seconds', 0.5))}[/]",
+        f"p95: [bold]{_ms(data.quantile('studybuddy_request_seconds', 0.95))}[/]",
+    )
+    overview.add_row(
+        f"Slow requests: {snapshot.value('studybuddy_slow_requests_total'):.0f}",
+        f"Tokens/min: [bold]{data.rate('studybuddy_llm_tokens_total', 60):.0f}[/]",
+        f"Over budget: {snapshot.value('studybuddy_budget_degraded_total'):.0f}",
+        f"Reviews due: [bold yellow]{snapshot.value('studybuddy_reviews_due'):.0f}[/]",
+    )
+    
+    agents = Table(title="Agents", expand=True)
+    for column in ("Agent", "Calls/min", "p50", "p95", "Tokens/min"):
+        agents.add_column(column, justify="left" if column == "Agent" else "right")
+    for agent in snapshot.label_values("studybuddy_llm_calls_total", "agent"):
+        agents.add_row(
+            agent,
+            f"{data.rate('studybuddy_llm_calls_total', 60, agent=agent):.1f}",
+            _ms(data.quantile("studybuddy_llm_seconds", 0.5, agent=agent)),
+            _ms(data.quantile("studybuddy_llm_seconds", 0.95, agent=agent)),
+            f"{data.rate('studybuddy_llm_tokens_total', 60, agent=agent):.0f}",
+        )
+    
+    caches = Table(title="Caches", expand=True)
+    for column in ("Cache", "Hits", "Misses", "Hit ratio"):
+        caches.add_column(column, justify="left" if column == "Cache" else "right")
+    for cache, hits, misses in data.cache_ratios():
+        ratio = hits / (hits + misses) if hits + misses else 0.0
+        caches.add_row(cache, f"{hits:.0f}", f"{misses:.0f}", f"{ratio:.0%}")
+    
+    storage = Table(title="Storage", expand=True)
+    for column in ("Store", "Writes/s", "Reads/s", "p95 write"):
+        storage.add_column(column, justify="left" if column == "Store" else "right")
+    for store in snapshot.label_values("studybuddy_persistence_seconds_count", "store"):
+        storage.add_row(
+            store,
+            f"{data.rate('studybuddy_persistence_seconds_count', store=store, operation='save'):.2f}",
+            f"{data.rate('studybuddy_persistence_seconds_count', store=store, operation='load'):.2f}",
+            _ms(data.quantile("studybuddy_persistence_seconds", 0.95, store=store, operation="save")),
+        )
+    
+    updated = datetime.fromtimestamp(snapshot.taken_at).strftime("%H:%M:%S")
+    return Panel(
+        Group(overview, agents, caches, storage),
+        title=f"[bold]{title}[/] ops",
+        subtitle=f"updated {updated} - last {data.window:.0f}s - Ctrl+C to exit",
+    )
+
+
+def run_dashboard(
+    source: Callable[[], str],
+    refresh: float = DASHBOARD_REFRESH_SECONDS,
+    title: str = "StudyBuddy",
+    console: Optional["Console"] = None
+) -> None:
+    """Redraw the dashboard every `refresh` seconds until Ctrl+C."""
+    if Live is None:
+        raise RuntimeError("The dashboard needs rich installed.")
+    data = DashboardData(source)
+    data.refresh()
+    # inline (not alternate-screen), which behaves over SSH and inside tmux
+    with Live(render(data, title), console=console, auto_refresh=False) as live:
+        try:
+            while True:
+                time.sleep(refresh)
+                data.refresh()
+                live.update(render(data, title), refresh=True)
+        except KeyboardInterrupt:
+            pass
+
+
+def local_source() -> str:
+    """This process's metrics."""
+    return metrics_registry.render_prometheus()
+
+
+def url_source(url: str, timeout: float = 5.0) -> Callable[[], str]:
+    """A worker's /metrics endpoint."""
+    def fetch() -> str:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return response.read().decode("utf-8")
+    return fetch
+
+
+def file_source(path: str) -> Callable[[], str]:
+    """A metrics dump file (METRICS_DUMP_FILE)."""
+    def read() -> str:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    return read
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Live StudyBuddy ops dashboard")
+    parser.add_argument("--url", help="Metrics endpoint (default: METRICS_PORT on localhost)")
+    parser.add_argument("--file", help="Read a metrics dump instead of an endpoint")
+    parser.add_argument("--refresh", type=float, default=DASHBOARD_REFRESH_SECONDS, help="Seconds between redraws")
+    parser.add_argument("--once", action="store_true", help="Print one frame and exit")
+    args = parser.parse_args(argv)
+    
+    if Console is None:
+        print("The dashboard needs rich installed.")
+        return 2
+    if args.file:
+        source, title = file_source(args.file), args.file
+    elif args.url or METRICS_PORT:
+        url = args.url or f"http://127.0.0.1:{METRICS_PORT}/metrics"
+        source, title = url_source(url), url
+    else:
+        source, title = file_source(METRICS_DUMP_FILE), METRICS_DUMP_FILE
+    
+    if args.once:
+        data = DashboardData(source)
+        data.refresh()
+        Console().print(render(data, title))
+    else:
+        run_dashboard(source, args.refresh, title)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
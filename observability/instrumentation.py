@@ -0,0 +1,223 @@
+"""
+Agent Instrumentation Hooks
+
+One place to plug into ADK's agent/model/tool callbacks. instrument_agent()
+installs dispatcher callbacks on an agent and every sub-agent reachable
+through its AgentTools; each registered hook object then sees every call.
+
+Hook objects subclass InstrumentationHooks and override what they need.
+A before_* hook that returns something other than None short-circuits the
+call, exactly like a plain ADK callback (e.g. before_model returning an
+LlmResponse skips the model). A model call that raises gets on_model_error
+instead of after_model (on ADK versions that have the callback).
+
+Either way some hooks never see a model call's after_model, so every hook
+also gets on_model_response once per call, with the response the agent goes
+on with: the model's, or the one a hook answered or replaced it with.
+"""
+
+import inspect
+from collections import OrderedDict
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+
+class InstrumentationHooks:
+    """Base class for hook objects - every method is a no-op by default."""
+    
+    def before_agent(self, callback_context) -> Optional[Any]:
+        return None
+    
+    def after_agent(self, callback_context) -> Optional[Any]:
+        return None
+    
+    def before_model(self, callback_context, llm_request) -> Optional[Any]:
+        return None
+    
+    def after_model(self, callback_context, llm_response) -> Optional[Any]:
+        return None
+    
+    def on_model_error(self, callback_context, llm_request, error) -> Optional[Any]:
+        return None
+    
+    def on_model_response(self, callback_context, llm_response) -> None:
+        """The response the agent goes on with (return value ignored)."""
+        return None
+    
+    def before_tool(self, tool, args, tool_context) -> Optional[Any]:
+        return None
+    
+    def after_tool(self, tool, args, tool_context, tool_response) -> Optional[Any]:
+        return None
+
+
+_hooks: List[InstrumentationHooks] = []
+_instrumented_ids = set()
+
+
+def register_hooks(hooks: InstrumentationHooks) -> InstrumentationHooks:
+    """Start sending callbacks to a hook object (no-op if already registered)."""
+    if hooks not in _hooks:
+        _hooks.append(hooks)
+    return hooks
+
+
+def unregister_hooks(hooks: InstrumentationHooks) -> None:
+    """Stop sending callbacks to a hook object."""
+    if hooks in _hooks:
+        _hooks.remove(hooks)
+
+
+def registered_hooks() -> List[InstrumentationHooks]:
+    """Hook objects currently registered, in call order."""
+    return list(_hooks)
+
+
+async def _dispatch(method: str, *args) -> Optional[Any]:
+    """Call `method` on every hook; the first non-None result wins."""
+    for hooks in list(_hooks):
+        result = getattr(hooks, method)(*args)
+        if inspect.isawaitable(result):
+            result = await result
+        if result is not None:
+            return result
+    return None
+
+
+async def _before_agent_callback(callback_context):
+    return await _dispatch("before_agent", callback_context)
+
+
+async def _after_agent_callback(callback_context):
+    return await _dispatch("after_agent", callback_context)
+
+
+async def _notify(method: str, *args) -> None:
+    """Call `method` on every hook, whatever they return."""
+    for hooks in list(_hooks):
+        result = getattr(hooks, method)(*args)
+        if inspect.isawaitable(result):
+            await result
+
+
+async def _before_model_callback(callback_context, llm_request):
+    result = await _dispatch("before_model", callback_context, llm_request)
+    if result is not None:
+        await _notify("on_model_response", callback_context, result)
+    return result
+
+
+async def _after_model_callback(callback_context, llm_response):
+    result = await _dispatch("after_model", callback_context, llm_response)
+    await _notify("on_model_response", callback_context, llm_response if result is None else result)
+    return result
+
+
+async def _on_model_error_callback(callback_context, llm_request, error):
+    return await _dispatch("on_model_error", callback_context, llm_request, error)
+
+
+async def _before_tool_callback(tool, args, tool_context):
+    return await _dispatch("before_tool", tool, args, tool_context)
+
+
+async def _after_tool_callback(tool, args, tool_context, tool_response):
+    return await _dispatch("after_tool", tool, args, tool_context, tool_response)
+
+
+def instrument_agent(agent) -> Any:
+    """
+    Install the dispatcher callbacks on an agent and all its sub-agents.
+    
+    Follows both sub_agents and AgentTool-wrapped agents. Agents that
+    already have their own callback for a slot keep it.
+    
+    Returns:
+        The same agent
+    """
+    if id(agent) in _instrumented_ids:
+        return agent
+    _instrumented_ids.add(id(agent))
+    
+    slots = {
+        "before_agent_callback": _before_agent_callback,
+        "after_agent_callback": _after_agent_callback,
+        "before_model_callback": _before_model_callback,
+        "after_model_callback": _after_model_callback,
+        "on_model_error_callback": _on_model_error_callback,
+        "before_tool_callback": _before_tool_callback,
+        "after_tool_callback": _after_tool_callback,
+    }
+    for slot, callback in slots.items():
+        if hasattr(agent, slot) and getattr(agent, slot) is None:
+            setattr(agent, slot, callback)
+    
+    for sub_agent in getattr(agent, "sub_agents", None) or []:
+        instrument_agent(sub_agent)
+    for tool in getattr(agent, "tools", None) or []:
+        wrapped = getattr(tool, "agent", None)
+        if wrapped is not None:
+            instrument_agent(wrapped)
+    
+    return agent
+
+
+def iter_agents(agent, _seen=None) -> Iterator[Any]:
+    """Yield an agent and every agent under it (sub_agents and AgentTools), once each."""
+    seen = _seen if _seen is not None else set()
+    if id(agent) in seen:
+        return
+    seen.add(id(agent))
+    yield agent
+    for sub_agent in getattr(agent, "sub_agents", None) or []:
+        yield from iter_agents(sub_agent, seen)
+    for tool in getattr(agent, "tools", None) or []:
+        wrapped = getattr(tool, "agent", None)
+        if wrapped is not None:
+            yield from iter_agents(wrapped, seen)
+
+
+class PendingCalls:
+    """
+    What a hook keeps about a model call from before_model to after_model,
+    keyed by (invocation, agent). A call that a later hook short-circuits
+    never gets an after_model, so only the newest `limit` are kept;
+    `on_evict(value)` is told about the ones dropped.
+    """
+    
+    def __init__(self, limit: int = 1024, on_evict: Optional[Callable[[Any], None]] = None):
+        self.limit = limit
+        self.on_evict = on_evict
+        self._calls: "OrderedDict[Tuple, Any]" = OrderedDict()
+    
+    @staticmethod
+    def key(callback_context) -> Tuple:
+        ids = context_ids(callback_context)
+        return ids["invocation_id"], ids["agent_name"]
+    
+    def put(self, callback_context, value: Any) -> None:
+        self._calls[self.key(callback_context)] = value
+        while len(self._calls) > self.limit:
+            stale = self._calls.popitem(last=False)[1]
+            if self.on_evict is not None:
+                self.on_evict(stale)
+    
+    def pop(self, callback_context, default: Any = None) -> Any:
+        return self._calls.pop(self.key(callback_context), default)
+    
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+def context_ids(context) -> dict:
+    """
+    Pull invocation/user/session ids and the agent name out of an ADK
+    CallbackContext or ToolContext (works on older ADK versions too).
+    """
+    invocation = getattr(context, "_invocation_context", None)
+    session = getattr(invocation, "session", None)
+    return {
+        "invocation_id": getattr(context, "invocation_id", None) or getattr(invocation, "invocation_id", None),
+        "user_id": getattr(context, "user_id", None) or getattr(invocation, "user_id", None),
+        "session_id": getattr(session, "id", None),
+        "agent_name": getattr(context, "agent_name", None),
+    }
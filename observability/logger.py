@@ -2,18 +2,30 @@
 Observability and Logging for StudyBuddy
 
 Provides logging and monitoring capabilities for debugging and observability.
+Log calls go through the structured pipeline (observability/pipeline.py):
+JSON lines to a rotating file, with the rich console as an optional sink.
 """
 
 import datetime
 from typing import Any, Dict, Optional
 
-from rich.console import Console
-from rich.panel import Panel
-from rich.table import Table
+try:
+    from rich.console import Console
+    from rich.panel import Panel
+    from rich.table import Table
+    console = Console()
+except ImportError:
+    # rich is only needed for terminal output - JSON logging works without it
+    console = None
 
 from config.settings import USE_OBSERVABILITY
+from observability import pipeline
 
-console = Console()
+
+def _ensure_pipeline() -> None:
+    """Start the logging pipeline on first use (rich console as one sink)."""
+    if not pipeline.is_configured():
+        pipeline.configure(console_render=_render_console if console else None)
 
 
 def log_event(
@@ -23,36 +35,18 @@ def log_event(
     level: str = "info"
 ) -> None:
     """
-    Log an agent event with rich formatting.
+    Log an agent event.
     
     Args:
         agent_name: Name of the agent
         action: Description of the action
         metadata: Additional context data
-        level: Log level (info, warning, error, success)
+        level: Log level (debug, info, warning, error, success)
     """
     if not USE_OBSERVABILITY:
         return
-    
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # Color coding by level
-    level_colors = {
-        "info": "cyan",
-        "warning": "yellow",
-        "error": "red",
-        "success": "green"
-    }
-    color = level_colors.get(level, "white")
-    
-    console.log(
-        f"[{color}]{timestamp}[/] | "
-        f"[bold green]{agent_name}[/] -> "
-        f"[yellow]{action}[/]"
-    )
-    
-    if metadata:
-        console.log(f"  [dim]{metadata}[/]")
+    _ensure_pipeline()
+    pipeline.emit("agent_event", level, agent=agent_name, action=action, metadata=metadata)
 
 
 def log_agent_call(
@@ -63,12 +57,8 @@ def log_agent_call(
     """Log when one agent calls another."""
     if not USE_OBSERVABILITY:
         return
-    
-    console.log(
-        f"[bold blue] Agent Call[/]: "
-        f"[green]{from_agent}[/] -> [cyan]{to_agent}[/]"
-    )
-    console.log(f"  Query: [dim]{query[:100]}{'...' if len(query) > 100 else ''}[/]")
+    _ensure_pipeline()
+    pipeline.emit("agent_call", "info", from_agent=from_agent, to_agent=to_agent, query=query[:100])
 
 
 def log_tool_call(
@@ -79,16 +69,11 @@ def log_tool_call(
     """Log when an agent uses a tool."""
     if not USE_OBSERVABILITY:
         return
-    
-    console.log(
-        f"[bold magenta] Tool Call[/]: "
-        f"[green]{agent_name}[/] using [yellow]{tool_name}[/]"
-    )
-    
-    # Show args (sanitized)
+    _ensure_pipeline()
+    # Sanitize args - long values get truncated
     safe_args = {k: str(v)[:50] + "..." if len(str(v)) > 50 else v 
                  for k, v in args.items()}
-    console.log(f"  Args: [dim]{safe_args}[/]")
+    pipeline.emit("tool_call", "info", agent=agent_name, tool=tool_name, args=safe_args)
 
 
 def log_response(
@@ -99,14 +84,9 @@ def log_response(
     """Log agent response."""
     if not USE_OBSERVABILITY:
         return
-    
+    _ensure_pipeline()
     preview = response_preview[:150] + "..." if len(response_preview) > 150 else response_preview
-    
-    console.log(f"[bold green]✓ Response[/] from [cyan]{agent_name}[/]:")
-    console.log(f"  [dim]{preview}[/]")
-    
-    if tokens_used:
-        console.log(f"  [dim]Tokens: {tokens_used}[/]")
+    pipeline.emit("response", "info", agent=agent_name, preview=preview, tokens_used=tokens_used)
 
 
 def log_session_event(
@@ -117,27 +97,74 @@ def log_session_event(
     """Log session-related events."""
     if not USE_OBSERVABILITY:
         return
+    _ensure_pipeline()
+    level = "error" if event_type == "error" else "info"
+    pipeline.emit("session", level, session_event=event_type, student=student_name, details=details)
+
+
+def _render_console(record: Dict[str, Any]) -> None:
+    """Console sink: show a pipeline record with rich formatting."""
+    event = record["event"]
+    
+    if event == "agent_event":
+        timestamp = datetime.datetime.fromtimestamp(record["ts"]).strftime("%Y-%m-%d %H:%M:%S")
+        # Color coding by level
+        level_colors = {
+            "info": "cyan",
+            "warning": "yellow",
+            "error": "red",
+            "success": "green"
+        }
+        color = level_colors.get(record["level"], "white")
+        console.log(
+            f"[{color}]{timestamp}[/] | "
+            f"[bold green]{record['agent']}[/] -> "
+            f"[yellow]{record['action']}[/]"
+        )
+        if record.get("metadata"):
+            console.log(f"  [dim]{record['metadata']}[/]")
+    
+    elif event == "agent_call":
+        query = record["query"]
+        console.log(
+            f"[bold blue] Agent Call[/]: "
+            f"[green]{record['from_agent']}[/] -> [cyan]{record['to_agent']}[/]"
+        )
+        console.log(f"  Query: [dim]{query}{'...' if len(query) >= 100 else ''}[/]")
     
-    emoji_map = {
-        "start": "[START]",
-        "end": "[END]",
-        "save": "[SAVE]",
-        "load": "[LOAD]",
-        "error": "[FAIL]"
-    }
-    emoji = emoji_map.get(event_type, "")
-    
-    console.log(
-        f"{emoji} [bold]Session {event_type}[/]: "
-        f"[cyan]{student_name}[/]"
-    )
-    if details:
-        console.log(f"  [dim]{details}[/]")
+    elif event == "tool_call":
+        console.log(
+            f"[bold magenta] Tool Call[/]: "
+            f"[green]{record['agent']}[/] using [yellow]{record['tool']}[/]"
+        )
+        console.log(f"  Args: [dim]{record['args']}[/]")
+    
+    elif event == "response":
+        console.log(f"[bold green]✓ Response[/] from [cyan]{record['agent']}[/]:")
+        console.log(f"  [dim]{record['preview']}[/]")
+        if record.get("tokens_used"):
+            console.log(f"  [dim]Tokens: {record['tokens_used']}[/]")
+    
+    elif event == "session":
+        emoji_map = {
+            "start": "[START]",
+            "end": "[END]",
+            "save": "[SAVE]",
+            "load": "[LOAD]",
+            "error": "[FAIL]"
+        }
+        event_type = record["session_event"]
+        console.log(
+            f"{emoji_map.get(event_type, '')} [bold]Session {event_type}[/]: "
+            f"[cyan]{record['student']}[/]"
+        )
+        if record.get("details"):
+            console.log(f"  [dim]{record['details']}[/]")
 
 
 def display_progress_summary(progress_data: Dict[str, Any]) -> None:
     """Display a formatted progress summary."""
-    if not USE_OBSERVABILITY:
+    if not USE_OBSERVABILITY or console is None:
         return
     
     table = Table(title="Learning Progress", show_header=True)
@@ -159,7 +186,7 @@ def display_progress_summary(progress_data: Dict[str, Any]) -> None:
 
 def display_review_schedule(schedule: Dict[str, Any]) -> None:
     """Display formatted review schedule."""
-    if not USE_OBSERVABILITY:
+    if not USE_OBSERVABILITY or console is None:
         return
     
     due = schedule.get("due_reviews", [])
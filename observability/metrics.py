@@ -0,0 +1,419 @@
+"""
+In-Process Metrics
+
+Counters, gauges and latency histograms cheap enough to leave on in
+production, plus a Prometheus text exposition (HTTP endpoint or file dump).
+
+Why it's cheap:
+- No locks on the hot path. Every thread gets its own cell to add into
+  (only that thread ever writes it), and readers sum the cells.
+- Histograms are HDR-style log-linear buckets: the bucket index comes
+  straight from math.frexp, no search, ~3% worst-case relative error.
+"""
+
+import math
+from math import frexp
+import os
+import threading
+import time
+from threading import get_ident
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from config.settings import METRICS_DUMP_FILE
+from observability import pipeline
+from observability.instrumentation import InstrumentationHooks, context_ids
+from observability.profiling import profiled
+
+# AgentTool name -> route label
+ROUTES = {
+    "learning_planner": "planner",
+    "tutor_agent": "tutor",
+    "quiz_agent": "quiz",
+    "progress_tracker": "progress",
+}
+
+
+# Histogram layout: powers of two from 2^MIN_EXP to 2^MAX_EXP, each split
+# into SUB_BUCKETS linear slices
+SUB_BUCKETS = 16
+MIN_EXP = -20
+MAX_EXP = 20
+TWO_SUB = 2 * SUB_BUCKETS
+LAST_BUCKET = (MAX_EXP - MIN_EXP) * SUB_BUCKETS - 1
+
+
+class _Cells:
+    """Per-thread accumulators. Each thread only ever writes its own cell."""
+    
+    def __init__(self, size: int):
+        self._size = size
+        self._cells: Dict[int, List[float]] = {}
+        self._lock = threading.Lock()  # only taken the first time a thread shows up
+    
+    def cell(self) -> List[float]:
+        cell = self._cells.get(threading.get_ident())
+        if cell is None:
+            with self._lock:
+                cell = self._cells.setdefault(threading.get_ident(), [0] * self._size)
+        return cell
+    
+    def snapshot(self) -> List[float]:
+        totals = [0] * self._size
+        for cell in list(self._cells.values()):
+            for i, value in enumerate(cell):
+                totals[i] += value
+        return totals
+
+
+class Counter:
+    """Monotonic counter."""
+    
+    kind = "counter"
+    
+    def __init__(self):
+        self._cells = _Cells(1)
+    
+    def inc(self, amount: float = 1) -> None:
+        (self._cells._cells.get(get_ident()) or self._cells.cell())[0] += amount
+    
+    @property
+    def value(self) -> float:
+        return self._cells.snapshot()[0]
+
+
+class Gauge:
+    """Value that goes up and down, or is read from a function when scraped."""
+    
+    kind = "gauge"
+    
+    def __init__(self, function: Optional[Callable[[], float]] = None):
+        self._cells = _Cells(1)
+        self._function = function
+    
+    def inc(self, amount: float = 1) -> None:
+        (self._cells._cells.get(get_ident()) or self._cells.cell())[0] += amount
+    
+    def dec(self, amount: float = 1) -> None:
+        (self._cells._cells.get(get_ident()) or self._cells.cell())[0] -= amount
+    
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+    
+    @property
+    def value(self) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._cells.snapshot()[0]
+
+
+class Histogram:
+    """
+    Log-linear histogram (HDR-style).
+    
+    Values are split by power of two, then each power of two into
+    SUB_BUCKETS linear slices. Covers 2^-20 (~1e-6) to 2^20 (~1e6) with
+    the ends clamped; use seconds for latencies.
+    """
+    
+    kind = "histogram"
+    SUB_BUCKETS = SUB_BUCKETS
+    MIN_EXP = MIN_EXP
+    MAX_EXP = MAX_EXP
+    _BUCKETS = (MAX_EXP - MIN_EXP) * SUB_BUCKETS
+    
+    def __init__(self):
+        # cell layout: [count, sum, bucket_0 ... bucket_n]
+        self._cells = _Cells(2 + self._BUCKETS)
+        self._by_thread = self._cells._cells
+    
+    def observe(self, value: float) -> None:
+        cell = self._by_thread.get(get_ident()) or self._cells.cell()
+        cell[0] += 1
+        cell[1] += value
+        # Same as _index(), inlined - this runs on every request
+        if value > 0:
+            mantissa, exponent = frexp(value)
+            if exponent <= MIN_EXP:
+                index = 0
+            elif exponent > MAX_EXP:
+                index = LAST_BUCKET
+            else:
+                index = (exponent - MIN_EXP - 1) * SUB_BUCKETS + int((mantissa - 0.5) * TWO_SUB)
+        else:
+            index = 0
+        cell[2 + index] += 1
+    
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the duration of a block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+    
+    @classmethod
+    def _index(cls, value: float) -> int:
+        if value <= 0:
+            return 0
+        mantissa, exponent = math.frexp(value)  # value = mantissa * 2**exponent, 0.5 <= mantissa < 1
+        if exponent <= cls.MIN_EXP:
+            return 0
+        if exponent > cls.MAX_EXP:
+            return cls._BUCKETS - 1
+        sub = int((mantissa - 0.5) * 2 * cls.SUB_BUCKETS)
+        return (exponent - cls.MIN_EXP - 1) * cls.SUB_BUCKETS + sub
+    
+    @classmethod
+    def _upper_bound(cls, index: int) -> float:
+        exponent, sub = divmod(index, cls.SUB_BUCKETS)
+        return math.ldexp(0.5 + (sub + 1) / (2 * cls.SUB_BUCKETS), exponent + cls.MIN_EXP + 1)
+    
+    @classmethod
+    def _midpoint(cls, index: int) -> float:
+        exponent, sub = divmod(index, cls.SUB_BUCKETS)
+        return math.ldexp(0.5 + (sub + 0.5) / (2 * cls.SUB_BUCKETS), exponent + cls.MIN_EXP + 1)
+    
+    @property
+    def count(self) -> int:
+        return int(self._cells.snapshot()[0])
+    
+    @property
+    def sum(self) -> float:
+        return self._cells.snapshot()[1]
+    
+    def buckets(self) -> List[Tuple[float, int]]:
+        """Non-empty buckets as (upper_bound, count), smallest first."""
+        snapshot = self._cells.snapshot()
+        return [(self._upper_bound(i), int(c)) for i, c in enumerate(snapshot[2:]) if c]
+    
+    def quantile(self, q: float) -> float:
+        """Approximate quantile (0-1) - the midpoint of the bucket it falls in."""
+        counts = self._cells.snapshot()[2:]
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        last = 0
+        for index, count in enumerate(counts):
+            if count:
+                seen += count
+                last = index
+                if seen >= rank:
+                    return self._midpoint(index)
+        return self._midpoint(last)
+
+
+class MetricsRegistry:
+    """Holds every metric, keyed by name + labels."""
+    
+    def __init__(self):
+        self._metrics: Dict[Tuple[str, Tuple], Any] = {}
+        self._help: Dict[str, str] = {}
+        self._lock = threading.Lock()
+    
+    def _get(self, cls, name: str, help_text: str, labels: Dict[str, str]):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = cls()
+                    self._help.setdefault(name, help_text)
+        return metric
+    
+    def counter(self, name: str, help_text: str = "", **labels: str) -> Counter:
+        return self._get(Counter, name, help_text, labels)
+    
+    def gauge(self, name: str, help_text: str = "", **labels: str) -> Gauge:
+        return self._get(Gauge, name, help_text, labels)
+    
+    def histogram(self, name: str, help_text: str = "", **labels: str) -> Histogram:
+        return self._get(Histogram, name, help_text, labels)
+    
+    def collect(self) -> List[Tuple[str, Dict[str, str], Any]]:
+        """All metrics as (name, labels, metric)."""
+        with self._lock:
+            items = list(self._metrics.items())
+        return [(name, dict(labels), metric) for (name, labels), metric in items]
+    
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        seen_names = set()
+        for name, labels, metric in sorted(self.collect(), key=lambda m: (m[0], sorted(m[1].items()))):
+            if name not in seen_names:
+                seen_names.add(name)
+                if self._help.get(name):
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+            if isinstance(metric, Histogram):
+                cumulative = 0
+                for bound, count in metric.buckets():
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(labels, le=f'{bound:.6g}')} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(labels, le='+Inf')} {metric.count}")
+                lines.append(f"{name}_sum{_labels(labels)} {metric.sum:.6g}")
+                lines.append(f"{name}_count{_labels(labels)} {metric.count}")
+            else:
+                lines.append(f"{name}{_labels(labels)} {metric.value:.6g}")
+        return "\n".join(lines) + "\n"
+    
+    def dump(self, path: str = METRICS_DUMP_FILE) -> str:
+        """Write the exposition to a file (e.g. for node_exporter's textfile collector)."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+        return path
+    
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serve /metrics over HTTP from a daemon thread."""
+        registry = self
+        
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, *args):
+                pass  # keep scrapes out of the console
+        
+        server = ThreadingHTTPServer((host, port), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+        return server
+
+
+def _labels(labels: Dict[str, str], **extra: str) -> str:
+    merged = {**labels, **extra}
+    if not merged:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for k, v in sorted(merged.items()))
+    return "{" + ",".join(escaped) + "}"
+
+
+registry = MetricsRegistry()
+
+# The logging pipeline's backlog, read at scrape time
+registry.gauge("studybuddy_log_queue_depth", "Log records waiting to be written").set_function(pipeline.queue_depth)
+registry.gauge("studybuddy_log_dropped", "Log records dropped because the queue was full").set_function(pipeline.dropped_count)
+
+
+# ---------------------------------------------------------------------------
+# Helpers used around the codebase
+# ---------------------------------------------------------------------------
+
+@contextmanager
+def persistence_timer(store: str, operation: str) -> Iterator[None]:
+    """Time a save/load: studybuddy_persistence_seconds{store, operation}."""
+    with registry.histogram(
+        "studybuddy_persistence_seconds", "Time spent saving/loading student data",
+        store=store, operation=operation
+    ).time(), profiled(f"persist:{store}.{operation}"):
+        yield
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    """Count a cache lookup: studybuddy_cache_lookups_total{cache, result}."""
+    registry.counter(
+        "studybuddy_cache_lookups_total", "Cache lookups by result",
+        cache=cache, result="hit" if hit else "miss"
+    ).inc()
+
+
+@contextmanager
+def track_request() -> Iterator[None]:
+    """Count a top-level request, its latency and how many are in flight."""
+    in_flight = registry.gauge("studybuddy_requests_in_flight", "Requests being processed right now")
+    in_flight.inc()
+    try:
+        with registry.histogram("studybuddy_request_seconds", "End-to-end request latency").time():
+            yield
+    finally:
+        in_flight.dec()
+        registry.counter("studybuddy_requests_total", "Requests handled").inc()
+
+
+class MetricsHooks(InstrumentationHooks):
+    """Route, model and token metrics from the ADK callbacks."""
+    
+    def __init__(self, metrics: MetricsRegistry = registry):
+        self.metrics = metrics
+        self._model_starts: Dict[Tuple, float] = {}
+        self._tool_starts: Dict[Tuple, float] = {}
+    
+    def before_model(self, callback_context, llm_request):
+        ids = context_ids(callback_context)
+        self._model_starts[(ids["invocation_id"], ids["agent_name"])] = time.perf_counter()
+        return None
+    
+    def after_model(self, callback_context, llm_response):
+        ids = context_ids(callback_context)
+        agent = ids["agent_name"] or "unknown"
+        start = self._model_starts.pop((ids["invocation_id"], ids["agent_name"]), None)
+        if start is not None:
+            self.metrics.histogram(
+                "studybuddy_llm_seconds", "Model call latency", agent=agent
+            ).observe(time.perf_counter() - start)
+        self.metrics.counter("studybuddy_llm_calls_total", "Model calls", agent=agent).inc()
+        
+        usage = getattr(llm_response, "usage_metadata", None)
+        if usage is not None:
+            for kind, field in (("input", "prompt_token_count"),
+                                ("output", "candidates_token_count"),
+                                ("cached", "cached_content_token_count")):
+                tokens = getattr(usage, field, None)
+                if tokens:
+                    self.metrics.counter(
+                        "studybuddy_llm_tokens_total", "Tokens by agent and kind",
+                        agent=agent, kind=kind
+                    ).inc(tokens)
+        return None
+    
+    def before_tool(self, tool, args, tool_context):
+        ids = context_ids(tool_context)
+        name = getattr(tool, "name", str(tool))
+        key = (ids["invocation_id"], getattr(tool_context, "function_call_id", None) or name)
+        self._tool_starts[key] = time.perf_counter()
+        route = ROUTES.get(name)
+        if route:
+            self.metrics.counter("studybuddy_route_requests_total", "Requests per route", route=route).inc()
+        else:
+            self.metrics.counter("studybuddy_tool_calls_total", "Function tool calls", tool=name).inc()
+        return None
+    
+    def after_tool(self, tool, args, tool_context, tool_response):
+        ids = context_ids(tool_context)
+        name = getattr(tool, "name", str(tool))
+        start = self._tool_starts.pop(
+            (ids["invocation_id"], getattr(tool_context, "function_call_id", None) or name), None
+        )
+        if start is not None:
+            route = ROUTES.get(name)
+            if route:
+                metric = self.metrics.histogram("studybuddy_route_seconds", "Latency per route", route=route)
+            else:
+                metric = self.metrics.histogram("studybuddy_tool_seconds", "Function tool latency", tool=name)
+            metric.observe(time.perf_counter() - start)
+        return None
+
+
+_hooks: Optional[MetricsHooks] = None
+
+
+def get_metrics_hooks() -> MetricsHooks:
+    """Process-wide metrics hooks, bound to the global registry."""
+    global _hooks
+    if _hooks is None:
+        _hooks = MetricsHooks(registry)
+    return _hooks
@@ -0,0 +1,196 @@
+"""
+Structured Logging Pipeline
+
+Logging on the request path should cost an enqueue, nothing more. Every log
+call checks the level and sampling rate, then drops a plain tuple on a queue.
+A background thread turns those into log records and writes JSON lines (for
+the log pipeline) and, optionally, rich console output (for humans watching
+the terminal).
+
+Built on the standard library:
+- QueueListener for the background writer
+- RotatingFileHandler for size-based rotation
+- Per-level sampling (e.g. keep 10% of debug logs)
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config.settings import (
+    LOG_LEVEL, LOG_JSON_FILE, LOG_CONSOLE, LOG_SAMPLE_RATES,
+    LOG_MAX_BYTES, LOG_BACKUP_COUNT, LOG_QUEUE_SIZE
+)
+
+LOGGER_NAME = "studybuddy"
+
+# "success" isn't a stdlib level - it logs at INFO and keeps its name in the record
+LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "success": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+}
+
+_queue: Optional[queue.SimpleQueue] = None
+_listener: Optional["_RecordListener"] = None
+_min_level = logging.INFO
+_sample_rates: Dict[str, float] = {}
+_dropped = 0
+
+
+class JsonLineFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, event, plus the record's fields."""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 6),
+            "level": getattr(record, "level_name", record.levelname.lower()),
+            "event": record.msg,
+        }
+        data.update(getattr(record, "fields", {}))
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class ConsoleSink(logging.Handler):
+    """
+    Hands records to a render function (e.g. the rich console in logger.py).
+    
+    Runs on the listener thread, so slow terminals don't slow requests down.
+    """
+    
+    def __init__(self, render: Callable[[Dict[str, Any]], None]):
+        super().__init__()
+        self.render = render
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.render({
+                "level": getattr(record, "level_name", record.levelname.lower()),
+                "event": record.msg,
+                "ts": record.created,
+                **getattr(record, "fields", {})
+            })
+        except Exception:
+            self.handleError(record)
+
+
+class _RecordListener(logging.handlers.QueueListener):
+    """QueueListener that builds the LogRecord on its own thread, not the caller's."""
+    
+    def prepare(self, item: Tuple) -> logging.LogRecord:
+        created, levelno, level_name, event, fields = item
+        record = logging.LogRecord(LOGGER_NAME, levelno, "", 0, event, (), None)
+        record.created = created
+        record.level_name = level_name
+        record.fields = fields
+        return record
+
+
+def configure(
+    sinks: Optional[List[logging.Handler]] = None,
+    console_render: Optional[Callable[[Dict[str, Any]], None]] = None,
+    level: str = LOG_LEVEL,
+    sample_rates: Optional[Dict[str, float]] = None
+) -> None:
+    """
+    Set up (or reset) the pipeline.
+    
+    Args:
+        sinks: Handlers to write to. Defaults to the rotating JSON file
+               (LOG_JSON_FILE) plus the console sink if LOG_CONSOLE is on.
+        console_render: Function that shows a record on the terminal
+        level: Minimum level to log
+        sample_rates: Fraction of records kept per level
+    """
+    global _queue, _listener, _min_level, _sample_rates, _dropped
+    
+    shutdown()
+    
+    if sinks is None:
+        sinks = []
+        if LOG_JSON_FILE:
+            os.makedirs(os.path.dirname(LOG_JSON_FILE) or ".", exist_ok=True)
+            file_sink = logging.handlers.RotatingFileHandler(
+                LOG_JSON_FILE, maxBytes=LOG_MAX_BYTES,
+                backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+            )
+            file_sink.setFormatter(JsonLineFormatter())
+            sinks.append(file_sink)
+        if LOG_CONSOLE and console_render is not None:
+            sinks.append(ConsoleSink(console_render))
+    
+    _min_level = LEVELS.get(level, logging.INFO)
+    _sample_rates = {k: v for k, v in (sample_rates if sample_rates is not None else LOG_SAMPLE_RATES).items() if v < 1.0}
+    _dropped = 0
+    _queue = queue.SimpleQueue()
+    _listener = _RecordListener(_queue, *sinks, respect_handler_level=True)
+    _listener.start()
+
+
+def emit(event: str, level: str = "info", **fields: Any) -> None:
+    """
+    Log a structured event. This is the hot path: level check, sampling, enqueue.
+    
+    Args:
+        event: Event type (e.g. "agent_event", "tool_call")
+        level: debug, info, success, warning or error
+        **fields: Anything JSON-serializable (other values go through str())
+    """
+    global _dropped
+    log_queue = _queue
+    if log_queue is None:
+        return
+    levelno = LEVELS.get(level, logging.INFO)
+    if levelno < _min_level:
+        return
+    rate = _sample_rates.get(level)
+    if rate is not None and random.random() >= rate:
+        return
+    if log_queue.qsize() >= LOG_QUEUE_SIZE:
+        _dropped += 1
+        return
+    log_queue.put_nowait((time.time(), levelno, level, event, fields))
+
+
+def is_configured() -> bool:
+    """True once configure() has been called."""
+    return _queue is not None
+
+
+def queue_depth() -> int:
+    """Records waiting to be written."""
+    return _queue.qsize() if _queue is not None else 0
+
+
+def dropped_count() -> int:
+    """Records dropped because the queue was full."""
+    return _dropped
+
+
+def flush() -> None:
+    """Write everything queued so far (stops and restarts the writer)."""
+    if _listener is not None:
+        _listener.stop()
+        _listener.start()
+
+
+def shutdown() -> None:
+    """Flush and stop the background writer."""
+    global _queue, _listener
+    _queue = None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown)
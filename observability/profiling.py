@@ -0,0 +1,387 @@
+"""
+On-Demand Profiling
+
+Profile a live StudyBuddy process without restarting it. Code we care about
+runs inside named regions (requests, persistence, tool calls); while a
+capture is running, time spent in those regions gets recorded and dumped to
+PROFILES_DIR as collapsed stacks - the input format for flamegraph.pl,
+speedscope and friends.
+
+Two modes:
+- sampling: a background thread grabs every thread's stack every
+  PROFILE_SAMPLE_INTERVAL seconds. Cheap enough to use on a busy worker.
+- cprofile: deterministic cProfile around each region. Exact call counts,
+  much higher overhead. Also writes a .prof file for pstats/snakeviz.
+
+Turning it on:
+- SIGUSR1 toggles a sampling capture, SIGUSR2 a cProfile capture
+- "/profile start|stop|status|slow <seconds>" in the interactive loop
+- "slow" arms per-request capture: only requests slower than the threshold
+  get written out, everything else is thrown away
+
+When nothing is running, entering a region costs one attribute check.
+"""
+
+import cProfile
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+
+from config.settings import PROFILES_DIR, PROFILE_SAMPLE_INTERVAL, PROFILE_MAX_DEPTH, PROFILE_SLOW_THRESHOLD
+from observability.instrumentation import InstrumentationHooks, context_ids
+
+MODES = ("sampling", "cprofile")
+
+
+class _Region:
+    """One outermost region of one key (what a slow-request dump covers)."""
+    
+    __slots__ = ("name", "depth", "thread", "start", "samples", "profile")
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.depth = 1
+        self.thread = threading.get_ident()  # what the sampler looks at
+        self.start = time.perf_counter()
+        self.samples: Counter = Counter()
+        self.profile: Optional[cProfile.Profile] = None
+
+
+class ProfilerControl:
+    """
+    Starts/stops captures and tracks what is inside a region.
+    
+    Regions are keyed by the thread by default. Agent calls interleave on
+    one event-loop thread, so the hooks key theirs by invocation instead.
+    """
+    
+    def __init__(self, directory: str = PROFILES_DIR, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        self.mode: Optional[str] = None        # whole-process capture in progress
+        self.slow_threshold: float = 0.0       # > 0 = dump any region slower than this
+        self.slow_mode = "sampling"
+        self.enabled = False                   # anything at all to do on region entry
+        self._regions: Dict[Hashable, _Region] = {}
+        self._samples: Counter = Counter()
+        self._stats: Optional[pstats.Stats] = None
+        self._started_at: Optional[float] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._stop_sampler = threading.Event()
+        self._lock = threading.Lock()
+    
+    # -- controls ---------------------------------------------------------
+    
+    def start(self, mode: str = "sampling") -> str:
+        """Start a whole-process capture."""
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode: {mode} (use {' or '.join(MODES)})")
+        if self.mode is not None:
+            return f"Already profiling ({self.mode})"
+        with self._lock:
+            self._samples = Counter()
+            self._stats = None
+        self.mode = mode
+        self._started_at = time.time()
+        self._refresh()
+        return f"Profiling started ({mode})"
+    
+    def stop(self) -> Optional[str]:
+        """Stop the capture and write it out. Returns the collapsed-stacks path."""
+        if self.mode is None:
+            return None
+        mode, self.mode = self.mode, None
+        self._refresh()
+        with self._lock:
+            samples, stats = self._samples, self._stats
+            self._samples, self._stats = Counter(), None
+        if mode == "cprofile" and stats is not None:
+            samples = collapse_pstats(stats)
+        stamp = datetime.fromtimestamp(self._started_at or time.time()).strftime("%Y%m%d_%H%M%S")
+        return self._write(f"{stamp}_{mode}", samples, stats)
+    
+    def toggle(self, mode: str = "sampling") -> str:
+        if self.mode is None:
+            return self.start(mode)
+        return f"Profile written to {self.stop()}"
+    
+    def arm_slow(self, threshold: float, mode: str = "sampling") -> str:
+        """Dump any region slower than `threshold` seconds (0 disarms)."""
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode: {mode} (use {' or '.join(MODES)})")
+        self.slow_threshold = max(0.0, threshold)
+        self.slow_mode = mode
+        self._refresh()
+        if not self.slow_threshold:
+            return "Slow-request capture off"
+        return f"Capturing requests slower than {self.slow_threshold:g}s ({mode})"
+    
+    def status(self) -> str:
+        parts = [f"capture: {self.mode or 'off'}"]
+        parts.append(f"slow capture: {f'>{self.slow_threshold:g}s ({self.slow_mode})' if self.slow_threshold else 'off'}")
+        parts.append(f"active regions: {len(self._regions)}")
+        return ", ".join(parts)
+    
+    def _refresh(self) -> None:
+        """Start/stop the sampler thread to match what's switched on."""
+        self.enabled = self.mode is not None or self.slow_threshold > 0
+        need_sampler = self.mode == "sampling" or (self.slow_threshold > 0 and self.slow_mode == "sampling")
+        if need_sampler and self._sampler is None:
+            self._stop_sampler.clear()
+            self._sampler = threading.Thread(target=self._sample_loop, daemon=True, name="profiler-sampler")
+            self._sampler.start()
+        elif not need_sampler and self._sampler is not None:
+            self._stop_sampler.set()
+            self._sampler.join()
+            self._sampler = None
+    
+    # -- regions ----------------------------------------------------------
+    
+    def enter(self, name: str, key: Optional[Hashable] = None) -> None:
+        key = threading.get_ident() if key is None else key
+        region = self._regions.get(key)
+        if region is not None:
+            region.depth += 1
+            return
+        region = _Region(name)
+        if self._wants_cprofile():
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+                region.profile = profile
+            except ValueError:
+                pass  # another region's cProfile is active (one at a time on 3.12+)
+        self._regions[key] = region
+    
+    def exit(self, key: Optional[Hashable] = None) -> None:
+        key = threading.get_ident() if key is None else key
+        region = self._regions.get(key)
+        if region is None:
+            return
+        region.depth -= 1
+        if region.depth:
+            return
+        del self._regions[key]
+        if region.profile is not None:
+            region.profile.disable()
+        
+        elapsed = time.perf_counter() - region.start
+        if self.mode is not None:
+            with self._lock:
+                self._samples.update(region.samples)
+                if region.profile is not None:
+                    if self._stats is None:
+                        self._stats = pstats.Stats(region.profile)
+                    else:
+                        self._stats.add(region.profile)
+        if self.slow_threshold and elapsed >= self.slow_threshold:
+            stats = pstats.Stats(region.profile) if region.profile is not None else None
+            samples = collapse_pstats(stats) if stats is not None else region.samples
+            stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            safe_name = "".join(c if c.isalnum() else "_" for c in region.name)
+            self._write(f"{stamp}_slow_{safe_name}_{int(elapsed * 1000)}ms", samples, stats)
+    
+    def _wants_cprofile(self) -> bool:
+        return self.mode == "cprofile" or (self.slow_threshold > 0 and self.slow_mode == "cprofile")
+    
+    # -- sampling ---------------------------------------------------------
+    
+    def _sample_loop(self) -> None:
+        me = threading.get_ident()
+        while not self._stop_sampler.wait(self.interval):
+            regions = dict(self._regions)
+            if not regions:
+                continue
+            frames = sys._current_frames()
+            for region in regions.values():
+                if region.thread == me or region.thread not in frames:
+                    continue
+                region.samples[_collapse_frame(frames[region.thread], region.name)] += 1
+    
+    # -- output -----------------------------------------------------------
+    
+    def _write(self, stem: str, samples: Counter, stats: Optional[pstats.Stats]) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{stem}.collapsed")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(samples.items()):
+                f.write(f"{stack} {count}\n")
+        if stats is not None:
+            stats.dump_stats(os.path.join(self.directory, f"{stem}.prof"))
+        return path
+
+
+def _frame_label(code) -> str:
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _collapse_frame(frame, root: str) -> str:
+    """Root-first 'region;file:func;file:func' for one stack."""
+    labels: List[str] = []
+    while frame is not None and len(labels) < PROFILE_MAX_DEPTH:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.append(root)
+    return ";".join(reversed(labels))
+
+
+def collapse_pstats(stats: pstats.Stats, min_us: int = 1) -> Counter:
+    """
+    Turn cProfile stats into collapsed stacks (weights in microseconds).
+    
+    cProfile only records caller -> callee edges, not full stacks, so each
+    function's own time gets spread back up its callers in proportion to how
+    much time each caller spent calling it. Good enough for a flame graph.
+    """
+    entries = stats.stats  # func -> (cc, nc, tt, ct, callers)
+    result: Counter = Counter()
+    
+    def label(func) -> str:
+        filename, _, name = func
+        return f"{os.path.basename(filename)}:{name}" if filename != "~" else name
+    
+    def walk(func, weight: float, path: List[str], seen: set) -> None:
+        callers = entries.get(func, (0, 0, 0, 0, {}))[4]
+        total = sum(edge[3] for edge in callers.values())
+        if not callers or not total or len(path) >= PROFILE_MAX_DEPTH:
+            result[";".join(reversed(path))] += int(weight)
+            return
+        for caller, edge in callers.items():
+            share = weight * edge[3] / total
+            if share < min_us:
+                continue
+            if caller in seen:
+                result[";".join(reversed(path))] += int(share)
+                continue
+            walk(caller, share, path + [label(caller)], seen | {caller})
+    
+    for func, (_, _, own_time, _, _) in entries.items():
+        weight = own_time * 1e6
+        if weight >= min_us:
+            walk(func, weight, [label(func)], {func})
+    return +result
+
+
+class ProfilingHooks(InstrumentationHooks):
+    """
+    Makes agent runs and tool calls profiling regions.
+    
+    runner.run() executes agents on its own thread, so the request regions
+    in main.py only see the caller waiting - these cover the actual work.
+    Regions are per invocation, and every call that entered one exits it -
+    even if profiling was switched off in between.
+    """
+    
+    def __init__(self, control: ProfilerControl):
+        self.control = control
+        self._entered = set()  # calls that entered a region and haven't exited it yet
+    
+    def _enter(self, call: Tuple, name: str) -> None:
+        self.control.enter(name, ("invocation", call[0]))
+        self._entered.add(call)
+    
+    def _exit(self, call: Tuple) -> None:
+        if call in self._entered:
+            self._entered.discard(call)
+            self.control.exit(("invocation", call[0]))
+    
+    @staticmethod
+    def _agent_call(callback_context) -> Tuple:
+        ids = context_ids(callback_context)
+        return ids["invocation_id"], "agent", ids["agent_name"]
+    
+    @staticmethod
+    def _tool_call(tool, tool_context) -> Tuple:
+        ids = context_ids(tool_context)
+        return ids["invocation_id"], "tool", getattr(tool_context, "function_call_id", None) or getattr(tool, "name", "")
+    
+    def before_agent(self, callback_context):
+        if self.control.enabled:
+            self._enter(self._agent_call(callback_context), f"agent:{getattr(callback_context, 'agent_name', '')}")
+        return None
+    
+    def after_agent(self, callback_context):
+        if self._entered:
+            self._exit(self._agent_call(callback_context))
+        return None
+    
+    def before_tool(self, tool, args, tool_context):
+        if self.control.enabled:
+            self._enter(self._tool_call(tool, tool_context), f"tool:{getattr(tool, 'name', tool)}")
+        return None
+    
+    def after_tool(self, tool, args, tool_context, tool_response):
+        if self._entered:
+            self._exit(self._tool_call(tool, tool_context))
+        return None
+
+
+_control = ProfilerControl()
+if PROFILE_SLOW_THRESHOLD:
+    _control.arm_slow(PROFILE_SLOW_THRESHOLD)
+
+
+def get_profiler() -> ProfilerControl:
+    """The process-wide profiler control."""
+    return _control
+
+
+@contextmanager
+def profiled(name: str) -> Iterator[None]:
+    """Mark a block as a profiling region (near-free when profiling is off)."""
+    if not _control.enabled:
+        yield
+        return
+    _control.enter(name)
+    try:
+        yield
+    finally:
+        _control.exit()
+
+
+def get_profiling_hooks() -> ProfilingHooks:
+    """Hooks that profile tool calls through the process-wide control."""
+    return ProfilingHooks(_control)
+
+
+def install_signal_handlers() -> bool:
+    """SIGUSR1 toggles a sampling capture, SIGUSR2 a cProfile one (Unix only)."""
+    if not hasattr(signal, "SIGUSR1") or threading.current_thread() is not threading.main_thread():
+        return False
+    signal.signal(signal.SIGUSR1, lambda signum, frame: print(f"\n[profile] {_control.toggle('sampling')}"))
+    signal.signal(signal.SIGUSR2, lambda signum, frame: print(f"\n[profile] {_control.toggle('cprofile')}"))
+    return True
+
+
+def handle_admin_command(command: str) -> str:
+    """
+    Run a "/profile ..." command from the interactive loop.
+    
+    /profile start [sampling|cprofile]
+    /profile stop
+    /profile status
+    /profile slow <seconds> [sampling|cprofile]   (0 turns it off)
+    """
+    words = command.split()[1:]
+    action = words[0] if words else "status"
+    try:
+        if action == "start":
+            return _control.start(words[1] if len(words) > 1 else "sampling")
+        if action == "stop":
+            path = _control.stop()
+            return f"Profile written to {path}" if path else "Not profiling"
+        if action == "slow":
+            return _control.arm_slow(float(words[1]) if len(words) > 1 else 0.0,
+                                     words[2] if len(words) > 2 else "sampling")
+        if action == "status":
+            return _control.status()
+    except ValueError as e:
+        return str(e)
+    return "Usage: /profile start [sampling|cprofile] | stop | status | slow <seconds> [mode]"
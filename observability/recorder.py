@@ -0,0 +1,225 @@
+"""
+Request Recorder
+
+Captures whole requests so they can be replayed offline (observability/replay.py):
+the user's input, the get_context() string we injected, the session state
+the agents started from, and then every agent run, model response and tool
+call (with arguments, results and timings) in the order they happened.
+
+Each request is one compact JSON line, appended to a gzip file
+(RECORDING_FILE). Gzip members concatenate, so appending is safe and the
+result still reads as one stream.
+
+Trace line:
+    {"v": 1, "user_id", "session_id", "ts", "input", "context", "message",
+     "state", "final", "duration_ms",
+     "events": [{"k": "agent"|"agent_end"|"model"|"tool", "t": ms since start, ...}]}
+"""
+
+import gzip
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from config.settings import USE_REQUEST_RECORDING, RECORDING_FILE
+from observability.instrumentation import InstrumentationHooks, context_ids
+
+TRACE_VERSION = 1
+
+
+def serialize_response(llm_response) -> Dict[str, Any]:
+    """LlmResponse -> JSON-safe dict (pydantic dump when available)."""
+    dump = getattr(llm_response, "model_dump", None)
+    if dump is not None:
+        return dump(mode="json", exclude_none=True)
+    
+    parts = []
+    content = getattr(llm_response, "content", None)
+    for part in getattr(content, "parts", None) or []:
+        call = getattr(part, "function_call", None)
+        if call is not None:
+            parts.append({"function_call": {"name": call.name, "args": dict(getattr(call, "args", None) or {})}})
+        elif getattr(part, "text", None) is not None:
+            parts.append({"text": part.text})
+    data: Dict[str, Any] = {"content": {"role": "model", "parts": parts}}
+    usage = getattr(llm_response, "usage_metadata", None)
+    if usage is not None:
+        data["usage_metadata"] = {
+            field: getattr(usage, field) for field in
+            ("prompt_token_count", "candidates_token_count", "cached_content_token_count")
+            if getattr(usage, field, None) is not None
+        }
+    return data
+
+
+def _json_safe(value: Any) -> Any:
+    return json.loads(json.dumps(value, default=str))
+
+
+class RecorderHooks(InstrumentationHooks):
+    """
+    Appends agent/model/tool events to the recording bound to the session,
+    or to the user - AgentTool runs each sub-agent in a session of its own.
+    
+    Model events are the responses the agents went on with - including ones
+    a hook answered without the model (budget stop, fan-out, single-flight)
+    or replaced - so a replay without those hooks gets the same answers.
+    """
+    
+    def __init__(self):
+        self._recordings: Dict[str, Dict[str, Any]] = {}
+        self._starts: Dict[Any, float] = {}
+        self._lock = threading.Lock()
+    
+    def bind(self, key: str, recording: Dict[str, Any]) -> None:
+        with self._lock:
+            self._recordings[key] = recording
+    
+    def unbind(self, key: str, recording: Optional[Dict[str, Any]] = None) -> None:
+        """Drop the recording bound to `key` (only if it's still `recording`, when given)."""
+        with self._lock:
+            if recording is None or self._recordings.get(key) is recording:
+                self._recordings.pop(key, None)
+    
+    def _recording(self, ids: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return self._recordings.get(ids["session_id"]) or self._recordings.get(ids["user_id"])
+    
+    def _add(self, recording: Dict[str, Any], kind: str, **fields: Any) -> None:
+        fields["k"] = kind
+        fields["t"] = round((time.perf_counter() - recording["_start"]) * 1000, 3)
+        recording["events"].append(fields)
+    
+    def before_agent(self, callback_context):
+        ids = context_ids(callback_context)
+        recording = self._recording(ids)
+        if recording is not None:
+            if recording["state"] is None:
+                state = getattr(callback_context, "state", None)
+                to_dict = getattr(state, "to_dict", None)
+                recording["state"] = _json_safe(to_dict() if to_dict else dict(state or {}))
+            self._add(recording, "agent", agent=ids["agent_name"])
+        return None
+    
+    def after_agent(self, callback_context):
+        ids = context_ids(callback_context)
+        recording = self._recording(ids)
+        if recording is not None:
+            self._add(recording, "agent_end", agent=ids["agent_name"])
+        return None
+    
+    def before_model(self, callback_context, llm_request):
+        ids = context_ids(callback_context)
+        self._starts[("model", ids["invocation_id"], ids["agent_name"])] = time.perf_counter()
+        return None
+    
+    def on_model_error(self, callback_context, llm_request, error):
+        ids = context_ids(callback_context)
+        self._starts.pop(("model", ids["invocation_id"], ids["agent_name"]), None)
+        return None
+    
+    def on_model_response(self, callback_context, llm_response):
+        ids = context_ids(callback_context)
+        start = self._starts.pop(("model", ids["invocation_id"], ids["agent_name"]), None)
+        recording = self._recording(ids)
+        if recording is not None:
+            self._add(
+                recording, "model", agent=ids["agent_name"],
+                ms=round((time.perf_counter() - start) * 1000, 3) if start else None,
+                response=serialize_response(llm_response)
+            )
+        return None
+    
+    def before_tool(self, tool, args, tool_context):
+        ids = context_ids(tool_context)
+        key = ("tool", ids["invocation_id"], getattr(tool_context, "function_call_id", None) or getattr(tool, "name", ""))
+        self._starts[key] = time.perf_counter()
+        return None
+    
+    def after_tool(self, tool, args, tool_context, tool_response):
+        ids = context_ids(tool_context)
+        key = ("tool", ids["invocation_id"], getattr(tool_context, "function_call_id", None) or getattr(tool, "name", ""))
+        start = self._starts.pop(key, None)
+        recording = self._recording(ids)
+        if recording is not None:
+            self._add(
+                recording, "tool", name=getattr(tool, "name", str(tool)), agent=ids["agent_name"],
+                args=_json_safe(args), response=_json_safe(tool_response),
+                ms=round((time.perf_counter() - start) * 1000, 3) if start else None
+            )
+        return None
+
+
+def append_trace(trace: Dict[str, Any], path: str = RECORDING_FILE) -> None:
+    """Append one request to the gzip JSONL recording file."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    line = json.dumps({k: v for k, v in trace.items() if not k.startswith("_")},
+                      separators=(",", ":"), default=str)
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def load_traces(path: str = RECORDING_FILE) -> List[Dict[str, Any]]:
+    """Read every recorded request (plain or gzipped JSONL)."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+_hooks: Optional[RecorderHooks] = None
+
+
+def get_recorder_hooks() -> RecorderHooks:
+    """Process-wide recorder hooks."""
+    global _hooks
+    if _hooks is None:
+        _hooks = RecorderHooks()
+    return _hooks
+
+
+@contextmanager
+def record_request(
+    user_id: str,
+    session_id: str,
+    query: str,
+    context: str = "",
+    message: str = "",
+    path: str = RECORDING_FILE,
+    enabled: bool = USE_REQUEST_RECORDING
+) -> Iterator[Dict[str, Any]]:
+    """
+    Record one request end to end. Set recording["final"] to the reply before leaving the block.
+    
+    Args:
+        user_id: Student name
+        session_id: ADK session id (what the callbacks see)
+        query: What the student typed
+        context: The get_context() string injected in front of it
+        message: The full message sent to the orchestrator
+        path: Where to append the trace
+        enabled: Record at all (defaults to USE_REQUEST_RECORDING)
+    """
+    recording: Dict[str, Any] = {
+        "v": TRACE_VERSION, "user_id": user_id, "session_id": session_id,
+        "ts": time.time(), "input": query, "context": context, "message": message or query,
+        "state": None, "final": None, "events": [], "_start": time.perf_counter()
+    }
+    if not enabled:
+        yield recording
+        return
+    
+    hooks = get_recorder_hooks()
+    hooks.bind(session_id, recording)
+    hooks.bind(user_id, recording)  # sub-agents (AgentTool) run in sessions of their own
+    try:
+        yield recording
+    finally:
+        hooks.unbind(session_id, recording)
+        hooks.unbind(user_id, recording)
+        recording["duration_ms"] = round((time.perf_counter() - recording["_start"]) * 1000, 3)
+        try:
+            append_trace(recording, path)
+        except Exception as e:
+            print(f"Error saving recording: {e}")
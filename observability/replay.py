@@ -0,0 +1,190 @@
+"""
+Replay Harness
+
+Re-runs recorded requests (observability/recorder.py) against a stub model
+that hands back the recorded responses in order. Everything except the
+model runs for real - routing, AgentTools, function tools, persistence,
+parsing - so timings are deterministic and need no network or API key.
+
+Usage:
+    python -m observability.replay output/recordings/requests.jsonl.gz --repeat 5
+    python -m observability.replay traces.jsonl.gz --write-baseline bench.json
+    python -m observability.replay traces.jsonl.gz --baseline bench.json --threshold 0.25
+
+Exits non-zero when a replay diverges from its recording (the agents asked
+for a model call that wasn't recorded, or gave a different final answer) or
+when a request got slower than the baseline by more than the threshold.
+Tool side effects land in a scratch directory, not the real output/ folder.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import deque
+from typing import Any, AsyncGenerator, Deque, Dict, List, Optional
+
+try:
+    from google.adk.models import BaseLlm, LlmResponse
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+    from google.genai.types import Content, Part
+except ImportError:
+    # ReplayScript works without ADK; running replays needs it
+    BaseLlm = object
+    LlmResponse = Runner = InMemorySessionService = Content = Part = None
+
+from config.settings import APP_NAME
+from observability.instrumentation import iter_agents
+from observability.recorder import load_traces
+
+
+class ReplayMismatch(Exception):
+    """The replayed agents did something the recording didn't."""
+
+
+class ReplayScript:
+    """Recorded model responses, queued per agent in the order they happened."""
+    
+    def __init__(self, trace: Dict[str, Any]):
+        self.queues: Dict[str, Deque[Dict[str, Any]]] = {}
+        for event in trace.get("events", []):
+            if event.get("k") == "model":
+                self.queues.setdefault(event.get("agent") or "", deque()).append(event["response"])
+    
+    def next_response(self, agent: str) -> Dict[str, Any]:
+        queue = self.queues.get(agent)
+        if not queue:
+            raise ReplayMismatch(f"{agent} made a model call that wasn't recorded")
+        return queue.popleft()
+    
+    def remaining(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+
+class ReplayLlm(BaseLlm):
+    """Stub model: answers from a ReplayScript instead of calling Gemini."""
+    
+    model: str = "replay"
+    agent_name: str = ""
+    script: Any = None
+    
+    async def generate_content_async(self, llm_request, stream: bool = False) -> AsyncGenerator:
+        yield LlmResponse.model_validate(self.script.next_response(self.agent_name))
+
+
+def install_replay_models(root_agent, script: ReplayScript) -> List[tuple]:
+    """Point every LLM agent at the script. Returns what restore_models() needs."""
+    saved = []
+    for agent in iter_agents(root_agent):
+        if hasattr(agent, "model"):
+            saved.append((agent, agent.model))
+            agent.model = ReplayLlm(agent_name=agent.name, script=script)
+    return saved
+
+
+def restore_models(saved: List[tuple]) -> None:
+    for agent, model in saved:
+        agent.model = model
+
+
+async def replay_trace(trace: Dict[str, Any], root_agent) -> Dict[str, Any]:
+    """
+    Replay one recorded request.
+    
+    Returns:
+        Timing and match info: ms, recorded_ms, final_matches, unused_responses, error
+    """
+    script = ReplayScript(trace)
+    saved = install_replay_models(root_agent, script)
+    user_id, session_id = trace["user_id"], trace["session_id"]
+    result: Dict[str, Any] = {"user_id": user_id, "input": trace.get("input", "")[:60],
+                              "recorded_ms": trace.get("duration_ms"), "error": None}
+    try:
+        session_service = InMemorySessionService()
+        await session_service.create_session(
+            app_name=APP_NAME, user_id=user_id, session_id=session_id, state=trace.get("state") or {}
+        )
+        runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=session_service)
+        
+        final_text = ""
+        start = time.perf_counter()
+        async for event in runner.run_async(
+            user_id=user_id, session_id=session_id,
+            new_message=Content(role="user", parts=[Part(text=trace["message"])])
+        ):
+            if event.is_final_response() and event.content and event.content.parts:
+                final_text = event.content.parts[0].text or ""
+        result["ms"] = round((time.perf_counter() - start) * 1000, 3)
+        result["final_matches"] = trace.get("final") is None or final_text == trace["final"]
+        result["unused_responses"] = script.remaining()
+    except ReplayMismatch as e:
+        result["error"] = str(e)
+    finally:
+        restore_models(saved)
+    return result
+
+
+def trace_key(trace: Dict[str, Any]) -> str:
+    return f"{trace['user_id']}@{trace.get('ts', 0):.3f}"
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded StudyBuddy requests with a stub model")
+    parser.add_argument("path", help="Recording file (.jsonl or .jsonl.gz)")
+    parser.add_argument("--repeat", type=int, default=3, help="Replays per request (median is reported)")
+    parser.add_argument("--baseline", help="Compare against a baseline written by --write-baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown vs. baseline (0.25 = 25%%)")
+    parser.add_argument("--write-baseline", help="Save median timings here")
+    args = parser.parse_args(argv)
+    
+    if Runner is None:
+        print("Replaying needs google-adk installed.")
+        return 2
+    
+    traces = load_traces(os.path.abspath(args.path))
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    write_baseline = os.path.abspath(args.write_baseline) if args.write_baseline else None
+    
+    from agents.study_buddy_agent import study_buddy_agent
+    
+    failures = 0
+    medians: Dict[str, float] = {}
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        os.chdir(scratch)  # tools write to relative output/ paths - keep them out of the real one
+        try:
+            for trace in traces:
+                runs = [asyncio.run(replay_trace(trace, study_buddy_agent)) for _ in range(max(1, args.repeat))]
+                key = trace_key(trace)
+                errors = [r["error"] for r in runs if r["error"]]
+                if errors or not all(r["final_matches"] for r in runs):
+                    failures += 1
+                    print(f"[MISMATCH] {key} {runs[0]['input']!r}: {errors[0] if errors else 'different final answer'}")
+                    continue
+                medians[key] = statistics.median(r["ms"] for r in runs)
+                line = f"{key:<40} {medians[key]:>9.2f} ms  (recorded {runs[0]['recorded_ms']} ms with model)"
+                previous = baseline.get(key)
+                if previous and medians[key] > previous * (1 + args.threshold):
+                    failures += 1
+                    line += f"  [REGRESSION vs {previous:.2f} ms]"
+                print(line)
+        finally:
+            os.chdir(original_cwd)
+    
+    if write_baseline:
+        with open(write_baseline, "w", encoding="utf-8") as f:
+            json.dump(medians, f, indent=2)
+    print(f"\n{len(traces)} request(s) replayed, {failures} problem(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
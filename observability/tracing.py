@@ -0,0 +1,390 @@
+"""
+Latency and Token Tracing
+
+Spans for the orchestrator, every AgentTool sub-agent call, every model call
+and every function tool, built from ADK callbacks (see instrumentation.py).
+
+Span tree for a typical request:
+    
+    request (run_query / interactive turn)
+    └── agent: study_buddy
+        ├── model: study_buddy            (latency, tokens, cache hits)
+        └── tool: tutor_agent             (AgentTool call)
+            └── agent: tutor_agent
+                └── model: tutor_agent
+
+Finished traces go to exporters: InMemoryCollector (tests, slow-request
+snapshots) and OTLPJsonFileExporter (OTLP/JSON lines, one trace per line).
+"""
+
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config.settings import TRACE_EXPORT_FILE
+from observability.instrumentation import InstrumentationHooks, context_ids
+from observability.logger import log_agent_call, log_tool_call, log_response
+
+
+class Span:
+    """One timed operation. Times are time.time_ns() values."""
+    
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id",
+                 "start_ns", "end_ns", "attributes", "status")
+    
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = attributes or {}
+        self.status = "ok"
+    
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+
+
+class InMemoryCollector:
+    """Keeps finished traces in memory (tests, slow-request snapshots)."""
+    
+    def __init__(self, max_traces: int = 100):
+        self.max_traces = max_traces
+        self.traces: Dict[str, List[Span]] = {}
+        self._lock = threading.Lock()
+    
+    def export(self, spans: List[Span]) -> None:
+        if not spans:
+            return
+        with self._lock:
+            self.traces[spans[0].trace_id] = spans
+            while len(self.traces) > self.max_traces:
+                self.traces.pop(next(iter(self.traces)))
+    
+    @property
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return [span for spans in self.traces.values() for span in spans]
+    
+    def clear(self) -> None:
+        with self._lock:
+            self.traces.clear()
+
+
+class OTLPJsonFileExporter:
+    """Appends each finished trace as one OTLP/JSON ExportTraceServiceRequest line."""
+    
+    _KINDS = {"request": 2, "agent": 1, "model": 3, "tool": 1}  # SERVER / INTERNAL / CLIENT
+    
+    def __init__(self, path: str = TRACE_EXPORT_FILE, service_name: str = "studybuddy"):
+        self.path = path
+        self.service_name = service_name
+        self._lock = threading.Lock()
+    
+    def export(self, spans: List[Span]) -> None:
+        if not spans:
+            return
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attr("service.name", self.service_name)]},
+                "scopeSpans": [{
+                    "scope": {"name": "studybuddy.tracing"},
+                    "spans": [self._otlp_span(span) for span in spans],
+                }],
+            }]
+        }
+        line = json.dumps(payload, default=str)
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    
+    def _otlp_span(self, span: Span) -> Dict[str, Any]:
+        data = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": f"{span.kind}: {span.name}",
+            "kind": self._KINDS.get(span.kind, 1),
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns or span.start_ns),
+            "attributes": [_otlp_attr(k, v) for k, v in span.attributes.items()],
+            "status": {"code": 2 if span.status == "error" else 1},
+        }
+        if span.parent_id:
+            data["parentSpanId"] = span.parent_id
+        return data
+
+
+def _otlp_attr(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class Tracer:
+    """
+    Creates spans and ships each trace to the exporters when its root ends.
+    
+    Spans are grouped per trace while open, so a trace is exported as one
+    unit (that's what the slow-request detector needs).
+    """
+    
+    def __init__(self, exporters: Optional[List[Any]] = None):
+        self.exporters = exporters if exporters is not None else []
+        self._open: Dict[str, List[Span]] = {}
+        self._roots: Dict[str, Span] = {}
+        self._lock = threading.Lock()
+    
+    def start_span(self, name: str, kind: str, parent: Optional[Span] = None, **attributes: Any) -> Span:
+        """Start a span; without a parent it starts a new trace."""
+        trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        span = Span(name, kind, trace_id, parent.span_id if parent else None, attributes)
+        with self._lock:
+            self._open.setdefault(trace_id, []).append(span)
+            if parent is None:
+                self._roots[trace_id] = span
+        return span
+    
+    def end_span(self, span: Span, status: str = "ok") -> None:
+        """End a span; ending a trace's root exports the whole trace."""
+        if span.end_ns is not None:
+            return
+        span.end_ns = time.time_ns()
+        span.status = status
+        finished = None
+        with self._lock:
+            if self._roots.get(span.trace_id) is span:
+                del self._roots[span.trace_id]
+                finished = self._open.pop(span.trace_id, [])
+        if finished:
+            for exporter in self.exporters:
+                try:
+                    exporter.export(finished)
+                except Exception as e:
+                    print(f"Error exporting trace: {e}")
+    
+    def trace_spans(self, trace_id: str) -> List[Span]:
+        """Spans of a trace that's still open."""
+        with self._lock:
+            return list(self._open.get(trace_id, []))
+    
+    @contextmanager
+    def span(self, name: str, kind: str = "request", parent: Optional[Span] = None, **attributes: Any) -> Iterator[Span]:
+        """Context manager version of start_span/end_span."""
+        span = self.start_span(name, kind, parent, **attributes)
+        try:
+            yield span
+        except BaseException:
+            self.end_span(span, status="error")
+            raise
+        self.end_span(span)
+
+
+class TracingHooks(InstrumentationHooks):
+    """
+    Turns ADK callbacks into spans.
+    
+    Agent spans parent onto the open AgentTool span with the same name for
+    the same user (that's how a sub-agent call links to its caller), or onto
+    the request span bound to the user's session via bind_request().
+    """
+    
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._agents: Dict[Tuple, Span] = {}
+        self._models: Dict[Tuple, Span] = {}
+        self._tools: Dict[Tuple, Span] = {}
+        self._requests: Dict[str, Span] = {}
+        self._lock = threading.Lock()
+    
+    def bind_request(self, key: str, span: Span) -> None:
+        """Attach agent spans for this user/session to a request span."""
+        with self._lock:
+            self._requests[key] = span
+    
+    def unbind_request(self, key: str) -> None:
+        with self._lock:
+            self._requests.pop(key, None)
+    
+    def before_agent(self, callback_context):
+        ids = context_ids(callback_context)
+        agent = ids["agent_name"]
+        with self._lock:
+            tool_span = self._find_tool_span(ids["user_id"], agent)
+            parent = (
+                tool_span
+                or self._requests.get(ids["session_id"])
+                or self._requests.get(ids["user_id"])
+            )
+        span = self.tracer.start_span(agent, "agent", parent, user_id=ids["user_id"])
+        with self._lock:
+            self._agents[(ids["invocation_id"], agent)] = span
+        if tool_span is not None:
+            caller = tool_span.attributes.get("agent", "")
+            log_agent_call(caller, agent, str(tool_span.attributes.get("request", "")))
+        return None
+    
+    def after_agent(self, callback_context):
+        ids = context_ids(callback_context)
+        with self._lock:
+            span = self._agents.pop((ids["invocation_id"], ids["agent_name"]), None)
+        if span is not None:
+            self.tracer.end_span(span)
+        return None
+    
+    def before_model(self, callback_context, llm_request):
+        ids = context_ids(callback_context)
+        with self._lock:
+            parent = self._agents.get((ids["invocation_id"], ids["agent_name"]))
+        span = self.tracer.start_span(
+            ids["agent_name"], "model", parent,
+            model=getattr(llm_request, "model", None) or ""
+        )
+        with self._lock:
+            self._models[(ids["invocation_id"], ids["agent_name"])] = span
+        return None
+    
+    def after_model(self, callback_context, llm_response):
+        ids = context_ids(callback_context)
+        key = (ids["invocation_id"], ids["agent_name"])
+        with self._lock:
+            span = self._models.pop(key, None)
+            agent_span = self._agents.get(key)
+        if span is None:
+            return None
+        
+        usage = _usage(llm_response)
+        span.attributes.update(usage)
+        span.attributes["latency_ms"] = round(span.duration_ms, 3)
+        if agent_span is not None:
+            for name, value in usage.items():
+                agent_span.attributes[name] = agent_span.attributes.get(name, 0) + value
+            agent_span.attributes["model_calls"] = agent_span.attributes.get("model_calls", 0) + 1
+        self.tracer.end_span(span, status="error" if getattr(llm_response, "error_code", None) else "ok")
+        
+        log_response(
+            ids["agent_name"] or "",
+            _response_text(llm_response),
+            usage.get("input_tokens", 0) + usage.get("output_tokens", 0) or None
+        )
+        return None
+    
+    def before_tool(self, tool, args, tool_context):
+        ids = context_ids(tool_context)
+        tool_name = getattr(tool, "name", str(tool))
+        with self._lock:
+            parent = self._agents.get((ids["invocation_id"], ids["agent_name"]))
+        span = self.tracer.start_span(
+            tool_name, "tool", parent,
+            agent=ids["agent_name"], user_id=ids["user_id"],
+            request=str((args or {}).get("request", ""))[:200]
+        )
+        with self._lock:
+            self._tools[self._tool_key(ids, tool_context, tool_name)] = span
+        log_tool_call(ids["agent_name"] or "", tool_name, args or {})
+        return None
+    
+    def after_tool(self, tool, args, tool_context, tool_response):
+        ids = context_ids(tool_context)
+        tool_name = getattr(tool, "name", str(tool))
+        with self._lock:
+            span = self._tools.pop(self._tool_key(ids, tool_context, tool_name), None)
+        if span is not None:
+            failed = isinstance(tool_response, dict) and tool_response.get("status") == "error"
+            self.tracer.end_span(span, status="error" if failed else "ok")
+        return None
+    
+    def _find_tool_span(self, user_id: Optional[str], name: str) -> Optional[Span]:
+        """Most recent open tool span called `name` for this user (caller holds the lock)."""
+        for span in reversed(list(self._tools.values())):
+            if span.name == name and span.attributes.get("user_id") == user_id:
+                return span
+        return None
+    
+    @staticmethod
+    def _tool_key(ids: Dict[str, Any], tool_context, tool_name: str) -> Tuple:
+        call_id = getattr(tool_context, "function_call_id", None)
+        return (ids["invocation_id"], call_id or tool_name)
+
+
+def _usage(llm_response) -> Dict[str, int]:
+    """Token counts from an LlmResponse's usage_metadata."""
+    usage = getattr(llm_response, "usage_metadata", None)
+    if usage is None:
+        return {}
+    return {
+        "input_tokens": getattr(usage, "prompt_token_count", None) or 0,
+        "output_tokens": getattr(usage, "candidates_token_count", None) or 0,
+        "cached_tokens": getattr(usage, "cached_content_token_count", None) or 0,
+    }
+
+
+def _response_text(llm_response) -> str:
+    content = getattr(llm_response, "content", None)
+    parts = getattr(content, "parts", None) or []
+    return "".join(getattr(part, "text", None) or "" for part in parts)
+
+
+_tracer: Optional[Tracer] = None
+_hooks: Optional[TracingHooks] = None
+
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer (in-memory collector + OTLP file exporter)."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer([InMemoryCollector(), OTLPJsonFileExporter()])
+    return _tracer
+
+
+def get_tracing_hooks() -> TracingHooks:
+    """Process-wide tracing hooks, bound to get_tracer()."""
+    global _hooks
+    if _hooks is None:
+        _hooks = TracingHooks(get_tracer())
+    return _hooks
+
+
+@contextmanager
+def trace_request(user_id: str, session_id: str, **attributes: Any) -> Iterator[Span]:
+    """
+    Root span for one request. Agent spans for this session nest under it.
+    
+    Usage:
+        with trace_request(student_name, session_id, query=query[:100]):
+            for event in runner.run(...): ...
+    """
+    hooks = get_tracing_hooks()
+    with hooks.tracer.span("request", "request", user_id=user_id, **attributes) as span:
+        hooks.bind_request(session_id, span)
+        try:
+            yield span
+        finally:
+            hooks.unbind_request(session_id)
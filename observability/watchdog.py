@@ -0,0 +1,157 @@
+"""
+Slow-Request Watchdog
+
+Wraps each request (run_query / one interactive turn). If it runs past
+SLOW_REQUEST_SLO_MS we save a snapshot to the slow log (SLOW_LOG_FILE,
+one JSON object per line) with what we need to explain the outlier:
+
+- the span tree for the request (agents, model calls, tools, tokens)
+- how big the injected get_context() string was
+- session history / quiz result counts
+- sizes of the student's files on disk (session, progress, reviews, ...)
+
+A timer also fires at the SLO while the request is still running, so a
+request that hangs still leaves a record of which spans were open.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from config.settings import (
+    SLOW_REQUEST_SLO_MS, SLOW_LOG_FILE, SESSIONS_DIR, PROGRESS_DIR,
+    SPACED_REPETITION_DIR, FLASHCARDS_DIR, USAGE_DIR
+)
+from observability.logger import log_event
+from observability.metrics import registry as metrics
+from observability.tracing import Span, get_tracer
+
+
+def span_tree(spans: List[Span]) -> List[Dict[str, Any]]:
+    """Nest spans under their parents (roots first, children in start order)."""
+    nodes = {}
+    for span in sorted(spans, key=lambda s: s.start_ns):
+        nodes[span.span_id] = {
+            "name": span.name,
+            "kind": span.kind,
+            "duration_ms": round(span.duration_ms, 1),
+            "open": span.end_ns is None,
+            "attributes": {k: v for k, v in span.attributes.items() if k != "response"},
+            "children": [],
+        }
+    roots = []
+    for span in sorted(spans, key=lambda s: s.start_ns):
+        parent = nodes.get(span.parent_id)
+        (parent["children"] if parent else roots).append(nodes[span.span_id])
+    return roots
+
+
+def persistence_sizes(student_name: str) -> Dict[str, Optional[int]]:
+    """Bytes on disk for each of a student's files (None if it doesn't exist)."""
+    paths = {
+        "session": os.path.join(SESSIONS_DIR, f"{student_name}_session.json"),
+        "progress": os.path.join(PROGRESS_DIR, f"{student_name}_progress.json"),
+        "topics": os.path.join(PROGRESS_DIR, f"{student_name}_topics.json"),
+        "reviews": os.path.join(SPACED_REPETITION_DIR, f"{student_name}_reviews.json"),
+        "flashcards": os.path.join(FLASHCARDS_DIR, f"{student_name}_cards.json"),
+        "usage": os.path.join(USAGE_DIR, f"{student_name}_usage.json"),
+    }
+    return {name: os.path.getsize(path) if os.path.exists(path) else None for name, path in paths.items()}
+
+
+class RequestWatch:
+    """State for one watched request."""
+    
+    def __init__(self, student_name: str, request_span: Optional[Span], context: str, session: Any):
+        self.student_name = student_name
+        self.request_span = request_span
+        self.context = context
+        self.session = session
+        self.start = time.perf_counter()
+        self.in_flight: Optional[Dict[str, Any]] = None
+        self.snapshot: Optional[Dict[str, Any]] = None
+    
+    @property
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+    
+    def spans(self) -> List[Span]:
+        if self.request_span is None:
+            return []
+        return get_tracer().trace_spans(self.request_span.trace_id)
+    
+    def on_slo_breach(self) -> None:
+        """Timer callback: note which spans are still open while it's slow."""
+        self.in_flight = {
+            "at_ms": round(self.elapsed_ms, 1),
+            "open_spans": [f"{s.kind}:{s.name}" for s in self.spans() if s.end_ns is None],
+        }
+        log_event("watchdog", "Request over SLO, still running", {
+            "student": self.student_name, **self.in_flight
+        }, level="warning")
+    
+    def build_snapshot(self, duration_ms: float, slo_ms: float) -> Dict[str, Any]:
+        session = self.session
+        return {
+            "ts": time.time(),
+            "student": self.student_name,
+            "duration_ms": round(duration_ms, 1),
+            "slo_ms": slo_ms,
+            "query": (self.request_span.attributes.get("query") if self.request_span else None),
+            "context_chars": len(self.context or ""),
+            "session_history_len": len(getattr(session, "session_history", []) or []),
+            "quiz_results_len": len(getattr(session, "quiz_results", []) or []),
+            "persistence_bytes": persistence_sizes(self.student_name),
+            "in_flight": self.in_flight,
+            "spans": span_tree(self.spans()),
+        }
+
+
+def write_slow_log(snapshot: Dict[str, Any], path: str = SLOW_LOG_FILE) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(snapshot, default=str, separators=(",", ":")) + "\n")
+
+
+@contextmanager
+def watch_request(
+    student_name: str,
+    request_span: Optional[Span] = None,
+    context: str = "",
+    session: Any = None,
+    slo_ms: float = SLOW_REQUEST_SLO_MS,
+    path: str = SLOW_LOG_FILE
+) -> Iterator[RequestWatch]:
+    """
+    Watch one request; write a slow-log snapshot if it runs past the SLO.
+    
+    Put it inside trace_request() so the span tree is still available:
+    
+        with trace_request(...) as span, watch_request(name, span, context, session):
+            for event in runner.run(...): ...
+    """
+    watch = RequestWatch(student_name, request_span, context, session)
+    timer = threading.Timer(slo_ms / 1000, watch.on_slo_breach) if slo_ms else None
+    if timer is not None:
+        timer.daemon = True
+        timer.start()
+    try:
+        yield watch
+    finally:
+        if timer is not None:
+            timer.cancel()
+        duration_ms = watch.elapsed_ms
+        if slo_ms and duration_ms >= slo_ms:
+            watch.snapshot = watch.build_snapshot(duration_ms, slo_ms)
+            metrics.counter("studybuddy_slow_requests_total", "Requests over the latency SLO").inc()
+            try:
+                write_slow_log(watch.snapshot, path)
+            except Exception as e:
+                print(f"Error writing slow log: {e}")
+            log_event("watchdog", "Slow request", {
+                "student": student_name, "duration_ms": round(duration_ms, 1),
+                "context_chars": watch.snapshot["context_chars"]
+            }, level="warning")
@@ -128,6 +128,193 @@ def test_spaced_repetition():
     return True
 
 
+def test_review_load_balancing():
+    """Test that load-aware scheduling moves reviews off busy days."""
+    print(" Testing review load balancing...\n")
+    
+    from memory.spaced_repetition import SpacedRepetitionScheduler
+    
+    scheduler = SpacedRepetitionScheduler()
+    start = datetime(2025, 1, 1, 9, 0)
+    
+    # Repetition 3 is a 14-day interval at 70% -> nominal Jan 15
+    nominal = scheduler.calculate_next_review(start, 3, 0.7)
+    busy_day = nominal.date().isoformat()
+    
+    balanced = scheduler.calculate_balanced_review(
+        start, 3, 0.7, day_load={busy_day: 5}
+    )
+    moved_by = abs((balanced - nominal).days)
+    print(f"  Nominal: {nominal.date()}  Balanced: {balanced.date()}")
+    
+    assert balanced.date().isoformat() != busy_day, "Review stayed on the busy day!"
+    assert 1 <= moved_by <= scheduler.fuzz_max_days, "Review moved too far!"
+    
+    # Short intervals are never fuzzed
+    short = scheduler.calculate_balanced_review(
+        start, 0, 0.7, day_load={(start.date()).isoformat(): 9}
+    )
+    assert short == scheduler.calculate_next_review(start, 0, 0.7), "1-day interval was fuzzed!"
+    
+    # Histogram counts booked reviews per day
+    day_load = scheduler.build_day_load([
+        {"next_review": "2025-01-15T09:00:00"},
+        {"next_review": "2025-01-15T18:00:00"},
+        {"next_review": "2025-01-16T09:00:00"},
+    ])
+    assert day_load == {"2025-01-15": 2, "2025-01-16": 1}, "Day-load histogram incorrect!"
+    
+    print("\n[OK] Review load balancing verified!")
+    
+    return True
+
+
+def test_flashcard_store():
+    """Test per-card scheduling, dedup and the due-card query."""
+    print(" Testing flashcard store...\n")
+    
+    from datetime import timedelta
+    from memory.card_store import FlashcardStore, card_id_for
+    
+    store = FlashcardStore()
+    start = datetime(2025, 1, 1, 9, 0)
+    
+    result = store.add_cards("Heaps", [
+        {"question": "What is a heap?", "answer": "A tree with the heap property"},
+        {"q": "Heap insert complexity?", "a": "O(log n)"},
+        {"question": "what is a HEAP", "answer": "Duplicate, different punctuation"},
+    ], now=start)
+    print(f"  Added: {result['added']}  Duplicates: {result['duplicates']}")
+    
+    assert result["added"] == 2 and result["duplicates"] == 1, "Dedup failed!"
+    assert card_id_for("What is a heap?") == card_id_for("what is a HEAP"), "Hash not normalized!"
+    
+    # Nothing is due straight away, both are due after the first interval
+    assert store.next_due(now=start) == [], "New cards due too early!"
+    later = start + timedelta(days=2)
+    assert store.count_due(now=later) == 2, "Cards not due after first interval!"
+    
+    # Reviewing a card well pushes it out, so only the other one stays due
+    first_id = card_id_for("What is a heap?")
+    store.review_card(first_id, 1.0, now=later)
+    due = store.next_due(limit=5, now=later)
+    print(f"  Due after one review: {[c['question'] for c in due]}")
+    assert [c["card_id"] for c in due] == [card_id_for("Heap insert complexity?")], "Due query wrong!"
+    
+    print("\n[OK] Flashcard store working!")
+    
+    return True
+
+
+def test_topic_registry():
+    """Test topic normalization, aliases and merging duplicate keys."""
+    print(" Testing topic registry...\n")
+    
+    from memory.topic_registry import (
+        TopicRegistry, normalize_topic, merge_progress_stats
+    )
+    
+    registry = TopicRegistry()
+    
+    assert normalize_topic("Binary Trees!") == normalize_topic("binary tree"), "Normalization failed!"
+    assert registry.canonicalize("Binary Search Trees") == "Binary Search Trees"
+    assert registry.canonicalize("BST basics") == "Binary Search Trees", "Default alias not applied!"
+    # Abbreviations that look plural, and canonicals spelt the way students write them
+    assert registry.resolve_key("DBMS") == registry.resolve_key("Database Management Systems"), "DBMS alias missed!"
+    assert registry.resolve_key("DSA") == registry.resolve_key("Data Structures and Algorithms"), "DSA alias missed!"
+    
+    registry.add_alias("Heapsort", "Heaps")
+    assert registry.canonicalize("heapsort") == "Heaps", "Manual alias not applied!"
+    
+    # Migration merges duplicate progress keys
+    progress = {
+        "binary search trees": {"attempts": 1, "last_score": 60, "best_score": 60,
+                                "total_answered": 5, "last_updated": "2025-01-01T10:00:00"},
+        "BST": {"attempts": 2, "last_score": 80, "best_score": 85,
+                "total_answered": 10, "last_updated": "2025-01-02T10:00:00"},
+    }
+    merged = registry.merge_keys(progress, merge_progress_stats)
+    print(f"  Merged keys: {list(merged)}")
+    
+    stats = merged["Binary Search Trees"]
+    assert list(merged) == ["Binary Search Trees"], "Duplicates not merged!"
+    assert stats["attempts"] == 3 and stats["total_answered"] == 15, "Counts not summed!"
+    assert stats["last_score"] == 80 and stats["best_score"] == 85, "Latest/best scores wrong!"
+    
+    suggestions = registry.suggest_merges(["Graph Traversal", "Graph Traversals BFS", "Sorting"], threshold=0.6)
+    assert suggestions and suggestions[0]["merge_into"] == "Graph Traversal", "No merge suggested!"
+    
+    print("\n[OK] Topic registry working!")
+    
+    return True
+
+
+def test_progress_aggregates():
+    """Test that running aggregates match a full recompute."""
+    print(" Testing progress aggregates...\n")
+    
+    from types import SimpleNamespace
+    from memory.progress_aggregates import rebuild_aggregates
+    from tools.progress_tools import record_quiz_result, get_progress_summary
+    
+    context = SimpleNamespace(state={})
+    results = [("Arrays", 90, 10), ("Graphs", 40, 5), ("Heaps", 75, 8),
+               ("Graphs", 65, 5), ("Tries", 30, 4), ("Arrays", 95, 10)]
+    for topic, score, total in results:
+        record_quiz_result(topic, score, total, "", context)
+    
+    state = context.state
+    incremental = state["progress_aggregates"]
+    assert incremental == rebuild_aggregates(state["progress"]), "Aggregates drifted!"
+    
+    summary = get_progress_summary(context)
+    print(f"  Summary: {summary['strengths']} / {summary['weaknesses']} avg {summary['average_score']}")
+    assert summary["total_attempts"] == 6 and summary["total_questions_answered"] == 42
+    assert summary["strengths"] == ["Arrays", "Heaps"], "Strengths wrong!"
+    assert summary["weaknesses"] == ["Graphs", "Tries"], "Weaknesses wrong!"
+    assert summary["average_score"] == round((95 + 65 + 75 + 30) / 4, 1), "Average wrong!"
+    
+    print("\n[OK] Progress aggregates working!")
+    
+    return True
+
+
+def test_score_history():
+    """Test the score time series, downsampling and derived fields."""
+    print(" Testing score history...\n")
+    
+    from datetime import timedelta
+    from config.settings import SCORE_HISTORY_MAX_POINTS
+    from memory.score_history import empty_history, append_score
+    
+    history = empty_history()
+    start = datetime(2025, 1, 1, 9, 0)
+    for i in range(100):
+        derived = append_score(history, 50 + i * 0.5, start + timedelta(hours=i))
+    
+    print(f"  Points kept: {len(history['s'])} for {history['n']} attempts")
+    print(f"  Derived: {derived}")
+    
+    assert len(history["s"]) <= SCORE_HISTORY_MAX_POINTS, "History not downsampled!"
+    assert sum(history["w"]) == 100, "Downsampling lost attempts!"
+    assert history["t"] == sorted(history["t"]), "Timestamps out of order!"
+    assert derived["trend_slope"] > 0, "Improving scores should have positive slope!"
+    assert derived["mastery"] > 0.5, "Consistent high scores should look mastered!"
+    
+    # Trend compares against the previous attempt, not the one just recorded
+    from types import SimpleNamespace
+    from tools.progress_tools import record_quiz_result
+    context = SimpleNamespace(state={})
+    record_quiz_result("Heaps", 50, 5, "", context)
+    result = record_quiz_result("Heaps", 80, 5, "", context)
+    assert result["trend"] == "improving", "Trend compared score to itself!"
+    assert "history" not in result["topic_stats"], "Raw history leaked into tool output!"
+    
+    print("\n[OK] Score history working!")
+    
+    return True
+
+
 def test_session_manager():
     """Test session creation and persistence."""
     print(" Testing session manager...\n")
@@ -146,8 +333,13 @@ def test_session_manager():
     print(f"  Current topic: {session.current_topic}")
     print(f"  Quiz results: {len(session.quiz_results)}")
     
-    # Save
-    saved = session.save()
+    # Save, with the flashcards the tools collected in ADK state
+    from memory.card_store import FlashcardStore
+    from memory.session_manager import ProgressTracker
+    
+    cards = FlashcardStore()
+    cards.add_cards("Test Topic", [{"question": "What is a test?", "answer": "A check"}])
+    saved = session.save({"flashcards": cards.cards})
     print(f"  Save successful: {saved}")
     
     # Load
@@ -157,18 +349,1278 @@ def test_session_manager():
     # Verify
     assert loaded.current_topic == "Test Topic", "Topic not preserved!"
     assert len(loaded.quiz_results) == 1, "Quiz results not preserved!"
+    if saved:
+        restored = ProgressTracker(test_student).as_state()["flashcards"]
+        assert restored == cards.cards, "Flashcards not saved with the session!"
     
     # Cleanup
     session_path = f"output/sessions/{test_student}_session.json"
-    if os.path.exists(session_path):
-        os.remove(session_path)
-        print("  Cleaned up test file")
+    for path in (session_path, f"output/flashcards/{test_student}_cards.json"):
+        if os.path.exists(path):
+            os.remove(path)
+    print("  Cleaned up test files")
     
     print("\n[OK] Session manager working!")
     
     return True
 
 
+def test_logging_pipeline():
+    """Test that log calls come out as JSON lines via the background writer."""
+    print(" Testing logging pipeline...\n")
+    
+    import logging
+    from observability import pipeline
+    
+    lines = []
+    
+    class ListSink(logging.Handler):
+        def emit(self, record):
+            lines.append(self.format(record))
+    
+    sink = ListSink()
+    sink.setFormatter(pipeline.JsonLineFormatter())
+    pipeline.configure(sinks=[sink], level="debug", sample_rates={"debug": 0.0})
+    try:
+        pipeline.emit("tool_call", "info", agent="quiz_agent", tool="record_quiz_result")
+        pipeline.emit("noise", "debug", detail="sampled out")
+        pipeline.emit("agent_event", "success", agent="tutor_agent", action="done")
+        pipeline.flush()
+    finally:
+        pipeline.shutdown()
+    
+    records = [json.loads(line) for line in lines]
+    print(f"  Records written: {len(records)}")
+    
+    assert [r["event"] for r in records] == ["tool_call", "agent_event"], "Wrong records written!"
+    assert records[0]["tool"] == "record_quiz_result", "Fields missing from JSON!"
+    assert records[1]["level"] == "success", "Custom level lost!"
+    
+    print("\n[OK] Logging pipeline working!")
+    
+    return True
+
+
+def test_tracing_spans():
+    """Test that ADK-style callbacks build a linked span tree with token counts."""
+    print(" Testing tracing spans...\n")
+    
+    from types import SimpleNamespace as NS
+    from observability.tracing import Tracer, InMemoryCollector, TracingHooks
+    
+    collector = InMemoryCollector()
+    tracer = Tracer([collector])
+    hooks = TracingHooks(tracer)
+    
+    def context(agent, invocation):
+        return NS(agent_name=agent, invocation_id=invocation, user_id="_Tracer",
+                  _invocation_context=NS(session=NS(id="_Tracer_session")),
+                  function_call_id="call-1")
+    
+    def response(prompt, output):
+        return NS(usage_metadata=NS(prompt_token_count=prompt, candidates_token_count=output,
+                                    cached_content_token_count=0), content=None)
+    
+    root, sub = context("study_buddy", "inv-1"), context("tutor_agent", "inv-2")
+    tutor_tool = NS(name="tutor_agent")
+    
+    with tracer.span("request", user_id="_Tracer") as request_span:
+        hooks.bind_request("_Tracer_session", request_span)
+        hooks.before_agent(root)
+        hooks.before_model(root, NS(model="test-model"))
+        hooks.after_model(root, response(100, 10))
+        hooks.before_tool(tutor_tool, {"request": "Explain heaps"}, root)
+        hooks.before_agent(sub)
+        hooks.before_model(sub, NS(model="test-model"))
+        hooks.after_model(sub, response(400, 300))
+        hooks.after_agent(sub)
+        hooks.after_tool(tutor_tool, {}, root, {"result": "..."})
+        hooks.after_agent(root)
+    
+    spans = {(s.kind, s.name): s for s in collector.spans}
+    print(f"  Spans: {sorted(spans)}")
+    
+    assert len(spans) == 6, "Expected request, 2 agents, 2 models, 1 tool!"
+    assert spans[("agent", "tutor_agent")].parent_id == spans[("tool", "tutor_agent")].span_id, \
+        "Sub-agent not linked to its AgentTool call!"
+    assert spans[("agent", "study_buddy")].parent_id == request_span.span_id, "Orchestrator not under request!"
+    assert spans[("model", "tutor_agent")].attributes["output_tokens"] == 300, "Tokens not recorded!"
+    assert spans[("agent", "tutor_agent")].attributes["input_tokens"] == 400, "Tokens not rolled up!"
+    assert len({s.trace_id for s in collector.spans}) == 1, "Spans split across traces!"
+    
+    print("\n[OK] Tracing spans working!")
+    
+    return True
+
+
+def test_metrics():
+    """Test counters, histograms and the Prometheus exposition."""
+    print(" Testing metrics...\n")
+    
+    import threading
+    import time
+    from types import SimpleNamespace as NS
+    from observability.metrics import MetricsRegistry, MetricsHooks, Histogram
+    
+    registry = MetricsRegistry()
+    counter = registry.counter("test_total", "A test counter", route="quiz")
+    
+    def bump():
+        for _ in range(10000):
+            counter.inc()
+    
+    threads = [threading.Thread(target=bump) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert counter.value == 40000, "Counter lost increments across threads!"
+    
+    histogram = registry.histogram("test_seconds", "A test histogram")
+    for i in range(1, 1001):
+        histogram.observe(i / 1000)
+    p50, p99 = histogram.quantile(0.5), histogram.quantile(0.99)
+    print(f"  p50={p50:.3f}s  p99={p99:.3f}s")
+    assert abs(p50 - 0.5) / 0.5 < 0.07 and abs(p99 - 0.99) / 0.99 < 0.07, "Quantiles off!"
+    
+    hooks = MetricsHooks(registry)
+    ctx = NS(agent_name="tutor_agent", invocation_id="inv-1", user_id="_Metrics", function_call_id="c1")
+    hooks.before_tool(NS(name="quiz_agent"), {}, ctx)
+    hooks.after_tool(NS(name="quiz_agent"), {}, ctx, {})
+    hooks.before_model(ctx, None)
+    hooks.after_model(ctx, NS(usage_metadata=NS(prompt_token_count=120, candidates_token_count=30,
+                                                cached_content_token_count=0)))
+    
+    text = registry.render_prometheus()
+    assert 'studybuddy_route_requests_total{route="quiz"} 1' in text, "Route not counted!"
+    assert 'studybuddy_llm_tokens_total{agent="tutor_agent",kind="input"} 120' in text, "Tokens not counted!"
+    assert 'test_seconds_bucket{le="+Inf"} 1000' in text, "Histogram not exposed!"
+    
+    start = time.perf_counter()
+    for _ in range(100000):
+        counter.inc()
+    per_call = (time.perf_counter() - start) / 100000 * 1e6
+    print(f"  Counter.inc: {per_call:.2f}us per call")
+    
+    print("\n[OK] Metrics working!")
+    
+    return True
+
+
+def test_token_accounting():
+    """Test per-student token accounting, budgets and the usage report."""
+    print(" Testing token accounting...\n")
+    
+    import shutil
+    import tempfile
+    from types import SimpleNamespace as NS
+    from observability.accounting import TokenAccountant, TokenAccountingHooks
+    
+    directory = tempfile.mkdtemp()
+    try:
+        accountant = TokenAccountant(directory=directory, daily_budget=1000)
+        hooks = TokenAccountingHooks(accountant)
+        
+        ctx = NS(agent_name="tutor_agent", invocation_id="inv-1", user_id="_Budget")
+        request = NS(contents=[NS(parts=[NS(text="Explain heaps")])])
+        answer = NS(usage_metadata=NS(prompt_token_count=500, candidates_token_count=300,
+                                      cached_content_token_count=100),
+                    content=NS(parts=[NS(text="A heap is...", function_call=None)]))
+        
+        assert hooks.before_model(ctx, request) is None, "Blocked a student under budget!"
+        hooks.after_model(ctx, answer)
+        accountant.record("_Budget", "quiz_agent", "record_quiz_result", 200, 50)
+        
+        print(f"  Used today: {accountant.used_today('_Budget')} / {accountant.daily_budget}")
+        assert accountant.used_today("_Budget") == 1050, "Usage not summed!"
+        assert accountant.over_budget("_Budget"), "Budget not enforced!"
+        assert hooks.before_model(ctx, request) is answer, "Cached answer not replayed over budget!"
+        accountant.record("_Other", "tutor_agent", None, 2000, 0)
+        other = NS(agent_name="tutor_agent", invocation_id="inv-3", user_id="_Other", state={})
+        hooks.make_response = lambda text: text
+        assert hooks.before_model(other, request) is not answer, "Another student's cached answer was replayed!"
+        
+        # Calls that never reach after_model (short-circuited further down) don't pile up
+        capped = TokenAccountingHooks(accountant, max_pending=10)
+        for i in range(50):
+            capped.before_model(NS(agent_name="quiz_agent", invocation_id=f"q-{i}", user_id="_Fresh"), request)
+        assert len(capped._pending_keys) == 10, "Pending keys grew without bound!"
+        
+        # Nothing cached for this prompt: the due flashcards in session state are the answer
+        from datetime import datetime, timedelta
+        from memory.card_store import FlashcardStore
+        cards = FlashcardStore()
+        cards.add_cards("Heaps", [{"question": "What is a min-heap?", "answer": "Parent <= children"}],
+                        now=datetime.now() - timedelta(days=30))
+        offline = TokenAccountingHooks(accountant, make_response=lambda text: text)
+        ctx_with_cards = NS(agent_name="tutor_agent", invocation_id="inv-2", user_id="_Budget",
+                            state={"flashcards": cards.cards})
+        reply = offline.before_model(ctx_with_cards, NS(contents=[NS(parts=[NS(text="Explain tries")])]))
+        print(f"  Offline reply: {reply.splitlines()[-1]}")
+        assert "What is a min-heap?" in reply, "Due cards from state missing from the offline reply!"
+        
+        accountant.flush()
+        reloaded = TokenAccountant(directory=directory)
+        rows = {r["tool"]: r for r in reloaded.report(by="tool")}
+        print(f"  Report by tool: {sorted(rows)}")
+        assert rows["record_quiz_result"]["input_tokens"] == 200, "Usage not persisted!"
+        assert rows["-"]["cached_tokens"] == 100, "Cached tokens not tracked!"
+        assert rows["-"]["cost_usd"] > 0, "Cost not estimated!"
+        
+        # Each row is priced at the model it ran on
+        from config.settings import MODEL_TIERS
+        from observability.accounting import estimate_cost
+        priced = TokenAccountant(directory=tempfile.mkdtemp(dir=directory))
+        priced.record("_Tiers", "study_buddy", None, 1000, 100, model=MODEL_TIERS["fast"])
+        priced.record("_Tiers", "tutor_agent", None, 1000, 100, model=MODEL_TIERS["strong"])
+        by_model = {r["model"]: r["cost_usd"] for r in priced.report(by="model")}
+        assert by_model == {
+            model: round(estimate_cost(1000, 100, model=model), 4)
+            for model in (MODEL_TIERS["fast"], MODEL_TIERS["strong"])
+        }, by_model
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    
+    print("\n[OK] Token accounting working!")
+    
+    return True
+
+
+def test_profiling():
+    """Test runtime-toggled profiling and collapsed-stack output."""
+    print(" Testing profiling...\n")
+    
+    import shutil
+    import tempfile
+    import time
+    from types import SimpleNamespace as NS
+    from observability.profiling import ProfilerControl, ProfilingHooks
+    
+    def busy_work():
+        deadline = time.perf_counter() + 0.1
+        while time.perf_counter() < deadline:
+            sum(range(1000))
+    
+    directory = tempfile.mkdtemp()
+    try:
+        control = ProfilerControl(directory=directory, interval=0.001)
+        for mode in ("sampling", "cprofile"):
+            control.start(mode)
+            control.enter("request")
+            busy_work()
+            control.exit()
+            path = control.stop()
+            
+            with open(path) as f:
+                lines = f.read().splitlines()
+            print(f"  {mode}: {len(lines)} stacks, e.g. {lines[0][:60]}")
+            assert lines, f"No stacks captured in {mode} mode!"
+            assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines), "Not collapsed-stack format!"
+            assert any("busy_work" in line for line in lines), "Hot function missing!"
+        
+        control.arm_slow(0.05)
+        control.enter("slow_request")
+        busy_work()
+        control.exit()
+        control.arm_slow(0)
+        assert any("slow_slow_request" in name for name in os.listdir(directory)), "Slow request not dumped!"
+        assert not control.enabled, "Profiler still enabled after stopping!"
+        
+        # Agent calls interleave on one thread: a region per invocation, and
+        # "/profile stop" mid-request still closes what was entered
+        hooks = ProfilingHooks(control)
+        first, second = (NS(invocation_id=i, agent_name="study_buddy", user_id="ana") for i in ("inv-1", "inv-2"))
+        control.start("sampling")
+        hooks.before_agent(first)
+        hooks.before_agent(second)
+        assert len(control._regions) == 2, "Interleaved invocations shared a region!"
+        control.stop()
+        hooks.after_agent(first)
+        hooks.after_agent(second)
+        assert not control._regions, "Regions left open after stopping mid-request!"
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    
+    print("\n[OK] Profiling working!")
+    
+    return True
+
+
+def test_request_recorder():
+    """Test recording a request and scripting its model responses for replay."""
+    print(" Testing request recorder...\n")
+    
+    import asyncio
+    import shutil
+    import tempfile
+    from types import SimpleNamespace as NS
+    from observability.accounting import TokenAccountant, TokenAccountingHooks
+    from observability.instrumentation import register_hooks, unregister_hooks, _before_model_callback
+    from observability.recorder import get_recorder_hooks, record_request, load_traces
+    from observability.replay import ReplayScript, ReplayMismatch
+    
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "requests.jsonl.gz")
+    hooks = register_hooks(get_recorder_hooks())
+    try:
+        ctx = NS(agent_name="study_buddy", invocation_id="inv-1", user_id="_Recorder",
+                 _invocation_context=NS(session=NS(id="_Recorder_session")),
+                 function_call_id="call-1", state={"current_topic": "Heaps"})
+        # AgentTool runs quiz_agent in a session of its own
+        sub = NS(agent_name="quiz_agent", invocation_id="inv-2", user_id="_Recorder",
+                 _invocation_context=NS(session=NS(id="agent-tool-session")), state={})
+        call = NS(usage_metadata=None, content=NS(parts=[NS(function_call=NS(name="quiz_agent", args={"request": "Quiz me"}))]))
+        quiz = NS(usage_metadata=None, content=NS(parts=[NS(function_call=None, text="Q1: ...")]))
+        reply = NS(usage_metadata=None, content=NS(parts=[NS(function_call=None, text="Score: 80%")]))
+        
+        for _ in range(2):
+            with record_request("_Recorder", "_Recorder_session", "quiz me", "Current topic: Heaps",
+                                "Context: ...", path=path, enabled=True) as recording:
+                hooks.before_agent(ctx)
+                hooks.before_model(ctx, None)
+                hooks.on_model_response(ctx, call)
+                hooks.before_tool(NS(name="quiz_agent"), {"request": "Quiz me"}, ctx)
+                hooks.before_agent(sub)
+                hooks.before_model(sub, None)
+                hooks.on_model_response(sub, quiz)
+                hooks.after_agent(sub)
+                hooks.after_tool(NS(name="quiz_agent"), {"request": "Quiz me"}, ctx, {"result": "80%"})
+                hooks.before_model(ctx, None)
+                hooks.on_model_response(ctx, reply)
+                hooks.after_agent(ctx)
+                recording["final"] = "Score: 80%"
+        
+        traces = load_traces(path)
+        print(f"  Recorded {len(traces)} requests, events: {[e['k'] for e in traces[0]['events']]}")
+        assert len(traces) == 2, "Appending to the gzip file lost a request!"
+        trace = traces[0]
+        assert trace["context"] == "Current topic: Heaps" and trace["state"] == {"current_topic": "Heaps"}
+        assert [e["k"] for e in trace["events"]] == [
+            "agent", "model", "agent", "model", "agent_end", "tool", "model", "agent_end"
+        ], "Sub-agent events not recorded!"
+        assert trace["events"][5]["args"] == {"request": "Quiz me"}, "Tool args not recorded!"
+        assert not get_recorder_hooks()._recordings, "Recording left bound!"
+        
+        script = ReplayScript(trace)
+        assert script.next_response("quiz_agent")["content"]["parts"][0]["text"] == "Q1: ..."
+        first = script.next_response("study_buddy")
+        assert first["content"]["parts"][0]["function_call"]["name"] == "quiz_agent", "Wrong replay order!"
+        assert script.next_response("study_buddy")["content"]["parts"][0]["text"] == "Score: 80%"
+        try:
+            script.next_response("study_buddy")
+            assert False, "Unrecorded model call not caught!"
+        except ReplayMismatch:
+            pass
+        
+        # A call a hook answers without the model (here: over budget) is recorded with that answer,
+        # so a replay - where the model is asked instead - gets it too
+        accountant = TokenAccountant(directory, daily_budget=10)
+        accountant.record("_Recorder", "study_buddy", None, 100, 0)
+        budget = TokenAccountingHooks(accountant, make_response=lambda text: NS(
+            usage_metadata=None, content=NS(parts=[NS(function_call=None, text=text)])
+        ))
+        unregister_hooks(hooks)
+        register_hooks(budget)  # ahead of the recorder, like in main.py
+        register_hooks(hooks)
+        try:
+            with record_request("_Recorder", "_Recorder_session", "hi", path=path, enabled=True):
+                stopped = asyncio.run(_before_model_callback(ctx, NS(contents=[], model="m")))
+        finally:
+            unregister_hooks(budget)
+        assert "study budget" in stopped.content.parts[0].text
+        script = ReplayScript(load_traces(path)[-1])
+        replayed = script.next_response("study_buddy")["content"]["parts"][0]["text"]
+        assert replayed == stopped.content.parts[0].text, "Short-circuited call missing from the recording!"
+    finally:
+        unregister_hooks(hooks)
+        shutil.rmtree(directory, ignore_errors=True)
+    
+    print("\n[OK] Request recorder working!")
+    
+    return True
+
+
+def test_benchmark_runner():
+    """Test benchmark timing and baseline regression checks."""
+    print(" Testing benchmark runner...\n")
+    
+    from benchmarks.runner import measure, compare, case_name, REFERENCE_CASE
+    
+    seconds = measure(lambda: sum(range(100)), min_time=0.01)
+    print(f"  sum(range(100)): {seconds * 1e6:.2f}us")
+    assert 0 < seconds < 0.01, "Timing looks wrong!"
+    
+    assert case_name("session.save", {"attempts": 10}) == "session.save[attempts=10]"
+    baseline = {"a": 1.0, "b": 1.0}
+    regressions = compare({"a": 1.1, "b": 1.5, "c": 9.0}, baseline, threshold=0.25)
+    assert [r[0] for r in regressions] == ["b"], "Regression threshold not applied!"
+    
+    # A machine twice as slow (per the reference workload) isn't a regression
+    slower = {REFERENCE_CASE: 2.0, "a": 2.1, "b": 3.0}
+    assert compare(slower, {**baseline, REFERENCE_CASE: 1.0}, threshold=0.25) == [("b", 2.0, 3.0)]
+    # Sub-millisecond cases get more slack than the threshold
+    assert compare({"tiny": 150e-6, "tinier": 250e-6}, {"tiny": 100e-6, "tinier": 100e-6}, threshold=0.25) == [
+        ("tinier", 100e-6, 250e-6)]
+    assert compare({"ns": 900e-9}, {"ns": 300e-9}) == [], "Sub-microsecond noise counted!"
+    
+    print("\n[OK] Benchmark runner working!")
+    
+    return True
+
+
+def test_fake_gemini_script():
+    """Test the fake Gemini backend's latency models and scripted tool calls."""
+    print(" Testing fake Gemini backend...\n")
+    
+    import random
+    from types import SimpleNamespace as NS
+    from loadtest.fake_gemini import LatencyModel, RequestInfo, plan_response
+    
+    latency = LatencyModel("lognormal:800:0.5", seed=1)
+    samples = [latency.sample_ms() for _ in range(2000)]
+    median = sorted(samples)[1000]
+    print(f"  lognormal:800:0.5 median: {median:.0f}ms")
+    assert 700 < median < 900, "Lognormal median off!"
+    assert LatencyModel("fixed:25").sample_ms() == 25
+    
+    info = RequestInfo("quiz", topic="Graphs", rng=random.Random(0))
+    user = NS(role="user", parts=[NS(text="Quiz me on graphs", function_response=None)])
+    call = NS(role="model", parts=[NS(text=None, function_call=NS(name="x"), function_response=None)])
+    answer = NS(role="user", parts=[NS(text=None, function_response=NS(name="x"))])
+    
+    kind, (name, args) = plan_response("study_buddy", [user], info)
+    assert (kind, name) == ("call", "quiz_agent"), "Orchestrator didn't route to quiz_agent!"
+    kind, (name, args) = plan_response("quiz_agent", [user], info)
+    assert name == "record_quiz_result" and args["topic"] == "Graphs", "Quiz agent didn't record!"
+    kind, (name, _) = plan_response("quiz_agent", [user, call, answer], info)
+    assert name == "update_spaced_repetition_schedule", "Second scripted call not played!"
+    kind, text = plan_response("quiz_agent", [user, call, answer, call, answer], info)
+    assert kind == "text", "Agent didn't answer after its script!"
+    print(f"  quiz script: study_buddy -> quiz_agent -> record_quiz_result -> ... -> '{text[:30]}...'")
+    
+    print("\n[OK] Fake Gemini backend working!")
+    
+    return True
+
+
+def test_slow_request_watchdog():
+    """Test that a request over the SLO leaves a slow-log snapshot."""
+    print(" Testing slow-request watchdog...\n")
+    
+    import json
+    import tempfile
+    import time
+    from types import SimpleNamespace as NS
+    from observability.tracing import get_tracer
+    from observability.watchdog import watch_request
+    
+    path = os.path.join(tempfile.mkdtemp(), "slow.jsonl")
+    tracer = get_tracer()
+    session = NS(session_history=[{"type": "query"}] * 3, quiz_results=[])
+    
+    with tracer.span("request", "request", query="quiz me") as root:
+        with watch_request("_test_slow", root, "x" * 120, session, slo_ms=20, path=path) as watch:
+            with tracer.span("study_buddy", "agent", parent=root):
+                time.sleep(0.04)
+    
+    assert watch.in_flight is not None, "SLO timer didn't fire!"
+    print(f"  open at SLO: {watch.in_flight['open_spans']}")
+    with open(path, "r", encoding="utf-8") as f:
+        snapshot = json.loads(f.readline())
+    assert snapshot["context_chars"] == 120 and snapshot["session_history_len"] == 3
+    assert snapshot["spans"][0]["children"][0]["name"] == "study_buddy", "Span tree missing!"
+    assert "session" in snapshot["persistence_bytes"]
+    print(f"  snapshot: {snapshot['duration_ms']}ms, spans={snapshot['spans'][0]['name']}")
+    
+    with watch_request("_test_slow", root, "", session, slo_ms=10000, path=path) as fast:
+        pass
+    assert fast.snapshot is None, "Fast request was logged!"
+    os.remove(path)
+    
+    print("\n[OK] Slow-request watchdog working!")
+    
+    return True
+
+
+def test_ops_dashboard():
+    """Test the dashboard's metrics parsing, windowed rates and percentiles."""
+    print(" Testing ops dashboard data...\n")
+    
+    from observability.metrics import MetricsRegistry
+    from observability.dashboard import DashboardData
+    
+    registry = MetricsRegistry()
+    data = DashboardData(registry.render_prometheus, window=60)
+    calls = registry.counter("studybuddy_llm_calls_total", agent="tutor_agent")
+    latency = registry.histogram("studybuddy_llm_seconds", agent="tutor_agent")
+    for _ in range(100):
+        latency.observe(5.0)  # before the window - shouldn't show in percentiles
+    data.refresh(now=1000.0)
+    
+    for i in range(100):
+        calls.inc()
+        latency.observe(0.1 if i < 90 else 2.0)
+    registry.counter("studybuddy_cache_lookups_total", cache="prefix", result="hit").inc(3)
+    registry.counter("studybuddy_cache_lookups_total", cache="prefix", result="miss").inc(1)
+    data.refresh(now=1030.0)
+    
+    calls_per_min = data.rate("studybuddy_llm_calls_total", 60, agent="tutor_agent")
+    p50 = data.quantile("studybuddy_llm_seconds", 0.5, agent="tutor_agent")
+    p95 = data.quantile("studybuddy_llm_seconds", 0.95, agent="tutor_agent")
+    print(f"  tutor_agent: {calls_per_min:.0f} calls/min, p50={p50 * 1000:.0f}ms, p95={p95 * 1000:.0f}ms")
+    assert abs(calls_per_min - 200) < 1e-6, "Rate over the window is wrong!"
+    assert 0.1 <= p50 < 0.11 and 2.0 <= p95 < 2.2, "Windowed percentiles are wrong!"  # bucket upper bounds
+    assert data.cache_ratios() == [("prefix", 3.0, 1.0)]
+    
+    print("\n[OK] Ops dashboard data working!")
+    
+    return True
+
+
+def test_context_builder():
+    """Test query-ranked, token-budgeted context building."""
+    print(" Testing context builder...\n")
+    
+    from memory.session_manager import StudyBuddySession
+    from memory.context_builder import ContextBuilder, estimate_tokens
+    
+    session = StudyBuddySession("_test_context")
+    session.current_topic = "Binary Trees"
+    session.add_quiz_result("Binary Trees", 55, 5)
+    state = {
+        "progress": {
+            "Recursion": {"last_score": 45, "best_score": 60, "mastery": 0.35},
+            "Hash Tables": {"last_score": 95, "best_score": 95, "mastery": 0.92},
+            **{f"Filler Subject {i}": {"last_score": 50, "best_score": 50, "mastery": 0.5} for i in range(200)},
+        },
+        "spaced_repetition": {"Graphs": {"repetition_number": 0, "last_review": datetime.now().isoformat(),
+                                         "next_review": "2020-01-01T00:00:00", "performance_history": []}},
+    }
+    builder = ContextBuilder()
+    
+    review = builder.build(session, "what should I review?", state)
+    print(f"  'what should I review?' ->\n    " + review.replace("\n", "\n    "))
+    assert review.startswith("Student: _test_context")
+    assert "Review due: Graphs" in review.split("\n")[1], "Due review not ranked first!"
+    assert "Currently studying: Binary Trees" in review, "Weak topics crowded out the rest!"
+    
+    hashing = builder.build(session, "explain hash tables", state, budget=40)
+    assert "Hash Tables" in hashing, "Query-relevant topic left out!"
+    assert estimate_tokens(hashing) <= 40, "Budget exceeded!"
+    assert "Filler Subject" not in hashing
+    
+    assert builder.misses == 1 and builder.hits == 1, "Facts not memoized!"
+    # A new question shows up without re-collecting the rest
+    session.add_interaction("query", "explain hash tables")
+    session.add_interaction("response", "Hash tables map keys to buckets...")
+    again = builder.build(session, "again", state)
+    assert "Recently asked: explain hash tables" in again, again
+    assert builder.misses == 1, "Asking something new threw away the facts!"
+    # Every turn's state is a fresh copy from the session service - same content, same facts
+    import copy
+    builder.build(session, "again", copy.deepcopy(state))
+    assert builder.misses == 1, "Copied state missed the cache!"
+    # ...what they're built from does
+    from datetime import timedelta
+    from tools.progress_tools import update_spaced_repetition_schedule
+    from types import SimpleNamespace as NS
+    update_spaced_repetition_schedule("Graphs", 1.0, NS(state=state))
+    assert "Review due: Graphs" not in builder.build(session, "what should I review?", state), "Stale review!"
+    assert builder.misses == 2, "Rescheduled review didn't refresh facts!"
+    # ...and so does time, once a review falls due
+    due = datetime.fromisoformat(state["spaced_repetition"]["Graphs"]["next_review"])
+    builder.build(session, "review", state, now=due - timedelta(minutes=1))
+    assert builder.misses == 2, "Facts re-collected before anything changed!"
+    assert "Review due: Graphs" in builder.build(session, "review", state, now=due + timedelta(minutes=1))
+    assert builder.misses == 3, "Review falling due didn't refresh facts!"
+    print(f"  cache: {builder.hits} hit(s), {builder.misses} miss(es)")
+    
+    print("\n[OK] Context builder working!")
+    
+    return True
+
+
+def test_conversation_summary():
+    """Test that per-turn prompt size stays flat over a long conversation."""
+    print(" Testing rolling conversation summary...\n")
+    
+    from types import SimpleNamespace as NS
+    from memory.summarizer import compact, content_tokens, SUMMARY_HEADER
+    
+    def text(role, value):
+        return NS(role=role, parts=[NS(text=value, function_call=None, function_response=None)])
+    
+    history, summary, sizes = [], None, []
+    for turn in range(100):
+        history.append(text("user", f"Context:\nStudent: Ana\n{'Progress line. ' * 20}\n\nUser: Quiz me on topic {turn}"))
+        history.append(NS(role="model", parts=[NS(text=None, function_call=NS(name="quiz_agent", args={}), function_response=None)]))
+        history.append(NS(role="user", parts=[NS(text=None, function_call=None, function_response=NS(name="quiz_agent", response={"ok": 1}))]))
+        history.append(text("model", f"Here is question {turn}. " + "Some explanation follows. " * 30))
+        sent, summary = compact(history, summary, lambda t: text("user", t),
+                                trigger_tokens=2000, keep_turns=3, max_tokens=300)
+        sizes.append(content_tokens(sent))
+    
+    full = content_tokens(history)
+    print(f"  turn 10: {sizes[9]} tokens, turn 50: {sizes[49]}, turn 100: {sizes[99]} (full history: {full})")
+    assert max(sizes) < 2000 + 300 + 50, "Prompt grew past trigger + summary!"
+    assert max(sizes[20:]) - min(sizes[20:]) < 1500, "Per-turn size isn't flat!"
+    assert summary["covered"] > 0 and "Quiz me on topic" in summary["text"]
+    assert "Progress line" not in summary["text"], "Old Context: blocks leaked into the summary!"
+    sent, _ = compact(history, summary, lambda t: text("user", t), trigger_tokens=2000, keep_turns=3, max_tokens=300)
+    assert sent[0].parts[0].text.startswith(SUMMARY_HEADER)
+    assert sent[1].role == "user" and sent[1].parts[0].text, "Cut split a tool call from its result!"
+    
+    print("\n[OK] Rolling conversation summary working!")
+    
+    return True
+
+
+def test_prefix_cache():
+    """Test instruction prefix caching: handles, TTL refresh and the stub discount."""
+    print(" Testing prefix cache...\n")
+    
+    from types import SimpleNamespace as NS
+    from memory.prefix_cache import PrefixCacheRegistry, PrefixCachingHooks, StubCacheBackend
+    
+    clock = [1000.0]
+    backend = StubCacheBackend(discount=0.75, clock=lambda: clock[0])
+    registry = PrefixCacheRegistry(backend, ttl=600, refresh_margin=60, min_tokens=100, clock=lambda: clock[0])
+    hooks = PrefixCachingHooks(registry, agents=["tutor_agent"])
+    instruction = "You are a friendly, patient tutor. " * 100
+    
+    def request(agent):
+        config = NS(system_instruction=instruction, tools=["search"], tool_config=None, cached_content=None)
+        return NS(agent_name=agent), NS(model="gemini-2.0-flash", config=config)
+    
+    ctx, first = request("tutor_agent")
+    hooks.before_model(ctx, first)
+    ctx, second = request("tutor_agent")
+    hooks.before_model(ctx, second)
+    assert first.config.cached_content == second.config.cached_content == "cachedContents/stub-1"
+    assert second.config.system_instruction is None and second.config.tools is None, "Prefix still sent!"
+    assert backend.created == 1, "Cache created twice for the same prefix!"
+    
+    _, other = request("quiz_validator")
+    hooks.before_model(NS(agent_name="quiz_validator"), other)
+    assert other.config.cached_content is None, "Agent outside the list was cached!"
+    
+    clock[0] += 560  # inside the refresh margin -> TTL extended, same handle
+    assert registry.handle("gemini-2.0-flash", instruction, ["search"]) == ("cachedContents/stub-1", True)
+    assert backend.refreshed == 1
+    clock[0] += 700  # expired -> new cache
+    name, reused = registry.handle("gemini-2.0-flash", instruction, ["search"])
+    assert (name, reused) == ("cachedContents/stub-2", False), "Expired handle reused!"
+    
+    cached = backend.cached_tokens(name)
+    billed = backend.bill(cached + 200, cached)
+    print(f"  prefix: {cached} tokens cached, a {cached + 200}-token prompt bills as {billed:.0f}")
+    assert billed < cached + 200
+    assert registry.handle("gemini-2.0-flash", "short", None) == (None, False), "Tiny prefix cached!"
+    
+    print("\n[OK] Prefix cache working!")
+    
+    return True
+
+
+def test_output_validation():
+    """Test the local structural checks and the validate -> regenerate loop."""
+    print(" Testing output validation...\n")
+    
+    import asyncio
+    from types import SimpleNamespace as NS
+    from agents.validation import (
+        ValidationPipeline, ValidatingHooks, check_quiz, check_study_plan, check_explanation,
+        VALID, INVALID, INCONCLUSIVE, SKIPPED
+    )
+    from observability.metrics import registry
+    
+    quiz = """**Q1. [MCQ]** What is a stack?
+- A. FIFO
+- B. LIFO
+
+**Q2. [MCQ]** Push is...
+
+**Q3. [Short Answer]** Name a use of stacks.
+
+---
+###  Answer Key
+1. **B** - Last in, first out
+2. **A** - Adds to the top
+3. Undo history, call stacks
+---"""
+    assert check_quiz(quiz).verdict == VALID
+    only_mcq = check_quiz(quiz.replace("[Short Answer]", "[MCQ]"))
+    assert only_mcq.verdict == INVALID and "variety" in only_mcq.feedback, only_mcq
+    assert check_quiz(quiz.split("---")[0]).verdict == INVALID, "Missing answer key passed!"
+    assert check_quiz(quiz.replace("**Q3. [Short Answer]**", "**Q3.**")).verdict == INCONCLUSIVE
+    assert check_quiz("Great job! You got 4/5 right.").verdict == SKIPPED
+    
+    plan = """### Overview
+Two weeks of DSA.
+### Learning Goals
+- Trees
+### Topics Breakdown
+| Day | Topics | Time | Resources |
+|-----|--------|------|-----------|
+| 1 | BST | 1h | CLRS |
+### Priority Topics
+Graphs
+### Review Schedule
+Day 3: BST
+### [OK] Checkpoints
+- Quiz on day 7"""
+    assert check_study_plan(plan).verdict == VALID
+    assert check_study_plan(plan.replace("### Priority Topics", "### Focus")).verdict == INCONCLUSIVE
+    assert check_study_plan("### Overview\nSoon.").verdict == INVALID
+    assert check_study_plan("When is your exam?").verdict == SKIPPED
+    explanation = ("### 1.  Explanation\nA stack is like a pile of plates, for example...\n"
+                   "### 2.  Key Points\n- LIFO\n### 3.  Flashcards\n**Q1:** x\n### 4.  Quick Quiz\n...")
+    assert check_explanation(explanation).verdict == VALID
+    assert check_explanation(explanation.replace("### 2.  Key Points", "")).verdict == INVALID
+    
+    # The LLM validator only sees what the local check can't decide
+    asked = []
+    
+    async def llm_validate(agent, text):
+        asked.append(agent)
+        return "VALID"
+    
+    pipeline = ValidationPipeline(llm_validate)
+    avoided = registry.counter("studybuddy_regenerations_avoided_total", agent="quiz_agent").value
+    result = asyncio.run(pipeline.validate("learning_planner", plan.replace("### Priority Topics", "### Focus")))
+    assert result.verdict == VALID and result.source == "llm" and asked == ["learning_planner"]
+    asyncio.run(pipeline.validate("quiz_agent", quiz))
+    assert asked == ["learning_planner"], "LLM validator called on a clear-cut quiz!"
+    assert registry.counter("studybuddy_regenerations_avoided_total", agent="quiz_agent").value == avoided + 1
+    
+    # An invalid quiz goes back to the quiz agent's model with the issues, until it passes
+    grading = "**Q1.** [OK] Correct - a stack is LIFO\n**Q2.** [FAIL] Incorrect - push adds to the top\nScore: 1/2"
+    assert check_quiz(grading).verdict == SKIPPED, "Grading feedback checked as a quiz!"
+    requests = []
+    answers = [quiz]
+    
+    async def ask_again(agent, llm_request, answer, feedback):
+        requests.append((llm_request, feedback))
+        return answers[0]
+    
+    hooks = ValidatingHooks(pipeline, max_iterations=3, ask_again=ask_again)
+    tool = NS(name="quiz_agent", agent=NS(name="quiz_agent"))
+    outer = NS(user_id="ana", agent_name="study_buddy")
+    inner = NS(user_id="ana", agent_name="quiz_agent")
+    
+    def quiz_call(response, tool_called=None):
+        async def run():
+            hooks.before_tool(tool, {"request": "Quiz me on stacks"}, outer)
+            hooks.before_model(inner, "quiz request")
+            if tool_called:
+                hooks.before_tool(NS(name=tool_called), {}, inner)
+            return await hooks.after_tool(tool, {"request": "Quiz me on stacks"}, outer, response)
+        return asyncio.run(run())
+    
+    bad = quiz.split("---")[0]
+    assert quiz_call(bad) == quiz and len(requests) == 1, requests
+    assert requests[0][0] == "quiz request" and "No answer key" in requests[0][1], requests
+    assert quiz_call(quiz) is None, "Valid output replaced!"
+    assert quiz_call(grading, "record_quiz_result") is None and len(requests) == 1, "Grading re-asked!"
+    # Asking again would record the result twice
+    assert quiz_call(bad, "record_quiz_result") is None and len(requests) == 1, "Re-asked after a state change!"
+    assert quiz_call(bad, "get_progress_summary") == quiz and len(requests) == 2
+    
+    requests.clear()
+    answers[0] = bad + "\n"
+    assert quiz_call(bad) == bad + "\n"
+    assert len(requests) == 2, f"Expected 2 retries, got {len(requests)}"
+    print(f"  quiz: {len(requests)} retries before giving up, LLM validator asked {len(asked)} time(s)")
+    
+    print("\n[OK] Output validation working!")
+    
+    return True
+
+
+def test_structured_output():
+    """Test structured tutor/quiz replies: parsing, rendering and flashcard export."""
+    print(" Testing structured output...\n")
+    
+    import json
+    import os
+    from types import SimpleNamespace as NS
+    from agents.schemas import (
+        SchemaError, StructuredOutputHooks, parse_explanation, parse_quiz, render_explanation, render_quiz
+    )
+    from agents.validation import check_explanation, check_quiz, VALID
+    from tools.file_tools import export_flashcards
+    
+    quiz = {
+        "topic": "Stacks",
+        "questions": [
+            {"number": 1, "type": "mcq", "question": "A stack is...", "options": ["FIFO", "LIFO"]},
+            {"number": 2, "type": "true_false", "question": "Pop removes the top element."},
+            {"number": 3, "type": "short_answer", "question": "Name a use of stacks."},
+        ],
+        "answer_key": [
+            {"number": 1, "answer": "B", "explanation": "Last in, first out"},
+            {"number": 2, "answer": "True", "explanation": "It takes the most recent push"},
+            {"number": 3, "answer": "Undo history", "explanation": "Latest action is undone first"},
+        ],
+    }
+    explanation = {
+        "topic": "Stacks",
+        "explanation": "A stack keeps items in the order they were added and hands back the newest first.",
+        "examples": ["A pile of plates - you take the top one."],
+        "key_points": ["LIFO order", "push/pop are O(1)"],
+        "flashcards": [{"question": "What order does a stack use?", "answer": "LIFO"},
+                       {"question": "Cost of push?", "answer": "O(1)"}],
+        "quiz": quiz,
+    }
+    
+    parsed = parse_quiz("```json\n" + json.dumps(quiz) + "\n```")
+    assert [q.answer for q in parsed.questions] == ["B", "True", "Undo history"]
+    assert parse_quiz(json.dumps(parsed.to_dict())).to_dict() == parsed.to_dict(), "Round trip changed the quiz!"
+    assert check_quiz(render_quiz(parsed)).verdict == VALID, render_quiz(parsed)
+    
+    broken = dict(quiz, answer_key=quiz["answer_key"][:2])
+    try:
+        parse_quiz(json.dumps(broken))
+        assert False, "Quiz without a full answer key parsed!"
+    except SchemaError as e:
+        assert "missing question(s) [3]" in str(e), e
+    
+    tutor = parse_explanation(json.dumps(explanation))
+    markdown = render_explanation(tutor)
+    assert "**Q2:** Cost of push?" in markdown and "### 4.  Quick Quiz" in markdown
+    assert check_explanation(markdown).verdict == VALID, markdown
+    
+    # The hook keeps the object in state and hands on the markdown
+    state = {}
+    response = NS(content=NS(parts=[NS(text=json.dumps(explanation), function_call=None)]))
+    StructuredOutputHooks().after_model(NS(agent_name="tutor_agent", state=state), response)
+    assert response.content.parts[0].text == markdown
+    assert state["last_explanation"]["flashcards"][1]["answer"] == "O(1)"
+    plain = NS(content=NS(parts=[NS(text="Great job, 4/5!", function_call=None)]))
+    StructuredOutputHooks().after_model(NS(agent_name="quiz_agent", state=state), plain)
+    assert plain.content.parts[0].text == "Great job, 4/5!" and "last_quiz" not in state
+    
+    # Downstream code takes the objects as they are
+    result = export_flashcards("Schema Test", tutor, "json")
+    path = result.split(" to ", 1)[1]
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)["flashcards"][0] == {"question": "What order does a stack use?", "answer": "LIFO"}
+    os.remove(path)
+    
+    # ...and fall back to the last explanation when the agent passes no cards
+    from tools.progress_tools import save_flashcards
+    result = export_flashcards("Schema Test", [], "md", tool_context=NS(state=state))
+    path = result.split(" to ", 1)[1]
+    with open(path, encoding="utf-8") as f:
+        assert "**Q:** Cost of push?" in f.read(), "Last explanation's cards not exported!"
+    os.remove(path)
+    saved = save_flashcards("Stacks", [], NS(state=state))
+    assert saved["added"] == 2 and len(state["flashcards"]) == 2, saved
+    print(f"  tutor: {len(json.dumps(explanation))} chars of JSON -> {len(markdown)} chars of markdown")
+    
+    print("\n[OK] Structured output working!")
+    
+    return True
+
+
+def test_fanout():
+    """Test compound-request splitting, parallel sub-agent runs and state merging."""
+    print(" Testing sub-agent fan-out...\n")
+    
+    import asyncio
+    import time
+    from types import SimpleNamespace as NS
+    from agents.fanout import FanOutHooks, plan_subtasks, merge_deltas
+    
+    tasks = plan_subtasks("Explain heaps and then quiz me")
+    assert [(t.agent, t.request) for t in tasks] == [
+        ("tutor_agent", "Explain heaps"), ("quiz_agent", "quiz me on heaps")
+    ], tasks
+    tasks = plan_subtasks("show my progress and make a plan")
+    assert [t.agent for t in tasks] == ["progress_tracker", "learning_planner"], tasks
+    assert plan_subtasks("explain stacks and queues") is None, "One request split in two!"
+    assert plan_subtasks("explain heaps and quiz me on that") is None, "Dependent part run in parallel!"
+    assert plan_subtasks("make a plan based on my progress") is None
+    
+    base = {"progress": {"heaps": 1}, "current_topic": "heaps"}
+    merged, conflicts = merge_deltas(base, [
+        {"progress": {"heaps": 1, "tries": 2}, "current_topic": "tries"},
+        {"progress": {"heaps": 3}, "flashcards": {"c1": {}}},
+    ])
+    assert merged["progress"] == {"heaps": 3, "tries": 2}, f"Lost an update: {merged}"
+    assert merged["current_topic"] == "tries" and "flashcards" in merged and conflicts == 0
+    _, conflicts = merge_deltas(base, [{"progress": {"heaps": 2}}, {"progress": {"heaps": 3}}])
+    assert conflicts == 1
+    
+    # Sub-agents run side by side, answers come back in the order asked
+    def sub_agent(name, delay, delta):
+        async def run_async(args, tool_context):
+            await asyncio.sleep(delay)
+            tool_context.actions.state_delta.update(delta)
+            return f"[{name}] {args['request'].split('User: ')[-1]}"
+        return NS(agent=NS(name=name), run_async=run_async)
+    
+    orchestrator = NS(tools=[
+        sub_agent("tutor_agent", 0.2, {"current_topic": "heaps"}),
+        sub_agent("quiz_agent", 0.2, {"progress": {"heaps": 1, "quiz": 2}}),
+        NS(name="google_search"),
+    ])
+    state = {"progress": {"heaps": 1}}
+    ctx = NS(agent_name="study_buddy", invocation_id="inv-1", state=state, _invocation_context=NS(agent=orchestrator))
+    message = NS(role="user", parts=[NS(text="Context:\nStudent: Ana\n\nUser: explain heaps and quiz me",
+                                        function_response=None)])
+    hooks = FanOutHooks(make_tool_context=lambda c: NS(actions=NS(state_delta={})), make_response=lambda c: c)
+    start = time.perf_counter()
+    calls = asyncio.run(hooks.before_model(ctx, NS(contents=[message])))
+    elapsed = time.perf_counter() - start
+    # The orchestrator gets the calls it would have made, and takes its next turn with their results
+    context = "Context:\nStudent: Ana\n\nUser: "
+    assert calls == [("tutor_agent", {"request": context + "explain heaps"}),
+                     ("quiz_agent", {"request": context + "quiz me on heaps"})], calls
+    assert state == {"progress": {"heaps": 1, "quiz": 2}, "current_topic": "heaps"}, state
+    assert elapsed < 0.35, f"Sub-agents ran one after another ({elapsed:.2f}s)"
+    tutor, quiz = orchestrator.tools[:2]
+    assert hooks.before_tool(quiz, calls[1][1], ctx) == "[quiz_agent] quiz me on heaps"
+    assert hooks.before_tool(tutor, calls[0][1], ctx) == "[tutor_agent] explain heaps"
+    assert hooks.before_tool(tutor, calls[0][1], ctx) is None, "Result served twice!"
+    print(f"  two 0.2s sub-agents answered in {elapsed:.2f}s")
+    
+    single = NS(role="user", parts=[NS(text="explain heaps", function_response=None)])
+    assert asyncio.run(hooks.before_model(ctx, NS(contents=[single]))) is None
+    
+    print("\n[OK] Fan-out working!")
+    
+    return True
+
+
+def test_prefetch():
+    """Test speculative prefetch: plan topics, serving a prefetch, divergence and the budget."""
+    print(" Testing prefetch...\n")
+    
+    import asyncio
+    import time
+    from types import SimpleNamespace as NS
+    from agents.prefetch import PrefetchScheduler, PrefetchHooks, plan_topics, next_plan_topic
+    from memory.content_cache import ContentCache
+    
+    plan = """### Overview
+Two weeks.
+### Topics Breakdown
+| Day | Topics | Time |
+|-----|--------|------|
+| 1 | Arrays, Linked Lists | 2h |
+| 2 | Binary Heaps | 2h |
+### Review Schedule
+..."""
+    topics = plan_topics(plan)
+    assert topics == ["Arrays", "Linked Lists", "Binary Heaps"], topics
+    assert next_plan_topic(topics, "linked lists") == "Binary Heaps"
+    assert next_plan_topic(topics, "binary heaps") is None
+    
+    generated = []
+    
+    async def generate(agent, request, student, state):
+        generated.append((agent, request))
+        await asyncio.sleep(0.05)
+        return f"<{agent}: {request}>"
+    
+    scheduler = PrefetchScheduler(generate, ContentCache(ttl=60), daily_limit=3, delay=0)
+    hooks = PrefetchHooks(scheduler)
+    planner, tutor, quiz = (NS(agent=NS(name=n)) for n in ("learning_planner", "tutor_agent", "quiz_agent"))
+    ctx = NS(user_id="ana", agent_name="study_buddy", state={})
+    
+    hooks.after_tool(planner, {"request": "plan DSA"}, ctx, plan)
+    assert ctx.state["plan_topics"] == topics
+    hooks.after_tool(tutor, {"request": "Explain linked lists to the student with a simple example"}, ctx,
+                     "### 1.  Explanation ...")
+    
+    # Grading answers on the topic isn't what was prefetched (and isn't a divergence)
+    time.sleep(0.2)
+    assert ("quiz_agent", "Create a quiz on linked lists") in generated, generated
+    grading = {"request": "Grade the student's answers on the linked lists quiz: 1. B 2. A"}
+    assert asyncio.run(hooks.before_tool(quiz, grading, ctx)) is None, "Prefetched quiz served for grading!"
+    
+    # Student follows the path: the quiz is already (being) written
+    start = time.perf_counter()
+    answer = asyncio.run(hooks.before_tool(quiz, {"request": "Create an intermediate quiz on linked lists"}, ctx))
+    assert answer == "<quiz_agent: Create a quiz on linked lists>", answer
+    assert time.perf_counter() - start < 0.05, "Prefetched quiz wasn't ready!"
+    assert ("tutor_agent", "Explain Binary Heaps") in generated, generated
+    
+    # Going somewhere else cancels what's left
+    assert scheduler.cache.find("ana", "tutor_agent", "Explain binary heaps") is not None
+    assert asyncio.run(hooks.before_tool(tutor, {"request": "Explain graph coloring"}, ctx)) is None
+    assert scheduler.cache.find("ana", "tutor_agent", "Explain binary heaps") is None, "Divergence didn't cancel!"
+    
+    # Per-student daily cap (2 used above)
+    assert scheduler.schedule("ana", "quiz_agent", "graphs", "Create a quiz on graphs", {})
+    assert not scheduler.schedule("ana", "quiz_agent", "tries", "Create a quiz on tries", {}), "Budget ignored!"
+    assert scheduler.schedule("ben", "quiz_agent", "tries", "Create a quiz on tries", {})
+    scheduler.cancel("ana")
+    scheduler.cancel("ben")
+    scheduler.shutdown()
+    
+    # A prefetch queued behind a slow one isn't waited for; a slow one only briefly
+    async def slow(agent, request, student, state):
+        await asyncio.sleep(5)
+        return f"<{agent}: {request}>"
+    
+    scheduler = PrefetchScheduler(slow, ContentCache(ttl=60), daily_limit=3, delay=0)
+    hooks = PrefetchHooks(scheduler, wait=0.1)
+    ben, cara = (NS(user_id=n, agent_name="study_buddy", state={}) for n in ("ben", "cara"))
+    assert scheduler.schedule("ben", "quiz_agent", "heaps", "Create a quiz on heaps", {})
+    time.sleep(0.05)
+    assert scheduler.schedule("cara", "quiz_agent", "tries", "Create a quiz on tries", {})
+    queued = scheduler.cache.find("cara", "quiz_agent", "Create a quiz on tries").value
+    start = time.perf_counter()
+    assert asyncio.run(hooks.before_tool(quiz, {"request": "Create a quiz on tries"}, cara)) is None
+    assert time.perf_counter() - start < 0.05, "Waited on a prefetch that hadn't started!"
+    assert queued.future.cancelled(), "Queued prefetch wasn't cancelled!"
+    start = time.perf_counter()
+    assert asyncio.run(hooks.before_tool(quiz, {"request": "Create a quiz on heaps"}, ben)) is None
+    assert time.perf_counter() - start < 0.5, "Waited too long on a slow prefetch!"
+    scheduler.shutdown()
+    print(f"  {len(generated)} prefetch(es) generated, quiz served in <50ms, queued/slow ones skipped")
+    
+    print("\n[OK] Prefetch working!")
+    
+    return True
+
+
+def test_model_tiering():
+    """Test model tiering: per-agent models, low-confidence detection and escalation."""
+    print(" Testing model tiering...\n")
+    
+    import asyncio
+    from types import SimpleNamespace as NS
+    from agents.tiering import TieringHooks, TierReport, model_for, next_model, low_confidence
+    from config.settings import MODEL_TIERS
+    
+    fast, standard, strong = MODEL_TIERS["fast"], MODEL_TIERS["standard"], MODEL_TIERS["strong"]
+    assert next_model(fast) == standard and next_model(strong) is None
+    assert next_model("some-other-model") is None
+    from config.settings import AGENT_TIERS
+    for content_agent in ("tutor_agent", "quiz_agent", "learning_planner"):
+        assert next_model(MODEL_TIERS[AGENT_TIERS[content_agent]]), f"{content_agent} can never escalate!"
+    assert isinstance(model_for("tutor_agent"), str)
+    
+    def reply(text, finish="STOP", logprob=None, tokens=(100, 50)):
+        return NS(content=NS(parts=[NS(text=text, function_call=None)]), finish_reason=finish,
+                  avg_logprobs=logprob, error_code=None, partial=False,
+                  usage_metadata=NS(prompt_token_count=tokens[0], candidates_token_count=tokens[1],
+                                    cached_content_token_count=0))
+    
+    assert low_confidence("study_buddy", reply("Sure, let me get the tutor.")) is None
+    assert low_confidence("study_buddy", reply("Half an ans", finish="MAX_TOKENS")) == "finish_max_tokens"
+    assert low_confidence("study_buddy", reply("  ")) == "empty"
+    assert low_confidence("study_buddy", reply("Maybe?", logprob=-2.5)) == "low_logprob"
+    quiz = "**Q1.** [MCQ] What is a heap?\n**Q2.** [MCQ] What is a stack?\n"
+    assert low_confidence("quiz_agent", reply(quiz)) == "invalid_structure"  # no answer key
+    grading = "**Q1.** [OK] Correct - heaps are trees\n**Q2.** [FAIL] Incorrect - a stack is LIFO\n"
+    assert low_confidence("quiz_agent", reply(grading)) is None, "Grading feedback escalated!"
+    
+    # Stub models: the fast one is unsure, the next tier up answers properly
+    calls, sent = [], []
+    
+    async def stub_model(model, llm_request):
+        calls.append(model)
+        sent.append(llm_request)
+        return reply("Routing to tutor_agent.", tokens=(120, 30))
+    
+    hooks = TieringHooks(TierReport(), call_model=stub_model)
+    ctx = NS(invocation_id="inv-1", agent_name="study_buddy", user_id="ana")
+    request = NS(model=fast, config=NS(system_instruction="Route requests.", tools=["tutor"],
+                                       tool_config=None, cached_content=None))
+    response = reply("Hmm", logprob=-3.0)
+    hooks.before_model(ctx, request)
+    # prefix caching runs later and swaps the instruction for a cache made for the fast model
+    request.config.cached_content, request.config.system_instruction, request.config.tools = "caches/fast", None, None
+    assert asyncio.run(hooks.after_model(ctx, response)) is None
+    assert calls == [standard], calls
+    assert sent[0].config.cached_content is None and sent[0].config.system_instruction == "Route requests.", \
+        "Escalated call reused the first model's cache handle!"
+    assert sent[0].config.tools == ["tutor"] and request.config.cached_content == "caches/fast"
+    assert response.content.parts[0].text == "Routing to tutor_agent.", "Answer wasn't replaced!"
+    assert response.usage_metadata.prompt_token_count == 220, "Both calls' tokens should be billed"
+    
+    # A confident answer is left alone
+    confident = reply("Routing to quiz_agent.")
+    hooks.before_model(NS(invocation_id="inv-2", agent_name="study_buddy"), NS(model=fast))
+    asyncio.run(hooks.after_model(NS(invocation_id="inv-2", agent_name="study_buddy"), confident))
+    assert calls == [standard] and confident.content.parts[0].text == "Routing to quiz_agent."
+    
+    rows = {(r["agent"], r["model"]): r for r in hooks.report.summary()}
+    assert rows[("study_buddy", fast)]["calls"] == 2
+    assert rows[("study_buddy", standard)]["escalations"] == 1
+    print(hooks.report.format())
+    
+    print("\n[OK] Model tiering working!")
+    
+    return True
+
+
+def test_single_flight():
+    """Test request coalescing: identical concurrent calls share one model call."""
+    print(" Testing single-flight...\n")
+    
+    import asyncio
+    import time
+    from types import SimpleNamespace as NS
+    from agents.single_flight import SingleFlight, SingleFlightHooks, request_key
+    
+    def request(text, instruction="You are a tutor."):
+        return NS(model="gemini-2.0-flash", config=NS(system_instruction=instruction),
+                  contents=[NS(role="user", parts=[NS(text=text, function_call=None, function_response=None)])])
+    
+    assert request_key("tutor_agent", request("Explain binary heaps")) == \
+        request_key("tutor_agent", request("  explain   Binary heaps?"))
+    assert request_key("tutor_agent", request("Explain heaps")) != request_key("quiz_agent", request("Explain heaps"))
+    assert request_key("tutor_agent", request("Explain heaps")) != \
+        request_key("tutor_agent", request("Explain heaps", "You are a tutor. Ana is a beginner."))
+    
+    hooks = SingleFlightHooks(SingleFlight(timeout=5), agents=["tutor_agent"])
+    model_calls = []
+    
+    async def student(i, text, agent="tutor_agent"):
+        ctx = NS(invocation_id=f"inv-{i}", agent_name=agent, user_id=f"student-{i}")
+        llm_request = request(text)
+        shared = await hooks.before_model(ctx, llm_request)
+        if shared is not None:
+            return shared
+        model_calls.append(text)
+        await asyncio.sleep(0.1)  # the model thinking
+        response = NS(content=NS(parts=[NS(text=f"Answer to {text}")]), error_code=None, partial=False,
+                      usage_metadata=NS(prompt_token_count=500, candidates_token_count=800))
+        hooks.after_model(ctx, response)
+        return response
+    
+    async def herd():
+        asks = ["Explain binary heaps"] * 20 + ["explain binary heaps?", "Explain tries"]
+        return await asyncio.gather(*(student(i, text) for i, text in enumerate(asks)))
+    
+    responses = asyncio.run(herd())
+    assert sorted(model_calls) == ["Explain binary heaps", "Explain tries"], model_calls
+    assert all(r.content.parts[0].text == "Answer to Explain binary heaps" for r in responses[:21])
+    assert responses[1] is not responses[2], "Each waiter should get its own copy"
+    assert sum(r.usage_metadata is None for r in responses) == 20, "Shared answers shouldn't be billed again"
+    assert len(hooks.flights) == 0, "Finished flights should be dropped"
+    
+    # Once the first call has landed, the next identical one is a fresh call
+    asyncio.run(student(99, "Explain binary heaps"))
+    assert model_calls.count("Explain binary heaps") == 2
+    
+    # A slow generation keeps its flight: the timeout is only a backstop...
+    assert SingleFlight().timeout >= 60, "Slow answers would send every waiter off on its own"
+    # ...for a leader that vanishes without an answer or an error
+    hooks = SingleFlightHooks(SingleFlight(timeout=0.1), agents=["tutor_agent"])
+    
+    async def stalled():
+        await hooks.before_model(NS(invocation_id="a", agent_name="tutor_agent"), request("Explain graphs"))
+        return await hooks.before_model(NS(invocation_id="b", agent_name="tutor_agent"), request("Explain graphs"))
+    
+    assert asyncio.run(stalled()) is None, "Waiter should fall back to its own call"
+    
+    # A leader whose call raises never reaches after_model - its waiters go at once
+    hooks = SingleFlightHooks(SingleFlight(timeout=5), agents=["tutor_agent"])
+    
+    async def failing_leader():
+        leader = NS(invocation_id="a", agent_name="tutor_agent")
+        await hooks.before_model(leader, request("Explain tries"))
+        waiter = asyncio.ensure_future(
+            hooks.before_model(NS(invocation_id="b", agent_name="tutor_agent"), request("Explain tries"))
+        )
+        await asyncio.sleep(0.05)
+        hooks.on_model_error(leader, None, RuntimeError("503 Service Unavailable"))
+        return await waiter
+    
+    start = time.perf_counter()
+    assert asyncio.run(failing_leader()) is None, "Waiter should make its own call"
+    assert time.perf_counter() - start < 1, "Waiter sat out the timeout after the leader failed!"
+    assert len(hooks.flights) == 0, "Failed flight still handed to new requests"
+    print(f"  22 requests, {len(model_calls) - 1} model calls")
+    
+    print("\n[OK] Single-flight working!")
+    
+    return True
+
+
+def test_batch_generation():
+    """Test batch generation: bounded concurrency, retries, resuming, and serving the results."""
+    print(" Testing batch generation...\n")
+    
+    import asyncio
+    import tempfile
+    from types import SimpleNamespace as NS
+    from agents.batch_generate import plan_items, run_batch
+    from agents.cohort_content import CohortContent, CohortContentHooks
+    
+    explanation = """### 1.  Explanation
+Imagine a stack of plates: an OS schedules processes like that, for example round robin.
+### 2.  Key Points
+- Processes share the CPU
+- The scheduler decides who runs
+### 3.  Flashcards
+**Q1:** What picks the next process?
+**A1:** The scheduler.
+
+**Q2:** What is a context switch?
+**A2:** Saving one process's state and loading another's.
+### 4.  Quick Quiz
+1. What does the scheduler do?"""
+    quiz = """**Q1. [MCQ]** Which is a scheduling algorithm?
+**Q2. [Short Answer]** What is a context switch?
+**Q3. [MCQ]** What is a process?
+### Answer Key
+1. B - round robin is one
+2. Saving and loading process state
+3. A - a program in execution"""
+    
+    running, peak, calls = 0, 0, []
+    
+    async def generate(agent, request, user_id, state):
+        nonlocal running, peak
+        calls.append(request)
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        if calls.count(request) == 1 and "beginner quiz" in request:
+            raise RuntimeError("429 Resource exhausted")  # first try fails, the retry works
+        if "DBMS" in request:
+            return "Here are some questions."  # never a usable quiz/explanation
+        return quiz if agent == "quiz_agent" else explanation
+    
+    with tempfile.TemporaryDirectory() as scratch:
+        store = CohortContent(scratch)
+        items = plan_items(["OS", "DBMS"], ["beginner", "intermediate"])
+        assert len(items) == 8
+        summary = asyncio.run(run_batch(items, generate, store, concurrency=2, retries=2, backoff=0))
+        assert peak <= 2, f"Concurrency bound ignored ({peak} at once)"
+        assert summary["generated"] == 4 and len(summary["failed"]) == 4, summary
+        assert calls.count("Create a beginner quiz on OS") == 2, "Failed generation wasn't retried"
+        
+        # Resuming only redoes what failed
+        calls.clear()
+        summary = asyncio.run(run_batch(items, generate, store, concurrency=2, retries=0, backoff=0))
+        assert summary["skipped"] == 4 and all("DBMS" in c for c in calls), calls
+        
+        # The live app serves exact matches and leaves the rest to the model
+        hooks = CohortContentHooks(CohortContent(scratch))
+        tutor, quiz_tool = NS(agent=NS(name="tutor_agent")), NS(agent=NS(name="quiz_agent"))
+        assert hooks.before_tool(quiz_tool, {"request": "Create an intermediate quiz on OS"}, None) == quiz
+        assert hooks.before_tool(tutor, {"request": "Explain OS to a beginner"}, None) == explanation
+        assert hooks.before_tool(tutor, {"request": "Explain paging in OS"}, None) is None
+        assert hooks.before_tool(quiz_tool, {"request": "Create an exam-prep quiz on OS"}, None) is None
+        record = hooks.store.find("tutor_agent", "Explain OS for a beginner student")
+        assert [c["question"] for c in record["flashcards"]] == [
+            "What picks the next process?", "What is a context switch?"], record["flashcards"]
+        print(f"  {len(hooks.store)} item(s) generated, 4 failed after retries, peak concurrency {peak}")
+    
+    print("\n[OK] Batch generation working!")
+    
+    return True
+
+
 def test_file_tools():
     """Test file saving tools."""
     print(" Testing file tools...\n")
@@ -261,7 +1713,7 @@ async def test_api_call():
         
         print("\n[OK] API working!")
         return True
-        
+    
     except Exception as e:
         print(f"  [FAIL] API test failed: {e}")
         return False
@@ -291,6 +1743,41 @@ async def main():
         print(f"[FAIL] Error: {e}")
         all_passed = False
     
+    print_header("3b. Review Load Balancing Tests")
+    try:
+        test_review_load_balancing()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("3c. Flashcard Store Tests")
+    try:
+        test_flashcard_store()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("3d. Topic Registry Tests")
+    try:
+        test_topic_registry()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("3e. Progress Aggregate Tests")
+    try:
+        test_progress_aggregates()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("3f. Score History Tests")
+    try:
+        test_score_history()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
     print_header("4. Session Manager Tests")
     try:
         test_session_manager()
@@ -305,6 +1792,146 @@ async def main():
         print(f"[FAIL] Error: {e}")
         all_passed = False
     
+    print_header("5b. Logging Pipeline Tests")
+    try:
+        test_logging_pipeline()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5c. Tracing Tests")
+    try:
+        test_tracing_spans()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5d. Metrics Tests")
+    try:
+        test_metrics()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5e. Token Accounting Tests")
+    try:
+        test_token_accounting()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5f. Profiling Tests")
+    try:
+        test_profiling()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5g. Request Recorder Tests")
+    try:
+        test_request_recorder()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5h. Benchmark Runner Tests")
+    try:
+        test_benchmark_runner()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5i. Load Test Backend Tests")
+    try:
+        test_fake_gemini_script()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5j. Slow Request Watchdog Tests")
+    try:
+        test_slow_request_watchdog()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5k. Ops Dashboard Tests")
+    try:
+        test_ops_dashboard()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5l. Context Builder Tests")
+    try:
+        test_context_builder()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5m. Conversation Summary Tests")
+    try:
+        test_conversation_summary()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5n. Prefix Cache Tests")
+    try:
+        test_prefix_cache()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5o. Output Validation Tests")
+    try:
+        test_output_validation()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5p. Structured Output Tests")
+    try:
+        test_structured_output()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5q. Fan-out Tests")
+    try:
+        test_fanout()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5r. Prefetch Tests")
+    try:
+        test_prefetch()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5s. Model Tiering Tests")
+    try:
+        test_model_tiering()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5t. Single-flight Tests")
+    try:
+        test_single_flight()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
+    print_header("5u. Batch Generation Tests")
+    try:
+        test_batch_generation()
+    except Exception as e:
+        print(f"[FAIL] Error: {e}")
+        all_passed = False
+    
     # API test (optional)
     print_header("6. API Test (Optional)")
     do_api = input("Run API test? (uses quota) [y/N]: ").strip().lower()
@@ -3,13 +3,19 @@ from tools.file_tools import save_study_plan_to_file, save_notes_to_file, export
 
 # Progress tools have ADK dependency, import conditionally
 try:
-    from tools.progress_tools import record_quiz_result, get_progress_summary
+    from tools.progress_tools import (
+        record_quiz_result, get_progress_summary,
+        save_flashcards, get_due_flashcards, review_flashcard
+    )
     __all__ = [
         "save_study_plan_to_file",
         "save_notes_to_file", 
         "export_flashcards",
         "record_quiz_result",
-        "get_progress_summary"
+        "get_progress_summary",
+        "save_flashcards",
+        "get_due_flashcards",
+        "review_flashcard"
     ]
 except ImportError:
     __all__ = [
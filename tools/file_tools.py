@@ -9,10 +9,16 @@ Nothing fancy here, just making sure students can export their work.
 import os
 import json
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from config.settings import OUTPUT_DIR, STUDY_PLANS_DIR
 
+try:
+    from google.adk.tools.tool_context import ToolContext
+except ImportError:
+    # Allow import without ADK for testing
+    ToolContext = Any
+
 
 def save_study_plan_to_file(filename: str, content: str) -> str:
     """
@@ -60,22 +66,35 @@ def save_notes_to_file(content: str, filename: str = "study_notes.md") -> str:
         return f"Error saving notes: {str(e)}"
 
 
-def export_flashcards(topic: str, flashcards: list, format: str = "md") -> str:
+def export_flashcards(
+    topic: str,
+    flashcards: Any,
+    format: str = "md",
+    tool_context: Optional[ToolContext] = None
+) -> str:
     """
     Export flashcards to a file for external use.
     
     Args:
         topic: The topic name
-        flashcards: List of Q/A pairs
+        flashcards: List of Q/A pairs (dicts or Flashcards), or a structured
+                    Explanation from the tutor (empty = the cards from the
+                    tutor's last structured explanation in session state)
         format: Output format ('md' or 'json')
+        tool_context: ADK tool context with session state
     
     Returns:
         Success/failure message
     """
+    from memory.card_store import card_text, last_explanation_cards
+    
     try:
         os.makedirs(OUTPUT_DIR, exist_ok=True)
         
         safe_topic = topic.replace(" ", "_").lower()
+        cards = getattr(flashcards, "flashcards", flashcards)
+        if not cards and tool_context is not None:
+            cards = last_explanation_cards(tool_context.state)
         
         if format == "json":
             filename = f"flashcards_{safe_topic}.json"
@@ -84,7 +103,7 @@ def export_flashcards(topic: str, flashcards: list, format: str = "md") -> str:
                 json.dump({
                     "topic": topic,
                     "created": datetime.now().isoformat(),
-                    "flashcards": flashcards
+                    "flashcards": [card if isinstance(card, dict) else card.to_dict() for card in cards]
                 }, f, indent=2)
         else:
             filename = f"flashcards_{safe_topic}.md"
@@ -92,10 +111,10 @@ def export_flashcards(topic: str, flashcards: list, format: str = "md") -> str:
             with open(filepath, "w", encoding="utf-8") as f:
                 f.write(f"# Flashcards: {topic}\n\n")
                 f.write(f"*Created: {datetime.now().strftime('%Y-%m-%d')}*\n\n")
-                for i, card in enumerate(flashcards, 1):
+                for i, (question, answer) in enumerate(map(card_text, cards), 1):
                     f.write(f"## Card {i}\n\n")
-                    f.write(f"**Q:** {card.get('question', card.get('q', ''))}\n\n")
-                    f.write(f"**A:** {card.get('answer', card.get('a', ''))}\n\n")
+                    f.write(f"**Q:** {question}\n\n")
+                    f.write(f"**A:** {answer}\n\n")
                     f.write("---\n\n")
         
         return f"Flashcards exported to {filepath}"
@@ -10,6 +10,12 @@ import json
 from datetime import datetime
 from typing import Any, Dict
 
+from memory.score_history import empty_history, append_score
+from memory.progress_aggregates import (
+    update_aggregates, rebuild_aggregates,
+    top_topics, bottom_topics, average_score
+)
+
 try:
     from google.adk.tools.tool_context import ToolContext
 except ImportError:
@@ -31,12 +37,15 @@ def record_quiz_result(
     what you're good at and what needs more work.
     """
     state = tool_context.state
+    topic = _canonical_topic(state, topic)
     
     # Initialize progress tracking if needed
     if "progress" not in state:
         state["progress"] = {}
     
-    # Get or create topic stats
+    # Get or create topic stats (snapshot the old values for the aggregates)
+    previous_stats = dict(state["progress"][topic]) if topic in state["progress"] else None
+    aggregates = _progress_aggregates(state)
     topic_stats = state["progress"].get(topic, {
         "attempts": 0,
         "last_score": 0.0,
@@ -45,6 +54,18 @@ def record_quiz_result(
         "notes": "",
     })
     
+    # Determine improvement trend (against the score before this one)
+    trend = "first_attempt"
+    if previous_stats is not None:
+        previous_score = previous_stats.get("last_score", score)
+        if score > previous_score:
+            trend = "improving"
+        elif score < previous_score:
+            trend = "declining"
+        else:
+            trend = "stable"
+        topic_stats["previous_score"] = previous_score
+    
     # Update stats
     topic_stats["attempts"] += 1
     topic_stats["last_score"] = score
@@ -53,24 +74,20 @@ def record_quiz_result(
     topic_stats["notes"] = notes
     topic_stats["last_updated"] = datetime.now().isoformat()
     
-    state["progress"][topic] = topic_stats
-    
-    # Determine improvement trend
-    trend = "first_attempt"
-    if topic_stats["attempts"] > 1:
-        if score > topic_stats.get("previous_score", score):
-            trend = "improving"
-        elif score < topic_stats.get("previous_score", score):
-            trend = "declining"
-        else:
-            trend = "stable"
+    # Score time series + precomputed ewma / trend_slope / mastery
+    history = topic_stats.setdefault("history", empty_history())
+    topic_stats.update(append_score(history, score))
     
-    topic_stats["previous_score"] = score
+    state["progress"][topic] = topic_stats
+    state["progress_aggregates"] = update_aggregates(
+        aggregates, topic, topic_stats, previous_stats
+    )
     
     return {
         "status": "ok",
         "message": f"Recorded quiz result for '{topic}'",
-        "topic_stats": topic_stats,
+        # the raw series stays in state - the model only needs the summary fields
+        "topic_stats": {k: v for k, v in topic_stats.items() if k != "history"},
         "trend": trend,
         "recommendation": _get_recommendation(score, topic_stats["attempts"])
     }
@@ -99,30 +116,20 @@ def get_progress_summary(
             "total_attempts": 0
         }
     
-    # Calculate overall stats
-    topics_studied = len(progress)
-    total_attempts = sum(t.get("attempts", 0) for t in progress.values())
-    total_questions = sum(t.get("total_answered", 0) for t in progress.values())
+    # Running totals are kept up to date by record_quiz_result
+    aggregates = _progress_aggregates(state)
     
     # Find strengths and weaknesses
-    sorted_topics = sorted(
-        progress.items(),
-        key=lambda x: x[1].get("last_score", 0),
-        reverse=True
-    )
-    
-    strengths = [t[0] for t in sorted_topics[:3] if t[1].get("last_score", 0) >= 70]
-    weaknesses = [t[0] for t in sorted_topics[-3:] if t[1].get("last_score", 0) < 70]
+    strengths = top_topics(aggregates)
+    weaknesses = bottom_topics(aggregates)
     
-    # Calculate average score
-    scores = [t.get("last_score", 0) for t in progress.values()]
-    avg_score = sum(scores) / len(scores) if scores else 0
+    avg_score = average_score(aggregates)
     
     return {
         "status": "ok",
-        "topics_studied": topics_studied,
-        "total_attempts": total_attempts,
-        "total_questions_answered": total_questions,
+        "topics_studied": aggregates["topics"],
+        "total_attempts": aggregates["total_attempts"],
+        "total_questions_answered": aggregates["total_questions"],
         "average_score": round(avg_score, 1),
         "strengths": strengths,
         "weaknesses": weaknesses,
@@ -147,8 +154,10 @@ def update_spaced_repetition_schedule(
         Updated schedule information
     """
     from memory.spaced_repetition import SpacedRepetitionScheduler
+    from config.settings import USE_REVIEW_LOAD_BALANCING
     
     state = tool_context.state
+    topic = _canonical_topic(state, topic)
     
     # Initialize spaced repetition data if needed
     if "spaced_repetition" not in state:
@@ -172,19 +181,29 @@ def update_spaced_repetition_schedule(
         "score": performance
     })
     
-    # Calculate next review
+    # Calculate next review (spread across quiet days if load balancing is on)
     scheduler = SpacedRepetitionScheduler()
     last_review = datetime.fromisoformat(topic_data["last_review"])
-    next_review = scheduler.calculate_next_review(
-        last_review=last_review,
-        repetition_number=topic_data["repetition_number"],
-        performance=performance
-    )
+    if USE_REVIEW_LOAD_BALANCING:
+        next_review = scheduler.calculate_balanced_review(
+            last_review=last_review,
+            repetition_number=topic_data["repetition_number"],
+            performance=performance,
+            day_load=scheduler.build_day_load(sr_data.values(), exclude=topic_data)
+        )
+    else:
+        next_review = scheduler.calculate_next_review(
+            last_review=last_review,
+            repetition_number=topic_data["repetition_number"],
+            performance=performance
+        )
     
     # Update topic data
     topic_data["repetition_number"] += 1
     topic_data["last_review"] = datetime.now().isoformat()
     topic_data["next_review"] = next_review.isoformat()
+    # changed in place, so tell the context builder's cache (see memory/context_builder.py)
+    state["review_updates"] = state.get("review_updates", 0) + 1
     
     days_until = (next_review - datetime.now()).days
     
@@ -260,6 +279,218 @@ def get_review_schedule(
     }
 
 
+def save_flashcards(
+    topic: str,
+    flashcards: list,
+    tool_context: ToolContext,
+) -> Dict[str, Any]:
+    """
+    Store the tutor's flashcards so each one gets its own review schedule.
+    
+    Args:
+        topic: The topic the cards cover
+        flashcards: List of {"question": ..., "answer": ...} pairs (empty =
+                    the cards from the tutor's last structured explanation)
+        tool_context: ADK tool context with session state
+    
+    Returns:
+        How many cards were added and how many were already stored
+    """
+    from memory.card_store import FlashcardStore, last_explanation_cards
+    
+    state = tool_context.state
+    topic = _canonical_topic(state, topic)
+    flashcards = flashcards or last_explanation_cards(state)
+    store = FlashcardStore(state.get("flashcards", {}))
+    result = store.add_cards(topic, flashcards)
+    state["flashcards"] = store.cards
+    
+    return {
+        "status": "ok",
+        "topic": topic,
+        "added": result["added"],
+        "duplicates": result["duplicates"],
+        "total_cards": len(store.cards),
+        "message": f"Saved {result['added']} new flashcard(s) for '{topic}'."
+    }
+
+
+def get_due_flashcards(
+    limit: int,
+    tool_context: ToolContext,
+) -> Dict[str, Any]:
+    """
+    Get the flashcards that are due for review, most overdue first.
+    
+    Args:
+        limit: Max number of cards to return (e.g. 10)
+        tool_context: ADK tool context with session state
+    
+    Returns:
+        Due cards with their ids, questions and answers
+    """
+    from memory.card_store import FlashcardStore
+    from config.settings import DUE_CARDS_LIMIT
+    
+    store = FlashcardStore(tool_context.state.get("flashcards", {}))
+    if not store.cards:
+        return {
+            "status": "no_cards",
+            "message": "No flashcards stored yet. Ask for an explanation to get some!",
+            "cards": [],
+            "total_due": 0
+        }
+    
+    cards = store.next_due(limit=limit or DUE_CARDS_LIMIT)
+    return {
+        "status": "ok",
+        "cards": [
+            {
+                "card_id": c["card_id"],
+                "topic": c["topic"],
+                "question": c["question"],
+                "answer": c["answer"]
+            }
+            for c in cards
+        ],
+        "total_due": store.count_due()
+    }
+
+
+def review_flashcard(
+    card_id: str,
+    performance: float,
+    tool_context: ToolContext,
+) -> Dict[str, Any]:
+    """
+    Record how well the student answered one flashcard.
+    
+    Args:
+        card_id: The card's id (from get_due_flashcards)
+        performance: Performance score (0-1, where 1 is perfect)
+        tool_context: ADK tool context with session state
+    
+    Returns:
+        When the card comes up next
+    """
+    from memory.card_store import FlashcardStore
+    
+    state = tool_context.state
+    store = FlashcardStore(state.get("flashcards", {}))
+    result = store.review_card(card_id, performance)
+    if result is None:
+        return {"status": "not_found", "message": f"No flashcard with id '{card_id}'."}
+    
+    state["flashcards"] = store.cards
+    return {"status": "ok", **result}
+
+
+def merge_topics(
+    topic: str,
+    into: str,
+    tool_context: ToolContext,
+) -> Dict[str, Any]:
+    """
+    Treat `topic` as another name for `into` and merge their progress data.
+    
+    Args:
+        topic: The duplicate topic name (e.g. "BST basics")
+        into: The topic to keep (e.g. "Binary Search Trees")
+        tool_context: ADK tool context with session state
+    
+    Returns:
+        The canonical topic name
+    """
+    state = tool_context.state
+    registry = _topic_registry(state)
+    canonical = registry.add_alias(topic, into)
+    _apply_topic_registry(state, registry)
+    
+    return {
+        "status": "ok",
+        "topic": canonical,
+        "message": f"'{topic}' is now tracked as '{canonical}'."
+    }
+
+
+def suggest_topic_merges(
+    tool_context: ToolContext,
+) -> Dict[str, Any]:
+    """
+    Find topics that look like duplicates of each other.
+    
+    Args:
+        tool_context: ADK tool context with session state
+    
+    Returns:
+        Suggested merges (confirm with the student, then call merge_topics)
+    """
+    state = tool_context.state
+    registry = _topic_registry(state)
+    suggestions = registry.suggest_merges(list(state.get("progress", {}).keys()))
+    
+    return {
+        "status": "ok",
+        "suggestions": suggestions,
+        "message": f"Found {len(suggestions)} possible duplicate topic(s)."
+    }
+
+
+def _topic_registry(state) -> Any:
+    """
+    Get the session's topic registry.
+    
+    Sessions from before the registry existed get their progress, review
+    and flashcard topics merged the first time this is called.
+    """
+    from memory.topic_registry import TopicRegistry
+    
+    if "topic_registry" in state:
+        return TopicRegistry(state["topic_registry"])
+    
+    registry = TopicRegistry()
+    _apply_topic_registry(state, registry)
+    return registry
+
+
+def _apply_topic_registry(state, registry) -> None:
+    """Re-key all topic data in state under canonical topic names."""
+    from memory.topic_registry import merge_progress_stats, merge_review_data
+    
+    if state.get("progress"):
+        state["progress"] = registry.merge_keys(state["progress"], merge_progress_stats)
+        state["progress_aggregates"] = rebuild_aggregates(state["progress"])
+    if state.get("spaced_repetition"):
+        state["spaced_repetition"] = registry.merge_keys(state["spaced_repetition"], merge_review_data)
+    if state.get("flashcards"):
+        cards = state["flashcards"]
+        for card in cards.values():
+            card["topic"] = registry.canonicalize(card["topic"])
+        state["flashcards"] = cards
+    state["topic_registry"] = registry.data
+
+
+def _progress_aggregates(state) -> Dict[str, Any]:
+    """
+    Get the running progress aggregates, rebuilding them if they're missing
+    or don't match state["progress"] (e.g. sessions saved before they existed).
+    """
+    progress = state.get("progress", {})
+    aggregates = state.get("progress_aggregates")
+    if aggregates is None or aggregates.get("topics") != len(progress):
+        aggregates = rebuild_aggregates(progress)
+        state["progress_aggregates"] = aggregates
+    return aggregates
+
+
+def _canonical_topic(state, topic: str) -> str:
+    """Canonical name for a topic, registering it in session state."""
+    registry = _topic_registry(state)
+    canonical = registry.canonicalize(topic)
+    state["topic_registry"] = registry.data
+    return canonical
+
+
 def _get_recommendation(score: float, attempts: int) -> str:
     """Get a recommendation based on score and attempts."""
     if score >= 90: